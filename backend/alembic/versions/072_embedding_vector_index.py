@@ -0,0 +1,46 @@
+"""072_embedding_vector_index
+
+为 terminology / data_training 的 embedding 列创建 pgvector HNSW 索引，
+维度按表中已存储向量的维度，表中还没有向量时跳过（启动时补建）。
+修改索引类型/维度或切换 embedding 模型后可执行 python -m apps.ai_model.vector_index rebuild 重建。
+Revision ID: 5d3c8e7f1a20
+Revises: a2e2ecfa5a9c
+Create Date: 2026-10-17 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5d3c8e7f1a20'
+down_revision = 'a2e2ecfa5a9c'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'terminology': 'idx_terminology_embedding',
+    'data_training': 'idx_data_training_embedding',
+}
+
+
+def upgrade():
+    conn = op.get_bind()
+    for table, index_name in INDEXES.items():
+        dim = conn.execute(sa.text(f"""
+SELECT vector_dims(embedding) AS dim FROM {table}
+WHERE embedding IS NOT NULL
+GROUP BY dim ORDER BY count(*) DESC LIMIT 1
+""")).scalar()
+        if not dim:
+            continue
+        op.execute(f"""
+CREATE INDEX IF NOT EXISTS {index_name}
+ON {table} USING hnsw ((CAST(embedding AS vector({int(dim)}))) vector_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE embedding IS NOT NULL AND vector_dims(embedding) = {int(dim)}
+""")
+
+
+def downgrade():
+    for index_name in INDEXES.values():
+        op.execute(f'DROP INDEX IF EXISTS {index_name}')
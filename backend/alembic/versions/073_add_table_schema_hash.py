@@ -0,0 +1,26 @@
+"""073_add_table_schema_hash
+
+core_table 增加 schema_hash，记录生成 embedding 时表结构文本的哈希，
+同步表结构时只为结构文本发生变化的表重新生成 embedding。
+Revision ID: 8b4e2f6c9d13
+Revises: 5d3c8e7f1a20
+Create Date: 2026-10-17 14:20:05.371902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8b4e2f6c9d13'
+down_revision = '5d3c8e7f1a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('core_table', sa.Column('schema_hash', sa.VARCHAR(length=64), nullable=True))
+    op.execute("COMMENT ON COLUMN core_table.schema_hash IS '表向量对应的结构文本哈希'")
+
+
+def downgrade():
+    op.drop_column('core_table', 'schema_hash')
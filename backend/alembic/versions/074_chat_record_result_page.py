@@ -0,0 +1,188 @@
+"""074_chat_record_result_page
+
+新增 chat_record_result_page，chat_record 的 data / predict_data 中的行数据按页压缩存储，
+原字段只保留结果头与 result_store；已有数据按对话分批转换，同一对话中内容相同的结果
+（分析、预测记录复制的原记录数据）共用一份数据页。
+Revision ID: c6f1a9e4b352
+Revises: 8b4e2f6c9d13
+Create Date: 2026-10-17 18:42:11.604215
+
+"""
+import hashlib
+import zlib
+
+import orjson
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c6f1a9e4b352'
+down_revision = '8b4e2f6c9d13'
+branch_labels = None
+depends_on = None
+
+CHAT_BATCH_SIZE = 100
+PAGE_SIZE = 500
+COMPRESS_LEVEL = 6
+
+RESULT_KIND_DATA = 'data'
+RESULT_KIND_PREDICT = 'predict'
+RESULT_STORE_KEY = 'result_store'
+
+page_table = sa.table('chat_record_result_page',
+                      sa.column('record_id', sa.BigInteger),
+                      sa.column('kind', sa.String),
+                      sa.column('row_start', sa.Integer),
+                      sa.column('row_count', sa.Integer),
+                      sa.column('content', sa.LargeBinary))
+
+
+def _encode_page(payload: dict) -> bytes:
+    return zlib.compress(orjson.dumps(payload), COMPRESS_LEVEL)
+
+
+def _decode_page(content: bytes) -> list:
+    payload = orjson.loads(zlib.decompress(content))
+    if 'rows' in payload:
+        return payload['rows']
+    keys = payload['keys']
+    return [dict(zip(keys, values, strict=True)) for values in zip(*payload['columns'], strict=True)]
+
+
+def _split_rows(rows: list):
+    """按 PAGE_SIZE 行分页，返回 (起始行, 行数, 压缩内容)；各行为键相同的对象时转为列式存储"""
+    if rows and isinstance(rows[0], dict):
+        keys = tuple(rows[0])
+        if all(isinstance(row, dict) and tuple(row) == keys for row in rows):
+            for start in range(0, len(rows), PAGE_SIZE):
+                page = rows[start:start + PAGE_SIZE]
+                columns = [list(values) for values in zip(*(row.values() for row in page), strict=True)]
+                yield start, len(page), _encode_page({'keys': list(keys), 'columns': columns})
+            return
+    for start in range(0, len(rows), PAGE_SIZE):
+        page = rows[start:start + PAGE_SIZE]
+        yield start, len(page), _encode_page({'rows': page})
+
+
+def _save_pages(conn, record_id: int, kind: str, rows: list) -> dict:
+    values = [{'record_id': record_id, 'kind': kind, 'row_start': row_start, 'row_count': row_count,
+               'content': content}
+              for row_start, row_count, content in _split_rows(rows)]
+    conn.execute(page_table.insert(), values)
+    return {'record_id': record_id, 'kind': kind, 'total': len(rows)}
+
+
+def _convert(conn, record_id: int, raw: str, kind: str, converted: dict):
+    """返回转换后的字段内容，无需转换时返回 None；converted 为同一对话中已转换内容的 {哈希: 新内容}"""
+    digest = hashlib.sha1(f'{kind}:{raw}'.encode()).hexdigest()
+    if digest in converted:
+        return converted[digest]
+    try:
+        obj = orjson.loads(raw)
+    except Exception:
+        return None
+    if kind == RESULT_KIND_DATA:
+        if not isinstance(obj, dict) or RESULT_STORE_KEY in obj or not isinstance(obj.get('data'), list) \
+                or not obj['data']:
+            return None
+        header = {key: value for key, value in obj.items() if key != 'data'}
+        header[RESULT_STORE_KEY] = _save_pages(conn, record_id, kind, obj['data'])
+        value = orjson.dumps(header).decode()
+    else:
+        if not isinstance(obj, list) or not obj:
+            return None
+        value = orjson.dumps({RESULT_STORE_KEY: _save_pages(conn, record_id, kind, obj)}).decode()
+    converted[digest] = value
+    return value
+
+
+def _migrate_existing(conn):
+    last_chat_id = None
+    while True:
+        params = {'size': CHAT_BATCH_SIZE}
+        condition = ''
+        if last_chat_id is not None:
+            params['last'] = last_chat_id
+            condition = ' AND chat_id > :last'
+        chat_ids = conn.execute(sa.text(
+            "SELECT DISTINCT chat_id FROM chat_record WHERE (data IS NOT NULL OR predict_data IS NOT NULL)"
+            f"{condition} ORDER BY chat_id LIMIT :size"), params).scalars().all()
+        if not chat_ids:
+            return
+        last_chat_id = chat_ids[-1]
+        records = conn.execute(sa.text(
+            "SELECT id, chat_id, data, predict_data FROM chat_record WHERE chat_id = ANY(:ids) ORDER BY chat_id, id"),
+            {'ids': list(chat_ids)}).all()
+        converted = {}
+        current_chat = None
+        for record in records:
+            if record.chat_id != current_chat:
+                current_chat = record.chat_id
+                converted = {}
+            values = {}
+            if record.data:
+                data = _convert(conn, record.id, record.data, RESULT_KIND_DATA, converted)
+                if data is not None:
+                    values['data'] = data
+            if record.predict_data:
+                predict_data = _convert(conn, record.id, record.predict_data, RESULT_KIND_PREDICT, converted)
+                if predict_data is not None:
+                    values['predict_data'] = predict_data
+            if values:
+                conn.execute(sa.text(f"UPDATE chat_record SET {', '.join(f'{k} = :{k}' for k in values)} "
+                                     f"WHERE id = :id"), dict(values, id=record.id))
+
+
+def _restore_existing(conn):
+    """降级：将数据页还原为 data / predict_data 中的完整 JSON"""
+    records = conn.execute(sa.text(
+        "SELECT id, data, predict_data FROM chat_record WHERE data LIKE :pattern OR predict_data LIKE :pattern"),
+        {'pattern': f'%"{RESULT_STORE_KEY}"%'}).all()
+    for record in records:
+        values = {}
+        for key in ('data', 'predict_data'):
+            raw = getattr(record, key)
+            if not raw:
+                continue
+            try:
+                obj = orjson.loads(raw)
+            except Exception:
+                continue
+            store = obj.get(RESULT_STORE_KEY) if isinstance(obj, dict) else None
+            if not store:
+                continue
+            rows = []
+            for page in conn.execute(sa.text(
+                    "SELECT content FROM chat_record_result_page WHERE record_id = :record_id AND kind = :kind "
+                    "ORDER BY row_start"), {'record_id': store['record_id'], 'kind': store['kind']}):
+                rows.extend(_decode_page(page.content))
+            if key == 'data':
+                obj.pop(RESULT_STORE_KEY)
+                obj['data'] = rows
+                values[key] = orjson.dumps(obj).decode()
+            else:
+                values[key] = orjson.dumps(rows).decode()
+        if values:
+            conn.execute(sa.text(f"UPDATE chat_record SET {', '.join(f'{k} = :{k}' for k in values)} WHERE id = :id"),
+                         dict(values, id=record.id))
+
+
+def upgrade():
+    op.create_table('chat_record_result_page',
+                    sa.Column('id', sa.BigInteger(), sa.Identity(always=True), nullable=False),
+                    sa.Column('record_id', sa.BigInteger(), nullable=False),
+                    sa.Column('kind', sa.String(length=16), nullable=False),
+                    sa.Column('row_start', sa.Integer(), nullable=False),
+                    sa.Column('row_count', sa.Integer(), nullable=False),
+                    sa.Column('content', sa.LargeBinary(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('idx_chat_record_result_page_record', 'chat_record_result_page',
+                    ['record_id', 'kind', 'row_start'])
+    _migrate_existing(op.get_bind())
+
+
+def downgrade():
+    _restore_existing(op.get_bind())
+    op.drop_index('idx_chat_record_result_page_record', table_name='chat_record_result_page')
+    op.drop_table('chat_record_result_page')
@@ -1,6 +1,10 @@
 import os.path
 import threading
-from typing import Optional
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
 
 from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
@@ -61,3 +65,138 @@ class EmbeddingModelCache:
                     _embedding_model[key] = model_instance
 
         return model_instance
+
+
+class EmbeddingQueryCache:
+    """
+    问题向量缓存
+    一次问答中术语、SQL示例、数据源、表的检索都会对同一个问题做 embed_query，
+    这里按 (模型, 归一化文本) 做两级缓存：请求级上下文 + 进程级带 TTL 的 LRU
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[tuple[str, str], tuple[float, list[float]]] = OrderedDict()
+        self.hits = 0
+        self.request_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple[str, str]) -> Optional[list[float]]:
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            expire_at, vector = item
+            if expire_at < time.monotonic():
+                del self._cache[key]
+                self.evictions += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: tuple[str, str], vector: list[float]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, vector)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def record_request_hit(self):
+        with self._lock:
+            self.request_hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.request_hits + self.misses
+            return {
+                'size': len(self._cache),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'request_hits': self.request_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.request_hits) / total if total else 0.0,
+            }
+
+
+embedding_query_cache = EmbeddingQueryCache(settings.EMBEDDING_QUERY_CACHE_SIZE, settings.EMBEDDING_QUERY_CACHE_TTL)
+
+_request_embeddings: ContextVar[Optional[dict[tuple[str, str], list[float]]]] = ContextVar('request_embeddings',
+                                                                                        default=None)
+# 调用模型的执行方式，异步模式下由 LLMService.run_blocking 放到线程中执行，避免推理阻塞事件循环
+_embedding_runner: ContextVar[Optional[Callable]] = ContextVar('embedding_runner', default=None)
+
+
+@contextmanager
+def question_embedding_context(runner: Optional[Callable] = None):
+    """
+    请求级问题向量上下文，在同一线程内（run_task 等）共享已计算的问题向量；
+    runner(fn, *args) 用于执行未命中缓存时的模型调用
+    """
+    token = _request_embeddings.set({})
+    runner_token = _embedding_runner.set(runner)
+    try:
+        yield
+    finally:
+        _embedding_runner.reset(runner_token)
+        _request_embeddings.reset(token)
+
+
+def _run_model(fn, *args):
+    runner = _embedding_runner.get()
+    return runner(fn, *args) if runner else fn(*args)
+
+
+def _embed_query(key: str, text: str) -> list[float]:
+    return EmbeddingModelCache.get_model(key).embed_query(text)
+
+
+def _embed_documents(key: str, texts: list[str]) -> list[list[float]]:
+    return EmbeddingModelCache.get_model(key).embed_documents(texts)
+
+
+def normalize_question(text: str) -> str:
+    return ' '.join(text.split()) if text else ''
+
+
+def embed_question(text: str, key: str = settings.DEFAULT_EMBEDDING_MODEL) -> list[float]:
+    """获取问题向量，依次查找请求上下文、进程级缓存，未命中才调用模型"""
+    cache_key = (key, normalize_question(text))
+
+    request_cache = _request_embeddings.get()
+    if request_cache is not None:
+        vector = request_cache.get(cache_key)
+        if vector is not None:
+            embedding_query_cache.record_request_hit()
+            return vector
+
+    vector = embedding_query_cache.get(cache_key)
+    if vector is None:
+        embedding_query_cache.record_miss()
+        vector = _run_model(_embed_query, key, text)
+        embedding_query_cache.put(cache_key, vector)
+
+    if request_cache is not None:
+        request_cache[cache_key] = vector
+    return vector
+
+
+def embed_documents(texts: list[str], key: str = settings.DEFAULT_EMBEDDING_MODEL) -> list[list[float]]:
+    """批量计算文本向量（不缓存），模型调用与 embed_question 一样按问题向量上下文的 runner 执行"""
+    return _run_model(_embed_documents, key, texts)
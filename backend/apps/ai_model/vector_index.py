@@ -0,0 +1,235 @@
+"""
+pgvector 向量索引管理
+
+terminology / data_training 的 embedding 列声明为不定长 VECTOR()，pgvector 无法直接在其上建立 HNSW/IVFFlat 索引，
+因此这里统一使用 `CAST(embedding AS vector(N))` 表达式索引，并以 `vector_dims(embedding) = N` 作为部分索引条件，
+维度不一致（例如切换过 embedding 模型）的历史数据不会进入索引，也不会导致建索引失败。
+
+索引维度取 EMBEDDING_VECTOR_DIMENSION，为 0 时按表中已存储向量的维度（重建时没有数据则按当前 embedding 模型的输出维度）；
+迁移时表中还没有向量的，启动时补建索引。
+检索时从索引定义读取实际维度，与问题向量维度一致才使用与索引完全相同的表达式和条件走索引，
+否则退回不带维度条件的表达式并告警，避免部分索引条件把所有数据过滤掉。
+
+重建索引：
+    python -m apps.ai_model.vector_index rebuild [--type hnsw|ivfflat|none] [--dimension 768]
+"""
+import argparse
+import re
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from common.core.config import settings
+from common.utils.utils import SQLBotLogUtil
+
+VECTOR_INDEX_TYPES = ('hnsw', 'ivfflat', 'none')
+
+# 表名 -> 索引名
+VECTOR_INDEX_TABLES: dict[str, str] = {
+    'terminology': 'idx_terminology_embedding',
+    'data_training': 'idx_data_training_embedding',
+}
+
+# 索引维度缓存（秒），索引可能由其他进程重建
+INDEX_DIMENSION_CACHE_TTL = 60
+
+# 表名 -> (读取时间, 索引维度)
+_index_dimensions: dict[str, tuple[float, Optional[int]]] = {}
+# 已告警过的 (表名, 索引维度, 问题向量维度)
+_dimension_warnings: set[tuple[str, int, int]] = set()
+
+
+def get_index_type(index_type: Optional[str] = None) -> str:
+    _type = (index_type or settings.EMBEDDING_VECTOR_INDEX_TYPE or 'none').lower()
+    if _type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f'Unsupported vector index type: {_type}')
+    return _type
+
+
+def get_dimension(dimension: Optional[int] = None) -> Optional[int]:
+    """显式配置的索引维度，未配置（0）时返回 None，由已存储数据或 embedding 模型决定"""
+    return dimension or settings.EMBEDDING_VECTOR_DIMENSION or None
+
+
+def vector_index_enabled() -> bool:
+    return get_index_type() != 'none'
+
+
+def detect_dimension(conn, table: str) -> Optional[int]:
+    """表中已存储向量最常见的维度"""
+    return conn.execute(text(f"""
+SELECT vector_dims(embedding) AS dim FROM {table}
+WHERE embedding IS NOT NULL
+GROUP BY dim ORDER BY count(*) DESC LIMIT 1
+""")).scalar()
+
+
+def get_index_dimension(session, table: str) -> Optional[int]:
+    """从索引定义中读取索引维度，没有索引时返回 None"""
+    now = time.monotonic()
+    cached = _index_dimensions.get(table)
+    if cached and now - cached[0] < INDEX_DIMENSION_CACHE_TTL:
+        return cached[1]
+    indexdef = session.execute(text('SELECT indexdef FROM pg_indexes WHERE indexname = :name'),
+                               {'name': VECTOR_INDEX_TABLES[table]}).scalar()
+    match = re.search(r'vector\((\d+)\)', indexdef) if indexdef else None
+    dimension = int(match.group(1)) if match else None
+    _index_dimensions[table] = (now, dimension)
+    return dimension
+
+
+def prepare_vector_search(session, table: str, embedding: list[float]) -> Optional[int]:
+    """
+    检索前确认能否走索引：问题向量维度与索引维度一致时设置检索参数并返回该维度，否则返回 None
+    维度不一致（例如切换过 embedding 模型但未重建索引）时告警，并使用不带索引的表达式检索
+    """
+    if not vector_index_enabled():
+        return None
+    dimension = len(embedding)
+    index_dimension = get_index_dimension(session, table)
+    if index_dimension is None:
+        return None
+    if index_dimension != dimension:
+        if (table, index_dimension, dimension) not in _dimension_warnings:
+            _dimension_warnings.add((table, index_dimension, dimension))
+            SQLBotLogUtil.warning(
+                f'Vector index on {table} has dimension {index_dimension}, but the embedding model returns '
+                f'{dimension}, searching without the index. Run "python -m apps.ai_model.vector_index rebuild" '
+                f'to rebuild it')
+        return None
+    apply_search_settings(session)
+    return dimension
+
+
+def embedding_distance_sql(column: str = 'embedding', param: str = 'embedding_array',
+                           dimension: Optional[int] = None) -> str:
+    """余弦距离表达式，传入索引维度时与索引表达式保持一致"""
+    if not dimension:
+        return f'{column} <=> :{param}'
+    return f'CAST({column} AS vector({dimension})) <=> CAST(:{param} AS vector({dimension}))'
+
+
+def embedding_filter_sql(column: str = 'embedding', dimension: Optional[int] = None) -> str:
+    """参与向量检索的行过滤条件，传入索引维度时与部分索引条件保持一致"""
+    if not dimension:
+        return f'{column} IS NOT NULL'
+    return f'{column} IS NOT NULL AND vector_dims({column}) = {dimension}'
+
+
+def render_search_sql(sql: str, dimension: Optional[int] = None) -> str:
+    """填充检索 SQL 模板中的 {embedding_distance} / {embedding_filter}"""
+    return sql.format(embedding_distance=embedding_distance_sql(dimension=dimension),
+                      embedding_filter=embedding_filter_sql(dimension=dimension))
+
+
+def search_settings_sql() -> list[str]:
+    """检索前需要在当前事务中设置的参数"""
+    index_type = get_index_type()
+    if index_type == 'hnsw':
+        return [f'SET LOCAL hnsw.ef_search = {int(settings.EMBEDDING_HNSW_EF_SEARCH)}']
+    if index_type == 'ivfflat':
+        return [f'SET LOCAL ivfflat.probes = {int(settings.EMBEDDING_IVFFLAT_PROBES)}']
+    return []
+
+
+def apply_search_settings(session) -> None:
+    for sql in search_settings_sql():
+        session.execute(text(sql))
+
+
+def create_index_sql(table: str, dimension: int, index_type: Optional[str] = None,
+                     concurrently: bool = False) -> Optional[str]:
+    index_type = get_index_type(index_type)
+    if index_type == 'none':
+        return None
+    index_name = VECTOR_INDEX_TABLES[table]
+    if index_type == 'hnsw':
+        options = f'WITH (m = {int(settings.EMBEDDING_HNSW_M)}, ef_construction = {int(settings.EMBEDDING_HNSW_EF_CONSTRUCTION)})'
+    else:
+        options = f'WITH (lists = {int(settings.EMBEDDING_IVFFLAT_LISTS)})'
+    return f"""
+CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name}
+ON {table} USING {index_type} ((CAST(embedding AS vector({int(dimension)}))) vector_cosine_ops)
+{options}
+WHERE embedding IS NOT NULL AND vector_dims(embedding) = {int(dimension)}
+"""
+
+
+def drop_index_sql(table: str, concurrently: bool = False) -> str:
+    return f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {VECTOR_INDEX_TABLES[table]}"
+
+
+def model_dimension() -> Optional[int]:
+    """当前 embedding 模型的输出维度"""
+    if not settings.EMBEDDING_ENABLED:
+        return None
+    from apps.ai_model.embedding import embed_documents
+
+    return len(embed_documents(['dimension'])[0])
+
+
+def rebuild_vector_indexes(engine: Engine, index_type: Optional[str] = None, dimension: Optional[int] = None):
+    """
+    重建向量索引（切换索引类型/维度/embedding 模型，或大批量导入数据后使用）
+    使用 CONCURRENTLY，不阻塞在线检索与写入
+    """
+    index_type = get_index_type(index_type)
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in VECTOR_INDEX_TABLES.keys():
+            conn.execute(text(drop_index_sql(table, concurrently=True)))
+            if index_type == 'none':
+                SQLBotLogUtil.info(f'Vector index on {table} dropped')
+                continue
+            dim = get_dimension(dimension) or detect_dimension(conn, table) or model_dimension()
+            if not dim:
+                SQLBotLogUtil.warning(f'Vector index on {table} skipped, the embedding dimension is unknown')
+                continue
+            conn.execute(text(create_index_sql(table, dim, index_type, concurrently=True)))
+            conn.execute(text(f'ANALYZE {table}'))
+            SQLBotLogUtil.info(f'Vector index on {table} rebuilt, type: {index_type}, dimension: {dim}')
+    _index_dimensions.clear()
+
+
+def ensure_vector_indexes(engine: Engine):
+    """
+    启动时为还没有向量索引的表建索引（迁移时表中还没有向量、无法确定维度的情况）
+    已有索引不做变更，切换 embedding 模型或索引配置后需手动重建
+    """
+    if not vector_index_enabled():
+        return
+    try:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for table, index_name in VECTOR_INDEX_TABLES.items():
+                if conn.execute(text('SELECT 1 FROM pg_indexes WHERE indexname = :name'),
+                                {'name': index_name}).first():
+                    continue
+                dim = get_dimension() or detect_dimension(conn, table)
+                if not dim:
+                    continue
+                conn.execute(text(create_index_sql(table, dim, concurrently=True)))
+                SQLBotLogUtil.info(f'Vector index on {table} created, dimension: {dim}')
+    except Exception as e:
+        SQLBotLogUtil.warning(f'Failed to create vector indexes: {e}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLBot pgvector index management')
+    parser.add_argument('action', choices=['rebuild', 'drop'])
+    parser.add_argument('--type', dest='index_type', choices=VECTOR_INDEX_TYPES, default=None)
+    parser.add_argument('--dimension', type=int, default=None)
+    args = parser.parse_args()
+
+    from common.core.db import engine
+
+    if args.action == 'rebuild':
+        rebuild_vector_indexes(engine, args.index_type, args.dimension)
+    else:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for table in VECTOR_INDEX_TABLES.keys():
+                conn.execute(text(drop_index_sql(table, concurrently=True)))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ from typing import Optional, List
 
 import orjson
 import pandas as pd
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy import and_, select
 from starlette.responses import JSONResponse
@@ -14,7 +14,7 @@ from apps.chat.curd.chat import delete_chat_with_user, get_chart_data_with_user,
     list_chats, get_chat_with_records, create_chat, get_chat_chart_data, get_chat_predict_data, \
     get_chat_with_records_with_data, get_chat_record_by_id, \
     format_json_data, format_json_list_data, get_chart_config, list_recent_questions, rename_chat_with_user, \
-    get_chat_log_history, get_chart_data_with_user_live
+    get_chat_log_history, get_chart_data_with_user_live, page_chart_data_with_user, page_chat_predict_data_with_user
 from apps.chat.models.chat_model import CreateChat, ChatRecord, RenameChat, ChatQuestion, AxisObj, QuickCommand, \
     ChatInfo, Chat, ChatFinishStep, ChatQuestionBase, SimpleChat
 from apps.chat.task.llm import LLMService
@@ -46,10 +46,12 @@ async def get_chat(session: SessionDep, current_user: CurrentUser, chart_id: int
 
 @router.get("/{chart_id}/with_data", response_model=ChatInfo, summary=f"{PLACEHOLDER_PREFIX}get_chat_with_data")
 async def get_chat_with_data(session: SessionDep, current_user: CurrentUser, chart_id: int,
-                             current_assistant: CurrentAssistant):
+                             current_assistant: CurrentAssistant,
+                             data_limit: Optional[int] = Query(None, ge=0,
+                                                               description=f"{PLACEHOLDER_PREFIX}chat_data_limit")):
     def inner():
         return get_chat_with_records_with_data(chart_id=chart_id, session=session, current_user=current_user,
-                                               current_assistant=current_assistant)
+                                               current_assistant=current_assistant, data_limit=data_limit)
 
     return await asyncio.to_thread(inner)
 
@@ -81,6 +83,24 @@ async def chat_record_data(session: SessionDep, current_user: CurrentUser, chat_
     return await asyncio.to_thread(inner)
 
 
+@router.get("/record/{chat_record_id}/data/page/{current_page}/{page_size}",
+            summary=f"{PLACEHOLDER_PREFIX}get_chart_data_page")
+async def chat_record_data_page(session: SessionDep, current_user: CurrentUser, chat_record_id: int, current_page: int,
+                                page_size: int):
+    def inner():
+        _current_page, _page_size, total_count, total_pages, data = page_chart_data_with_user(
+            session, current_user, chat_record_id, current_page, page_size)
+        return {
+            "current_page": _current_page,
+            "page_size": _page_size,
+            "total_count": total_count,
+            "total_pages": total_pages,
+            **format_json_data(data)
+        }
+
+    return await asyncio.to_thread(inner)
+
+
 @router.get("/record/{chat_record_id}/data_live", summary=f"{PLACEHOLDER_PREFIX}get_chart_data_live")
 async def chat_record_data_live(session: SessionDep, current_user: CurrentUser, chat_record_id: int):
     def inner():
@@ -100,6 +120,24 @@ async def chat_predict_data(session: SessionDep, current_user: CurrentUser, chat
     return await asyncio.to_thread(inner)
 
 
+@router.get("/record/{chat_record_id}/predict_data/page/{current_page}/{page_size}",
+            summary=f"{PLACEHOLDER_PREFIX}get_chart_predict_data_page")
+async def chat_predict_data_page(session: SessionDep, current_user: CurrentUser, chat_record_id: int,
+                                 current_page: int, page_size: int):
+    def inner():
+        _current_page, _page_size, total_count, total_pages, data = page_chat_predict_data_with_user(
+            session, current_user, chat_record_id, current_page, page_size)
+        return {
+            "current_page": _current_page,
+            "page_size": _page_size,
+            "total_count": total_count,
+            "total_pages": total_pages,
+            "data": format_json_list_data(data)
+        }
+
+    return await asyncio.to_thread(inner)
+
+
 @router.get("/record/{chat_record_id}/log", summary=f"{PLACEHOLDER_PREFIX}get_record_log")
 async def chat_record_log(session: SessionDep, current_user: CurrentUser, chat_record_id: int):
     def inner():
@@ -362,7 +400,7 @@ async def stream_sql(session: SessionDep, current_user: CurrentUser, request_que
     else:
         res = llm_service.await_result()
         raw_data = {}
-        for chunk in res:
+        async for chunk in res:
             if chunk:
                 raw_data = chunk
         status_code = 200
@@ -433,7 +471,7 @@ async def analysis_or_predict(session: SessionDep, current_user: CurrentUser, ch
     else:
         res = llm_service.await_result()
         raw_data = {}
-        for chunk in res:
+        async for chunk in res:
             if chunk:
                 raw_data = chunk
         status_code = 200
@@ -3,11 +3,13 @@ from decimal import Decimal
 from typing import List, Optional, Union, Dict, Any
 
 import orjson
-import sqlparse
 from sqlalchemy import and_, select, update
 from sqlalchemy import desc, func
 from sqlalchemy.orm import aliased
 
+from apps.chat.curd.chat_result import RESULT_KIND_DATA, RESULT_KIND_PREDICT, RESULT_STORE_KEY, save_result_pages, \
+    split_columns, split_rows, build_data_header, get_result_store, load_record_data, load_record_predict_data, \
+    load_result_rows_batch, result_total
 from apps.chat.models.chat_model import Chat, ChatRecord, CreateChat, ChatInfo, RenameChat, ChatQuestion, ChatLog, \
     TypeEnum, OperationEnum, ChatRecordResult, ChatLogHistory, ChatLogHistoryItem
 from apps.datasource.crud.datasource import get_ds
@@ -15,8 +17,11 @@ from apps.datasource.crud.recommended_problem import get_datasource_recommended_
 from apps.datasource.models.datasource import CoreDatasource
 from apps.db.constant import DB
 from apps.db.db import exec_sql
+from apps.db.parsed_sql import parse_sql
+from apps.db.result_set import ColumnarResult
 from apps.system.crud.assistant import AssistantOutDs, AssistantOutDsFactory
 from apps.system.schemas.system_schema import AssistantOutDsSchema
+from common.core.config import settings
 from common.core.deps import CurrentAssistant, SessionDep, CurrentUser, Trans
 from common.utils.data_format import DataFormat
 from common.utils.utils import extract_nested_json, SQLBotLogUtil
@@ -229,17 +234,59 @@ def get_chat_chart_config(session: SessionDep, chat_record_id: int):
     return {}
 
 
-def get_chart_data_with_user(session: SessionDep, current_user: CurrentUser, chat_record_id: int):
+def get_chart_data_with_user(session: SessionDep, current_user: CurrentUser, chat_record_id: int,
+                             offset: int = 0, limit: Optional[int] = None):
     stmt = select(ChatRecord.data).where(and_(ChatRecord.id == chat_record_id, ChatRecord.create_by == current_user.id))
     res = session.execute(stmt)
     for row in res:
         try:
-            return orjson.loads(row.data)
+            return load_record_data(session, orjson.loads(row.data), offset, limit)
         except Exception:
             pass
     return {}
 
 
+def _page_range(total_count: int, current_page: int, page_size: int):
+    page_size = max(1, page_size)
+    total_pages = (total_count + page_size - 1) // page_size
+    current_page = max(1, min(current_page, total_pages)) if total_pages > 0 else 1
+    return current_page, page_size, total_pages
+
+
+def page_chart_data_with_user(session: SessionDep, current_user: CurrentUser, chat_record_id: int,
+                              current_page: int = 1, page_size: int = 100):
+    """分页读取查询结果，只解压当前页涉及的数据页"""
+    stmt = select(ChatRecord.data).where(and_(ChatRecord.id == chat_record_id, ChatRecord.create_by == current_user.id))
+    row = session.execute(stmt).first()
+    obj = {}
+    if row and row.data:
+        try:
+            obj = orjson.loads(row.data)
+        except Exception:
+            pass
+    total_count = result_total(obj)
+    current_page, page_size, total_pages = _page_range(total_count, current_page, page_size)
+    data = load_record_data(session, obj, (current_page - 1) * page_size, page_size)
+    return current_page, page_size, total_count, total_pages, data
+
+
+def page_chat_predict_data_with_user(session: SessionDep, current_user: CurrentUser, chat_record_id: int,
+                                     current_page: int = 1, page_size: int = 100):
+    stmt = select(ChatRecord.predict_data).where(
+        and_(ChatRecord.id == chat_record_id, ChatRecord.create_by == current_user.id))
+    row = session.execute(stmt).first()
+    obj = []
+    if row and row.predict_data:
+        try:
+            obj = orjson.loads(row.predict_data)
+        except Exception:
+            pass
+    total_count = result_total(obj)
+    current_page, page_size, total_pages = _page_range(total_count, current_page, page_size)
+    data = load_record_predict_data(session, obj, (current_page - 1) * page_size, page_size)
+    return current_page, page_size, total_count, total_pages, data if isinstance(data, list) else []
+
+
 def get_chart_data_with_user_live(session: SessionDep, current_user: CurrentUser, chat_record_id: int):
     stmt = select(ChatRecord.datasource, ChatRecord.sql).where(
         and_(ChatRecord.id == chat_record_id, ChatRecord.create_by == current_user.id))
@@ -248,18 +295,27 @@ def get_chart_data_with_user_live(session: SessionDep, current_user: CurrentUser
 
 
 def get_chart_data_ds(session: SessionDep, ds_id, sql):
-    json_result: Dict[str, Any] = {'status': 'success', 'data': [], 'message': ''}
     try:
         datasource = get_ds(session, ds_id)
+    except Exception as e:
+        SQLBotLogUtil.error(f"Function failed: {e}")
+        return {'status': 'failed', 'data': [], 'message': f"{e}"}
+    return get_chart_data_by_ds(datasource, sql)
+
+
+def get_chart_data_by_ds(datasource: CoreDatasource | None, sql):
+    """执行图表 SQL，不依赖数据库会话，可在线程池中并发调用"""
+    json_result: Dict[str, Any] = {'status': 'success', 'data': [], 'message': ''}
+    try:
         if datasource is None:
             json_result['status'] = 'failed'
             json_result['message'] = 'Datasource not found'
             return json_result
         else:
-            result = exec_sql(ds=datasource, sql=sql, origin_column=False)
-            _data = DataFormat.convert_large_numbers_in_object_array(result.get('data'))
-            _data = DataFormat.normalize_qualified_sql_column_keys_in_object_array(_data)
-            json_result['data'] = _data
+            result = exec_sql(ds=datasource, sql=sql, origin_column=False, use_cache=True, columnar=True)
+            DataFormat.convert_large_numbers_in_columns(result)
+            DataFormat.normalize_qualified_sql_column_keys_in_columns(result)
+            json_result['data'] = result.rows()
             return json_result
     except Exception as e:
         SQLBotLogUtil.error(f"Function failed: {e}")
@@ -274,7 +330,7 @@ def get_chat_chart_data(session: SessionDep, chat_record_id: int):
     res = session.execute(stmt)
     for row in res:
         try:
-            return orjson.loads(row.data)
+            return load_record_data(session, orjson.loads(row.data))
         except Exception:
             pass
     return {}
@@ -286,7 +342,7 @@ def get_chat_predict_data_with_user(session: SessionDep, current_user: CurrentUs
     res = session.execute(stmt)
     for row in res:
         try:
-            return orjson.loads(row.predict_data)
+            return load_record_predict_data(session, orjson.loads(row.predict_data))
         except Exception:
             pass
     return {}
@@ -297,15 +353,15 @@ def get_chat_predict_data(session: SessionDep, chat_record_id: int):
     res = session.execute(stmt)
     for row in res:
         try:
-            return orjson.loads(row.predict_data)
+            return load_record_predict_data(session, orjson.loads(row.predict_data))
         except Exception:
             pass
     return {}
 
 
 def get_chat_with_records_with_data(session: SessionDep, chart_id: int, current_user: CurrentUser,
-                                    current_assistant: CurrentAssistant) -> ChatInfo:
-    return get_chat_with_records(session, chart_id, current_user, current_assistant, True)
+                                    current_assistant: CurrentAssistant, data_limit: Optional[int] = None) -> ChatInfo:
+    return get_chat_with_records(session, chart_id, current_user, current_assistant, True, data_limit=data_limit)
 
 
 dynamic_ds_types = [1, 3]
@@ -313,7 +369,8 @@ dynamic_ds_types = [1, 3]
 
 def get_chat_with_records(session: SessionDep, chart_id: int, current_user: CurrentUser,
                           current_assistant: CurrentAssistant, with_data: bool = False,
-                          trans: Trans = None) -> ChatInfo:
+                          trans: Trans = None, data_limit: Optional[int] = None) -> ChatInfo:
+    """data_limit: with_data 时每条记录返回的查询结果、预测数据行数上限，None 为全部，其余行通过分页接口读取"""
     chat = session.get(Chat, chart_id)
     if not chat:
         raise Exception(f"Chat with id {chart_id} not found")
@@ -466,6 +523,9 @@ def get_chat_with_records(session: SessionDep, chart_id: int, current_user: Curr
 
     result = list(map(format_record, record_list))
 
+    if with_data:
+        _fill_record_result_rows(session, result, data_limit)
+
     for row in result:
         try:
             data_value = row.get('data')
@@ -479,6 +539,36 @@ def get_chat_with_records(session: SessionDep, chart_id: int, current_user: Curr
     return chat_info
 
 
+def _fill_record_result_rows(session: SessionDep, records: list[dict], data_limit: Optional[int] = None):
+    """批量读取各记录分页存储的查询结果、预测数据（一次查询），data_total / predict_data_total 为总行数"""
+    stores = []
+    for record in records:
+        for key in ('data', 'predict_data'):
+            store = get_result_store(record.get(key))
+            if store:
+                stores.append(store)
+    rows_map = load_result_rows_batch(session, stores, data_limit)
+    for record in records:
+        data_value = record.get('data')
+        if isinstance(data_value, dict):
+            record['data_total'] = result_total(data_value)
+            store = get_result_store(data_value)
+            if store:
+                data_value = {key: value for key, value in data_value.items() if key != RESULT_STORE_KEY}
+                data_value['data'] = rows_map.get((store['record_id'], store['kind']), [])
+                record['data'] = data_value
+            elif data_limit is not None and data_value.get('data'):
+                data_value['data'] = data_value['data'][:data_limit]
+        predict_value = record.get('predict_data')
+        if predict_value is not None:
+            record['predict_data_total'] = result_total(predict_value)
+            store = get_result_store(predict_value)
+            if store:
+                record['predict_data'] = rows_map.get((store['record_id'], store['kind']), [])
+            elif data_limit is not None and isinstance(predict_value, list):
+                record['predict_data'] = predict_value[:data_limit]
+
+
 def format_record(record: ChatRecordResult):
     _dict = record.model_dump()
 
@@ -522,7 +612,7 @@ def format_record(record: ChatRecordResult):
             pass
     if record.sql and record.sql.strip() != '':
         try:
-            _dict['sql'] = sqlparse.format(record.sql, reindent=True)
+            _dict['sql'] = parse_sql(record.sql).pretty()
         except Exception:
             pass
 
@@ -822,6 +912,7 @@ def save_analysis_predict_record(session: SessionDep, base_record: ChatRecord, a
     record.create_time = datetime.datetime.now()
     record.create_by = base_record.create_by
     record.chart = base_record.chart
+    # 结果头中的 result_store 指向原记录的数据页，直接共用
     record.data = base_record.data
 
     if action_type == 'analysis':
@@ -1077,6 +1168,18 @@ def save_predict_data(session: SessionDep, record_id: int, data: str = '') -> Ch
         raise Exception("Record id cannot be None")
     record = get_chat_record_by_id(session, record_id)
 
+    rows = None
+    try:
+        rows = orjson.loads(data) if data else None
+    except Exception:
+        pass
+    if isinstance(rows, list) and rows:
+        # 预测数据分页压缩存储，predict_data 只保存 result_store
+        store = save_result_pages(session, record.id, RESULT_KIND_PREDICT,
+                                  split_rows(rows, settings.CHAT_RESULT_PAGE_SIZE))
+        data = orjson.dumps({RESULT_STORE_KEY: store}).decode()
+    else:
+        save_result_pages(session, record.id, RESULT_KIND_PREDICT, [])
     record.predict_data = data
 
     result = ChatRecord(**record.model_dump())
@@ -1144,6 +1247,22 @@ def save_sql_exec_data(session: SessionDep, record_id: int, data: str) -> ChatRe
     return result
 
 
+def save_sql_exec_result(session: SessionDep, record_id: int, data_obj: dict,
+                         result: Optional[ColumnarResult] = None) -> ChatRecord:
+    """
+    保存查询结果，data_obj 为结果头（fields、fields_info、sql 等，不含行数据）
+    有数据时按列分页压缩存储，ChatRecord.data 只保存结果头与 result_store；没有数据时保存 data 为空数组
+    """
+    if result is not None and len(result):
+        store = save_result_pages(session, record_id, RESULT_KIND_DATA,
+                                  split_columns(result.keys, result.columns, settings.CHAT_RESULT_PAGE_SIZE))
+        data = build_data_header(data_obj, store)
+    else:
+        save_result_pages(session, record_id, RESULT_KIND_DATA, [])
+        data = orjson.dumps(dict(data_obj, data=[])).decode()
+    return save_sql_exec_data(session, record_id, data)
+
+
 def finish_record(session: SessionDep, record_id: int) -> ChatRecord:
     if not record_id:
         raise Exception("Record id cannot be None")
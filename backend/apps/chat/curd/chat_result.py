@@ -0,0 +1,164 @@
+"""
+对话查询结果的分页存储
+
+ChatRecord.data / predict_data 中只保存结果头（fields、fields_info、sql 等）与 result_store 描述，
+行数据按 CHAT_RESULT_PAGE_SIZE 行一页写入 chat_record_result_page，每页为 zlib 压缩的列式 JSON：
+    {"keys": [...], "columns": [[...], ...]}   各行键相同时（查询结果）
+    {"rows": [{...}, ...]}                      各行键不同时（如预测数据）
+读取时只解压与请求范围相交的页。result_store 中记录数据页所属的 record_id，
+分析、预测记录复制原记录的结果头即可共享数据页。
+未分页的旧格式（data 中直接保存行）仍可读取，由 074 迁移转换为分页存储。
+"""
+import zlib
+from typing import Any, Iterable, Iterator, Optional
+
+import orjson
+from sqlalchemy import and_, delete, select
+
+from apps.chat.models.chat_model import ChatRecordResultPage
+from common.core.config import settings
+from common.core.deps import SessionDep
+
+RESULT_KIND_DATA = 'data'
+RESULT_KIND_PREDICT = 'predict'
+RESULT_STORE_KEY = 'result_store'
+
+
+def encode_page(payload: dict) -> bytes:
+    return zlib.compress(orjson.dumps(payload), settings.CHAT_RESULT_COMPRESS_LEVEL)
+
+
+def decode_page(content: bytes) -> list:
+    payload = orjson.loads(zlib.decompress(content))
+    if 'rows' in payload:
+        return payload['rows']
+    keys = payload['keys']
+    return [dict(zip(keys, values)) for values in zip(*payload['columns'])]
+
+
+def split_columns(keys: list[str], columns: list[list], page_size: int) -> Iterator[tuple[int, int, bytes]]:
+    """按列数据分页，返回 (起始行, 行数, 压缩内容)"""
+    total = len(columns[0]) if columns else 0
+    for start in range(0, total, page_size):
+        page = [values[start:start + page_size] for values in columns]
+        yield start, len(page[0]), encode_page({'keys': keys, 'columns': page})
+
+
+def split_rows(rows: list, page_size: int) -> Iterator[tuple[int, int, bytes]]:
+    """按行数据分页；各行为键相同的对象时转为列式存储"""
+    if rows and isinstance(rows[0], dict):
+        keys = tuple(rows[0])
+        if all(isinstance(row, dict) and tuple(row) == keys for row in rows):
+            yield from split_columns(list(keys), [list(values) for values in zip(*(row.values() for row in rows))],
+                                     page_size)
+            return
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        yield start, len(page), encode_page({'rows': page})
+
+
+def build_store(record_id: int, kind: str, total: int) -> dict:
+    return {'record_id': record_id, 'kind': kind, 'total': total}
+
+
+def get_result_store(obj: Any) -> Optional[dict]:
+    return obj.get(RESULT_STORE_KEY) if isinstance(obj, dict) else None
+
+
+def save_result_pages(session: SessionDep, record_id: int, kind: str,
+                      pages: Iterable[tuple[int, int, bytes]]) -> dict:
+    """替换记录的数据页（不提交事务），返回 result_store 描述"""
+    session.execute(delete(ChatRecordResultPage).where(
+        and_(ChatRecordResultPage.record_id == record_id, ChatRecordResultPage.kind == kind)))
+    total = 0
+    for row_start, row_count, content in pages:
+        session.add(ChatRecordResultPage(record_id=record_id, kind=kind, row_start=row_start, row_count=row_count,
+                                         content=content))
+        total = row_start + row_count
+    return build_store(record_id, kind, total)
+
+
+def _page_condition(store: dict, offset: int = 0, limit: Optional[int] = None):
+    conditions = [ChatRecordResultPage.record_id == store['record_id'], ChatRecordResultPage.kind == store['kind'],
+                  ChatRecordResultPage.row_start + ChatRecordResultPage.row_count > offset]
+    if limit is not None:
+        conditions.append(ChatRecordResultPage.row_start < offset + limit)
+    return and_(*conditions)
+
+
+def load_result_rows(session: SessionDep, store: dict, offset: int = 0, limit: Optional[int] = None) -> list:
+    """读取 [offset, offset + limit) 范围内的行，limit 为 None 时读取到末尾"""
+    stmt = select(ChatRecordResultPage.row_start, ChatRecordResultPage.content).where(
+        _page_condition(store, offset, limit)).order_by(ChatRecordResultPage.row_start)
+    rows = []
+    first_start = None
+    for page in session.execute(stmt):
+        if first_start is None:
+            first_start = page.row_start
+        rows.extend(decode_page(page.content))
+    if first_start is None:
+        return []
+    begin = offset - first_start
+    return rows[begin:] if limit is None else rows[begin:begin + limit]
+
+
+def load_result_rows_batch(session: SessionDep, stores: list[dict], limit: Optional[int] = None) \
+        -> dict[tuple[int, str], list]:
+    """一次查询读取多个结果的前 limit 行，返回 {(record_id, kind): 行}"""
+    keys = {(store['record_id'], store['kind']) for store in stores}
+    if not keys:
+        return {}
+    conditions = [ChatRecordResultPage.record_id.in_({record_id for record_id, _ in keys})]
+    if limit is not None:
+        conditions.append(ChatRecordResultPage.row_start < limit)
+    stmt = select(ChatRecordResultPage.record_id, ChatRecordResultPage.kind, ChatRecordResultPage.content).where(
+        and_(*conditions)).order_by(ChatRecordResultPage.record_id, ChatRecordResultPage.kind,
+                                    ChatRecordResultPage.row_start)
+    result: dict[tuple[int, str], list] = {key: [] for key in keys}
+    for page in session.execute(stmt):
+        key = (page.record_id, page.kind)
+        if key in result:
+            result[key].extend(decode_page(page.content))
+    if limit is not None:
+        result = {key: rows[:limit] for key, rows in result.items()}
+    return result
+
+
+def result_total(obj: Any) -> int:
+    """结果的总行数，obj 为解析后的 data（对象）或 predict_data（数组或对象）"""
+    store = get_result_store(obj)
+    if store:
+        return store['total']
+    if isinstance(obj, dict):
+        return len(obj.get('data') or [])
+    return len(obj) if isinstance(obj, list) else 0
+
+
+def load_record_data(session: SessionDep, obj: Any, offset: int = 0, limit: Optional[int] = None) -> dict:
+    """解析后的 ChatRecord.data -> {"fields", "data", ...}，data 为 [offset, offset + limit) 范围内的行"""
+    if not isinstance(obj, dict):
+        return {}
+    store = get_result_store(obj)
+    result = {key: value for key, value in obj.items() if key != RESULT_STORE_KEY}
+    if store:
+        result['data'] = load_result_rows(session, store, offset, limit)
+    elif result.get('data') and (offset or limit is not None):
+        result['data'] = result['data'][offset:None if limit is None else offset + limit]
+    return result
+
+
+def load_record_predict_data(session: SessionDep, obj: Any, offset: int = 0, limit: Optional[int] = None):
+    """解析后的 ChatRecord.predict_data -> 范围内的行；未分页的旧格式原样切片"""
+    store = get_result_store(obj)
+    if store:
+        return load_result_rows(session, store, offset, limit)
+    if isinstance(obj, list) and (offset or limit is not None):
+        return obj[offset:None if limit is None else offset + limit]
+    return obj
+
+
+def build_data_header(data_obj: dict, store: dict) -> str:
+    """ChatRecord.data 中保存的结果头：去掉行数据，增加 result_store"""
+    header = {key: value for key, value in data_obj.items() if key != 'data'}
+    header[RESULT_STORE_KEY] = store
+    return orjson.dumps(header).decode()
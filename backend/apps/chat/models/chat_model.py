@@ -5,7 +5,7 @@ from typing import List, Optional, Any, Union
 from fastapi import Body
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, Text, BigInteger, DateTime, Identity, Boolean
+from sqlalchemy import Column, Integer, Text, BigInteger, DateTime, Identity, Boolean, LargeBinary, String, Index
 from sqlalchemy import Enum as SQLAlchemyEnum
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import SQLModel, Field
@@ -131,6 +131,18 @@ class ChatRecord(SQLModel, table=True):
     regenerate_record_id: int = Field(sa_column=Column(BigInteger, nullable=True))
 
 
+
+class ChatRecordResultPage(SQLModel, table=True):
+    """对话查询结果（data / predict_data）的分页存储，每页为压缩后的列式 JSON"""
+    __tablename__ = "chat_record_result_page"
+    __table_args__ = (Index('idx_chat_record_result_page_record', 'record_id', 'kind', 'row_start'),)
+    id: Optional[int] = Field(sa_column=Column(BigInteger, Identity(always=True), primary_key=True))
+    record_id: int = Field(sa_column=Column(BigInteger, nullable=False))
+    kind: str = Field(sa_column=Column(String(16), nullable=False))  # data / predict
+    row_start: int = Field(sa_column=Column(Integer, nullable=False))
+    row_count: int = Field(sa_column=Column(Integer, nullable=False))
+    content: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
 class ChatRecordResult(BaseModel):
     id: Optional[int] = None
     chat_id: Optional[int] = None
@@ -1,23 +1,25 @@
+import asyncio
 import concurrent
+import functools
 import json
 import os
 import traceback
 import urllib.parse
 import warnings
-from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Any, List, Optional, Union, Dict, Iterator
 
+import httpx
 import orjson
 import pandas as pd
 import requests
-import sqlglot
-import sqlparse
 from langchain.chat_models.base import BaseChatModel
 from langchain_community.utilities import SQLDatabase
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, BaseMessageChunk
 from sqlalchemy import and_, select
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.util import await_only
 from sqlbot_xpack.config.model import SysArgModel
 from sqlbot_xpack.custom_prompt.curd.custom_prompt import find_custom_prompts
 from sqlbot_xpack.custom_prompt.models.custom_prompt_model import CustomPromptTypeEnum
@@ -25,9 +27,10 @@ from sqlbot_xpack.license.license_manage import SQLBotLicenseUtil
 from sqlglot import exp
 from sqlmodel import Session
 
+from apps.ai_model.embedding import question_embedding_context
 from apps.ai_model.model_factory import LLMConfig, LLMFactory, get_default_config
 from apps.chat.curd.chat import save_question, save_sql_answer, save_sql, \
-    save_error_message, save_sql_exec_data, save_chart_answer, save_chart, \
+    save_error_message, save_sql_exec_result, save_chart_answer, save_chart, \
     finish_record, save_analysis_answer, save_predict_answer, save_predict_data, \
     save_select_datasource_answer, save_recommend_question_answer, \
     get_old_questions, save_analysis_predict_record, rename_chat, get_chart_config, \
@@ -39,9 +42,12 @@ from apps.chat.models.chat_model import ChatQuestion, ChatRecord, Chat, RenameCh
 from apps.data_training.curd.data_training import get_training_template
 from apps.datasource.crud.datasource import get_table_schema, get_tables_sample_data
 from apps.datasource.crud.permission import get_row_permission_filters, is_normal_user
+from apps.datasource.crud.sql_rewrite import SQLRewriteError, apply_row_permission_filters, substitute_subqueries
 from apps.datasource.embedding.ds_embedding import get_ds_embedding
 from apps.datasource.models.datasource import CoreDatasource
-from apps.db.db import exec_sql, get_version, check_connection, get_sqlglot_dialect
+from apps.db.db import exec_sql, datasource_health
+from apps.db.parsed_sql import parse_sql
+from apps.db.result_set import ColumnarResult
 from apps.system.crud.aimodel_manage import get_ai_model_list_by_workspace
 from apps.system.crud.assistant import AssistantOutDs, AssistantOutDsFactory, get_assistant_ds
 from apps.system.crud.parameter_manage import get_groups
@@ -49,39 +55,32 @@ from apps.system.crud.user import user_ws_list
 from apps.system.schemas.system_schema import AssistantOutDsSchema
 from apps.terminology.curd.terminology import get_terminology_template
 from common.core.config import settings
-from common.core.db import engine
+from common.core.db import engine, async_engine_supported, get_async_session_maker
 from common.core.deps import CurrentAssistant, CurrentUser
+from common.core.task_scheduler import task_scheduler, LANE_CHAT, LANE_BACKGROUND_LLM, TaskTimeoutError
 from common.error import SingleMessageError, SQLBotDBError, ParseSQLResultError, SQLBotDBConnectionError
 from common.utils.data_format import DataFormat
 from common.utils.locale import I18n, I18nHelper
+from common.utils.stream_channel import StreamChannel
 from common.utils.utils import SQLBotLogUtil, extract_nested_json, prepare_for_orjson
 
 warnings.filterwarnings("ignore")
 
-executor = ThreadPoolExecutor(max_workers=200)
-
 dynamic_ds_types = [1, 3]
-dynamic_subsql_prefix = 'select * from sqlbot_dynamic_temp_table_'
+dynamic_subsql_table_prefix = 'sqlbot_dynamic_temp_table_'
+dynamic_subsql_prefix = f'select * from {dynamic_subsql_table_prefix}'
 
 session_maker = scoped_session(sessionmaker(bind=engine, class_=Session))
 
+# 异步模式下运行中的任务，保持引用避免被回收
+_async_tasks: set[asyncio.Task] = set()
+
 i18n = I18n()
 
 
 def extract_tables_from_sql(sql: str, ds_type: str = None) -> set:
     """从 SQL 中提取表名（使用 sqlglot 解析，可信）"""
-    tables = set()
-    dialect = get_sqlglot_dialect(ds_type)
-    try:
-        statements = sqlglot.parse(sql, dialect=dialect)
-        for stmt in statements:
-            if stmt:
-                for table in stmt.find_all(exp.Table):
-                    if table.name:
-                        tables.add(table.name)
-    except Exception:
-        pass
-    return tables
+    return parse_sql(sql).tables(ds_type)
 
 
 class LLMService:
@@ -103,12 +102,17 @@ class LLMService:
     generate_sql_logs: List[ChatLog]
     generate_chart_logs: List[ChatLog]
     current_logs: dict[OperationEnum, ChatLog]
-    chunk_list: List[str]
-    future: Future
+    channel: Optional[StreamChannel] = None
+    future: Future | asyncio.Task
+    # 异步模式：整个任务在事件循环上执行，元数据库使用异步会话，LLM 使用 astream
+    async_mode: bool = False
+    async_session: Optional[Session] = None
 
     trans: I18nHelper = None
 
     last_execute_sql_error: str = None
+    # 生成当前 SQL 时使用的行权限条件，参与查询结果缓存键
+    row_permission_filters: Optional[list] = None
     articles_number: int = 4
 
     enable_sql_row_limit: bool = settings.GENERATE_SQL_QUERY_LIMIT_ENABLED
@@ -122,7 +126,6 @@ class LLMService:
         self.generate_sql_logs = []
         self.generate_chart_logs = []
         self.current_logs = {}
-        self.chunk_list = []
         self.current_user = current_user
         self.current_assistant = current_assistant
 
@@ -169,12 +172,13 @@ class LLMService:
                 ds = self.out_ds_instance.get_ds(chat.datasource)
                 if not ds:
                     raise SingleMessageError("No available datasource configuration found")
-                chat_question.engine = ds.type + get_version(ds)
+                chat_question.engine = ds.type + datasource_health.get_version(ds)
             else:
                 ds = session.get(CoreDatasource, chat.datasource)
                 if not ds:
                     raise SingleMessageError("No available datasource configuration found")
-                chat_question.engine = (ds.type_name if ds.type != 'excel' else 'PostgreSQL') + get_version(ds)
+                chat_question.engine = (ds.type_name if ds.type != 'excel' else 'PostgreSQL') + \
+                                       datasource_health.get_version(ds)
 
         self.generate_sql_logs = list_generate_sql_logs(session=session, chart_id=chat_id)
         self.generate_chart_logs = list_generate_chart_logs(session=session, chart_id=chat_id)
@@ -222,7 +226,11 @@ class LLMService:
                         specialized_model_id = args[3].custom_model
                         print("use custom model: id[" + specialized_model_id + "]")
         config: LLMConfig = await get_default_config(specialized_model_id)
-        instance = cls(*args, **kwargs, config=config)
+        if settings.CHAT_ASYNC_MODE_ENABLED and async_engine_supported():
+            # 构造时会请求助手数据源接口、探测数据源版本，异步模式下放到线程中执行
+            instance = await asyncio.to_thread(functools.partial(cls, *args, **kwargs, config=config))
+        else:
+            instance = cls(*args, **kwargs, config=config)
 
         chat_params: list[SysArgModel] = await get_groups(args[0], "chat")
         for config in chat_params:
@@ -245,6 +253,8 @@ class LLMService:
         return instance
 
     def is_running(self, timeout=0.5):
+        if isinstance(self.future, asyncio.Task):
+            return not self.future.done()
         try:
             r = concurrent.futures.wait([self.future], timeout)
             if len(r.not_done) > 0:
@@ -486,7 +496,7 @@ class LLMService:
         full_thinking_text = ''
         full_analysis_text = ''
         token_usage = {}
-        res = process_stream(self.llm.stream(analysis_msg), token_usage)
+        res = process_stream(self.stream_llm(analysis_msg), token_usage)
         for chunk in res:
             if chunk.get('content'):
                 full_analysis_text += chunk.get('content')
@@ -538,7 +548,7 @@ class LLMService:
         full_thinking_text = ''
         full_predict_text = ''
         token_usage = {}
-        res = process_stream(self.llm.stream(predict_msg), token_usage)
+        res = process_stream(self.stream_llm(predict_msg), token_usage)
         for chunk in res:
             if chunk.get('content'):
                 full_predict_text += chunk.get('content')
@@ -602,7 +612,7 @@ class LLMService:
         full_thinking_text = ''
         full_guess_text = ''
         token_usage = {}
-        res = process_stream(self.llm.stream(guess_msg), token_usage)
+        res = process_stream(self.stream_llm(guess_msg), token_usage)
         for chunk in res:
             if chunk.get('content'):
                 full_guess_text += chunk.get('content')
@@ -634,7 +644,7 @@ class LLMService:
         datasource_msg: List[Union[BaseMessage, dict[str, Any]]] = []
         datasource_msg.append(SystemPromptMessage(self.chat_question.datasource_sys_question()))
         if self.current_assistant and self.current_assistant.type != 4:
-            _ds_list = get_assistant_ds(session=_session, llm_service=self)
+            _ds_list = self.get_assistant_ds(_session)
         else:
             stmt = select(CoreDatasource.id, CoreDatasource.name, CoreDatasource.description).where(
                 and_(CoreDatasource.oid == self.oid))
@@ -680,7 +690,7 @@ class LLMService:
                                                                                          msg in datasource_msg])
 
             token_usage = {}
-            res = process_stream(self.llm.stream(datasource_msg), token_usage)
+            res = process_stream(self.stream_llm(datasource_msg), token_usage)
             for chunk in res:
                 if chunk.get('content'):
                     full_text += chunk.get('content')
@@ -720,7 +730,7 @@ class LLMService:
                 if self.current_assistant and self.current_assistant.type in dynamic_ds_types:
                     _ds = self.out_ds_instance.get_ds(data['id'])
                     self.ds = _ds
-                    self.chat_question.engine = _ds.type + get_version(self.ds)
+                    self.chat_question.engine = _ds.type + self.run_blocking(datasource_health.get_version, self.ds)
 
                     _engine_type = self.chat_question.engine
                     _chat.engine_type = _ds.type
@@ -730,8 +740,8 @@ class LLMService:
                         _datasource = None
                         raise SingleMessageError(f"Datasource configuration with id {_datasource} not found")
                     self.ds = CoreDatasource(**_ds.model_dump())
-                    self.chat_question.engine = (_ds.type_name if _ds.type != 'excel' else 'PostgreSQL') + get_version(
-                        self.ds)
+                    self.chat_question.engine = (_ds.type_name if _ds.type != 'excel' else 'PostgreSQL') + \
+                                                self.run_blocking(datasource_health.get_version, self.ds)
 
                     _engine_type = self.chat_question.engine
                     _chat.engine_type = _ds.type_name
@@ -795,7 +805,7 @@ class LLMService:
         full_thinking_text = ''
         full_sql_text = ''
         token_usage = {}
-        res = process_stream(self.llm.stream(self.sql_message), token_usage)
+        res = process_stream(self.stream_llm(self.sql_message), token_usage)
         for chunk in res:
             if chunk.get('content'):
                 full_sql_text += chunk.get('content')
@@ -842,7 +852,7 @@ class LLMService:
         full_thinking_text = ''
         full_dynamic_text = ''
         token_usage = {}
-        res = process_stream(self.llm.stream(dynamic_sql_msg), token_usage)
+        res = process_stream(self.stream_llm(dynamic_sql_msg), token_usage)
         for chunk in res:
             if chunk.get('content'):
                 full_dynamic_text += chunk.get('content')
@@ -867,20 +877,39 @@ class LLMService:
         SQLBotLogUtil.info(full_dynamic_text)
         return full_dynamic_text
 
-    def generate_assistant_dynamic_sql(self, _session: Session, sql, tables: List):
+    def generate_assistant_dynamic_sql(self, _session: Session, sql, tables: List) -> Optional[tuple[str, str]]:
+        """
+        将小助手动态数据源中配置了 SQL 的表替换为子查询，返回 (保存的 SQL, 实际执行的 SQL)
+        保存的 SQL 中子查询以临时表占位，不暴露数据源配置的 SQL；默认使用 sqlglot 确定性改写，
+        改写失败且开启 SQL_REWRITE_LLM_FALLBACK 时再交由 LLM 改写
+        """
         ds: AssistantOutDsSchema = self.ds
-        sub_query = []
-        result_dict = {}
-        for table in ds.tables:
-            if table.name in tables and table.sql:
-                # sub_query.append({"table": table.name, "query": table.sql})
-                result_dict[table.name] = table.sql
-                sub_query.append({"table": table.name, "query": f'{dynamic_subsql_prefix}{table.name}'})
+        sub_sql_dict = {table.name: table.sql for table in ds.tables or [] if table.sql}
+        if not sub_sql_dict:
+            return None
+        try:
+            real_sql = self.run_blocking(substitute_subqueries, sql, sub_sql_dict, ds.type)
+            if real_sql is None:
+                return None
+            temp_sql = self.run_blocking(substitute_subqueries, sql, {
+                name: exp.select('*').from_(exp.to_identifier(f'{dynamic_subsql_table_prefix}{name}'))
+                for name in sub_sql_dict.keys()}, ds.type)
+            return temp_sql, real_sql
+        except SQLRewriteError as e:
+            if not settings.SQL_REWRITE_LLM_FALLBACK:
+                raise SingleMessageError(f'Failed to build dynamic datasource SQL: {e}')
+            SQLBotLogUtil.warning(f'Dynamic datasource SQL rewrite failed, fallback to LLM: {e}')
+
+        sub_query = [{"table": name, "query": f'{dynamic_subsql_prefix}{name}'} for name in sub_sql_dict.keys() if
+                     name in tables]
         if not sub_query:
             return None
         temp_sql_text = self.generate_with_sub_sql(session=_session, sql=sql, sub_mappings=sub_query)
-        result_dict['sqlbot_temp_sql_text'] = temp_sql_text
-        return result_dict
+        temp_sql, *_ = self.check_sql(session=_session, res=temp_sql_text, operate=OperationEnum.GENERATE_DYNAMIC_SQL)
+        real_sql = temp_sql
+        for origin_table, sub_sql in sub_sql_dict.items():
+            real_sql = real_sql.replace(f'{dynamic_subsql_prefix}{origin_table}', sub_sql)
+        return temp_sql, real_sql
 
     def build_table_filter(self, session: Session, sql: str, filters: list):
         filter = json.dumps(filters, ensure_ascii=False)
@@ -906,7 +935,7 @@ class LLMService:
         full_thinking_text = ''
         full_filter_text = ''
         token_usage = {}
-        res = process_stream(self.llm.stream(permission_sql_msg), token_usage)
+        res = process_stream(self.stream_llm(permission_sql_msg), token_usage)
         for chunk in res:
             if chunk.get('content'):
                 full_filter_text += chunk.get('content')
@@ -931,12 +960,29 @@ class LLMService:
         SQLBotLogUtil.info(full_filter_text)
         return full_filter_text
 
+    def apply_table_filter(self, session: Session, sql: str, filters: list) -> str:
+        """
+        将行权限过滤条件注入 SQL：默认使用 sqlglot 确定性改写，
+        改写失败且开启 SQL_REWRITE_LLM_FALLBACK 时再交由 LLM 改写
+        """
+        try:
+            return self.run_blocking(apply_row_permission_filters, sql, filters, self.ds.type)
+        except SQLRewriteError as e:
+            if not settings.SQL_REWRITE_LLM_FALLBACK:
+                raise SingleMessageError(f'Failed to apply row permission filters: {e}')
+            SQLBotLogUtil.warning(f'Row permission rewrite failed, fallback to LLM: {e}')
+        res = self.build_table_filter(session=session, sql=sql, filters=filters)
+        filtered_sql, *_ = self.check_sql(session=session, res=res,
+                                          operate=OperationEnum.GENERATE_SQL_WITH_PERMISSIONS)
+        return filtered_sql
+
     def generate_filter(self, _session: Session, sql: str, tables: List):
         filters = get_row_permission_filters(session=_session, current_user=self.current_user, ds=self.ds,
                                              tables=tables)
+        self.row_permission_filters = filters
         if not filters:
             return None
-        return self.build_table_filter(session=_session, sql=sql, filters=filters)
+        return self.apply_table_filter(session=_session, sql=sql, filters=filters)
 
     def generate_assistant_filter(self, _session: Session, sql, tables: List):
         ds: AssistantOutDsSchema = self.ds
@@ -946,7 +992,7 @@ class LLMService:
                 filters.append({"table": table.name, "filter": table.rule})
         if not filters:
             return None
-        return self.build_table_filter(session=_session, sql=sql, filters=filters)
+        return self.apply_table_filter(session=_session, sql=sql, filters=filters)
 
     def generate_chart(self, _session: Session, chart_type: Optional[str] = '', schema: Optional[str] = ''):
         # append current question
@@ -967,7 +1013,7 @@ class LLMService:
         full_thinking_text = ''
         full_chart_text = ''
         token_usage = {}
-        res = process_stream(self.llm.stream(self.chart_message), token_usage)
+        res = process_stream(self.stream_llm(self.chart_message), token_usage)
         for chunk in res:
             if chunk.get('content'):
                 full_chart_text += chunk.get('content')
@@ -1148,20 +1194,28 @@ class LLMService:
     def save_error(self, session: Session, message: str):
         return save_error_message(session=session, record_id=self.record.id, message=message)
 
-    def save_sql_data(self, session: Session, data_obj: Dict[str, Any]):
+    def save_sql_data(self, session: Session, result: ColumnarResult):
+        """保存查询结果，超过行数限制时截断（与原先一样直接作用于 result），行数据按列分页存储"""
         try:
-            data_result = data_obj.get('data')
             limit = 1000
-            if data_result:
-                data_result = prepare_for_orjson(data_result)
-                if data_result and len(data_result) > limit and self.enable_sql_row_limit:
-                    data_obj['data'] = data_result[:limit]
+            limited = False
+            if len(result) > limit and self.enable_sql_row_limit:
+                result.columns = result.head(limit).columns
+                limited = True
+            data_obj = {"fields": result.fields, "fields_info": result.fields_info, "sql": result.sql,
+                        "truncated": result.truncated}
+            if len(result):
+                prepared = {}
+                for idx, values in enumerate(result.columns):
+                    if id(values) not in prepared:
+                        # 只有包含 bytes、对象、数组的列需要处理
+                        prepared[id(values)] = [prepare_for_orjson(value) for value in values] if any(
+                            issubclass(t, (bytes, dict, list, tuple)) for t in set(map(type, values))) else values
+                    result.columns[idx] = prepared[id(values)]
+                if limited:
                     data_obj['limit'] = limit
-                else:
-                    data_obj['data'] = data_result
                 data_obj['datasource'] = self.ds.id
-            return save_sql_exec_data(session=session, record_id=self.record.id,
-                                      data=orjson.dumps(data_obj).decode())
+            return save_sql_exec_result(session=session, record_id=self.record.id, data_obj=data_obj, result=result)
         except Exception as e:
             raise e
 
@@ -1176,11 +1230,12 @@ class LLMService:
             sql: SQL query statement
 
         Returns:
-            Query results
+            Query results (ColumnarResult)
         """
         SQLBotLogUtil.info(f"Executing SQL on ds_id {self.ds.id}: {sql}")
         try:
-            return exec_sql(ds=self.ds, sql=sql, origin_column=False)
+            return self.run_blocking(exec_sql, ds=self.ds, sql=sql, origin_column=False, use_cache=True,
+                                     filters=self.row_permission_filters, columnar=True)
         except Exception as e:
             if isinstance(e, ParseSQLResultError):
                 raise e
@@ -1188,44 +1243,161 @@ class LLMService:
                 err = traceback.format_exc(limit=1, chain=True)
                 raise SQLBotDBError(err)
 
-    def pop_chunk(self):
+    async def await_result(self):
+        async for chunk in self.channel:
+            yield chunk
+
+    def submit_to_channel(self, lane: str, fn, *args, in_chat: bool = True, stream: bool = True):
+        """在调度通道中执行生成器任务，产出的数据块写入 channel，由 await_result 异步读取"""
+        self.enable_async_mode()
+        channel = StreamChannel()
+        self.channel = channel
+
+        def _run():
+            try:
+                for chunk in fn(*args):
+                    channel.put(chunk)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                channel.close()
+
+        def _done(future: Future):
+            # 排队超时未执行，任务内的错误处理不会触发，这里补充错误信息并结束输出
+            if future.cancelled() or not isinstance(future.exception(), TaskTimeoutError):
+                return
+            try:
+                for chunk in self.format_task_error(str(future.exception()), in_chat, stream):
+                    channel.put(chunk)
+            finally:
+                channel.close()
+
+        if self.async_mode:
+            # 异步任务不进线程池，但与线程任务共用通道的并发上限、排队上限与排队超时
+            slot = task_scheduler.acquire(lane, workspace=self.current_user.oid)
+            self.future = asyncio.get_running_loop().create_task(
+                self._run_async(channel, lane, slot, fn, *args, in_chat=in_chat, stream=stream))
+            _async_tasks.add(self.future)
+            self.future.add_done_callback(_async_tasks.discard)
+            return
+
+        self.future = task_scheduler.submit(lane, _run, workspace=self.current_user.oid)
+        self.future.add_done_callback(_done)
+
+    async def _run_async(self, channel: StreamChannel, lane: str, slot: Future, fn, *args,
+                         in_chat: bool = True, stream: bool = True):
+        """
+        在事件循环中执行生成器任务，先等待通道的执行名额（slot）
+        任务运行在 run_sync 的 greenlet 中，只有以下调用不会阻塞事件循环：
+            open_session() 返回的会话：由异步驱动完成
+            stream_llm / request_picture：使用异步接口
+            embed_question 等向量计算：由 question_embedding_context 放到线程中执行
+            数据源查询、外部接口、sqlglot 解析改写、pandas 生成表格：需通过 run_blocking 放到线程中执行
+        自行打开同步会话（Session(engine) / session_maker()）的函数也必须通过 run_blocking 调用，
+        embedding 生成等后台任务统一提交到 task_scheduler，不在对话任务中直接执行
+        """
         try:
-            chunk = self.chunk_list.pop(0)
-            return chunk
-        except IndexError as e:
-            return None
+            await asyncio.wrap_future(slot)
+        except asyncio.CancelledError:
+            # 取消时名额可能刚好分配，分配后立即归还
+            slot.add_done_callback(lambda f: None if f.cancelled() or f.exception() else task_scheduler.release(lane))
+            channel.close()
+            raise
+        except TaskTimeoutError as e:
+            try:
+                for chunk in self.format_task_error(str(e), in_chat, stream):
+                    await channel.aput(chunk)
+            finally:
+                channel.close()
+            return
+
+        def _drive(sync_session: Session):
+            # 运行在 run_sync 的 greenlet 中：同步写法的会话操作由异步驱动完成，不阻塞事件循环
+            self.async_session = sync_session
+            for chunk in fn(*args):
+                await_only(channel.aput(chunk))
+
+        failed = False
+        try:
+            async with get_async_session_maker()() as session:
+                await session.run_sync(_drive)
+        except Exception:
+            failed = True
+            traceback.print_exc()
+        finally:
+            self.async_session = None
+            channel.close()
+            task_scheduler.release(lane, failed=failed)
+
+    def enable_async_mode(self) -> bool:
+        """元数据库支持异步驱动时启用异步模式，否则仍在线程池中执行"""
+        self.async_mode = settings.CHAT_ASYNC_MODE_ENABLED and async_engine_supported()
+        return self.async_mode
+
+    def open_session(self) -> Session:
+        if self.async_mode and self.async_session is not None:
+            return self.async_session
+        return session_maker()
+
+    def close_session(self):
+        if not self.async_mode:
+            session_maker.remove()
 
-    def await_result(self):
-        while self.is_running():
-            while True:
-                chunk = self.pop_chunk()
-                if chunk is not None:
-                    yield chunk
-                else:
-                    break
+    def stream_llm(self, messages) -> Iterator[BaseMessageChunk]:
+        if not self.async_mode:
+            yield from self.llm.stream(messages)
+            return
+        iterator = self.llm.astream(messages).__aiter__()
         while True:
-            chunk = self.pop_chunk()
-            if chunk is None:
+            try:
+                chunk = await_only(iterator.__anext__())
+            except StopAsyncIteration:
                 break
             yield chunk
 
+    def run_blocking(self, fn, *args, **kwargs):
+        """阻塞调用（数据源查询等），异步模式下放到线程中执行"""
+        if not self.async_mode:
+            return fn(*args, **kwargs)
+        return await_only(asyncio.to_thread(functools.partial(fn, *args, **kwargs)))
+
+    def get_assistant_ds(self, session: Session) -> list[dict]:
+        """助手的数据源列表，外部数据源需要请求助手接口，放到 run_blocking 中执行"""
+        if self.current_assistant.type in (0, 2):
+            return get_assistant_ds(session=session, llm_service=self)
+        return self.run_blocking(get_assistant_ds, session=session, llm_service=self)
+
+    def request_picture(self, chat_id: int, record_id: int, chart: dict, data: dict):
+        if not self.async_mode:
+            return request_picture(chat_id, record_id, chart, data)
+        return await_only(arequest_picture(chat_id, record_id, chart, data))
+
+    @staticmethod
+    def format_task_error(error_msg: str, in_chat: bool = True, stream: bool = True) -> list:
+        if in_chat:
+            return ['data:' + orjson.dumps({'content': error_msg, 'type': 'error'}).decode() + '\n\n']
+        if stream:
+            return ['&#x274c; **ERROR:**\n', f'> {error_msg}\n']
+        return [{'success': False, 'message': error_msg}]
+
     def run_task_async(self, in_chat: bool = True, stream: bool = True,
                        finish_step: ChatFinishStep = ChatFinishStep.GENERATE_CHART, return_img: bool = True):
         if in_chat:
             stream = True
-        self.future = executor.submit(self.run_task_cache, in_chat, stream, finish_step, return_img)
+        self.submit_to_channel(LANE_CHAT, self.run_task_cache, in_chat, stream, finish_step, return_img,
+                               in_chat=in_chat, stream=stream)
 
     def run_task_cache(self, in_chat: bool = True, stream: bool = True,
                        finish_step: ChatFinishStep = ChatFinishStep.GENERATE_CHART, return_img: bool = True):
-        for chunk in self.run_task(in_chat, stream, finish_step, return_img):
-            self.chunk_list.append(chunk)
+        with question_embedding_context(self.run_blocking):
+            yield from self.run_task(in_chat, stream, finish_step, return_img)
 
     def run_task(self, in_chat: bool = True, stream: bool = True,
                  finish_step: ChatFinishStep = ChatFinishStep.GENERATE_CHART, return_img: bool = True):
         json_result: Dict[str, Any] = {'success': True}
         _session = None
         try:
-            _session = session_maker()
+            _session = self.open_session()
             if self.ds:
                 oid = self.ds.oid if isinstance(self.ds, CoreDatasource) else 1
                 ds_id = self.ds.id if isinstance(self.ds, CoreDatasource) else None
@@ -1271,8 +1443,8 @@ class LLMService:
             else:
                 self.validate_history_ds(_session)
 
-            # check connection
-            connected = check_connection(ds=self.ds, trans=None)
+            # check connection（缓存的探测结果，见 apps/db/health.py）
+            connected = self.run_blocking(datasource_health.check_connection, self.ds)
             if not connected:
                 raise SQLBotDBConnectionError('Connect DB failed')
 
@@ -1310,7 +1482,6 @@ class LLMService:
             use_dynamic_ds: bool = self.current_assistant and self.current_assistant.type in dynamic_ds_types
             is_page_embedded: bool = self.current_assistant and self.current_assistant.type == 4
             dynamic_sql_result = None
-            sqlbot_temp_sql_text = None
             assistant_dynamic_sql = None
             # row permission
 
@@ -1318,7 +1489,7 @@ class LLMService:
             sql, tables = self.check_sql(session=_session, res=full_sql_text, operate=sql_operate)
 
             # 表名安全检查：用 sqlglot 解析真实 SQL，不信任 AI 返回的 tables
-            actual_tables = extract_tables_from_sql(sql, ds_type=self.ds.type)
+            actual_tables = self.run_blocking(extract_tables_from_sql, sql, ds_type=self.ds.type)
             if not actual_tables:
                 raise SingleMessageError(
                     "SQL parsing failed: unable to extract table names. "
@@ -1338,19 +1509,18 @@ class LLMService:
 
                 if use_dynamic_ds:
                     dynamic_sql_result = self.generate_assistant_dynamic_sql(_session, sql, tables)
-                    sqlbot_temp_sql_text = dynamic_sql_result.get(
-                        'sqlbot_temp_sql_text') if dynamic_sql_result else None
                 else:
                     sql_result = self.generate_filter(_session, sql, tables)  # maybe no sql and tables
 
                 if sql_result:
                     SQLBotLogUtil.info(sql_result)
-                    sql_operate = OperationEnum.GENERATE_SQL_WITH_PERMISSIONS
-                    sql = self.check_save_sql(session=_session, res=sql_result, operate=sql_operate)
-                elif dynamic_sql_result and sqlbot_temp_sql_text:
-                    sql_operate = OperationEnum.GENERATE_DYNAMIC_SQL
-                    assistant_dynamic_sql = self.check_save_sql(session=_session, res=sqlbot_temp_sql_text,
-                                                                operate=sql_operate)
+                    sql = sql_result
+                    save_sql(session=_session, sql=sql, record_id=self.record.id)
+                    self.chat_question.sql = sql
+                elif dynamic_sql_result:
+                    sqlbot_temp_sql, assistant_dynamic_sql = dynamic_sql_result
+                    save_sql(session=_session, sql=sqlbot_temp_sql, record_id=self.record.id)
+                    self.chat_question.sql = sqlbot_temp_sql
                 else:
                     sql = self.check_save_sql(session=_session, res=full_sql_text, operate=sql_operate)
             else:
@@ -1361,7 +1531,7 @@ class LLMService:
             if not stream:
                 json_result['sql'] = sql
 
-            format_sql = sqlparse.format(sql, reindent=True)
+            format_sql = parse_sql(sql).pretty()
             if in_chat:
                 yield 'data:' + orjson.dumps({'content': format_sql, 'type': 'sql'}).decode() + '\n\n'
             else:
@@ -1369,13 +1539,7 @@ class LLMService:
                     yield f'```sql\n{format_sql}\n```\n\n'
 
             # execute sql
-            real_execute_sql = sql
-            if sqlbot_temp_sql_text and assistant_dynamic_sql:
-                dynamic_sql_result.pop('sqlbot_temp_sql_text')
-                for origin_table, subsql in dynamic_sql_result.items():
-                    assistant_dynamic_sql = assistant_dynamic_sql.replace(f'{dynamic_subsql_prefix}{origin_table}',
-                                                                          subsql)
-                real_execute_sql = assistant_dynamic_sql
+            real_execute_sql = assistant_dynamic_sql if assistant_dynamic_sql else sql
 
             if finish_step.value <= ChatFinishStep.GENERATE_SQL.value:
                 if in_chat:
@@ -1391,15 +1555,16 @@ class LLMService:
             self.current_logs[OperationEnum.EXECUTE_SQL] = end_log(session=_session,
                                                                    log=self.current_logs[OperationEnum.EXECUTE_SQL],
                                                                    full_message={'sql': real_execute_sql,
-                                                                                 'count': len(result.get('data'))})
+                                                                                 'count': len(result)})
 
-            _data = DataFormat.convert_large_numbers_in_object_array(result.get('data'))
-            _data = DataFormat.normalize_qualified_sql_column_keys_in_object_array(_data)
-            result["data"] = _data
+            DataFormat.convert_large_numbers_in_columns(result)
+            DataFormat.normalize_qualified_sql_column_keys_in_columns(result)
 
-            self.save_sql_data(session=_session, data_obj=result)
+            self.save_sql_data(session=_session, result=result)
             if in_chat:
-                yield 'data:' + orjson.dumps({'content': 'execute-success', 'type': 'sql-data'}).decode() + '\n\n'
+                # truncated：结果超过 SQL_EXEC_MAX_ROWS / SQL_EXEC_MAX_BYTES 被截断
+                yield 'data:' + orjson.dumps({'content': 'execute-success', 'type': 'sql-data',
+                                              'truncated': result.truncated}).decode() + '\n\n'
             if not stream:
                 json_result['data'] = get_chat_chart_data(_session, self.record.id)
 
@@ -1409,20 +1574,15 @@ class LLMService:
                         yield 'data:' + orjson.dumps({'type': 'finish'}).decode() + '\n\n'
                     else:
                         _column_list = []
-                        for field in result.get('fields'):
+                        for field in result.fields:
                             _column_list.append(AxisObj(name=field, value=field))
 
-                        md_data, _fields_list = DataFormat.convert_object_array_for_pandas(_column_list,
-                                                                                           result.get('data'))
+                        md_data, _fields_list = DataFormat.convert_columns_for_pandas(_column_list, result)
 
-                        # data, _fields_list, col_formats = self.format_pd_data(_column_list, result.get('data'))
-
-                        if not _data or not _fields_list:
+                        if not md_data or not _fields_list:
                             yield 'The SQL execution result is empty.\n\n'
                         else:
-                            df = pd.DataFrame(_data, columns=_fields_list)
-                            df_safe = DataFormat.safe_convert_to_string(df)
-                            markdown_table = df_safe.to_markdown(index=False)
+                            markdown_table = self.run_blocking(render_markdown_table, md_data, _fields_list)
                             yield markdown_table + '\n\n'
                 else:
                     yield json_result
@@ -1462,16 +1622,13 @@ class LLMService:
                     {'content': orjson.dumps(chart).decode(), 'type': 'chart'}).decode() + '\n\n'
             else:
                 if stream:
-                    md_data, _fields_list = DataFormat.convert_data_fields_for_pandas(chart, result.get('fields'),
-                                                                                      result.get('data'))
-                    # data, _fields_list, col_formats = self.format_pd_data(_column_list, result.get('data'))
+                    md_data, _fields_list = DataFormat.convert_columns_for_pandas(
+                        DataFormat.chart_column_list(chart, result.fields), result)
 
                     if not md_data or not _fields_list:
                         yield 'The SQL execution result is empty.\n\n'
                     else:
-                        df = pd.DataFrame(md_data, columns=_fields_list)
-                        df_safe = DataFormat.safe_convert_to_string(df)
-                        markdown_table = df_safe.to_markdown(index=False)
+                        markdown_table = self.run_blocking(render_markdown_table, md_data, _fields_list)
                         yield markdown_table + '\n\n'
 
             if in_chat:
@@ -1485,8 +1642,8 @@ class LLMService:
                                                                                       operate=OperationEnum.GENERATE_PICTURE,
                                                                                       record_id=self.record.id,
                                                                                       local_operation=True)
-                        image_url, error = request_picture(self.record.chat_id, self.record.id, chart,
-                                                           format_json_data(result))
+                        image_url, error = self.request_picture(self.record.chat_id, self.record.id, chart,
+                                                           format_json_data(result.to_dict()))
                         SQLBotLogUtil.info(image_url)
                         if stream:
                             yield f'![{chart.get("type")}]({image_url})'
@@ -1535,18 +1692,14 @@ class LLMService:
                     yield json_result
         finally:
             self.finish(_session)
-            session_maker.remove()
+            self.close_session()
 
     def run_recommend_questions_task_async(self):
-        self.future = executor.submit(self.run_recommend_questions_task_cache)
-
-    def run_recommend_questions_task_cache(self):
-        for chunk in self.run_recommend_questions_task():
-            self.chunk_list.append(chunk)
+        self.submit_to_channel(LANE_BACKGROUND_LLM, self.run_recommend_questions_task)
 
     def run_recommend_questions_task(self):
         try:
-            _session = session_maker()
+            _session = self.open_session()
             res = self.generate_recommend_questions_task(_session)
 
             for chunk in res:
@@ -1561,22 +1714,23 @@ class LLMService:
         except Exception:
             traceback.print_exc()
         finally:
-            session_maker.remove()
+            self.close_session()
 
     def run_analysis_or_predict_task_async(self, session: Session, action_type: str, base_record: ChatRecord,
                                            in_chat: bool = True, stream: bool = True):
         self.set_record(save_analysis_predict_record(session, base_record, action_type))
-        self.future = executor.submit(self.run_analysis_or_predict_task_cache, action_type, in_chat, stream)
+        self.submit_to_channel(LANE_CHAT, self.run_analysis_or_predict_task_cache, action_type, in_chat, stream,
+                               in_chat=in_chat, stream=stream)
 
     def run_analysis_or_predict_task_cache(self, action_type: str, in_chat: bool = True, stream: bool = True):
-        for chunk in self.run_analysis_or_predict_task(action_type, in_chat, stream):
-            self.chunk_list.append(chunk)
+        with question_embedding_context(self.run_blocking):
+            yield from self.run_analysis_or_predict_task(action_type, in_chat, stream)
 
     def run_analysis_or_predict_task(self, action_type: str, in_chat: bool = True, stream: bool = True):
         json_result: Dict[str, Any] = {'success': True}
         _session = None
         try:
-            _session = session_maker()
+            _session = self.open_session()
             if in_chat:
                 yield 'data:' + orjson.dumps({'type': 'id', 'id': self.get_record().id}).decode() + '\n\n'
             else:
@@ -1637,9 +1791,7 @@ class LLMService:
                             if not md_data or not _fields_list:
                                 yield 'Predict data result is empty.\n\n'
                             else:
-                                df = pd.DataFrame(md_data, columns=_fields_list)
-                                df_safe = DataFormat.safe_convert_to_string(df)
-                                markdown_table = df_safe.to_markdown(index=False)
+                                markdown_table = self.run_blocking(render_markdown_table, md_data, _fields_list)
                                 yield markdown_table + '\n\n'
 
                         else:
@@ -1654,7 +1806,7 @@ class LLMService:
                                 _data = get_chat_chart_data(_session, self.record.id)
                                 _data['data'] = _data.get('data') + predict_data
 
-                                image_url, error = request_picture(self.record.chat_id, self.record.id, chart,
+                                image_url, error = self.request_picture(self.record.chat_id, self.record.id, chart,
                                                                    format_json_data(_data))
                                 SQLBotLogUtil.info(image_url)
                                 if stream:
@@ -1705,7 +1857,7 @@ class LLMService:
                     yield json_result
         finally:
             # end
-            session_maker.remove()
+            self.close_session()
 
     def validate_history_ds(self, session: Session):
         _ds = self.ds
@@ -1718,7 +1870,7 @@ class LLMService:
                 raise SingleMessageError("chat.ds_is_invalid")
         else:
             try:
-                _ds_list: list[dict] = get_assistant_ds(session=session, llm_service=self)
+                _ds_list: list[dict] = self.get_assistant_ds(session)
                 match_ds = any(item.get("id") == _ds.id for item in _ds_list)
                 if not match_ds:
                     type = self.current_assistant.type
@@ -1728,6 +1880,11 @@ class LLMService:
                 raise SingleMessageError(f"ds is invalid [{str(e)}]")
 
 
+def render_markdown_table(md_data: list, fields: list) -> str:
+    df = pd.DataFrame(md_data, columns=fields)
+    return DataFormat.safe_convert_to_string(df).to_markdown(index=False)
+
+
 def execute_sql_with_db(db: SQLDatabase, sql: str) -> str:
     """Execute SQL query using SQLDatabase
 
@@ -1754,7 +1911,7 @@ def execute_sql_with_db(db: SQLDatabase, sql: str) -> str:
         raise RuntimeError(error_msg)
 
 
-def request_picture(chat_id: int, record_id: int, chart: dict, data: dict):
+def build_picture_request(chat_id: int, record_id: int, chart: dict, data: dict):
     file_name = f'c_{chat_id}_r_{record_id}'
 
     columns = chart.get('columns') if chart.get('columns') else []
@@ -1805,13 +1962,32 @@ def request_picture(chat_id: int, record_id: int, chart: dict, data: dict):
         "axis": orjson.dumps(axis).decode(),
     }
 
+    request_path = urllib.parse.urljoin(settings.SERVER_IMAGE_HOST, f"{file_name}.png")
+
+    return request_obj, request_path
+
+
+def request_picture(chat_id: int, record_id: int, chart: dict, data: dict):
+    request_obj, request_path = build_picture_request(chat_id, record_id, chart, data)
+
     _error = None
     try:
         requests.post(url=settings.MCP_IMAGE_HOST, json=request_obj, timeout=settings.SERVER_IMAGE_TIMEOUT)
     except Exception as e:
         _error = e
 
-    request_path = urllib.parse.urljoin(settings.SERVER_IMAGE_HOST, f"{file_name}.png")
+    return request_path, _error
+
+
+async def arequest_picture(chat_id: int, record_id: int, chart: dict, data: dict):
+    request_obj, request_path = build_picture_request(chat_id, record_id, chart, data)
+
+    _error = None
+    try:
+        async with httpx.AsyncClient(timeout=settings.SERVER_IMAGE_TIMEOUT) as client:
+            await client.post(url=settings.MCP_IMAGE_HOST, json=request_obj)
+    except Exception as e:
+        _error = e
 
     return request_path, _error
 
@@ -1,9 +1,10 @@
 from typing import List
 
 from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
 
-from apps.dashboard.crud.dashboard_service import list_resource, load_resource, \
-    create_resource, create_canvas, validate_name, delete_resource, update_resource, update_canvas
+from apps.dashboard.crud.dashboard_service import list_resource, get_resource, load_chart_data, \
+    stream_chart_data, create_resource, create_canvas, validate_name, delete_resource, update_resource, update_canvas
 from apps.dashboard.models.dashboard_model import CreateDashboard, BaseDashboard, QueryDashboard
 from apps.swagger.i18n import PLACEHOLDER_PREFIX
 from common.audit.models.log_model import OperationType, OperationModules
@@ -20,15 +21,30 @@ async def list_resource_api(session: SessionDep, dashboard: QueryDashboard, curr
 
 @router.post("/load_resource", summary=f"{PLACEHOLDER_PREFIX}load_resource_api")
 async def load_resource_api(session: SessionDep, current_user: CurrentUser, dashboard: QueryDashboard):
-    resource_dict = load_resource(session=session, dashboard=dashboard)
+    resource_dict = get_resource(session, dashboard.id)
+    check_resource_permission(resource_dict, current_user)
+    if resource_dict is None:
+        return None
+    return await load_chart_data(session, resource_dict)
+
+
+@router.post("/load_resource_stream", summary=f"{PLACEHOLDER_PREFIX}load_resource_api")
+async def load_resource_stream_api(session: SessionDep, current_user: CurrentUser, dashboard: QueryDashboard):
+    resource_dict = get_resource(session, dashboard.id)
+    check_resource_permission(resource_dict, current_user)
+    if resource_dict is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return StreamingResponse(stream_chart_data(session, resource_dict), media_type="text/event-stream")
+
+
+def check_resource_permission(resource_dict: dict | None, current_user: CurrentUser):
+    # 先校验权限，再执行图表查询
     if resource_dict and resource_dict.get("create_by") != str(current_user.id):
         raise HTTPException(
             status_code=403,
             detail="You do not have permission to access this resource"
         )
 
-    return resource_dict
-
 
 @router.post("/create_resource", response_model=BaseDashboard, summary=f"{PLACEHOLDER_PREFIX}create_resource_api")
 async def create_resource_api(session: SessionDep, user: CurrentUser, dashboard: CreateDashboard):
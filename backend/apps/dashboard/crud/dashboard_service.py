@@ -1,15 +1,28 @@
+import asyncio
 import base64
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from orjson import orjson
 from sqlalchemy import select, and_, text
 
-from apps.chat.curd.chat import get_chart_data_ds
+from apps.chat.curd.chat import get_chart_data_by_ds
+from apps.datasource.crud.datasource import get_ds
 from apps.dashboard.models.dashboard_model import CoreDashboard, CreateDashboard, QueryDashboard, DashboardBaseResponse
+from common.core.config import settings
 from common.core.deps import SessionDep, CurrentUser
 import uuid
 import time
 
 from common.utils.tree_utils import build_tree_generic
+from common.utils.utils import SQLBotLogUtil
+
+# 仪表板图表查询线程池，同一数据源的并发查询数由 DASHBOARD_DS_CONCURRENCY 限制
+chart_executor = ThreadPoolExecutor(max_workers=max(1, settings.DASHBOARD_CHART_WORKERS),
+                                    thread_name_prefix='sqlbot-dashboard')
+_ds_queues: dict = {}
+_ds_queues_lock = threading.Lock()
 
 
 def list_resource(session: SessionDep, dashboard: QueryDashboard, current_user: CurrentUser):
@@ -34,7 +47,7 @@ def list_resource(session: SessionDep, dashboard: QueryDashboard, current_user:
     return tree
 
 
-def load_resource(session: SessionDep, dashboard: QueryDashboard):
+def get_resource(session: SessionDep, dashboard_id: str):
     sql = text("""
                SELECT cd.*,
                       creator.name AS create_name,
@@ -45,20 +58,144 @@ def load_resource(session: SessionDep, dashboard: QueryDashboard):
                ON cd.update_by = updater.id:: varchar
                WHERE cd.id = :dashboard_id
                """)
-    result = session.execute(sql, {"dashboard_id": dashboard.id}).mappings().first()
+    result = session.execute(sql, {"dashboard_id": dashboard_id}).mappings().first()
+    return dict(result) if result else None
+
+
+def _chart_items(canvas_view_obj: dict) -> list[tuple[str, dict]]:
+    return [(view_id, item) for view_id, item in canvas_view_obj.items() if
+            all(key in item for key in ['datasource', 'sql']) and item['datasource'] is not None and item[
+                'sql'] is not None]
+
+
+class _DsQueryQueue:
+    """单个数据源的图表查询队列：执行中的查询数达到上限时排队，排队的查询不占用线程池中的线程"""
+
+    def __init__(self):
+        self.running = 0
+        self.pending: deque = deque()
+
+
+def _submit_chart_query(datasource, sql) -> Future:
+    # 同一数据源同时执行的图表查询数受限，避免压垮慢数据源；慢数据源的排队不影响其他数据源的查询
+    ds_id = datasource.id if datasource else None
+    future = Future()
+    with _ds_queues_lock:
+        queue = _ds_queues.get(ds_id)
+        if queue is None:
+            queue = _ds_queues[ds_id] = _DsQueryQueue()
+        if queue.running >= max(1, settings.DASHBOARD_DS_CONCURRENCY):
+            queue.pending.append((future, datasource, sql))
+            return future
+        queue.running += 1
+    _run_chart_query(ds_id, future, datasource, sql)
+    return future
+
+
+def _run_chart_query(ds_id, future: Future, datasource, sql):
+    task = chart_executor.submit(get_chart_data_by_ds, datasource, sql)
+    task.add_done_callback(lambda done: _finish_chart_query(ds_id, future, done))
+
+
+def _finish_chart_query(ds_id, future: Future, done: Future):
+    # 查询完成后由该数据源队列中的下一个查询接替执行
+    with _ds_queues_lock:
+        queue = _ds_queues[ds_id]
+        next_query = queue.pending.popleft() if queue.pending else None
+        if next_query is None:
+            queue.running -= 1
+            if not queue.running:
+                del _ds_queues[ds_id]
+    if next_query is not None:
+        _run_chart_query(ds_id, *next_query)
+    error = done.exception()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(done.result())
+
 
-    result_dict = dict(result)
+def submit_chart_queries(session: SessionDep, canvas_view_obj: dict) -> tuple[
+    dict[tuple, Future], list[tuple[str, dict, tuple]]]:
+    """
+    并发提交仪表板中的图表查询，相同数据源 + SQL 只查询一次
+    返回 ({(数据源ID, SQL): future}, [(视图ID, 视图, (数据源ID, SQL))])
+    """
+    items = _chart_items(canvas_view_obj)
+    # 数据源在请求线程中加载，线程池中的查询不再使用数据库会话
+    ds_dict = {}
+    ds_errors = {}
+    for ds_id in {item['datasource'] for _, item in items}:
+        try:
+            ds_dict[ds_id] = get_ds(session, ds_id)
+        except Exception as e:
+            SQLBotLogUtil.error(f"Function failed: {e}")
+            ds_errors[ds_id] = f"{e}"
+
+    futures: dict[tuple, Future] = {}
+    views = []
+    for view_id, item in items:
+        key = (item['datasource'], item['sql'])
+        if key not in futures:
+            if key[0] in ds_errors:
+                futures[key] = Future()
+                futures[key].set_result({'status': 'failed', 'data': [], 'message': ds_errors[key[0]]})
+            else:
+                futures[key] = _submit_chart_query(ds_dict.get(key[0]), key[1])
+        views.append((view_id, item, key))
+    return futures, views
+
+
+def _apply_chart_data(item: dict, data_result: dict):
+    item['data']['data'] = data_result['data']
+    item['status'] = data_result['status']
+    item['message'] = data_result['message']
+
+
+async def _wait_chart_query(key: tuple, future: Future):
+    return key, await asyncio.wrap_future(future)
+
+
+async def load_chart_data(session: SessionDep, result_dict: dict):
     canvas_view_obj = orjson.loads(result_dict['canvas_view_info'])
-    for item in canvas_view_obj.values():
-        if all(key in item for key in ['datasource', 'sql']) and item['datasource'] is not None and item['sql'] is not None:
-            data_result = get_chart_data_ds(session, item['datasource'], item['sql'])
-            item['data']['data'] = data_result['data']
-            item['status'] = data_result['status']
-            item['message'] = data_result['message']
+    futures, views = submit_chart_queries(session, canvas_view_obj)
+    results = dict(await asyncio.gather(*[_wait_chart_query(key, future) for key, future in futures.items()]))
+    for _view_id, item, key in views:
+        _apply_chart_data(item, results[key])
     result_dict['canvas_view_info'] = orjson.dumps(canvas_view_obj)
     return result_dict
 
 
+def stream_chart_data(session: SessionDep, result_dict: dict):
+    """
+    流式返回仪表板：先返回不含图表数据的仪表板信息，之后每个图表查询完成即推送一条
+    data:{"type": "resource"} / data:{"type": "chart", "id": 视图ID, ...} / data:{"type": "finish"}
+    查询在调用时即提交（数据源在请求会话中加载），返回的异步生成器只等待结果
+    """
+    canvas_view_obj = orjson.loads(result_dict['canvas_view_info'])
+    futures, views = submit_chart_queries(session, canvas_view_obj)
+    return _stream_chart_events(result_dict, canvas_view_obj, futures, views)
+
+
+async def _stream_chart_events(result_dict: dict, canvas_view_obj: dict, futures: dict[tuple, Future],
+                               views: list[tuple[str, dict, tuple]]):
+    views_by_key: dict[tuple, list[str]] = {}
+    for view_id, item, key in views:
+        item['data']['data'] = []
+        views_by_key.setdefault(key, []).append(view_id)
+    resource = dict(result_dict)
+    resource['canvas_view_info'] = orjson.dumps(canvas_view_obj).decode()
+    yield 'data:' + orjson.dumps({'type': 'resource', 'content': resource}, default=str).decode() + '\n\n'
+
+    for done in asyncio.as_completed([_wait_chart_query(key, future) for key, future in futures.items()]):
+        key, data_result = await done
+        for view_id in views_by_key[key]:
+            yield 'data:' + orjson.dumps({'type': 'chart', 'id': view_id, 'data': data_result['data'],
+                                          'status': data_result['status'],
+                                          'message': data_result['message']}, default=str).decode() + '\n\n'
+    yield 'data:' + orjson.dumps({'type': 'finish'}).decode() + '\n\n'
+
+
 def get_create_base_info(user: CurrentUser, dashboard: CreateDashboard):
     new_id = uuid.uuid4().hex
     record = CoreDashboard(**dashboard.model_dump())
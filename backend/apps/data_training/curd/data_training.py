@@ -8,7 +8,8 @@ import dicttoxml
 from sqlalchemy import and_, select, func, delete, update, or_
 from sqlalchemy import text
 
-from apps.ai_model.embedding import EmbeddingModelCache
+from apps.ai_model.embedding import EmbeddingModelCache, embed_question
+from apps.ai_model.vector_index import prepare_vector_search, render_search_sql
 from apps.data_training.models.data_training_model import DataTrainingInfo, DataTraining, DataTrainingInfoResult
 from apps.datasource.models.datasource import CoreDatasource
 from apps.system.models.system_model import AssistantModel
@@ -204,7 +205,7 @@ def create_training(session: SessionDep, info: DataTrainingInfo, oid: int, trans
 
     # 处理embedding（批量插入时跳过）
     if not skip_embedding:
-        run_save_data_training_embeddings([data_training.id])
+        run_save_data_training_embeddings([data_training.id], oid)
 
     return data_training.id
 
@@ -254,7 +255,7 @@ def update_training(session: SessionDep, info: DataTrainingInfo, oid: int, trans
     session.commit()
 
     # embedding
-    run_save_data_training_embeddings([info.id])
+    run_save_data_training_embeddings([info.id], oid)
 
     return info.id
 
@@ -383,7 +384,7 @@ def batch_create_training(session: SessionDep, info_list: List[DataTrainingInfo]
         # 批量处理embedding（只在最后执行一次）
         if success_count > 0 and inserted_ids:
             try:
-                run_save_data_training_embeddings(inserted_ids)
+                run_save_data_training_embeddings(inserted_ids, oid)
             except Exception as e:
                 # 如果embedding处理失败，记录错误但不回滚数据
                 print(f"Embedding processing failed: {str(e)}")
@@ -473,24 +474,28 @@ def save_embeddings(session_maker, ids: List[int]):
 embedding_sql = f"""
 SELECT id, datasource, question, similarity
 FROM
-(SELECT id, datasource, question, oid, enabled,
-( 1 - (embedding <=> :embedding_array) ) AS similarity
+(SELECT id, datasource, question,
+( 1 - ({{embedding_distance}}) ) AS similarity
 FROM data_training AS child
+WHERE oid = :oid and datasource = :datasource and enabled = true AND {{embedding_filter}}
+ORDER BY {{embedding_distance}}
+LIMIT {settings.EMBEDDING_DATA_TRAINING_TOP_COUNT}
 ) TEMP
-WHERE similarity > {settings.EMBEDDING_DATA_TRAINING_SIMILARITY} and oid = :oid and datasource = :datasource and enabled = true
+WHERE similarity > {settings.EMBEDDING_DATA_TRAINING_SIMILARITY}
 ORDER BY similarity DESC
-LIMIT {settings.EMBEDDING_DATA_TRAINING_TOP_COUNT}
 """
 embedding_sql_in_advanced_application = f"""
 SELECT id, advanced_application, question, similarity
 FROM
-(SELECT id, advanced_application, question, oid, enabled,
-( 1 - (embedding <=> :embedding_array) ) AS similarity
+(SELECT id, advanced_application, question,
+( 1 - ({{embedding_distance}}) ) AS similarity
 FROM data_training AS child
+WHERE oid = :oid and advanced_application = :advanced_application and enabled = true AND {{embedding_filter}}
+ORDER BY {{embedding_distance}}
+LIMIT {settings.EMBEDDING_DATA_TRAINING_TOP_COUNT}
 ) TEMP
-WHERE similarity > {settings.EMBEDDING_DATA_TRAINING_SIMILARITY} and oid = :oid and advanced_application = :advanced_application and enabled = true
+WHERE similarity > {settings.EMBEDDING_DATA_TRAINING_SIMILARITY}
 ORDER BY similarity DESC
-LIMIT {settings.EMBEDDING_DATA_TRAINING_TOP_COUNT}
 """
 
 
@@ -526,16 +531,15 @@ def select_training_by_question(session: SessionDep, question: str, oid: int, da
     if settings.EMBEDDING_ENABLED:
         with session.begin_nested():
             try:
-                model = EmbeddingModelCache.get_model()
-
-                embedding = model.embed_query(question)
+                embedding = embed_question(question)
 
+                dimension = prepare_vector_search(session, 'data_training', embedding)
                 if advanced_application_id is not None:
-                    results = session.execute(text(embedding_sql_in_advanced_application),
+                    results = session.execute(text(render_search_sql(embedding_sql_in_advanced_application, dimension)),
                                               {'embedding_array': str(embedding), 'oid': oid,
                                                'advanced_application': advanced_application_id})
                 else:
-                    results = session.execute(text(embedding_sql),
+                    results = session.execute(text(render_search_sql(embedding_sql, dimension)),
                                               {'embedding_array': str(embedding), 'oid': oid, 'datasource': datasource})
 
                 for row in results:
@@ -5,14 +5,12 @@ import os
 import traceback
 import uuid
 import re
-from io import StringIO
 from typing import List
 from urllib.parse import quote
 
 import pandas as pd
 from fastapi import APIRouter, File, UploadFile, HTTPException, Path
 from fastapi.responses import StreamingResponse
-from psycopg2 import sql
 from sqlalchemy import and_
 
 from apps.db.db import get_schema
@@ -31,7 +29,8 @@ from ..crud.field import get_fields_by_table_id
 from ..crud.table import get_tables_by_ds_id
 from ..models.datasource import CoreDatasource, CreateDatasource, TableObj, CoreTable, CoreField, FieldObj, \
     TableSchemaResponse, ColumnSchemaResponse, PreviewResponse, ImportRequest
-from ..utils.excel import parse_excel_preview, USER_TYPE_TO_PANDAS
+from ..utils.excel import parse_excel_preview
+from ..utils.excel_import import ExcelReadError, ExcelWriteError, SheetImport, import_file
 
 router = APIRouter(tags=["Datasource"], prefix="/datasource")
 path = settings.EXCEL_PATH
@@ -333,21 +332,20 @@ async def upload_excel(session: SessionDep, file: UploadFile = File(..., descrip
 
     def inner():
         sheets = []
-        engine = get_engine_conn()
         if filename.endswith(".csv"):
-            df = pd.read_csv(save_path, engine='c')
-            tableName = f"sheet1_{hashlib.sha256(uuid.uuid4().bytes).hexdigest()[:10]}"
-            sheets.append({"tableName": tableName, "tableComment": ""})
-            insert_pg(df, tableName, engine)
+            sheet_names = ["sheet1"]
         else:
-            sheet_names = pd.ExcelFile(save_path).sheet_names
-            for sheet_name in sheet_names:
-                tableName = f"{sheet_name}_{hashlib.sha256(uuid.uuid4().bytes).hexdigest()[:10]}"
-                sheets.append({"tableName": tableName, "tableComment": ""})
-                # df_temp = pd.read_excel(save_path, nrows=5)
-                # non_empty_cols = df_temp.columns[df_temp.notna().any()].tolist()
-                df = pd.read_excel(save_path, sheet_name=sheet_name, engine='calamine')
-                insert_pg(df, tableName, engine)
+            sheet_names = pd.ExcelFile(save_path, engine='calamine').sheet_names
+        imports = [SheetImport(sheet_name=sheet_name,
+                               table_name=f"{sheet_name}_{hashlib.sha256(uuid.uuid4().bytes).hexdigest()[:10]}")
+                   for sheet_name in sheet_names]
+        try:
+            import_file(get_engine_conn(), save_path, imports)
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(400, str(e))
+        for sheet in imports:
+            sheets.append({"tableName": sheet.table_name, "tableComment": ""})
 
         # os.remove(save_path)
         return {"filename": filename, "sheets": sheets}
@@ -355,40 +353,6 @@ async def upload_excel(session: SessionDep, file: UploadFile = File(..., descrip
     return await asyncio.to_thread(inner)
 
 
-def insert_pg(df, tableName, engine):
-    # fix field type
-    for i in range(len(df.dtypes)):
-        if str(df.dtypes[i]) == 'uint64':
-            df[str(df.columns[i])] = df[str(df.columns[i])].astype('string')
-
-    conn = engine.raw_connection()
-    cursor = conn.cursor()
-    try:
-        df.to_sql(
-            tableName,
-            engine,
-            if_exists='replace',
-            index=False
-        )
-        # trans csv
-        output = StringIO()
-        df.to_csv(output, sep='\t', header=False, index=False)
-        # output.seek(0)
-
-        # pg copy
-        query = sql.SQL("COPY {} FROM STDIN WITH CSV DELIMITER E'\t'").format(
-            sql.Identifier(tableName)
-        )
-        cursor.copy_expert(sql=query.as_string(cursor.connection), file=output)
-        conn.commit()
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(400, str(e))
-    finally:
-        cursor.close()
-        conn.close()
-
-
 t_sheet = "数据表列表"
 t_s_col = "Sheet名称"
 t_n_col = "表名"
@@ -565,58 +529,27 @@ async def import_to_db(session: SessionDep, trans: Trans, import_req: ImportRequ
         raise HTTPException(400, "File not found")
 
     def inner():
-        engine = get_engine_conn()
-        results = []
-
+        imports = []
         for sheet_info in import_req.sheets:
-            sheet_name = sheet_info.sheetName
-            table_name = f"excel_{filter_string(sheet_name)}_{hashlib.sha256(uuid.uuid4().bytes).hexdigest()[:10]}"
-            fields = sheet_info.fields
-
-            field_mapping = {f.fieldName: f.fieldType for f in fields}
-            dtype_dict = {
-                col: USER_TYPE_TO_PANDAS.get(field_mapping.get(col, 'string'), 'string')
-                for col in field_mapping.keys()
-            }
-
-            try:
-                if save_path.endswith(".csv"):
-                    df = pd.read_csv(save_path, engine='c', dtype=dtype_dict)
-                    sheet_name = "Sheet1"
-                else:
-                    df = pd.read_excel(save_path, sheet_name=sheet_name, engine='calamine', dtype=dtype_dict)
-            except Exception as e:
-                raise HTTPException(500, f"{trans('i18n_ds_upload_error')}: {str(e)}")
-
-            conn = engine.raw_connection()
-            cursor = conn.cursor()
-            try:
-                df.to_sql(
-                    table_name,
-                    engine,
-                    if_exists='replace',
-                    index=False
-                )
-                output = StringIO()
-                df.to_csv(output, sep='\t', header=False, index=False)
-
-                query = sql.SQL("COPY {} FROM STDIN WITH CSV DELIMITER E'\t'").format(
-                    sql.Identifier(table_name)
-                )
-                cursor.copy_expert(sql=query.as_string(cursor.connection), file=output)
-                conn.commit()
-                results.append({
-                    "sheetName": sheet_name,
-                    "tableName": table_name,
-                    "tableComment": "",
-                    "rows": len(df)
-                })
-            except Exception as e:
-                raise HTTPException(500, f"Insert data failed for {table_name}: {str(e)}")
-            finally:
-                cursor.close()
-                conn.close()
+            sheet_name = "Sheet1" if save_path.endswith(".csv") else sheet_info.sheetName
+            table_name = (f"excel_{filter_string(sheet_info.sheetName)}_"
+                          f"{hashlib.sha256(uuid.uuid4().bytes).hexdigest()[:10]}")
+            imports.append(SheetImport(sheet_name=sheet_name, table_name=table_name,
+                                       field_types={f.fieldName: f.fieldType for f in sheet_info.fields}))
 
+        try:
+            rows = import_file(get_engine_conn(), save_path, imports)
+        except ExcelReadError as e:
+            raise HTTPException(500, f"{trans('i18n_ds_upload_error')}: {str(e)}")
+        except ExcelWriteError as e:
+            raise HTTPException(500, f"Insert data failed for {e.table_name}: {str(e)}")
+
+        results = [{
+            "sheetName": sheet.sheet_name,
+            "tableName": sheet.table_name,
+            "tableComment": "",
+            "rows": count
+        } for sheet, count in zip(imports, rows)]
         return {"filename": import_req.filePath, "sheets": results}
 
     return await asyncio.to_thread(inner)
@@ -3,25 +3,30 @@ import json
 from typing import List, Optional
 
 from fastapi import HTTPException
-from sqlalchemy import and_, text
-from sqlbot_xpack.permissions.models.ds_rules import DsRules
+from sqlalchemy import and_, text, update
+from sqlalchemy.orm import defer
 from sqlmodel import select
 
-from apps.datasource.crud.permission import get_column_permission_fields, get_row_permission_filters, is_normal_user
+from apps.datasource.crud.permission import get_column_permission_fields, get_row_permission_filters, is_normal_user, \
+    get_permission_plan, permission_plan_cache, PermissionPlan
+from apps.datasource.crud.schema_prompt import SchemaPrompt, column_mask_fingerprint, relation_fingerprint, \
+    schema_prompt_cache
+from apps.datasource.embedding.matrix import table_embedding_store
 from apps.datasource.embedding.table_embedding import calc_table_embedding
 from apps.datasource.utils.utils import aes_decrypt
 from apps.db.constant import DB
-from apps.db.db import get_tables, get_fields, exec_sql, check_connection
+from apps.db.db import get_tables, get_fields, exec_sql, check_connection, datasource_health, pool_manager
 from apps.db.engine import get_engine_config, get_engine_conn
+from apps.db.result_cache import sql_result_cache, config_version
 from apps.system.schemas.auth import CacheName, CacheNamespace
 from common.core.config import settings
 from common.core.deps import SessionDep, CurrentUser, Trans
-from common.utils.embedding_threads import run_save_table_embeddings, run_save_ds_embeddings
+from common.utils.embedding_threads import run_save_table_and_ds_embeddings, run_save_ds_embeddings
 from common.utils.utils import SQLBotLogUtil, deepcopy_ignore_extra, equals_ignore_case
 from common.core.sqlbot_cache import cache, clear_cache
 from .table import get_tables_by_ds_id
 from ..crud.field import delete_field_by_ds_id, update_field
-from ..crud.table import delete_table_by_ds_id, update_table
+from ..crud.table import delete_table_by_ds_id, update_table, get_changed_table_ids
 from ..models.datasource import CoreDatasource, CreateDatasource, CoreTable, CoreField, ColumnSchema, TableObj, \
     DatasourceConf, TableAndFields
 
@@ -109,7 +114,12 @@ def update_ds(session: SessionDep, trans: Trans, user: CurrentUser, ds: CoreData
     session.add(record)
     session.commit()
 
-    run_save_ds_embeddings([ds.id])
+    sql_result_cache.invalidate(ds.id)
+    datasource_health.invalidate(ds.id)
+    pool_manager.invalidate(ds.id)
+    permission_plan_cache.invalidate(ds.id)
+    schema_prompt_cache.invalidate(ds.id)
+    run_save_ds_embeddings([ds.id], record.oid)
     return ds
 
 
@@ -135,6 +145,12 @@ async def delete_ds(session: SessionDep, id: int):
     session.commit()
     delete_table_by_ds_id(session, id)
     delete_field_by_ds_id(session, id)
+    table_embedding_store.invalidate(id)
+    sql_result_cache.invalidate(id)
+    datasource_health.invalidate(id)
+    pool_manager.invalidate(id)
+    permission_plan_cache.invalidate(id)
+    schema_prompt_cache.invalidate(id)
     if term:
         await clear_ws_ds_cache(term.oid)
     return {
@@ -185,112 +201,146 @@ def sync_single_fields(session: SessionDep, trans: Trans, id: int):
     # sync field
     fields = getFieldsByDs(session, ds, table.table_name)
     sync_fields(session, ds, table, fields)
+    session.commit()
+    permission_plan_cache.invalidate(ds.id)
+    schema_prompt_cache.invalidate(ds.id)
 
     # do table embedding
-    run_save_table_embeddings([table.id])
-    run_save_ds_embeddings([ds.id])
+    save_changed_table_embeddings(session, [table.id], ds.id, oid=ds.oid)
 
 
 def sync_table(session: SessionDep, ds: CoreDatasource, tables: List[CoreTable]):
+    # 一次查出数据源下已有的表，在内存中比对后批量新增/更新/删除
+    exist_tables = session.query(CoreTable).options(defer(CoreTable.embedding)).filter(
+        CoreTable.ds_id == ds.id).all()
+    exist_dict = {t.table_name: t for t in exist_tables}
+
     id_list = []
+    update_list = []
+    new_list = []
     for item in tables:
-        statement = select(CoreTable).where(and_(CoreTable.ds_id == ds.id, CoreTable.table_name == item.table_name))
-        record = session.exec(statement).first()
+        record = exist_dict.get(item.table_name)
         # update exist table, only update table_comment
         if record is not None:
             item.id = record.id
             id_list.append(record.id)
-
-            record.table_comment = item.table_comment
-            session.add(record)
-            session.commit()
+            if record.table_comment != item.table_comment:
+                update_list.append({'id': record.id, 'table_comment': item.table_comment})
         else:
             # save new table
-            table = CoreTable(ds_id=ds.id, checked=True, table_name=item.table_name, table_comment=item.table_comment,
-                              custom_comment=item.table_comment)
-            session.add(table)
-            session.flush()
-            session.refresh(table)
+            new_list.append((item, CoreTable(ds_id=ds.id, checked=True, table_name=item.table_name,
+                                             table_comment=item.table_comment, custom_comment=item.table_comment)))
+
+    if update_list:
+        session.execute(update(CoreTable), update_list)
+    if new_list:
+        session.add_all([table for _, table in new_list])
+        session.flush()
+        for item, table in new_list:
             item.id = table.id
             id_list.append(table.id)
-            session.commit()
 
-        # sync field
-        fields = getFieldsByDs(session, ds, item.table_name)
-        sync_fields(session, ds, item, fields)
+    keep_ids = set(id_list)
+    deleted_ids = [t.id for t in exist_tables if t.id not in keep_ids]
+    if deleted_ids:
+        session.query(CoreTable).filter(CoreTable.id.in_(deleted_ids)).delete(synchronize_session=False)
+    session.query(CoreField).filter(and_(CoreField.ds_id == ds.id, CoreField.table_id.not_in(id_list))).delete(
+        synchronize_session=False)
 
-    if len(id_list) > 0:
-        session.query(CoreTable).filter(and_(CoreTable.ds_id == ds.id, CoreTable.id.not_in(id_list))).delete(
-            synchronize_session=False)
-        session.query(CoreField).filter(and_(CoreField.ds_id == ds.id, CoreField.table_id.not_in(id_list))).delete(
-            synchronize_session=False)
-        session.commit()
-    else:  # delete all tables and fields in this ds
-        session.query(CoreTable).filter(CoreTable.ds_id == ds.id).delete(synchronize_session=False)
-        session.query(CoreField).filter(CoreField.ds_id == ds.id).delete(synchronize_session=False)
-        session.commit()
+    # sync field
+    exist_fields: dict[int, List[CoreField]] = {}
+    if id_list:
+        for field in session.query(CoreField).filter(CoreField.table_id.in_(id_list)).all():
+            exist_fields.setdefault(field.table_id, []).append(field)
+    for item in tables:
+        fields = getFieldsByDs(session, ds, item.table_name)
+        sync_fields(session, ds, item, fields, exist_fields.get(item.id, []))
+    session.commit()
+    permission_plan_cache.invalidate(ds.id)
+    schema_prompt_cache.invalidate(ds.id)
 
     # do table embedding
-    run_save_table_embeddings(id_list)
-    run_save_ds_embeddings([ds.id])
+    save_changed_table_embeddings(session, id_list, ds.id, force_ds=bool(deleted_ids) or not ds.embedding,
+                                  oid=ds.oid)
+
 
+def sync_fields(session: SessionDep, ds: CoreDatasource, table: CoreTable, fields: List[ColumnSchema],
+                exist_fields: Optional[List[CoreField]] = None):
+    """
+    在内存中比对字段后批量新增/更新/删除，不提交事务，由调用方提交
+    exist_fields 为该表已有字段，未传入时查询
+    """
+    if exist_fields is None:
+        exist_fields = session.query(CoreField).filter(CoreField.table_id == table.id).all()
+    exist_dict = {f.field_name: f for f in exist_fields}
 
-def sync_fields(session: SessionDep, ds: CoreDatasource, table: CoreTable, fields: List[ColumnSchema]):
     id_list = []
+    update_list = []
+    new_list = []
     for index, item in enumerate(fields):
-        statement = select(CoreField).where(
-            and_(CoreField.table_id == table.id, CoreField.field_name == item.fieldName))
-        record = session.exec(statement).first()
+        record = exist_dict.get(item.fieldName)
         if record is not None:
             item.id = record.id
             id_list.append(record.id)
-
-            record.field_comment = item.fieldComment
-            record.field_index = index
-            record.field_type = item.fieldType
-            session.add(record)
-            session.commit()
+            if (record.field_comment != item.fieldComment or record.field_index != index
+                    or record.field_type != item.fieldType):
+                update_list.append({'id': record.id, 'field_comment': item.fieldComment, 'field_index': index,
+                                    'field_type': item.fieldType})
         else:
-            field = CoreField(ds_id=ds.id, table_id=table.id, checked=True, field_name=item.fieldName,
-                              field_type=item.fieldType, field_comment=item.fieldComment,
-                              custom_comment=item.fieldComment, field_index=index)
-            session.add(field)
-            session.flush()
-            session.refresh(field)
+            new_list.append((item, CoreField(ds_id=ds.id, table_id=table.id, checked=True, field_name=item.fieldName,
+                                             field_type=item.fieldType, field_comment=item.fieldComment,
+                                             custom_comment=item.fieldComment, field_index=index)))
+
+    if update_list:
+        session.execute(update(CoreField), update_list)
+    if new_list:
+        session.add_all([field for _, field in new_list])
+        session.flush()
+        for item, field in new_list:
             item.id = field.id
             id_list.append(field.id)
-            session.commit()
 
     if len(id_list) > 0:
-        session.query(CoreField).filter(and_(CoreField.table_id == table.id, CoreField.id.not_in(id_list))).delete(
-            synchronize_session=False)
-        session.commit()
+        keep_ids = set(id_list)
+        deleted_ids = [f.id for f in exist_fields if f.id not in keep_ids]
+        if deleted_ids:
+            session.query(CoreField).filter(CoreField.id.in_(deleted_ids)).delete(synchronize_session=False)
 
 
 def update_table_and_fields(session: SessionDep, data: TableObj):
     update_table(session, data.table)
     for field in data.fields:
         update_field(session, field)
+    schema_prompt_cache.invalidate(data.table.ds_id)
 
     # do table embedding
-    run_save_table_embeddings([data.table.id])
-    run_save_ds_embeddings([data.table.ds_id])
+    save_changed_table_embeddings(session, [data.table.id], data.table.ds_id)
 
 
 def updateTable(session: SessionDep, table: CoreTable):
     update_table(session, table)
+    schema_prompt_cache.invalidate(table.ds_id)
 
     # do table embedding
-    run_save_table_embeddings([table.id])
-    run_save_ds_embeddings([table.ds_id])
+    save_changed_table_embeddings(session, [table.id], table.ds_id)
 
 
 def updateField(session: SessionDep, field: CoreField):
     update_field(session, field)
+    schema_prompt_cache.invalidate(field.ds_id)
 
     # do table embedding
-    run_save_table_embeddings([field.table_id])
-    run_save_ds_embeddings([field.ds_id])
+    save_changed_table_embeddings(session, [field.table_id], field.ds_id)
+
+
+def save_changed_table_embeddings(session: SessionDep, table_ids: List[int], ds_id: int, force_ds: bool = False,
+                                  oid: Optional[int] = None):
+    """
+    只为结构文本发生变化的表重新生成 embedding，有表变化（或 force_ds）时同时更新数据源 embedding
+    """
+    changed_ids = get_changed_table_ids(session, table_ids) if table_ids else []
+    if changed_ids or force_ds:
+        run_save_table_and_ds_embeddings(changed_ids, [ds_id], oid)
 
 
 def preview(session: SessionDep, current_user: CurrentUser, id: int, data: TableObj):
@@ -311,14 +361,14 @@ def preview(session: SessionDep, current_user: CurrentUser, id: int, data: Table
     f_list = [f for f in fields if f.checked]
     if is_normal_user(current_user):
         # column is checked, and, column permission for data.fields
-        contain_rules = session.query(DsRules).all()
+        plan = get_permission_plan(session, current_user, ds)
         f_list = get_column_permission_fields(session=session, current_user=current_user, table=data.table,
-                                              fields=f_list, contain_rules=contain_rules)
+                                              fields=f_list, plan=plan)
 
         # row permission tree
         where_str = ''
         filter_mapping = get_row_permission_filters(session=session, current_user=current_user, ds=ds, tables=None,
-                                                    single_table=data.table)
+                                                    single_table=data.table, plan=plan)
         if filter_mapping:
             mapping_dict = filter_mapping[0]
             where_str = mapping_dict.get('filter')
@@ -400,9 +450,11 @@ def updateNum(session: SessionDep, ds: CoreDatasource):
     session.commit()
 
 
-def get_table_obj_by_ds(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource) -> List[TableAndFields]:
+def get_table_obj_by_ds(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource,
+                        plan: Optional[PermissionPlan] = None) -> List[TableAndFields]:
     _list: List = []
-    tables = session.query(CoreTable).filter(
+    # embedding 由内存中的向量矩阵提供，这里不再加载
+    tables = session.query(CoreTable).options(defer(CoreTable.embedding)).filter(
         and_(CoreTable.ds_id == ds.id, CoreTable.checked == True)
     ).all()
     conf = DatasourceConf(**json.loads(aes_decrypt(ds.configuration))) if ds.type != "excel" else get_engine_config()
@@ -420,14 +472,15 @@ def get_table_obj_by_ds(session: SessionDep, current_user: CurrentUser, ds: Core
         else:
             fields_dict[field.table_id] = [field]
 
-    contain_rules = session.query(DsRules).all()
+    # 行/列权限一次加载并按用户缓存
+    plan = plan or get_permission_plan(session, current_user, ds)
     for table in tables:
         # fields = session.query(CoreField).filter(and_(CoreField.table_id == table.id, CoreField.checked == True)).all()
         fields = fields_dict.get(table.id)
 
         # do column permissions, filter fields
         fields = get_column_permission_fields(session=session, current_user=current_user, table=table, fields=fields,
-                                              contain_rules=contain_rules)
+                                              plan=plan)
         _list.append(TableAndFields(schema=schema, table=table, fields=fields))
     return _list
 
@@ -505,24 +558,16 @@ def get_tables_sample_data(session: SessionDep, current_user: CurrentUser, ds: C
     return "\n".join(sample_data_parts)
 
 
-def get_table_schema(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource, question: str,
-                     embedding: bool = True, table_list: list[str] = None) -> tuple[str, list]:
-    schema_str = ""
-    table_objs = get_table_obj_by_ds(session=session, current_user=current_user, ds=ds)
+def _build_schema_prompt(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource,
+                         plan: PermissionPlan) -> SchemaPrompt:
+    table_objs = get_table_obj_by_ds(session=session, current_user=current_user, ds=ds, plan=plan)
     if len(table_objs) == 0:
-        return schema_str, []
+        return SchemaPrompt()
     db_name = table_objs[0].schema
-    schema_str += f"【DB_ID】 {db_name}\n【Schema】\n"
-    tables = []
-    all_tables = []  # temp save all tables
-    table_name_list = []
+    prompt = SchemaPrompt(db_name=db_name)
+    no_schema_types = ["mysql", "es", "sqlite", "hive", "doris", "starrocks"]
     for obj in table_objs:
-        # 如果传入了table_list，则只处理在列表中的表
-        if table_list is not None and obj.table.table_name not in table_list:
-            continue
-
         schema_table = ''
-        no_schema_types = ["mysql", "es", "sqlite", "hive", "doris", "starrocks"]
         schema_table += f"# Table: {db_name}.{obj.table.table_name}" if ds.type not in no_schema_types and db_name else f"# Table: {obj.table.table_name}"
         table_comment = ''
         if obj.table.custom_comment:
@@ -545,10 +590,48 @@ def get_table_schema(session: SessionDep, current_user: CurrentUser, ds: CoreDat
             schema_table += ",\n".join(field_list)
         schema_table += '\n]\n'
 
-        t_obj = {"id": obj.table.id, "table_name": obj.table.table_name, "schema_table": schema_table,
-                 "embedding": obj.table.embedding}
-        tables.append(t_obj)
-        all_tables.append(t_obj)
+        prompt.tables.append({"id": obj.table.id, "table_name": obj.table.table_name, "schema_table": schema_table})
+
+    # field relation，表名、字段名一次查出并拼好外键行
+    relations = list(filter(lambda x: x.get('shape') == 'edge', ds.table_relation or []))
+    if relations:
+        relation_table_ids = set()
+        relation_field_ids = set()
+        for r in relations:
+            relation_table_ids.update([r.get('source').get('cell'), r.get('target').get('cell')])
+            relation_field_ids.update([r.get('source').get('port'), r.get('target').get('port')])
+        table_dict = {ele.id: ele.table_name for ele in session.query(CoreTable.id, CoreTable.table_name).filter(
+            CoreTable.id.in_(list(map(int, relation_table_ids)))).all()}
+        field_dict = {ele.id: ele.field_name for ele in session.query(CoreField.id, CoreField.field_name).filter(
+            CoreField.id.in_(list(map(int, relation_field_ids)))).all()}
+        for ele in relations:
+            source, target = ele.get('source'), ele.get('target')
+            prompt.relations.append((source.get('cell'), target.get('cell'),
+                                     f"{table_dict.get(int(source.get('cell')))}.{field_dict.get(int(source.get('port')))}={table_dict.get(int(target.get('cell')))}.{field_dict.get(int(target.get('port')))}\n"))
+    return prompt
+
+
+def get_schema_prompt(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource) -> SchemaPrompt:
+    """
+    数据源结构片段按 (数据源结构版本, 用户列权限指纹) 缓存，同一问题中选表与生成图表共用
+    """
+    plan = get_permission_plan(session, current_user, ds)
+    fingerprint = f"{config_version(ds)}|{relation_fingerprint(ds.table_relation)}"
+    return schema_prompt_cache.get_or_build(ds.id, column_mask_fingerprint(plan.column_masks), fingerprint,
+                                            lambda: _build_schema_prompt(session, current_user, ds, plan))
+
+
+def get_table_schema(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource, question: str,
+                     embedding: bool = True, table_list: list[str] = None) -> tuple[str, list]:
+    schema_str = ""
+    prompt = get_schema_prompt(session, current_user, ds)
+    if len(prompt.tables) == 0:
+        return schema_str, []
+    schema_str += f"【DB_ID】 {prompt.db_name}\n【Schema】\n"
+    table_name_list = []
+    # 如果传入了table_list，则只处理在列表中的表
+    all_tables = prompt.tables if table_list is None else [t for t in prompt.tables if t['table_name'] in table_list]
+    tables = all_tables
 
     # 如果没有符合过滤条件的表，直接返回
     if not tables:
@@ -556,7 +639,7 @@ def get_table_schema(session: SessionDep, current_user: CurrentUser, ds: CoreDat
 
     # do table embedding
     if embedding and tables and settings.TABLE_EMBEDDING_ENABLED:
-        tables = calc_table_embedding(tables, question)
+        tables = calc_table_embedding(tables, question, session=session, ds_id=ds.id)
     # splice schema
     if tables:
         for s in tables:
@@ -564,52 +647,25 @@ def get_table_schema(session: SessionDep, current_user: CurrentUser, ds: CoreDat
             table_name_list.append(s.get('table_name'))
 
     # field relation
-    if tables and ds.table_relation:
-        relations = list(filter(lambda x: x.get('shape') == 'edge', ds.table_relation))
-        if relations:
-            # Complete the missing table
-            # get tables in relation, remove irrelevant relation
-            embedding_table_ids = [s.get('id') for s in tables]
-            all_relations = list(
-                filter(lambda x: x.get('source').get('cell') in embedding_table_ids or x.get('target').get(
-                    'cell') in embedding_table_ids, relations))
-
-            # get relation table ids, sub embedding table ids
-            relation_table_ids = []
+    if tables and prompt.relations:
+        # Complete the missing table
+        # get tables in relation, remove irrelevant relation
+        embedding_table_ids = [s.get('id') for s in tables]
+        all_relations = [r for r in prompt.relations if r[0] in embedding_table_ids or r[1] in embedding_table_ids]
+
+        # get lost table ids
+        relation_table_ids = set(r[0] for r in all_relations) | set(r[1] for r in all_relations)
+        lost_table_ids = relation_table_ids - set(embedding_table_ids)
+        # get lost table schema and splice it
+        for s in all_tables:
+            if s.get('id') in lost_table_ids:
+                schema_str += s.get('schema_table')
+                table_name_list.append(s.get('table_name'))
+
+        if all_relations:
+            schema_str += '【Foreign keys】\n'
             for r in all_relations:
-                relation_table_ids.append(r.get('source').get('cell'))
-                relation_table_ids.append(r.get('target').get('cell'))
-            relation_table_ids = list(set(relation_table_ids))
-            # get table dict
-            table_records = session.query(CoreTable).filter(CoreTable.id.in_(list(map(int, relation_table_ids)))).all()
-            table_dict = {}
-            for ele in table_records:
-                table_dict[ele.id] = ele.table_name
-
-            # get lost table ids
-            lost_table_ids = list(set(relation_table_ids) - set(embedding_table_ids))
-            # get lost table schema and splice it
-            lost_tables = list(filter(lambda x: x.get('id') in lost_table_ids, all_tables))
-            if lost_tables:
-                for s in lost_tables:
-                    schema_str += s.get('schema_table')
-                    table_name_list.append(s.get('table_name'))
-
-            # get field dict
-            relation_field_ids = []
-            for relation in all_relations:
-                relation_field_ids.append(relation.get('source').get('port'))
-                relation_field_ids.append(relation.get('target').get('port'))
-            relation_field_ids = list(set(relation_field_ids))
-            field_records = session.query(CoreField).filter(CoreField.id.in_(list(map(int, relation_field_ids)))).all()
-            field_dict = {}
-            for ele in field_records:
-                field_dict[ele.id] = ele.field_name
-
-            if all_relations:
-                schema_str += '【Foreign keys】\n'
-                for ele in all_relations:
-                    schema_str += f"{table_dict.get(int(ele.get('source').get('cell')))}.{field_dict.get(int(ele.get('source').get('port')))}={table_dict.get(int(ele.get('target').get('cell')))}.{field_dict.get(int(ele.get('target').get('port')))}\n"
+                schema_str += r[2]
 
     return schema_str, table_name_list
 
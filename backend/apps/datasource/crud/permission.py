@@ -1,88 +1,210 @@
+import hashlib
 import json
-from typing import List, Optional
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
 
+import orjson
 from sqlalchemy import and_, cast, or_
-from sqlbot_xpack.permissions.api.permission import transRecord2DTO
-from sqlbot_xpack.permissions.models.ds_permission import DsPermission, PermissionDTO
+from sqlbot_xpack.permissions.models.ds_permission import DsPermission
 from sqlbot_xpack.permissions.models.ds_rules import DsRules
 
-from apps.datasource.crud.row_permission import transFilterTree
+from apps.datasource.crud.row_permission import FilterLookup, transTreeToWhere
 from apps.datasource.models.datasource import CoreDatasource, CoreField, CoreTable
+from apps.system.models.system_variable_model import SystemVariable
+from common.core.config import settings
 from common.core.deps import CurrentUser, SessionDep
 from sqlalchemy.dialects.postgresql import JSONB
 
 
-def get_row_permission_filters(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource,
-                               tables: Optional[list] = None, single_table: Optional[CoreTable] = None):
-    if single_table:
-        table_list = [session.get(CoreTable, single_table.id)]
-    else:
-        table_list = session.query(CoreTable).filter(
-            and_(CoreTable.ds_id == ds.id, CoreTable.table_name.in_(tables))
-        ).all()
+@dataclass
+class PermissionPlan:
+    """
+    用户在某个数据源上的权限计划
+    row_filters: {table_id: (表名, 行权限 WHERE 条件)}，只包含条件非空的表
+    column_masks: {table_id: 被禁用的字段 ID}
+    """
+    row_filters: dict[int, tuple[str, str]] = field(default_factory=dict)
+    column_masks: dict[int, set[int]] = field(default_factory=dict)
+
+
+class PermissionPlanCache:
+    """
+    按 (用户, 数据源) 缓存编译后的权限计划
+    每次使用前仍查询该数据源的权限与用户所在规则（两条查询），与用户信息一起计算指纹，
+    规则、权限的修改（包括 xpack 中的修改）会改变指纹，计划自动重新编译；
+    字段、表、系统变量的修改不体现在指纹中，由对应的修改操作调用 invalidate 清除。
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple[int, int], tuple[str, PermissionPlan]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: tuple[int, int], fingerprint: str) -> Optional[PermissionPlan]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == fingerprint:
+                self._items.move_to_end(key)
+                self._hits += 1
+                return item[1]
+            self._misses += 1
+            return None
+
+    def put(self, key: tuple[int, int], fingerprint: str, plan: PermissionPlan):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (fingerprint, plan)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, ds_id: Optional[int] = None):
+        """清除某个数据源（不传则全部）的权限计划"""
+        with self._lock:
+            if ds_id is None:
+                self._items.clear()
+            else:
+                for key in [k for k in self._items if k[1] == ds_id]:
+                    del self._items[key]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._items), 'max_size': self.max_size, 'hits': self._hits, 'misses': self._misses}
+
+
+permission_plan_cache = PermissionPlanCache(settings.PERMISSION_PLAN_CACHE_SIZE)
+
+
+def _json_value(value, default):
+    if value is None:
+        return default
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
 
+def _collect_tree_refs(tree: Any, field_ids: set, variable_ids: set):
+    if not tree:
+        return
+    for item in tree.get('items') or []:
+        if item.get('type') == 'item':
+            if item.get('field_id') is not None:
+                field_ids.add(int(item['field_id']))
+            if item.get('value_type') == 'variable' and item.get('variable_id') is not None:
+                variable_ids.add(item['variable_id'])
+        elif item.get('type') == 'tree':
+            _collect_tree_refs(item.get('sub_tree'), field_ids, variable_ids)
+
+
+def _user_fingerprint(current_user: CurrentUser) -> list:
+    # 行权限条件会用到用户的名称、账号、邮箱和用户变量
+    return [current_user.id, getattr(current_user, 'name', None), getattr(current_user, 'account', None),
+            getattr(current_user, 'email', None), getattr(current_user, 'system_variables', None)]
+
+
+def _compile_plan(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource,
+                  permissions: list[tuple[DsPermission, str]]) -> PermissionPlan:
+    plan = PermissionPlan()
+    row_trees: dict[int, tuple[str, list]] = {}
+    field_ids: set[int] = set()
+    variable_ids: set = set()
+    for permission, table_name in permissions:
+        if permission.type == 'row':
+            tree = _json_value(permission.expression_tree, None)
+            row_trees.setdefault(permission.table_id, (table_name, []))[1].append(tree)
+            _collect_tree_refs(tree, field_ids, variable_ids)
+        else:
+            for item in _json_value(permission.permissions, []):
+                if not item['enable']:
+                    plan.column_masks.setdefault(permission.table_id, set()).add(item['field_id'])
+
+    if not row_trees:
+        return plan
+    fields = {f.id: f for f in session.query(CoreField).filter(CoreField.id.in_(field_ids)).all()} \
+        if field_ids else {}
+    variables = {v.id: v for v in session.query(SystemVariable).filter(SystemVariable.id.in_(variable_ids)).all()} \
+        if variable_ids else {}
+    lookup = FilterLookup(session, fields, variables)
+    for table_id, (table_name, trees) in row_trees.items():
+        res: List[str] = []
+        for tree in trees:
+            if not tree:
+                continue
+            tree_exp = transTreeToWhere(session, current_user, tree, ds, lookup)
+            if tree_exp is not None:
+                res.append(tree_exp)
+        where_str = " AND ".join(res)
+        if where_str:
+            plan.row_filters[table_id] = (table_name, where_str)
+    return plan
+
+
+def get_permission_plan(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource) -> PermissionPlan:
+    """
+    一次加载数据源下全部行/列权限及用户所在规则，编译为权限计划；管理员返回空计划
+    """
+    if not is_normal_user(current_user):
+        return PermissionPlan()
+
+    rows = session.query(DsPermission, CoreTable.table_name).join(
+        CoreTable, CoreTable.id == DsPermission.table_id).filter(
+        and_(CoreTable.ds_id == ds.id, DsPermission.type.in_(['row', 'column']))).order_by(DsPermission.id).all()
+    if not rows:
+        return PermissionPlan()
+
+    # check permission and user in same rules
+    rules = session.query(DsRules.id, DsRules.permission_list).filter(
+        or_(DsRules.user_list.op('@>')(cast([f'{current_user.id}'], JSONB)),
+            DsRules.user_list.op('@>')(cast([current_user.id], JSONB)))
+    ).all()
+    # 与 permission_list @> [permission.id] 一致，只匹配数字类型的 ID
+    rule_permission_ids = {pid for rule in rules for pid in _json_value(rule.permission_list, [])
+                           if isinstance(pid, int) and not isinstance(pid, bool)}
+    permissions = [(permission, table_name) for permission, table_name in rows
+                   if permission.id in rule_permission_ids]
+    if not permissions:
+        return PermissionPlan()
+
+    fingerprint = hashlib.sha1(orjson.dumps([
+        _user_fingerprint(current_user), ds.type,
+        [[p.id, p.type, p.table_id, table_name, p.expression_tree, p.permissions] for p, table_name in permissions]
+    ], default=str)).hexdigest()
+    key = (current_user.id, ds.id)
+    plan = permission_plan_cache.get(key, fingerprint)
+    if plan is None:
+        plan = _compile_plan(session, current_user, ds, permissions)
+        permission_plan_cache.put(key, fingerprint, plan)
+    return plan
+
+
+def get_row_permission_filters(session: SessionDep, current_user: CurrentUser, ds: CoreDatasource,
+                               tables: Optional[list] = None, single_table: Optional[CoreTable] = None,
+                               plan: Optional[PermissionPlan] = None):
     filters = []
     if is_normal_user(current_user):
-        # contain_rules = session.query(DsRules).all()
-        for table in table_list:
-            row_permissions = session.query(DsPermission).filter(
-                and_(DsPermission.table_id == table.id, DsPermission.type == 'row')).all()
-            res: List[PermissionDTO] = []
-            if row_permissions is not None:
-                for permission in row_permissions:
-                    # check permission and user in same rules
-                    obj = session.query(DsRules).filter(
-                        and_(DsRules.permission_list.op('@>')(cast([permission.id], JSONB)),
-                             or_(DsRules.user_list.op('@>')(cast([f'{current_user.id}'], JSONB)),
-                                 DsRules.user_list.op('@>')(cast([current_user.id], JSONB))))
-                    ).first()
-                    if obj is not None:
-                        res.append(transRecord2DTO(session, permission))
-
-                    # flag = False
-                    # for r in contain_rules:
-                    #     p_list = json.loads(r.permission_list)
-                    #     u_list = json.loads(r.user_list)
-                    #     if p_list is not None and u_list is not None and permission.id in p_list and (
-                    #             current_user.id in u_list or f'{current_user.id}' in u_list):
-                    #         flag = True
-                    #         break
-                    # if flag:
-                    #     res.append(transRecord2DTO(session, permission))
-            where_str = transFilterTree(session, current_user, res, ds)
-            if where_str:
-                filters.append({"table": table.table_name, "filter": where_str})
+        plan = plan or get_permission_plan(session, current_user, ds)
+        for table_id, (table_name, where_str) in plan.row_filters.items():
+            if single_table:
+                if table_id != single_table.id:
+                    continue
+            elif table_name not in (tables or []):
+                continue
+            filters.append({"table": table_name, "filter": where_str})
     return filters
 
 
 def get_column_permission_fields(session: SessionDep, current_user: CurrentUser, table: CoreTable,
-                                 fields: list[CoreField], contain_rules: list[DsRules]):
+                                 fields: list[CoreField], contain_rules: Optional[list[DsRules]] = None,
+                                 plan: Optional[PermissionPlan] = None, ds: Optional[CoreDatasource] = None):
     if is_normal_user(current_user):
-        column_permissions = session.query(DsPermission).filter(
-            and_(DsPermission.table_id == table.id, DsPermission.type == 'column')).all()
-        if column_permissions is not None:
-            for permission in column_permissions:
-                # check permission and user in same rules
-                obj = session.query(DsRules).filter(
-                    and_(DsRules.permission_list.op('@>')(cast([permission.id], JSONB)),
-                         or_(DsRules.user_list.op('@>')(cast([f'{current_user.id}'], JSONB)),
-                             DsRules.user_list.op('@>')(cast([current_user.id], JSONB))))
-                ).first()
-                if obj is not None:
-                    permission_list = json.loads(permission.permissions)
-                    fields = filter_list(fields, permission_list)
-
-                # flag = False
-                # for r in contain_rules:
-                #     p_list = json.loads(r.permission_list)
-                #     u_list = json.loads(r.user_list)
-                #     if p_list is not None and u_list is not None and permission.id in p_list and (
-                #             current_user.id in u_list or f'{current_user.id}' in u_list):
-                #         flag = True
-                #         break
-                # if flag:
-                #     permission_list = json.loads(permission.permissions)
-                #     fields = filter_list(fields, permission_list)
+        if plan is None:
+            plan = get_permission_plan(session, current_user, ds or session.get(CoreDatasource, table.ds_id))
+        disabled = plan.column_masks.get(table.id)
+        if disabled and fields:
+            fields = [f for f in fields if f.id not in disabled]
     return fields
 
 
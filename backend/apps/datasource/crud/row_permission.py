@@ -1,7 +1,7 @@
 # Author: Junjun
 # Date: 2025/6/25
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from apps.datasource.models.datasource import CoreField, CoreDatasource
 from apps.db.constant import DB
@@ -24,16 +24,39 @@ def _escape_sql_value(value: str) -> str:
     return escaped
 
 
+class FilterLookup:
+    """
+    行权限条件中字段、系统变量的查询；fields / variables 为预先批量加载的 {id: 对象} 时不再逐条查询
+    """
+
+    def __init__(self, session: SessionDep, fields: Optional[Dict[int, CoreField]] = None,
+                 variables: Optional[Dict[int, SystemVariable]] = None):
+        self.session = session
+        self.fields = fields
+        self.variables = variables
+
+    def field(self, field_id: int) -> CoreField | None:
+        if self.fields is not None:
+            return self.fields.get(field_id)
+        return self.session.query(CoreField).filter(CoreField.id == field_id).first()
+
+    def variable(self, variable_id: int) -> SystemVariable | None:
+        if self.variables is not None:
+            return self.variables.get(variable_id)
+        return self.session.query(SystemVariable).filter(SystemVariable.id == variable_id).first()
+
+
 def transFilterTree(session: SessionDep, current_user: CurrentUser, tree_list: List[any],
-                    ds: CoreDatasource) -> str | None:
+                    ds: CoreDatasource, lookup: Optional[FilterLookup] = None) -> str | None:
     if tree_list is None:
         return None
+    lookup = lookup or FilterLookup(session)
     res: List[str] = []
     for dto in tree_list:
         tree = dto.tree
         if tree is None:
             continue
-        tree_exp = transTreeToWhere(session, current_user, tree, ds)
+        tree_exp = transTreeToWhere(session, current_user, tree, ds, lookup)
         if tree_exp is not None:
             res.append(tree_exp)
     return " AND ".join(res)
@@ -42,7 +65,8 @@ def transFilterTree(session: SessionDep, current_user: CurrentUser, tree_list: L
 _VALID_LOGIC_OPS = {"AND", "OR"}
 
 
-def transTreeToWhere(session: SessionDep, current_user: CurrentUser, tree: any, ds: CoreDatasource) -> str | None:
+def transTreeToWhere(session: SessionDep, current_user: CurrentUser, tree: any, ds: CoreDatasource,
+                     lookup: Optional[FilterLookup] = None) -> str | None:
     if tree is None:
         return None
     logic = tree['logic']
@@ -56,18 +80,20 @@ def transTreeToWhere(session: SessionDep, current_user: CurrentUser, tree: any,
         for item in items:
             exp: str = None
             if item['type'] == 'item':
-                exp = transTreeItem(session, current_user, item, ds)
+                exp = transTreeItem(session, current_user, item, ds, lookup)
             elif item['type'] == 'tree':
-                exp = transTreeToWhere(session, current_user, item['sub_tree'], ds)
+                exp = transTreeToWhere(session, current_user, item['sub_tree'], ds, lookup)
 
             if exp is not None:
                 list.append(exp)
     return '(' + f' {logic} '.join(list) + ')' if len(list) > 0 else None
 
 
-def transTreeItem(session: SessionDep, current_user: CurrentUser, item: Dict, ds: CoreDatasource) -> str | None:
+def transTreeItem(session: SessionDep, current_user: CurrentUser, item: Dict, ds: CoreDatasource,
+                  lookup: Optional[FilterLookup] = None) -> str | None:
     res: str = None
-    field = session.query(CoreField).filter(CoreField.id == int(item['field_id'])).first()
+    lookup = lookup or FilterLookup(session)
+    field = lookup.field(int(item['field_id']))
     if field is None:
         return None
 
@@ -91,7 +117,7 @@ def transTreeItem(session: SessionDep, current_user: CurrentUser, item: Dict, ds
             # get system variable
             variable_id = item.get('variable_id')
             if variable_id is not None:
-                sys_variable = session.query(SystemVariable).filter(SystemVariable.id == variable_id).first()
+                sys_variable = lookup.variable(variable_id)
                 if sys_variable is None:
                     return None
 
@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import orjson
+
+from common.core.config import settings
+
+
+@dataclass
+class SchemaPrompt:
+    """
+    数据源结构提示词的预先拼接结果
+    db_name: 【DB_ID】 中的库名
+    tables: 有权限的表片段 [{"id", "table_name", "schema_table"}]，按表查询顺序
+    relations: 关系连线 (源表 cell, 目标表 cell, 外键行文本)
+    """
+    db_name: Optional[str] = None
+    tables: list[dict] = field(default_factory=list)
+    relations: list[tuple[Any, Any, str]] = field(default_factory=list)
+
+
+def column_mask_fingerprint(column_masks: dict[int, set[int]]) -> str:
+    """用户列权限指纹：被禁用字段相同的用户共用同一份结构片段"""
+    if not column_masks:
+        return ''
+    return hashlib.sha1(orjson.dumps(
+        sorted([table_id, sorted(field_ids)] for table_id, field_ids in column_masks.items() if field_ids)
+    )).hexdigest()
+
+
+def relation_fingerprint(table_relation: Any) -> str:
+    if not table_relation:
+        return ''
+    return hashlib.sha1(orjson.dumps(table_relation, default=str)).hexdigest()
+
+
+class SchemaPromptCache:
+    """
+    按 (数据源, 列权限指纹) 缓存表结构片段与外键关系
+    数据源的结构版本在表/字段同步、修改时通过 invalidate 递增，构建期间版本变化的结果不写入缓存；
+    数据源连接配置、表关系作为指纹的一部分，修改后自动重建；
+    TTL 兜底其它进程中的修改。
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple[int, str], tuple[tuple[int, int], str, float, SchemaPrompt]] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_build(self, ds_id: int, mask_fingerprint: str, fingerprint: str,
+                     builder: Callable[[], SchemaPrompt]) -> SchemaPrompt:
+        key = (ds_id, mask_fingerprint)
+        now = time.monotonic()
+        with self._lock:
+            version = self._version(ds_id)
+            item = self._items.get(key)
+            if item is not None and item[0] == version and item[1] == fingerprint and now - item[2] < self.ttl:
+                self._items.move_to_end(key)
+                self._hits += 1
+                return item[3]
+            self._misses += 1
+
+        prompt = builder()
+        if self.max_size <= 0:
+            return prompt
+        with self._lock:
+            # 构建期间结构被修改，结果可能已过时，不写入缓存
+            if self._version(ds_id) == version:
+                self._items[key] = (version, fingerprint, now, prompt)
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+        return prompt
+
+    def _version(self, ds_id: int) -> tuple[int, int]:
+        return self._generation, self._versions.get(ds_id, 0)
+
+    def invalidate(self, ds_id: Optional[int] = None):
+        """数据源（不传则全部）的表/字段结构发生变化，递增结构版本并清除缓存"""
+        with self._lock:
+            if ds_id is None:
+                self._generation += 1
+                self._items.clear()
+                return
+            self._versions[ds_id] = self._versions.get(ds_id, 0) + 1
+            for key in [k for k in self._items if k[0] == ds_id]:
+                del self._items[key]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._items), 'max_size': self.max_size, 'ttl': self.ttl, 'hits': self._hits,
+                    'misses': self._misses}
+
+
+schema_prompt_cache = SchemaPromptCache(settings.SCHEMA_PROMPT_CACHE_SIZE, settings.SCHEMA_PROMPT_CACHE_TTL)
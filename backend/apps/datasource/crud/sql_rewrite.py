@@ -0,0 +1,158 @@
+"""
+基于 sqlglot 的确定性 SQL 改写
+
+行权限：将 SQL 中引用到的受限表替换为带过滤条件的子查询
+    SELECT ... FROM orders o  ->  SELECT ... FROM (SELECT * FROM orders WHERE <filter>) AS o
+原表别名（没有别名时为表名）保留为子查询别名，外层对字段的引用无需修改；
+过滤条件在连接之前生效，外连接时也不会放宽或收紧原 SQL 的语义。
+
+动态数据源：将小助手数据源中配置了 SQL 的表替换为该 SQL 的子查询
+    SELECT ... FROM orders o  ->  SELECT ... FROM (<orders 的 SQL>) AS o
+"""
+from typing import Callable, Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ErrorLevel
+
+from apps.db.parsed_sql import get_sqlglot_dialect, parse_sql
+from common.utils.utils import equals_ignore_case
+
+
+class SQLRewriteError(Exception):
+    pass
+
+
+def rewrite_dialect(ds_type: Optional[str]) -> Optional[str]:
+    """改写时使用的 sqlglot dialect，get_sqlglot_dialect 未覆盖的类型按语法相近的方言生成（如 Oracle 子查询别名不能带 AS）"""
+    dialect = get_sqlglot_dialect(ds_type)
+    if dialect:
+        return dialect
+    if equals_ignore_case(ds_type, 'oracle', 'dm'):
+        return 'oracle'
+    elif equals_ignore_case(ds_type, 'pg', 'excel', 'kingbase'):
+        return 'postgres'
+    elif equals_ignore_case(ds_type, 'redshift'):
+        return 'redshift'
+    elif equals_ignore_case(ds_type, 'ck'):
+        return 'clickhouse'
+    return None
+
+
+def parse_statement(sql: str, dialect: Optional[str]) -> exp.Expression:
+    """解析为单条语句，返回解析上下文中语法树的副本，调用方可以直接改写"""
+    try:
+        statements = [s for s in parse_sql(sql).statements(dialect) if s]
+    except Exception as e:
+        raise SQLRewriteError(f'Cannot parse SQL: {e}')
+    if len(statements) != 1:
+        raise SQLRewriteError(f'Expected exactly one SQL statement, got {len(statements)}')
+    return statements[0].copy()
+
+
+def generate_sql(statement: exp.Expression, dialect: Optional[str]) -> str:
+    try:
+        return statement.sql(dialect=dialect, unsupported_level=ErrorLevel.RAISE)
+    except Exception as e:
+        raise SQLRewriteError(f'Cannot generate SQL: {e}')
+
+
+def _cte_names(statement: exp.Expression) -> set[str]:
+    return {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE) if cte.alias_or_name}
+
+
+def replace_tables(statement: exp.Expression, names: set[str],
+                   build_source: Callable[[exp.Table], exp.Expression]) -> set[str]:
+    """
+    将 statement 中名称（忽略大小写）在 names 中的表替换为 build_source(表) 返回的子查询主体，返回实际替换过的表名
+    原表别名（没有别名时为表名）作为子查询别名；同名 CTE 的引用不替换
+    """
+    cte_names = _cte_names(statement)
+    replaced = set()
+    # 先收集再替换，新插入子查询中的表不会被再次处理
+    for table in list(statement.find_all(exp.Table)):
+        name = table.name
+        if not name or not isinstance(table.this, exp.Identifier):
+            continue
+        key = name.lower()
+        if key not in names:
+            continue
+        if not table.args.get('db') and key in cte_names:
+            continue
+
+        alias = table.args.get('alias')
+        alias = alias.copy() if alias else exp.TableAlias(this=table.this.copy())
+        subquery = exp.Subquery(this=build_source(table), alias=alias)
+        if table.args.get('pivots'):
+            subquery.set('pivots', table.args['pivots'])
+        table.replace(subquery)
+        replaced.add(key)
+
+        if table.args.get('db') and not table.alias:
+            # 子查询以表名为别名，schema.table.column 形式的引用去掉 schema 部分
+            for column in statement.find_all(exp.Column):
+                if column.table.lower() == key and column.args.get('db'):
+                    column.set('db', None)
+                    column.set('catalog', None)
+    return replaced
+
+
+def apply_row_permission_filters(sql: str, filters: list[dict], ds_type: Optional[str]) -> str:
+    """
+    将行权限过滤条件注入 SQL，filters 形如 [{"table": "表名", "filter": "过滤条件"}, ...]
+    同一张表的多条过滤条件去重后以 AND 连接；SQL 或过滤条件无法解析、生成时抛出 SQLRewriteError
+    """
+    dialect = rewrite_dialect(ds_type)
+    statement = parse_statement(sql, dialect)
+
+    conditions: dict[str, list[str]] = {}
+    for f in filters:
+        table_name, condition = f.get('table'), f.get('filter')
+        if not table_name or not condition:
+            continue
+        items = conditions.setdefault(table_name.lower(), [])
+        if condition not in items:
+            items.append(condition)
+    if not conditions:
+        return sql
+
+    predicates: dict[str, exp.Expression] = {}
+    for key, items in conditions.items():
+        try:
+            predicates[key] = exp.and_(*[sqlglot.condition(c, dialect=dialect) for c in items])
+        except Exception as e:
+            raise SQLRewriteError(f'Cannot parse row permission filter of table {key}: {e}')
+
+    def build_source(table: exp.Table) -> exp.Expression:
+        # 子查询中的表保留原 SQL 中的写法（schema、引号、提示）
+        source = table.copy()
+        source.set('alias', None)
+        source.set('pivots', None)
+        return exp.select('*').from_(source).where(predicates[table.name.lower()].copy())
+
+    if not replace_tables(statement, set(predicates.keys()), build_source):
+        return sql
+    return generate_sql(statement, dialect)
+
+
+def substitute_subqueries(sql: str, subqueries: dict[str, str | exp.Expression],
+                          ds_type: Optional[str]) -> Optional[str]:
+    """
+    将 SQL 中引用到的表替换为对应的子查询，subqueries 形如 {"表名": "SELECT ..."}，值也可以是已构造好的查询表达式
+    SQL 中没有引用到 subqueries 中的表时返回 None；SQL 或子查询无法解析、生成时抛出 SQLRewriteError
+    """
+    dialect = rewrite_dialect(ds_type)
+    statement = parse_statement(sql, dialect)
+
+    sources: dict[str, exp.Expression] = {}
+    for table_name, query in subqueries.items():
+        if not table_name or not query:
+            continue
+        source = query if isinstance(query, exp.Expression) else parse_statement(query, dialect)
+        if not isinstance(source, exp.Query):
+            raise SQLRewriteError(f'SQL of table {table_name} is not a query')
+        sources[table_name.lower()] = source
+
+    if not replace_tables(statement, set(sources.keys()), lambda table: sources[table.name.lower()].copy()):
+        return None
+    return generate_sql(statement, dialect)
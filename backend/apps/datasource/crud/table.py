@@ -1,11 +1,14 @@
+import hashlib
 import json
 import time
 import traceback
-from typing import List
+from typing import List, Optional, Callable
 
-from sqlalchemy import and_, select, update
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import defer
 
 from apps.ai_model.embedding import EmbeddingModelCache
+from apps.datasource.embedding.matrix import table_embedding_store, ds_embedding_store, DS_MATRIX_KEY
 from common.core.config import settings
 from common.core.deps import SessionDep
 from common.utils.utils import SQLBotLogUtil
@@ -41,121 +44,182 @@ def run_fill_empty_table_and_ds_embedding(session_maker):
         stmt = select(CoreTable.id).where(and_(CoreTable.embedding.is_(None)))
         results = session.execute(stmt).scalars().all()
         SQLBotLogUtil.info('table result: ' + str(len(results)))
-        save_table_embedding(session_maker, results)
 
         SQLBotLogUtil.info('get datasource')
         ds_stmt = select(CoreDatasource.id).where(and_(CoreDatasource.embedding.is_(None)))
         ds_results = session.execute(ds_stmt).scalars().all()
         SQLBotLogUtil.info('datasource result: ' + str(len(ds_results)))
-        save_ds_embedding(session_maker, ds_results)
+
+        save_table_and_ds_embedding(session_maker, results, ds_results)
     except Exception:
         traceback.print_exc()
     finally:
         session_maker.remove()
 
 
-def save_table_embedding(session_maker, ids: List[int]):
+def build_table_schema_text(table: CoreTable, fields: List[CoreField]) -> str:
+    schema_table = ''
+    schema_table += f"# Table: {table.table_name}"
+    table_comment = ''
+    if table.custom_comment:
+        table_comment = table.custom_comment.strip()
+    if table_comment == '':
+        schema_table += '\n[\n'
+    else:
+        schema_table += f", {table_comment}\n[\n"
+
+    if fields:
+        field_list = []
+        for field in fields:
+            field_comment = ''
+            if field.custom_comment:
+                field_comment = field.custom_comment.strip()
+            if field_comment == '':
+                field_list.append(f"({field.field_name}:{field.field_type})")
+            else:
+                field_list.append(f"({field.field_name}:{field.field_type}, {field_comment})")
+        schema_table += ",\n".join(field_list)
+    schema_table += '\n]\n'
+    return schema_table
+
+
+def table_schema_hash(schema_table: str) -> str:
+    return hashlib.sha256(schema_table.encode('utf-8')).hexdigest()
+
+
+def get_changed_table_ids(session, table_ids: List[int]) -> List[int]:
+    """
+    过滤出结构文本与已生成 embedding 时不一致（或尚未生成 embedding）的表
+    """
+    texts = load_table_schema_texts(session, table_ids)
+    return [_id for _id, (table, schema_table) in texts.items() if
+            table.schema_hash != table_schema_hash(schema_table)]
+
+
+def load_table_schema_texts(session, table_ids: Optional[List[int]] = None,
+                            ds_ids: Optional[List[int]] = None) -> dict[int, tuple[CoreTable, str]]:
+    """
+    一次查询表、一次查询字段，生成每张表的 schema 文本
+    返回 {table_id: (table, schema_text)}，按表 ID 排序
+    """
+    conditions = []
+    if table_ids:
+        conditions.append(CoreTable.id.in_(table_ids))
+    if ds_ids:
+        conditions.append(CoreTable.ds_id.in_(ds_ids))
+    if not conditions:
+        return {}
+    tables = session.query(CoreTable).options(defer(CoreTable.embedding)).filter(or_(*conditions)).order_by(
+        CoreTable.id.asc()).all()
+    if not tables:
+        return {}
+
+    fields_dict: dict[int, List[CoreField]] = {}
+    all_fields = session.query(CoreField).filter(CoreField.table_id.in_([table.id for table in tables])).order_by(
+        CoreField.id.asc()).all()
+    for field in all_fields:
+        fields_dict.setdefault(field.table_id, []).append(field)
+
+    return {table.id: (table, build_table_schema_text(table, fields_dict.get(table.id))) for table in tables}
+
+
+def _batches(items: list, size: int):
+    size = max(1, size)
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+def _embed_and_save_tables(session, model, texts: dict[int, tuple[CoreTable, str]], ids: List[int],
+                           progress: Optional[Callable[[int, int], None]] = None):
+    ids = [_id for _id in ids if _id in texts]
+    total = len(ids)
+    done = 0
+    for batch in _batches(ids, settings.TABLE_EMBEDDING_BATCH_SIZE):
+        vectors = model.embed_documents([texts[_id][1] for _id in batch])
+        # executemany: 每批一次 UPDATE
+        session.execute(update(CoreTable),
+                        [{'id': _id, 'embedding': json.dumps(vector), 'schema_hash': table_schema_hash(texts[_id][1])}
+                         for _id, vector in zip(batch, vectors)])
+        session.commit()
+
+        ds_vectors: dict[int, dict[int, list[float]]] = {}
+        for _id, vector in zip(batch, vectors):
+            ds_vectors.setdefault(texts[_id][0].ds_id, {})[_id] = vector
+        for ds_id, items in ds_vectors.items():
+            table_embedding_store.refresh(ds_id, items)
+
+        done += len(batch)
+        _report_progress('table', done, total, progress)
+
+
+def _embed_and_save_datasources(session, model, texts: dict[int, tuple[CoreTable, str]], ids: List[int],
+                                progress: Optional[Callable[[int, int], None]] = None):
+    ds_list = session.query(CoreDatasource.id, CoreDatasource.name, CoreDatasource.description).filter(
+        CoreDatasource.id.in_(ids)).all()
+    ds_tables: dict[int, List[str]] = {}
+    for table, schema_table in texts.values():
+        ds_tables.setdefault(table.ds_id, []).append(schema_table)
+
+    total = len(ds_list)
+    done = 0
+    for batch in _batches(ds_list, settings.TABLE_EMBEDDING_BATCH_SIZE):
+        documents = [f"{ds.name}, {ds.description}\n" + ''.join(ds_tables.get(ds.id, [])) for ds in batch]
+        vectors = model.embed_documents(documents)
+        session.execute(update(CoreDatasource),
+                        [{'id': ds.id, 'embedding': json.dumps(vector)} for ds, vector in zip(batch, vectors)])
+        session.commit()
+        ds_embedding_store.refresh(DS_MATRIX_KEY, {ds.id: vector for ds, vector in zip(batch, vectors)})
+
+        done += len(batch)
+        _report_progress('datasource', done, total, progress)
+
+
+def _report_progress(name: str, done: int, total: int, progress: Optional[Callable[[int, int], None]] = None):
+    SQLBotLogUtil.info(f'{name} embedding progress: {done}/{total}')
+    if progress:
+        progress(done, total)
+
+
+def save_table_and_ds_embedding(session_maker, table_ids: List[int], ds_ids: List[int],
+                                progress: Optional[Callable[[str, int, int], None]] = None):
+    """
+    表与数据源 embedding 流水线：
+    一次性加载涉及的表和字段生成 schema 文本，按批调用 embed_documents 并批量写回，
+    数据源文档直接复用表的 schema 文本拼接
+    """
     if not settings.TABLE_EMBEDDING_ENABLED:
         return
 
-    if not ids or len(ids) == 0:
+    table_ids = list(table_ids or [])
+    ds_ids = list(ds_ids or [])
+    if not table_ids and not ds_ids:
         return
     try:
-        SQLBotLogUtil.info('start table embedding')
         start_time = time.time()
         model = EmbeddingModelCache.get_model()
         session = session_maker()
-        for _id in ids:
-            table = session.query(CoreTable).filter(CoreTable.id == _id).first()
-            fields = session.query(CoreField).filter(CoreField.table_id == table.id).all()
-
-            schema_table = ''
-            schema_table += f"# Table: {table.table_name}"
-            table_comment = ''
-            if table.custom_comment:
-                table_comment = table.custom_comment.strip()
-            if table_comment == '':
-                schema_table += '\n[\n'
-            else:
-                schema_table += f", {table_comment}\n[\n"
-
-            if fields:
-                field_list = []
-                for field in fields:
-                    field_comment = ''
-                    if field.custom_comment:
-                        field_comment = field.custom_comment.strip()
-                    if field_comment == '':
-                        field_list.append(f"({field.field_name}:{field.field_type})")
-                    else:
-                        field_list.append(f"({field.field_name}:{field.field_type}, {field_comment})")
-                schema_table += ",\n".join(field_list)
-            schema_table += '\n]\n'
-            # table_schema.append(schema_table)
-            emb = json.dumps(model.embed_query(schema_table))
-
-            stmt = update(CoreTable).where(and_(CoreTable.id == _id)).values(embedding=emb)
-            session.execute(stmt)
-            session.commit()
+
+        texts = load_table_schema_texts(session, table_ids, ds_ids)
+        if table_ids:
+            SQLBotLogUtil.info('start table embedding')
+            _embed_and_save_tables(session, model, texts, table_ids,
+                                   (lambda done, total: progress('table', done, total)) if progress else None)
+        if ds_ids:
+            SQLBotLogUtil.info('start datasource embedding')
+            _embed_and_save_datasources(session, model, texts, ds_ids,
+                                        (lambda done, total: progress('datasource', done, total)) if progress else None)
 
         end_time = time.time()
-        SQLBotLogUtil.info('table embedding finished in: ' + str(end_time - start_time) + ' seconds')
+        SQLBotLogUtil.info('table and datasource embedding finished in: ' + str(end_time - start_time) + ' seconds')
     except Exception:
         traceback.print_exc()
     finally:
         session_maker.remove()
 
 
-def save_ds_embedding(session_maker, ids: List[int]):
-    if not settings.TABLE_EMBEDDING_ENABLED:
-        return
+def save_table_embedding(session_maker, ids: List[int]):
+    save_table_and_ds_embedding(session_maker, ids, [])
 
-    if not ids or len(ids) == 0:
-        return
-    try:
-        SQLBotLogUtil.info('start datasource embedding')
-        start_time = time.time()
-        model = EmbeddingModelCache.get_model()
-        session = session_maker()
-        for _id in ids:
-            schema_table = ''
-            ds = session.query(CoreDatasource).filter(CoreDatasource.id == _id).first()
-            schema_table += f"{ds.name}, {ds.description}\n"
-            tables = session.query(CoreTable).filter(CoreTable.ds_id == ds.id).all()
-            for table in tables:
-                fields = session.query(CoreField).filter(CoreField.table_id == table.id).all()
-
-                schema_table += f"# Table: {table.table_name}"
-                table_comment = ''
-                if table.custom_comment:
-                    table_comment = table.custom_comment.strip()
-                if table_comment == '':
-                    schema_table += '\n[\n'
-                else:
-                    schema_table += f", {table_comment}\n[\n"
-
-                if fields:
-                    field_list = []
-                    for field in fields:
-                        field_comment = ''
-                        if field.custom_comment:
-                            field_comment = field.custom_comment.strip()
-                        if field_comment == '':
-                            field_list.append(f"({field.field_name}:{field.field_type})")
-                        else:
-                            field_list.append(f"({field.field_name}:{field.field_type}, {field_comment})")
-                    schema_table += ",\n".join(field_list)
-                schema_table += '\n]\n'
-            # table_schema.append(schema_table)
-            emb = json.dumps(model.embed_query(schema_table))
-
-            stmt = update(CoreDatasource).where(and_(CoreDatasource.id == _id)).values(embedding=emb)
-            session.execute(stmt)
-            session.commit()
 
-        end_time = time.time()
-        SQLBotLogUtil.info('datasource embedding finished in: ' + str(end_time - start_time) + ' seconds')
-    except Exception:
-        traceback.print_exc()
-    finally:
-        session_maker.remove()
+def save_ds_embedding(session_maker, ids: List[int]):
+    save_table_and_ds_embedding(session_maker, [], ids)
@@ -5,8 +5,10 @@ import time
 import traceback
 from typing import Optional
 
-from apps.ai_model.embedding import EmbeddingModelCache
-from apps.datasource.embedding.utils import cosine_similarity
+from sqlmodel import select
+
+from apps.ai_model.embedding import embed_documents, embed_question
+from apps.datasource.embedding.matrix import EmbeddingMatrix, ds_embedding_store, DS_MATRIX_KEY, top_k
 from apps.datasource.models.datasource import CoreDatasource
 from apps.system.crud.assistant import AssistantOutDs
 from common.core.config import settings
@@ -15,6 +17,11 @@ from common.core.deps import SessionDep
 from common.utils.utils import SQLBotLogUtil
 
 
+def load_ds_embeddings(session: SessionDep) -> dict[int, Optional[str]]:
+    stmt = select(CoreDatasource.id, CoreDatasource.embedding)
+    return {row.id: row.embedding for row in session.exec(stmt)}
+
+
 def get_ds_embedding(session: SessionDep, _ds_list, out_ds: AssistantOutDs,
                      question: str,
                      current_assistant: Optional[CurrentAssistant] = None):
@@ -32,17 +39,16 @@ def get_ds_embedding(session: SessionDep, _ds_list, out_ds: AssistantOutDs,
             try:
                 text = [s.get('ds_schema') for s in _list]
 
-                model = EmbeddingModelCache.get_model()
-                results = model.embed_documents(text)
+                results = embed_documents(text)
 
-                q_embedding = model.embed_query(question)
-                for index in range(len(results)):
-                    item = results[index]
-                    _list[index]['cosine_similarity'] = cosine_similarity(q_embedding, item)
+                q_embedding = embed_question(question)
+                matrix = EmbeddingMatrix({index: item for index, item in enumerate(results)})
+                scores = matrix.scores(q_embedding)
+                for index in range(len(_list)):
+                    _list[index]['cosine_similarity'] = float(scores[index])
 
-                _list.sort(key=lambda x: x['cosine_similarity'], reverse=True)
                 # print(len(_list))
-                _list = _list[:settings.DS_EMBEDDING_COUNT]
+                _list = [_list[index] for index in top_k(scores, settings.DS_EMBEDDING_COUNT)]
                 SQLBotLogUtil.info(json.dumps(
                     [{"id": ele.get("id"), "name": ele.get("ds").name,
                       "cosine_similarity": ele.get("cosine_similarity")}
@@ -52,34 +58,37 @@ def get_ds_embedding(session: SessionDep, _ds_list, out_ds: AssistantOutDs,
             except Exception:
                 traceback.print_exc()
     else:
-        for _ds in _ds_list:
-            if _ds.get('id'):
-                ds = session.get(CoreDatasource, _ds.get('id'))
-                # table_schema = get_table_schema(session, current_user, ds, question, embedding=False)
-                # ds_info = f"{ds.name}, {ds.description}\n"
-                # ds_schema = ds_info + table_schema
-                _list.append({"id": ds.id, "cosine_similarity": 0.0, "ds": ds, "embedding": ds.embedding})
+        ds_ids = [_ds.get('id') for _ds in _ds_list if _ds.get('id')]
+        if ds_ids:
+            ds_dict = {ds.id: ds for ds in session.exec(
+                select(CoreDatasource.id, CoreDatasource.name, CoreDatasource.description).where(
+                    CoreDatasource.id.in_(ds_ids)))}
+            for _id in ds_ids:
+                ds = ds_dict.get(_id)
+                if ds:
+                    # table_schema = get_table_schema(session, current_user, ds, question, embedding=False)
+                    # ds_info = f"{ds.name}, {ds.description}\n"
+                    # ds_schema = ds_info + table_schema
+                    _list.append({"id": ds.id, "cosine_similarity": 0.0, "ds": ds})
 
         if _list:
             try:
                 # text = [s.get('ds_schema') for s in _list]
 
-                model = EmbeddingModelCache.get_model()
                 start_time = time.time()
                 # results = model.embed_documents(text)
-                results = [item.get('embedding') for item in _list]
+                ids = [item.get('id') for item in _list]
+                matrix = ds_embedding_store.get(DS_MATRIX_KEY, ids, lambda: load_ds_embeddings(session))
 
-                q_embedding = model.embed_query(question)
-                for index in range(len(results)):
-                    item = results[index]
-                    if item:
-                        _list[index]['cosine_similarity'] = cosine_similarity(q_embedding, json.loads(item))
+                q_embedding = embed_question(question)
+                scores = matrix.scores(q_embedding, ids)
+                for index in range(len(_list)):
+                    _list[index]['cosine_similarity'] = float(scores[index])
 
-                _list.sort(key=lambda x: x['cosine_similarity'], reverse=True)
                 # print(len(_list))
                 end_time = time.time()
                 SQLBotLogUtil.info(str(end_time - start_time))
-                _list = _list[:settings.DS_EMBEDDING_COUNT]
+                _list = [_list[index] for index in top_k(scores, settings.DS_EMBEDDING_COUNT)]
                 SQLBotLogUtil.info(json.dumps(
                     [{"id": ele.get("id"), "name": ele.get("ds").name,
                       "cosine_similarity": ele.get("cosine_similarity")}
@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from typing import Callable, Optional, Hashable, Iterable
+
+import numpy as np
+
+from common.core.config import settings
+
+
+def _to_vector(value) -> Optional[list[float]]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+class EmbeddingMatrix:
+    """
+    一组 embedding 的 float32 矩阵，预先计算好范数，一次矩阵向量乘完成相似度计算
+    """
+
+    def __init__(self, vectors: dict[int, list[float]]):
+        self.ids = np.fromiter(vectors.keys(), dtype=np.int64, count=len(vectors))
+        self.index: dict[int, int] = {_id: i for i, _id in enumerate(vectors.keys())}
+        if vectors:
+            self.matrix = np.asarray(list(vectors.values()), dtype=np.float32)
+        else:
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.norms = np.linalg.norm(self.matrix, axis=1) if len(self.ids) else np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def with_updates(self, vectors: dict[int, list[float]]) -> 'EmbeddingMatrix':
+        """替换已有行、追加新行，返回新矩阵（旧矩阵可能仍在被其它线程读取）"""
+        updated = EmbeddingMatrix.__new__(EmbeddingMatrix)
+        matrix = self.matrix.copy()
+        ids = self.ids.tolist()
+        index = dict(self.index)
+        appended = []
+        for _id, vector in vectors.items():
+            row = np.asarray(vector, dtype=np.float32)
+            if len(ids) and row.shape[0] != matrix.shape[1]:
+                # 维度变化（切换了 embedding 模型），旧模型生成的行不再可比，只用新向量重建
+                return EmbeddingMatrix(vectors)
+            if _id in index:
+                matrix[index[_id]] = row
+            else:
+                index[_id] = len(ids) + len(appended)
+                appended.append(row)
+        if appended:
+            new_ids = [_id for _id in vectors.keys() if _id not in self.index]
+            matrix = np.vstack([matrix, np.asarray(appended, dtype=np.float32)]) if len(ids) else np.asarray(
+                appended, dtype=np.float32)
+            ids = ids + new_ids
+        updated.ids = np.asarray(ids, dtype=np.int64)
+        updated.index = index
+        updated.matrix = matrix
+        updated.norms = np.linalg.norm(matrix, axis=1) if len(ids) else np.empty(0, dtype=np.float32)
+        return updated
+
+    def scores(self, q_embedding: list[float], ids: Optional[list[int]] = None) -> np.ndarray:
+        """
+        计算与问题向量的余弦相似度
+        传入 ids 时按 ids 顺序返回，不在矩阵中（没有 embedding）的记 0.0
+        """
+        if ids is None:
+            ids = self.ids.tolist()
+        result = np.zeros(len(ids), dtype=np.float32)
+        if len(self.ids) == 0 or len(ids) == 0:
+            return result
+
+        q = np.asarray(q_embedding, dtype=np.float32)
+        if q.shape[0] != self.matrix.shape[1]:
+            raise ValueError("The vector dimension must be the same")
+        q_norm = float(np.linalg.norm(q))
+        if q_norm == 0:
+            return result
+
+        positions = np.fromiter((self.index.get(_id, -1) for _id in ids), dtype=np.int64, count=len(ids))
+        found = positions >= 0
+        rows = positions[found]
+        norms = self.norms[rows]
+        dots = self.matrix[rows] @ q
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sims = np.where(norms > 0, dots / (norms * q_norm), 0.0)
+        result[found] = sims
+        return result
+
+
+def top_k(scores: np.ndarray, k: int) -> list[int]:
+    """返回得分最高的 k 个下标，得分相同保持原顺序"""
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return []
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order].tolist()
+
+
+class EmbeddingMatrixStore:
+    """
+    按 key（数据源 ID 等）缓存 EmbeddingMatrix
+    首次使用时通过 loader 一次性加载，写入新向量时调用 refresh 更新；
+    多进程部署时其它进程写入的向量依靠 ttl 过期后重新加载
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._matrices: dict[Hashable, tuple[float, EmbeddingMatrix, set[int]]] = {}
+
+    def get(self, key: Hashable, ids: Iterable[int],
+            loader: Callable[[], dict[int, Optional[str | list[float]]]]) -> EmbeddingMatrix:
+        """
+        获取矩阵，ids 中存在矩阵未覆盖的记录（新增表/数据源）时重新加载
+        loader 返回 {id: embedding}，embedding 可以是 JSON 文本或向量，None 表示尚未生成
+        """
+        ids = list(ids)
+        with self._lock:
+            item = self._matrices.get(key)
+        if item is not None:
+            expire_at, matrix, known_ids = item
+            if expire_at >= time.monotonic() and known_ids.issuperset(ids):
+                return matrix
+
+        raw = loader()
+        vectors = {}
+        for _id, value in raw.items():
+            vector = _to_vector(value)
+            if vector:
+                vectors[_id] = vector
+        matrix = EmbeddingMatrix(vectors)
+        with self._lock:
+            self._matrices[key] = (time.monotonic() + self.ttl, matrix, set(raw.keys()) | set(ids))
+        return matrix
+
+    def refresh(self, key: Hashable, vectors: dict[int, list[float]]):
+        """写入新向量后更新已缓存的矩阵，未缓存的 key 等首次使用时再加载"""
+        with self._lock:
+            item = self._matrices.get(key)
+            if item is None:
+                return
+            expire_at, matrix, known_ids = item
+            updated = matrix.with_updates(vectors)
+            if len(matrix) and updated.matrix.shape[1] != matrix.matrix.shape[1]:
+                # 维度变化丢弃了旧行，旧记录再次使用时重新加载
+                known_ids = set()
+            self._matrices[key] = (expire_at, updated, known_ids | set(vectors.keys()))
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._matrices.clear()
+            else:
+                self._matrices.pop(key, None)
+
+
+# 表向量按数据源缓存，数据源向量统一缓存在 DS_MATRIX_KEY 下
+table_embedding_store = EmbeddingMatrixStore(settings.TABLE_EMBEDDING_MATRIX_TTL)
+ds_embedding_store = EmbeddingMatrixStore(settings.TABLE_EMBEDDING_MATRIX_TTL)
+DS_MATRIX_KEY = 'datasource'
@@ -3,9 +3,13 @@
 import json
 import time
 import traceback
+from typing import Optional
 
-from apps.ai_model.embedding import EmbeddingModelCache
-from apps.datasource.embedding.utils import cosine_similarity
+from sqlalchemy import and_, select
+
+from apps.ai_model.embedding import EmbeddingModelCache, embed_question
+from apps.datasource.embedding.matrix import EmbeddingMatrix, table_embedding_store, top_k
+from apps.datasource.models.datasource import CoreTable
 from common.core.config import settings
 from common.utils.utils import SQLBotLogUtil
 
@@ -25,13 +29,13 @@ def get_table_embedding(tables: list[dict], question: str):
             end_time = time.time()
             SQLBotLogUtil.info(str(end_time - start_time))
 
-            q_embedding = model.embed_query(question)
-            for index in range(len(results)):
-                item = results[index]
-                _list[index]['cosine_similarity'] = cosine_similarity(q_embedding, item)
+            q_embedding = embed_question(question)
+            matrix = EmbeddingMatrix({index: item for index, item in enumerate(results)})
+            scores = matrix.scores(q_embedding)
+            for index in range(len(_list)):
+                _list[index]['cosine_similarity'] = float(scores[index])
 
-            _list.sort(key=lambda x: x['cosine_similarity'], reverse=True)
-            _list = _list[:settings.TABLE_EMBEDDING_COUNT]
+            _list = [_list[index] for index in top_k(scores, settings.TABLE_EMBEDDING_COUNT)]
             # print(len(_list))
             SQLBotLogUtil.info(json.dumps(_list))
             return _list
@@ -40,32 +44,35 @@ def get_table_embedding(tables: list[dict], question: str):
     return _list
 
 
-def calc_table_embedding(tables: list[dict], question: str):
+def load_table_embeddings(session, ds_id: int) -> dict[int, Optional[str]]:
+    stmt = select(CoreTable.id, CoreTable.embedding).where(and_(CoreTable.ds_id == ds_id))
+    return {row.id: row.embedding for row in session.execute(stmt)}
+
+
+def calc_table_embedding(tables: list[dict], question: str, session=None, ds_id: Optional[int] = None):
     _list = []
     for table in tables:
         _list.append(
-            {"id": table.get('id'), "schema_table": table.get('schema_table'), "embedding": table.get('embedding'),
-             "cosine_similarity": 0.0, "table_name": table.get('table_name')})
+            {"id": table.get('id'), "schema_table": table.get('schema_table'), "cosine_similarity": 0.0,
+             "table_name": table.get('table_name')})
 
     if _list:
         try:
-            # text = [s.get('schema_table') for s in _list]
-            #
-            model = EmbeddingModelCache.get_model()
             start_time = time.time()
-            # results = model.embed_documents(text)
-            # end_time = time.time()
-            # SQLBotLogUtil.info(str(end_time - start_time))
-            results = [item.get('embedding') for item in _list]
+            ids = [item.get('id') for item in _list]
+            if session is not None and ds_id is not None:
+                # 数据源下的表向量矩阵只在首次使用、过期或出现新表时从库中加载
+                matrix = table_embedding_store.get(ds_id, ids, lambda: load_table_embeddings(session, ds_id))
+            else:
+                matrix = EmbeddingMatrix(
+                    {table.get('id'): json.loads(table.get('embedding')) for table in tables if table.get('embedding')})
 
-            q_embedding = model.embed_query(question)
-            for index in range(len(results)):
-                item = results[index]
-                if item:
-                    _list[index]['cosine_similarity'] = cosine_similarity(q_embedding, json.loads(item))
+            q_embedding = embed_question(question)
+            scores = matrix.scores(q_embedding, ids)
+            for index in range(len(_list)):
+                _list[index]['cosine_similarity'] = float(scores[index])
 
-            _list.sort(key=lambda x: x['cosine_similarity'], reverse=True)
-            _list = _list[:settings.TABLE_EMBEDDING_COUNT]
+            _list = [_list[index] for index in top_k(scores, settings.TABLE_EMBEDDING_COUNT)]
             # print(len(_list))
             end_time = time.time()
             SQLBotLogUtil.info(str(end_time - start_time))
@@ -34,6 +34,7 @@ class CoreTable(SQLModel, table=True):
     table_comment: str = Field(sa_column=Column(Text))
     custom_comment: str = Field(sa_column=Column(Text))
     embedding: str = Field(sa_column=Column(Text, nullable=True))
+    schema_hash: str = Field(max_length=64, nullable=True)
 
 
 class DsRecommendedProblem(SQLModel, table=True):
@@ -13,7 +13,7 @@ FIELD_TYPE_MAP = {
 }
 
 USER_TYPE_TO_PANDAS = {
-    'int': 'int64',
+    'int': 'Int64',
     'float': 'float64',
     'datetime': 'datetime64[ns]',
     'string': 'string',
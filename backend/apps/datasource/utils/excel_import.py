@@ -0,0 +1,297 @@
+"""
+Excel/CSV 分块导入数据引擎
+
+按声明的字段类型只建一次表，CSV 用 pandas chunksize、Excel 用 calamine 按行迭代，每 EXCEL_IMPORT_CHUNK_SIZE 行
+转换类型后通过 COPY 写入（未声明类型时先完整读取一遍推断类型），同一个 sheet 的建表和所有 COPY 在一个事务内；Python 侧内存只与块大小有关，与文件大小无关。
+多个 sheet 由 EXCEL_IMPORT_WORKERS 个线程并行导入，每个 sheet 使用连接池中的一个连接；
+任一 sheet 失败时取消未开始的 sheet 并删除本次已导入的表。导入进度可通过 excel_import_progress.stats() 查看。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from io import StringIO
+from typing import Any, Callable, Iterator, Optional
+
+import pandas as pd
+from psycopg2 import sql
+
+from common.core.config import settings
+from common.utils.utils import SQLBotLogUtil
+from .excel import USER_TYPE_TO_PANDAS, infer_field_type
+
+USER_TYPE_TO_PG = {
+    'int': 'bigint',
+    'float': 'double precision',
+    'datetime': 'timestamp',
+    'string': 'text',
+}
+
+
+class ExcelReadError(Exception):
+    """读取或转换文件内容失败"""
+
+
+class ExcelWriteError(Exception):
+    """建表或写入数据失败"""
+
+    def __init__(self, table_name: str, error: Exception):
+        super().__init__(str(error))
+        self.table_name = table_name
+
+
+@dataclass
+class SheetImport:
+    sheet_name: str
+    table_name: str
+    # 列名 -> 用户类型（int/float/datetime/string），None 时读取全部数据推断
+    field_types: Optional[dict[Any, str]] = None
+
+
+def cast_chunk(df: pd.DataFrame, field_types: dict[Any, str]) -> pd.DataFrame:
+    """按字段类型转换一块数据，整数使用可空类型，空值写入为 NULL"""
+    for col in df.columns:
+        field_type = field_types.get(col, 'string')
+        if field_type == 'datetime':
+            df[col] = pd.to_datetime(df[col])
+        else:
+            df[col] = df[col].astype(USER_TYPE_TO_PANDAS.get(field_type, 'string'))
+    return df
+
+
+def _convert_cell(value):
+    # 与 pandas calamine 引擎的转换一致，空单元格视为空值
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, date):
+        return pd.Timestamp(value)
+    if isinstance(value, timedelta):
+        return pd.Timedelta(value)
+    if value == '':
+        return None
+    return value
+
+
+def _iter_csv(save_path: str, field_types: Optional[dict[Any, str]], chunk_size: int) -> Iterator[pd.DataFrame]:
+    # 非日期列直接按声明类型解析（保留字符串列的前导 0），日期列读取后再转换
+    dtype = {col: USER_TYPE_TO_PANDAS.get(field_type, 'string') for col, field_type in (field_types or {}).items()
+             if field_type != 'datetime'}
+    with pd.read_csv(save_path, engine='c', dtype=dtype or None, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def _iter_excel(save_path: str, sheet_name: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    from python_calamine import CalamineWorkbook
+
+    # 表头与 pd.read_excel 一致（空列名、重名列的处理）
+    columns = pd.read_excel(save_path, sheet_name=sheet_name, engine='calamine', nrows=0).columns
+    sheet = CalamineWorkbook.from_path(save_path).get_sheet_by_name(sheet_name)
+    # iter_rows 从数据区域的起始列开始，补齐前面的空列
+    padding = [''] * sheet.start[1] if sheet.start else []
+    width = len(columns)
+    rows = []
+    yielded = False
+    for index, row in enumerate(sheet.iter_rows()):
+        if index == 0:
+            continue
+        row = [_convert_cell(value) for value in padding + row][:width]
+        rows.append(row + [None] * (width - len(row)))
+        if len(rows) >= chunk_size:
+            yield pd.DataFrame(rows, columns=columns)
+            rows = []
+            yielded = True
+    if rows or not yielded:
+        # 没有数据行时也返回一个空块，保证建表
+        yield pd.DataFrame(rows, columns=columns)
+
+
+def _iter_chunks(save_path: str, sheet_name: str, field_types: Optional[dict[Any, str]],
+                 chunk_size: int) -> Iterator[pd.DataFrame]:
+    if save_path.endswith('.csv'):
+        return _iter_csv(save_path, field_types, chunk_size)
+    return _iter_excel(save_path, sheet_name, chunk_size)
+
+
+def _merge_field_type(current: Optional[str], field_type: str) -> str:
+    if current is None or current == field_type:
+        return field_type
+    if {current, field_type} == {'int', 'float'}:
+        return 'float'
+    return 'string'
+
+
+def scan_field_types(save_path: str, sheet_name: str, chunk_size: int) -> dict[Any, str]:
+    """
+    按块读取全部数据推断字段类型，与整表读入后推断的类型一致：
+    各块类型不同时 int 与 float 合并为 float，其余合并为 string；某块中全为空的列不参与合并
+    """
+    field_types: dict[Any, Optional[str]] = {}
+    empty_types: dict[Any, str] = {}
+    for df in _iter_chunks(save_path, sheet_name, None, chunk_size):
+        for col in df.columns:
+            field_type = infer_field_type(df[col].infer_objects().dtype)
+            if df[col].isna().all():
+                field_types.setdefault(col, None)
+                empty_types.setdefault(col, field_type)
+            else:
+                field_types[col] = _merge_field_type(field_types.get(col), field_type)
+    return {col: field_type or empty_types[col] for col, field_type in field_types.items()}
+
+
+def read_chunks(save_path: str, sheet: SheetImport, chunk_size: int) -> Iterator[tuple[dict[Any, str], pd.DataFrame]]:
+    """按块读取并转换类型，返回 (字段类型, 数据块)；未声明类型时先由 scan_field_types 推断，所有块按相同类型转换"""
+    try:
+        field_types = sheet.field_types
+        if field_types is None:
+            field_types = scan_field_types(save_path, sheet.sheet_name, chunk_size)
+        for df in _iter_chunks(save_path, sheet.sheet_name, field_types, chunk_size):
+            yield field_types, cast_chunk(df, field_types)
+    except Exception as e:
+        raise ExcelReadError(str(e)) from e
+
+
+def _create_table_sql(table_name: str, columns, field_types: dict[Any, str]) -> sql.Composed:
+    return sql.SQL("CREATE TABLE {} ({})").format(
+        sql.Identifier(table_name),
+        sql.SQL(', ').join(sql.SQL('{} {}').format(sql.Identifier(str(col)),
+                                                   sql.SQL(USER_TYPE_TO_PG.get(field_types.get(col), 'text')))
+                           for col in columns))
+
+
+def write_sheet(engine, table_name: str, chunks: Iterator[tuple[dict[Any, str], pd.DataFrame]],
+                on_chunk: Callable[[int], None]) -> int:
+    """第一块到达时建表，之后每块 COPY 一次，全部成功后提交"""
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    rows = 0
+    copy_sql = None
+    try:
+        for field_types, df in chunks:
+            if copy_sql is None:
+                cursor.execute(_create_table_sql(table_name, df.columns, field_types))
+                copy_sql = sql.SQL("COPY {} ({}) FROM STDIN WITH CSV DELIMITER E'\t'").format(
+                    sql.Identifier(table_name), sql.SQL(', ').join(sql.Identifier(str(col)) for col in df.columns)
+                ).as_string(cursor.connection)
+            output = StringIO()
+            df.to_csv(output, sep='\t', header=False, index=False)
+            output.seek(0)
+            cursor.copy_expert(sql=copy_sql, file=output)
+            rows += len(df)
+            on_chunk(rows)
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def drop_tables(engine, table_names: list[str]):
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    try:
+        for table_name in table_names:
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table_name)))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class ImportProgress:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running: dict[str, dict[str, Any]] = {}
+        self._finished = 0
+        self._failed = 0
+        self._rows = 0
+
+    def start(self, sheet: SheetImport):
+        with self._lock:
+            self._running[sheet.table_name] = {'sheet_name': sheet.sheet_name, 'rows': 0,
+                                               'start_time': time.monotonic()}
+
+    def update(self, table_name: str, rows: int):
+        with self._lock:
+            task = self._running.get(table_name)
+            if task is not None:
+                task['rows'] = rows
+        SQLBotLogUtil.debug(f'[ExcelImport] {table_name}: {rows} rows')
+
+    def finish(self, table_name: str, rows: int, error: Optional[Exception] = None):
+        with self._lock:
+            task = self._running.pop(table_name, None)
+            if error is None:
+                self._finished += 1
+                self._rows += rows
+            else:
+                self._failed += 1
+        elapsed = time.monotonic() - task['start_time'] if task else 0
+        if error is None:
+            SQLBotLogUtil.info(f'[ExcelImport] {table_name}: {rows} rows imported in {elapsed:.1f}s')
+        else:
+            SQLBotLogUtil.error(f'[ExcelImport] {table_name}: failed after {elapsed:.1f}s: {error}')
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'running': [{'table_name': table_name, 'sheet_name': task['sheet_name'], 'rows': task['rows'],
+                             'elapsed': round(now - task['start_time'], 1)}
+                            for table_name, task in self._running.items()],
+                'finished': self._finished,
+                'failed': self._failed,
+                'rows': self._rows,
+            }
+
+
+excel_import_progress = ImportProgress()
+
+
+def import_file(engine, save_path: str, sheets: list[SheetImport], chunk_size: Optional[int] = None,
+                workers: Optional[int] = None, writer: Callable = write_sheet) -> list[int]:
+    """并行导入多个 sheet，按 sheets 顺序返回各表行数；失败时删除本次已导入的表并抛出第一个异常"""
+    chunk_size = max(1, chunk_size or settings.EXCEL_IMPORT_CHUNK_SIZE)
+    workers = max(1, min(workers or settings.EXCEL_IMPORT_WORKERS, len(sheets) or 1))
+    failed = threading.Event()
+
+    def run(sheet: SheetImport) -> Optional[int]:
+        if failed.is_set():
+            return None
+        excel_import_progress.start(sheet)
+        rows = 0
+        try:
+            rows = writer(engine, sheet.table_name, read_chunks(save_path, sheet, chunk_size),
+                          lambda count: excel_import_progress.update(sheet.table_name, count))
+            excel_import_progress.finish(sheet.table_name, rows)
+            return rows
+        except Exception as e:
+            failed.set()
+            excel_import_progress.finish(sheet.table_name, rows, e)
+            if isinstance(e, ExcelReadError):
+                raise
+            raise ExcelWriteError(sheet.table_name, e) from e
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='excel-import') as executor:
+        futures = [executor.submit(run, sheet) for sheet in sheets]
+        results, error = [], None
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = error or e
+                results.append(None)
+
+    if error is not None:
+        imported = [sheet.table_name for sheet, rows in zip(sheets, results, strict=True) if rows is not None]
+        if imported:
+            try:
+                drop_tables(engine, imported)
+            except Exception as e:
+                SQLBotLogUtil.error(f'[ExcelImport] failed to drop imported tables {imported}: {e}')
+        raise error
+    return results
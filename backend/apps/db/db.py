@@ -1,18 +1,22 @@
 import base64
+import itertools
 import json
 import os
 import platform
+import re
 import urllib.parse
+from contextlib import contextmanager
 from datetime import datetime, date, time, timedelta
 from decimal import Decimal
-from typing import Optional, List
+from operator import attrgetter, methodcaller
+from typing import Iterator, Optional, List
 
 import oracledb
 import psycopg2
 import pymssql
 
 from apps.db.db_sql import get_table_sql, get_field_sql, get_version_sql
-from common.error import ParseSQLResultError
+from common.error import ParseSQLResultError, SQLBotDBError
 
 if platform.system() != "Darwin":
     import dmPython
@@ -25,6 +29,11 @@ from apps.datasource.models.datasource import DatasourceConf, CoreDatasource, Ta
 from apps.datasource.utils.utils import aes_decrypt
 from apps.db.constant import DB, ConnectType
 from apps.db.engine import get_engine_config
+from apps.db.health import DatasourceHealthService
+from apps.db.parsed_sql import parse_sql, get_sqlglot_dialect
+from apps.db.pool import DatasourcePoolManager, PoolKind, POOL_DRIVER, POOL_ENGINE
+from apps.db.result_cache import sql_result_cache
+from apps.db.result_set import ColumnarResult
 from apps.system.crud.assistant import get_out_ds_conf
 from apps.system.schemas.system_schema import AssistantOutDsSchema
 from common.core.deps import Trans
@@ -32,8 +41,6 @@ from common.utils.utils import SQLBotLogUtil, equals_ignore_case
 from fastapi import HTTPException
 from apps.db.es_engine import get_es_connect, get_es_index, get_es_fields, get_es_data_by_http
 from common.core.config import settings
-import sqlglot
-from sqlglot import expressions as exp
 from pyhive import hive
 from sqlalchemy.pool import NullPool
 from dbutils.pooled_db import PooledDB
@@ -136,7 +143,8 @@ def get_origin_connect(type: str, conf: DatasourceConf):
 
 
 # use sqlalchemy
-def get_engine(ds: CoreDatasource, timeout: int = 0, use_pool: bool = False) -> Engine:
+def get_engine(ds: CoreDatasource, timeout: int = 0, use_pool: bool = False,
+               max_connections: Optional[int] = None) -> Engine:
     conf = DatasourceConf(**json.loads(aes_decrypt(ds.configuration))) if not equals_ignore_case(ds.type,
                                                                                                  "excel") else get_engine_config()
     if conf.timeout is None:
@@ -144,13 +152,24 @@ def get_engine(ds: CoreDatasource, timeout: int = 0, use_pool: bool = False) ->
     if timeout > 0:
         conf.timeout = timeout
 
-    db_config = {
-        'pool_size': conf.poolSize if conf.poolSize else 5,
-        'max_overflow': 20,
-        'pool_recycle': 3600
-    } if use_pool else {
-        'poolclass': NullPool
-    }
+    if use_pool:
+        # max_connections 为连接池管理器按全局额度分配的上限（pool_size + max_overflow）
+        pool_size = conf.poolSize if conf.poolSize else 5
+        max_overflow = settings.DS_POOL_MAX_OVERFLOW
+        if max_connections is not None:
+            pool_size = max(1, min(pool_size, max_connections))
+            max_overflow = max(0, min(max_overflow, max_connections - pool_size))
+        db_config = {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_recycle': settings.DS_POOL_RECYCLE,
+            'pool_timeout': settings.DS_POOL_TIMEOUT,
+            'pool_pre_ping': settings.DS_POOL_PRE_PING,
+        }
+    else:
+        db_config = {
+            'poolclass': NullPool
+        }
 
     if equals_ignore_case(ds.type, "pg"):
         if conf.dbSchema is not None and conf.dbSchema != "":
@@ -183,22 +202,30 @@ def get_session(ds: CoreDatasource | AssistantOutDsSchema):
     # session_maker = sessionmaker(bind=engine)
 
     # get session from pool
-    session = pool_manager.get_pool(ds=ds, **{})
+    session = pool_manager.get_pool(POOL_ENGINE, ds)
     return session()
 
 
-def get_driver_connection(ds: CoreDatasource | AssistantOutDsSchema, db_config: dict = {}, use_pool: bool = False):
+def get_driver_connection(ds: CoreDatasource | AssistantOutDsSchema, db_config: dict = {}, use_pool: bool = False,
+                          max_connections: Optional[int] = None):
     conf = DatasourceConf(**json.loads(aes_decrypt(ds.configuration)))
     extra_config_dict = get_extra_config(conf)
 
-    pool_config = {
-        'maxconnections': conf.poolSize if conf.poolSize else 5,
-        'mincached': 5,
-        'maxcached': 10,
-        'blocking': True,
-        'maxusage': 100,
-        'ping': 1,
-    } if use_pool else {}
+    pool_config = {}
+    if use_pool:
+        pool_max = conf.poolSize if conf.poolSize else 5
+        if max_connections is not None:
+            pool_max = max(1, min(pool_max, max_connections))
+        pool_config = {
+            'maxconnections': pool_max,
+            # 默认不预先建立连接，按需创建，空闲连接最多保留 maxconnections 个
+            'mincached': min(settings.DS_DRIVER_POOL_MIN_CACHED, pool_max),
+            'maxcached': pool_max,
+            'blocking': True,
+            'maxusage': 100,
+            # 1: 每次从连接池取出连接时检查连接是否可用
+            'ping': 1 if settings.DS_POOL_PRE_PING else 0,
+        }
     conn_conf = extra_config_dict | db_config | pool_config
 
     conn = None
@@ -285,7 +312,7 @@ def get_driver_connection(ds: CoreDatasource | AssistantOutDsSchema, db_config:
 
 
 def get_driver_pool(ds: CoreDatasource | AssistantOutDsSchema, db_config: dict = {}):
-    pool = driver_pool_manager.get_pool(ds, db_config)
+    pool = pool_manager.get_pool(POOL_DRIVER, ds, db_config)
     return pool
 
 
@@ -447,6 +474,30 @@ def get_version(ds: CoreDatasource | AssistantOutDsSchema):
     return version.decode() if isinstance(version, bytes) else version
 
 
+def ping_datasource(ds: CoreDatasource | AssistantOutDsSchema) -> bool:
+    """从连接池取连接检查数据源是否可用，不另建引擎；未使用连接池的类型（es）仍走 check_connection"""
+    db = DB.get_db(ds.type)
+    if db.connect_type == ConnectType.sqlalchemy:
+        with get_session(ds) as session:
+            connection = session.connection()
+            # 与 pool_pre_ping 相同，由方言执行各自的探测语句（如 Oracle 的 select 1 from dual）
+            if not connection.dialect.do_ping(connection.connection.dbapi_connection):
+                connection.invalidate()
+                return False
+            return True
+    if equals_ignore_case(ds.type, 'dm', 'doris', 'starrocks', 'redshift', 'kingbase', 'hive'):
+        t_conf = {'connect_timeout': 10, 'read_timeout': 10} if equals_ignore_case(ds.type, 'doris',
+                                                                                   'starrocks') else {}
+        with get_driver_pool(ds, t_conf).connection() as conn, conn.cursor() as cursor:
+            if equals_ignore_case(ds.type, 'dm'):
+                cursor.execute('select 1', timeout=10)
+            else:
+                cursor.execute('select 1')
+            cursor.fetchall()
+            return True
+    return check_connection(None, ds)
+
+
 def get_schema(ds: CoreDatasource):
     conf = DatasourceConf(**json.loads(aes_decrypt(ds.configuration))) if ds.type != "excel" else get_engine_config()
     db = DB.get_db(ds.type)
@@ -665,6 +716,75 @@ def convert_value(value, datetime_format='space'):
         return value
 
 
+def _decimals_to_float(values: list) -> list:
+    return list(map(float, values))
+
+
+_datetime_isoformat = methodcaller('isoformat', ' ', 'seconds')
+
+
+def _datetimes_to_str(values: list) -> list:
+    # 无时区且年份为四位时 isoformat 与 strftime('%Y-%m-%d %H:%M:%S') 结果相同，速度快得多
+    if not any(map(attrgetter('tzinfo'), values)) and min(map(attrgetter('year'), values)) >= 1000:
+        return list(map(_datetime_isoformat, values))
+    return [value.strftime('%Y-%m-%d %H:%M:%S') for value in values]
+
+
+def _dates_to_str(values: list) -> list:
+    return list(map(date.isoformat, values))
+
+
+def _values_to_str(values: list) -> list:
+    return list(map(str, values))
+
+
+# 按 Python 类型选择的整列转换函数（输入不含 None），与 convert_value 默认（datetime_format='space'）的结果一致
+_PASSTHROUGH_TYPES = frozenset({int, str, float, bool})
+_COLUMN_CONVERTERS = {
+    Decimal: _decimals_to_float,
+    datetime: _datetimes_to_str,
+    date: _dates_to_str,
+    time: _values_to_str,
+    timedelta: _values_to_str,
+}
+_NONE_TYPE = type(None)
+
+
+class ColumnConverterPlan:
+    """
+    按列选择值转换函数，替代逐个单元格调用 convert_value
+    列由 cursor.description 确定，根据第一批数据中每列第一个非空值的类型为每列选定一个转换函数（整数、字符串等不转换）；
+    之后每批按列转换，先用 set(map(type, 列)) 确认该列类型与计划一致，不一致（类型混杂、bytes 等）时该列退回 convert_value
+    """
+
+    def __init__(self, columns: list, first_batch: list):
+        self.types: list[Optional[type]] = [None] * len(columns)
+        for col_idx in range(len(columns)):
+            for row in first_batch:
+                if row[col_idx] is not None:
+                    self.types[col_idx] = type(row[col_idx])
+                    break
+
+    def convert_column(self, col_idx: int, values: tuple) -> list | tuple:
+        value_types = set(map(type, values))
+        has_none = _NONE_TYPE in value_types
+        value_types.discard(_NONE_TYPE)
+        if value_types <= _PASSTHROUGH_TYPES:
+            return values
+        planned = self.types[col_idx]
+        if len(value_types) == 1 and planned in value_types and planned in _COLUMN_CONVERTERS:
+            converter = _COLUMN_CONVERTERS[planned]
+            if not has_none:
+                return converter(values)
+            converted = iter(converter([value for value in values if value is not None]))
+            return [None if value is None else next(converted) for value in values]
+        return list(map(convert_value, values))
+
+    def convert(self, batch: list) -> list:
+        """转换一批行，返回转换后的列（每列一个序列）"""
+        return [self.convert_column(col_idx, values) for col_idx, values in enumerate(zip(*batch))]
+
+
 def is_numeric_type_code(type_code, dialect_name: str) -> bool:
     """
     根据数据库方言和 type_code 判断是否为数值类型
@@ -750,154 +870,354 @@ def is_numeric_type_code(type_code, dialect_name: str) -> bool:
     return False
 
 
-def exec_sql(ds: CoreDatasource | AssistantOutDsSchema, sql: str, origin_column=False):
+def _prepare_read_sql(sql: str, ds: CoreDatasource | AssistantOutDsSchema) -> str:
     while sql.endswith(';'):
         sql = sql[:-1]
     # check execute sql only contain read operations
     is_safe, error_reason = check_sql_read(sql, ds)
     if not is_safe:
         raise ValueError(f"SQL can only contain read operations: {error_reason}")
+    return sql
 
-    db = DB.get_db(ds.type)
-    if db.connect_type == ConnectType.sqlalchemy:
+
+def exec_sql(ds: CoreDatasource | AssistantOutDsSchema, sql: str, origin_column=False, use_cache: bool = False,
+             filters: Optional[list] = None, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+             columnar: bool = False):
+    """
+    执行只读 SQL
+    use_cache: 使用查询结果缓存，filters 为生成该 SQL 时使用的行权限条件，参与缓存键计算
+    max_rows / max_bytes: 读取行数、估算字节数上限，默认取 SQL_EXEC_MAX_ROWS / SQL_EXEC_MAX_BYTES，0 表示不限制；
+    超过上限时停止读取，返回结果中 truncated 为 True
+    columnar: 返回 ColumnarResult（按列存储），否则返回 {"fields", "data": [{列名: 值}], ...}
+    """
+    sql = _prepare_read_sql(sql, ds)
+
+    # 自定义上限的结果不写入缓存，避免被默认上限的查询复用
+    if not use_cache or max_rows is not None or max_bytes is not None or not sql_result_cache.enabled_for(ds):
+        result = _exec_sql(ds, sql, origin_column, max_rows, max_bytes)
+    else:
+        cache_key = sql_result_cache.build_key(ds, sql, origin_column, filters, get_sqlglot_dialect(ds.type))
+        cached = sql_result_cache.get(cache_key)
+        if cached is None:
+            result = _exec_sql(ds, sql, origin_column)
+            sql_result_cache.put(cache_key, ds, result.to_cache())
+        else:
+            result = ColumnarResult.from_cache(cached)
+    return result if columnar else result.to_dict()
+
+
+def iter_sql(ds: CoreDatasource | AssistantOutDsSchema, sql: str, origin_column=False, max_rows: int = 0,
+             max_bytes: int = 0) -> Iterator[list[dict]]:
+    """
+    生成器模式执行只读 SQL（用于导出等场景），按批返回 [{列名: 值}]，默认不限制行数与大小
+    需要列信息时使用 open_sql_stream
+    """
+    with open_sql_stream(ds, sql, origin_column, max_rows, max_bytes) as stream:
+        yield from stream.batches()
+
+
+@contextmanager
+def open_sql_stream(ds: CoreDatasource | AssistantOutDsSchema, sql: str, origin_column=False,
+                    max_rows: Optional[int] = None, max_bytes: Optional[int] = None) -> Iterator['SQLResultStream']:
+    """执行只读 SQL，返回 SQLResultStream，连接在退出 with 块时归还"""
+    sql = _prepare_read_sql(sql, ds)
+    with _open_result_stream(ds, sql, origin_column, max_rows, max_bytes) as stream:
+        yield stream
+
+
+def _exec_sql(ds: CoreDatasource | AssistantOutDsSchema, sql: str, origin_column=False,
+              max_rows: Optional[int] = None, max_bytes: Optional[int] = None) -> ColumnarResult:
+    with _open_result_stream(ds, sql, origin_column, max_rows, max_bytes) as stream:
+        columns = [[] for _ in stream.fields]
+        for batch in stream.column_batches():
+            for values, batch_values in zip(columns, batch):
+                values.extend(batch_values)
+        if stream.truncated:
+            SQLBotLogUtil.warning(f"SQL result truncated at {stream.row_count} rows / {stream.byte_count} bytes, "
+                                  f"datasource: {ds.id}")
+        return ColumnarResult(stream.fields, columns, stream.fields_info,
+                              bytes.decode(base64.b64encode(bytes(stream.sql, 'utf-8'))), stream.truncated,
+                              list(stream.keys))
+
+
+@contextmanager
+def _open_result_stream(ds: CoreDatasource | AssistantOutDsSchema, sql: str, origin_column=False,
+                        max_rows: Optional[int] = None, max_bytes: Optional[int] = None):
+    adapter = get_sql_adapter(ds.type)
+    sql = adapter.prepare_sql(sql)
+    with adapter.connect(ds) as handle:
+        try:
+            cursor = adapter.run(handle, ds, sql)
+        except Exception as ex:
+            raise SQLBotDBError(str(ex))
+        try:
+            stream = SQLResultStream(adapter, cursor, sql, origin_column,
+                                     settings.SQL_EXEC_MAX_ROWS if max_rows is None else max_rows,
+                                     settings.SQL_EXEC_MAX_BYTES if max_bytes is None else max_bytes)
+            yield stream
+        finally:
+            adapter.close(cursor)
+
+
+def _estimate_size(value) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 8
+
+
+class SQLResultStream:
+    """
+    按批读取查询结果：每批 fetchmany(array_size) 行并转换为 {列名: 值}，
+    读取行数超过 max_rows 或估算大小超过 max_bytes 时停止读取，truncated 标记结果被截断
+    列信息在读取第一批后确定（部分驱动的服务端游标在首次读取前没有 description）
+    读取数据失败抛出 SQLBotDBError，转换结果失败抛出 ParseSQLResultError
+    """
+
+    def __init__(self, adapter: 'SQLExecuteAdapter', cursor, sql: str, origin_column: bool, max_rows: int = 0,
+                 max_bytes: int = 0):
+        self.adapter = adapter
+        self.cursor = cursor
+        self.sql = sql
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.array_size = adapter.array_size or settings.SQL_EXEC_FETCH_SIZE
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = False
+
+        adapter.set_array_size(cursor, self.array_size)
+        self._first = self._fetch(self._batch_size())
+        try:
+            columns = adapter.columns(cursor)
+            self.fields = columns if origin_column else [item.lower() for item in columns]
+            self.fields_info = adapter.fields_info(cursor, origin_column)
+            self.keys = [str(column) for column in self.fields]
+            self._plan = ColumnConverterPlan(columns, self._first or [])
+        except Exception as ex:
+            raise ParseSQLResultError(str(ex))
+
+    def _fetch(self, size: int) -> list:
+        try:
+            return self.adapter.fetch(self.cursor, size)
+        except Exception as ex:
+            raise SQLBotDBError(str(ex))
+
+    def _convert(self, batch: list) -> list:
+        try:
+            return self._plan.convert(batch)
+        except Exception as ex:
+            raise ParseSQLResultError(str(ex))
+
+    def _batch_size(self) -> int:
+        if self.max_rows > 0:
+            return max(1, min(self.array_size, self.max_rows - self.row_count))
+        return self.array_size
+
+    def _row_sizes(self, columns: list) -> list[int]:
+        column_sizes = []
+        for values in columns:
+            if set(map(type, values)) == {str}:
+                column_sizes.append(map(len, values))
+            else:
+                column_sizes.append(map(_estimate_size, values))
+        return list(map(sum, zip(*column_sizes)))
+
+    def batches(self) -> Iterator[list[dict]]:
+        for columns in self.column_batches():
+            yield [dict(zip(self.keys, values)) for values in zip(*columns)]
+
+    def column_batches(self) -> Iterator[list[list]]:
+        """按批返回转换后的列数据 [[第 1 列的值], [第 2 列的值], ...]，与 fields 一一对应"""
+        batch = self._first
+        self._first = None
+        while batch:
+            columns = self._convert(batch)
+            count = len(batch)
+            if self.max_bytes > 0:
+                sizes = self._row_sizes(columns)
+                total = sum(sizes)
+                if self.byte_count + total > self.max_bytes:
+                    self.truncated = True
+                    count = 0
+                    for size in sizes:
+                        if self.byte_count + size > self.max_bytes:
+                            break
+                        self.byte_count += size
+                        count += 1
+                    columns = [values[:count] for values in columns]
+                else:
+                    self.byte_count += total
+            self.row_count += count
+            if count:
+                yield columns
+            if self.truncated:
+                return
+            if 0 < self.max_rows <= self.row_count:
+                # 恰好读满上限时再探测一行，判断是否还有剩余数据
+                self.truncated = bool(self._fetch(1))
+                return
+            batch = self._fetch(self._batch_size())
+
+
+class SQLExecuteAdapter:
+    """
+    单个数据源类型的执行适配，各类型的差异只体现在这里：
+    connect 获取连接，run 执行 SQL 并返回游标，prepare_sql 预处理 SQL，fields_info 判断数值列，array_size 每批读取行数
+    """
+    fields_db_type: str = 'postgresql'
+    array_size: Optional[int] = None
+
+    def prepare_sql(self, sql: str) -> str:
+        return sql
+
+    @contextmanager
+    def connect(self, ds: CoreDatasource | AssistantOutDsSchema):
+        with get_driver_pool(ds).connection() as conn, conn.cursor() as cursor:
+            yield cursor
+
+    def run(self, handle, ds: CoreDatasource | AssistantOutDsSchema, sql: str):
+        handle.execute(sql)
+        return handle
+
+    def close(self, cursor):
+        """读取结束（包括截断后未读完）时释放结果，驱动游标随连接一起关闭"""
+        pass
+
+    def set_array_size(self, cursor, array_size: int):
+        try:
+            cursor.arraysize = array_size
+        except Exception:
+            pass
+
+    def fetch(self, cursor, size: int) -> list:
+        return cursor.fetchmany(size)
+
+    def columns(self, cursor) -> list[str]:
+        return [field[0] for field in cursor.description]
+
+    def fields_info(self, cursor, origin_column: bool) -> list[dict]:
+        return build_fields_info_from_cursor(cursor, origin_column, self.fields_db_type)
+
+
+class _SQLAlchemyCursor:
+
+    def __init__(self, result, dialect_name: str):
+        self.result = result
+        self.dialect_name = dialect_name
+
+
+class SQLAlchemyExecuteAdapter(SQLExecuteAdapter):
+    # 这些方言使用服务端游标，按批从数据库读取，不在客户端缓存全部结果
+    stream_dialects = {'postgresql'}
+
+    @contextmanager
+    def connect(self, ds: CoreDatasource | AssistantOutDsSchema):
         with get_session(ds) as session:
-            # 获取当前数据库方言
-            dialect_name = session.bind.dialect.name
+            yield session
 
-            with session.execute(text(sql)) as result:
-                try:
-                    columns = result.keys()._keys if origin_column else [item.lower() for item in result.keys()._keys]
+    def run(self, handle, ds: CoreDatasource | AssistantOutDsSchema, sql: str):
+        # 获取当前数据库方言
+        dialect_name = handle.bind.dialect.name
+        options = {}
+        if dialect_name in self.stream_dialects:
+            options = {'stream_results': True, 'max_row_buffer': self.array_size or settings.SQL_EXEC_FETCH_SIZE}
+        return _SQLAlchemyCursor(handle.execute(text(sql), execution_options=options), dialect_name)
 
-                    fields_info = []
+    def close(self, cursor):
+        cursor.result.close()
 
-                    for col_idx, col_name in enumerate(columns):
-                        is_numeric = False
-                        try:
-                            type_code = result.cursor.description[col_idx][1]
-                            is_numeric = is_numeric_type_code(type_code, dialect_name)
-                        except (IndexError, AttributeError):
-                            pass
+    def set_array_size(self, cursor, array_size: int):
+        super().set_array_size(cursor.result.cursor, array_size)
 
-                        fields_info.append({
-                            "name": col_name,
-                            "is_numeric": is_numeric
-                        })
+    def fetch(self, cursor, size: int) -> list:
+        return cursor.result.fetchmany(size)
 
-                    res = result.fetchall()
-                    result_list = [
-                        {str(columns[i]): convert_value(value) for i, value in enumerate(tuple_item)} for tuple_item in
-                        res
-                    ]
-                    return {"fields": columns, "data": result_list, "fields_info": fields_info,
-                            "sql": bytes.decode(base64.b64encode(bytes(sql, 'utf-8')))}
-                except Exception as ex:
-                    raise ParseSQLResultError(str(ex))
-    else:
-        conf = DatasourceConf(**json.loads(aes_decrypt(ds.configuration)))
-        # extra_config_dict = get_extra_config(conf)
-        if equals_ignore_case(ds.type, 'dm'):
-            with get_driver_pool(ds).connection() as conn, conn.cursor() as cursor:
-                try:
-                    cursor.execute(sql, timeout=conf.timeout)
-                    res = cursor.fetchall()
-                    columns = [field[0] for field in cursor.description] if origin_column else [field[0].lower() for
-                                                                                                field in
-                                                                                                cursor.description]
-                    fields_info = build_fields_info_from_cursor(cursor, origin_column, 'dm')
-                    result_list = [
-                        {str(columns[i]): convert_value(value) for i, value in enumerate(tuple_item)} for tuple_item in
-                        res
-                    ]
-                    return {"fields": columns, "data": result_list, "fields_info": fields_info,
-                            "sql": bytes.decode(base64.b64encode(bytes(sql, 'utf-8')))}
-                except Exception as ex:
-                    raise ParseSQLResultError(str(ex))
-        elif equals_ignore_case(ds.type, 'doris', 'starrocks'):
-            with get_driver_pool(ds).connection() as conn, conn.cursor() as cursor:
-                try:
-                    cursor.execute(sql)
-                    res = cursor.fetchall()
-                    columns = [field[0] for field in cursor.description] if origin_column else [field[0].lower() for
-                                                                                                field in
-                                                                                                cursor.description]
-                    fields_info = build_fields_info_from_cursor(cursor, origin_column, 'mysql')
-                    result_list = [
-                        {str(columns[i]): convert_value(value) for i, value in enumerate(tuple_item)} for tuple_item in
-                        res
-                    ]
-                    return {"fields": columns, "data": result_list, "fields_info": fields_info,
-                            "sql": bytes.decode(base64.b64encode(bytes(sql, 'utf-8')))}
-                except Exception as ex:
-                    raise ParseSQLResultError(str(ex))
-        elif equals_ignore_case(ds.type, 'redshift'):
-            with get_driver_pool(ds).connection() as conn, conn.cursor() as cursor:
-                try:
-                    cursor.execute(sql)
-                    res = cursor.fetchall()
-                    columns = [field[0] for field in cursor.description] if origin_column else [field[0].lower() for
-                                                                                                field in
-                                                                                                cursor.description]
-                    fields_info = build_fields_info_from_cursor(cursor, origin_column, 'postgresql')
-                    result_list = [
-                        {str(columns[i]): convert_value(value) for i, value in enumerate(tuple_item)} for tuple_item in
-                        res
-                    ]
-                    return {"fields": columns, "data": result_list, "fields_info": fields_info,
-                            "sql": bytes.decode(base64.b64encode(bytes(sql, 'utf-8')))}
-                except Exception as ex:
-                    raise ParseSQLResultError(str(ex))
-        elif equals_ignore_case(ds.type, 'kingbase'):
-            with get_driver_pool(ds).connection() as conn, conn.cursor() as cursor:
-                try:
-                    cursor.execute(sql)
-                    res = cursor.fetchall()
-                    columns = [field[0] for field in cursor.description] if origin_column else [field[0].lower() for
-                                                                                                field in
-                                                                                                cursor.description]
-                    fields_info = build_fields_info_from_cursor(cursor, origin_column, 'postgresql')
-                    result_list = [
-                        {str(columns[i]): convert_value(value) for i, value in enumerate(tuple_item)} for tuple_item in
-                        res
-                    ]
-                    return {"fields": columns, "data": result_list, "fields_info": fields_info,
-                            "sql": bytes.decode(base64.b64encode(bytes(sql, 'utf-8')))}
-                except Exception as ex:
-                    raise ParseSQLResultError(str(ex))
-        elif equals_ignore_case(ds.type, 'es'):
+    def columns(self, cursor) -> list[str]:
+        return list(cursor.result.keys())
+
+    def fields_info(self, cursor, origin_column: bool) -> list[dict]:
+        fields_info = []
+        for col_idx, col_name in enumerate(self.columns(cursor)):
+            is_numeric = False
             try:
-                res, raw_columns = get_es_data_by_http(conf, sql)
-                columns = [field.get('name') for field in raw_columns] if origin_column else [field.get('name').lower()
-                                                                                              for
-                                                                                              field in
-                                                                                              raw_columns]
-                fields_info = build_fields_info_from_es(raw_columns, origin_column)
-                result_list = [
-                    {str(columns[i]): convert_value(value) for i, value in enumerate(tuple_item)} for tuple_item in
-                    res
-                ]
-                return {"fields": columns, "data": result_list, "fields_info": fields_info,
-                        "sql": bytes.decode(base64.b64encode(bytes(sql, 'utf-8')))}
-            except Exception as ex:
-                raise Exception(str(ex))
-        elif equals_ignore_case(ds.type, 'hive'):
-            with get_driver_pool(ds).connection() as conn, conn.cursor() as cursor:
-                try:
-                    # Hive uses backticks for identifiers; normalize quoted identifiers as a compatibility fallback.
-                    hive_sql = re.sub(r'"([A-Za-z_][A-Za-z0-9_]*)"', r'`\1`', sql)
-                    cursor.execute(hive_sql)
-                    res = cursor.fetchall()
-                    columns = [field[0] for field in cursor.description] if origin_column else [field[0].lower() for
-                                                                                                field in
-                                                                                                cursor.description]
-                    fields_info = build_fields_info_from_cursor(cursor, origin_column, 'hive')
-                    result_list = [
-                        {str(columns[i]): convert_value(value) for i, value in enumerate(tuple_item)} for tuple_item in
-                        res
-                    ]
-                    return {"fields": columns, "data": result_list, "fields_info": fields_info,
-                            "sql": bytes.decode(base64.b64encode(bytes(hive_sql, 'utf-8')))}
-                except Exception as ex:
-                    raise ParseSQLResultError(str(ex))
+                type_code = cursor.result.cursor.description[col_idx][1]
+                is_numeric = is_numeric_type_code(type_code, cursor.dialect_name)
+            except (IndexError, AttributeError, TypeError):
+                pass
+            fields_info.append({
+                "name": col_name if origin_column else col_name.lower(),
+                "is_numeric": is_numeric
+            })
+        return fields_info
+
+
+class DMExecuteAdapter(SQLExecuteAdapter):
+    fields_db_type = 'dm'
+
+    def run(self, handle, ds: CoreDatasource | AssistantOutDsSchema, sql: str):
+        conf = DatasourceConf(**json.loads(aes_decrypt(ds.configuration)))
+        handle.execute(sql, timeout=conf.timeout)
+        return handle
+
+
+class HiveExecuteAdapter(SQLExecuteAdapter):
+    fields_db_type = 'hive'
+
+    def prepare_sql(self, sql: str) -> str:
+        # Hive uses backticks for identifiers; normalize quoted identifiers as a compatibility fallback.
+        return re.sub(r'"([A-Za-z_][A-Za-z0-9_]*)"', r'`\1`', sql)
+
+
+class ESExecuteAdapter(SQLExecuteAdapter):
+    """Elasticsearch 通过 HTTP 一次返回结果，按批读取仅用于统一截断逻辑"""
+
+    @contextmanager
+    def connect(self, ds: CoreDatasource | AssistantOutDsSchema):
+        yield DatasourceConf(**json.loads(aes_decrypt(ds.configuration)))
+
+    def run(self, handle, ds: CoreDatasource | AssistantOutDsSchema, sql: str):
+        res, raw_columns = get_es_data_by_http(handle, sql)
+        return {'rows': iter(res), 'columns': raw_columns}
+
+    def set_array_size(self, cursor, array_size: int):
+        pass
+
+    def fetch(self, cursor, size: int) -> list:
+        return list(itertools.islice(cursor['rows'], size))
+
+    def columns(self, cursor) -> list[str]:
+        return [field.get('name') for field in cursor['columns']]
+
+    def fields_info(self, cursor, origin_column: bool) -> list[dict]:
+        return build_fields_info_from_es(cursor['columns'], origin_column)
+
+
+def _driver_adapter(fields_db_type: str) -> SQLExecuteAdapter:
+    adapter = SQLExecuteAdapter()
+    adapter.fields_db_type = fields_db_type
+    return adapter
+
+
+_SQLALCHEMY_ADAPTER = SQLAlchemyExecuteAdapter()
+_SQL_ADAPTERS: dict[str, SQLExecuteAdapter] = {
+    'dm': DMExecuteAdapter(),
+    'doris': _driver_adapter('mysql'),
+    'starrocks': _driver_adapter('mysql'),
+    'redshift': _driver_adapter('postgresql'),
+    'kingbase': _driver_adapter('postgresql'),
+    'es': ESExecuteAdapter(),
+    'hive': HiveExecuteAdapter(),
+}
+
+
+def get_sql_adapter(ds_type: str) -> SQLExecuteAdapter:
+    db = DB.get_db(ds_type)
+    if db.connect_type == ConnectType.sqlalchemy:
+        return _SQLALCHEMY_ADAPTER
+    adapter = _SQL_ADAPTERS.get(db.type.lower())
+    if adapter is None:
+        raise SQLBotDBError(f"Unsupported datasource type: {ds_type}")
+    return adapter
 
 
 def build_fields_info_from_cursor(cursor, origin_column, db_type='postgresql'):
@@ -1001,130 +1321,12 @@ def build_fields_info_from_es(raw_columns, origin_column):
     return fields_info
 
 
-def get_sqlglot_dialect(ds_type: str) -> str:
-    """根据数据源类型获取 sqlglot dialect"""
-    if equals_ignore_case(ds_type, 'mysql', 'doris', 'starrocks'):
-        return 'mysql'
-    elif equals_ignore_case(ds_type, 'sqlServer'):
-        return 'tsql'
-    elif equals_ignore_case(ds_type, 'hive'):
-        return 'hive'
-    return None
-
-
-# 通用危险函数（适用于所有数据库）
-COMMON_DANGEROUS_FUNCTIONS = {'version', 'current_user', 'user', 'database'}
-
-# 特定数据库的危险函数
-DS_SPECIFIC_DANGEROUS_FUNCTIONS = {
-    'mysql': {'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'},
-    'doris': {'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'},
-    'starrocks': {'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'},
-    'postgresql': {'pg_read_file', 'pg_write_file', 'lo_import', 'lo_export'},
-    'sqlserver': {'EXEC', 'xp_cmdshell', 'sp_executesql'},
-    'oracle': {'UTL_FILE', 'DBMS_PIPE', 'DBMS_LOCK'},
-    'hive': {'ADD FILE', 'ADD JAR'},
-}
-
-# 危险模式正则表达式（用于检查特殊语法）
-import re
-
-DANGEROUS_PATTERNS = [
-    r'\bINTO\s+OUTFILE\b',
-    r'\bINTO\s+DUMPFILE\b',
-    r'\bEXEC\s*\(',
-    r'\bCOPY\s+.*\bTO\s+PROGRAM\b',
-]
-
-
-def get_dangerous_functions(ds_type: str) -> set:
-    """获取危险函数（通用 + 特定数据源）"""
-    functions = COMMON_DANGEROUS_FUNCTIONS.copy()
-    ds_key = ds_type.lower() if ds_type else ''
-    if ds_key in DS_SPECIFIC_DANGEROUS_FUNCTIONS:
-        functions.update(DS_SPECIFIC_DANGEROUS_FUNCTIONS[ds_key])
-    return functions
-
-
-def check_dangerous_functions(statements: list, ds_type: str) -> bool:
-    """检查是否使用了危险函数，返回 True 表示安全"""
-    dangerous_functions = get_dangerous_functions(ds_type)
-    dangerous_functions_upper = {f.upper() for f in dangerous_functions}
-
-    for stmt in statements:
-        if stmt:
-            for func in stmt.find_all(exp.Anonymous):
-                if func.name.upper() in dangerous_functions_upper:
-                    return False
-    return True
-
-
 def check_sql_read(sql: str, ds: CoreDatasource | AssistantOutDsSchema) -> tuple[bool, str]:
     """
     检查 SQL 是否为安全的只读查询
     返回: (是否安全, 错误原因)
     """
-    try:
-        normalized_sql = sql.strip().lstrip("(").strip()
-        first_keyword = normalized_sql.split(None, 1)[0].upper() if normalized_sql else ""
-
-        # 根据配置决定是否允许元数据查询
-        if settings.SQLBOT_ALLOW_METADATA_QUERIES:
-            allowed_read_commands = {"SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"}
-        else:
-            allowed_read_commands = {"SELECT", "WITH"}
-
-        denied_write_commands = {
-            "INSERT", "UPDATE", "DELETE", "CREATE", "DROP", "ALTER",
-            "TRUNCATE", "MERGE", "COPY", "REPLACE", "GRANT", "REVOKE",
-            "USE", "SET", "CALL"
-        }
-
-        if not first_keyword:
-            raise ValueError("Parse SQL Error")
-        if first_keyword in denied_write_commands:
-            return False, f"Write operation '{first_keyword}' is not allowed"
-
-        # 1. 使用正则检查特殊模式
-        for pattern in DANGEROUS_PATTERNS:
-            if re.search(pattern, sql, re.IGNORECASE):
-                return False, f"SQL contains dangerous pattern: {pattern}"
-
-        dialect = get_sqlglot_dialect(ds.type)
-        statements = sqlglot.parse(sql, dialect=dialect)
-
-        if not statements:
-            raise ValueError("Parse SQL Error")
-
-        # 2. 使用 sqlglot 检查函数调用
-        dangerous_functions = get_dangerous_functions(ds.type)
-        dangerous_functions_upper = {f.upper() for f in dangerous_functions}
-        for stmt in statements:
-            if stmt:
-                for func in stmt.find_all(exp.Anonymous):
-                    if func.name.upper() in dangerous_functions_upper:
-                        return False, f"SQL contains dangerous function: {func.name}"
-
-        # 3. 检查写操作类型
-        write_types = (
-            exp.Insert, exp.Update, exp.Delete,
-            exp.Create, exp.Drop, exp.Alter,
-            exp.Merge, exp.Copy
-        )
-
-        for stmt in statements:
-            if stmt is None:
-                continue
-            if isinstance(stmt, write_types):
-                return False, f"SQL contains write operation: {type(stmt).__name__}"
-
-        if first_keyword not in allowed_read_commands:
-            return False, f"SQL command '{first_keyword}' is not allowed. Only SELECT and WITH are permitted"
-
-        return True, ""
-
-    except Exception as e:
-        raise ValueError(f"Parse SQL Error: {e}")
+    return parse_sql(sql).check_read(ds.type)
 
 
 def checkParams(extraParams: str, illegalParams: List[str]):
@@ -1136,96 +1338,42 @@ def checkParams(extraParams: str, illegalParams: List[str]):
                 raise HTTPException(status_code=500, detail=f'Illegal Parameter: {k}')
 
 
-import threading
-from collections import OrderedDict
+def _get_pool_conf(ds: CoreDatasource | AssistantOutDsSchema) -> DatasourceConf:
+    return DatasourceConf(**json.loads(aes_decrypt(ds.configuration))) if not equals_ignore_case(ds.type,
+                                                                                                 "excel") else get_engine_config()
 
 
-class ConnectionPoolManager:
-    def __init__(self, max_pools=500):
-        """
-        init
-        :param max_pools: max pool
-        """
-        self.max_pools = max_pools
-        self._pools = OrderedDict()  # 使用有序字典实现 LRU
-        self._lock = threading.Lock()  # 保证多线程安全
+def _create_engine_pool(ds: CoreDatasource | AssistantOutDsSchema, max_connections: int):
+    engine = get_engine(ds, use_pool=True, max_connections=max_connections)
+    return sessionmaker(bind=engine), engine
 
-    def get_pool(self, ds: CoreDatasource | AssistantOutDsSchema, **db_config):
-        """
-        get connection pool（lazy load + LRU update）
-        """
-        with self._lock:
-            if ds.id:
-                # 1. 如果连接池已存在，将其移动到字典末尾（标记为最近使用）
-                if ds.id in self._pools:
-                    self._pools.move_to_end(ds.id)
-                    print(f"[LRU] return: {ds.id}")
-                    return self._pools[ds.id]
-
-                # 2. 如果连接池不存在，检查是否达到上限，若达到则淘汰最久未使用的（字典头部）
-                if len(self._pools) >= self.max_pools:
-                    oldest_id, oldest_pool = self._pools.popitem(last=False)
-                    oldest_pool.close()  # 安全关闭被驱逐的连接池
-                    print(f"[LRU] remove oldest: {oldest_id}")
-
-            # 3. 创建新连接池并放入字典末尾
-            engine = get_engine(ds, use_pool=True)
-            new_pool = sessionmaker(bind=engine)
-            self._pools[ds.id] = new_pool
-            print(f"[LRU] create: {ds.id}")
-            return new_pool
-
-    def close_all(self):
-        """stop"""
-        with self._lock:
-            for pool in self._pools.values():
-                pool.close()
-            self._pools.clear()
-
-
-pool_manager = ConnectionPoolManager(max_pools=500)
-
-
-class DriverConnectionPoolManager:
-    def __init__(self, max_pools=500):
-        """
-        init
-        :param max_pools: max pool
-        """
-        self.max_pools = max_pools
-        self._pools = OrderedDict()  # 使用有序字典实现 LRU
-        self._lock = threading.Lock()  # 保证多线程安全
 
-    def get_pool(self, ds: CoreDatasource | AssistantOutDsSchema, db_config):
-        """
-        get connection pool（lazy load + LRU update）
-        """
-        with self._lock:
-            if ds.id:
-                # 1. 如果连接池已存在，将其移动到字典末尾（标记为最近使用）
-                if ds.id in self._pools:
-                    self._pools.move_to_end(ds.id)
-                    print(f"[LRU] return: {ds.id}")
-                    return self._pools[ds.id]
-
-                # 2. 如果连接池不存在，检查是否达到上限，若达到则淘汰最久未使用的（字典头部）
-                if len(self._pools) >= self.max_pools:
-                    oldest_id, oldest_pool = self._pools.popitem(last=False)
-                    oldest_pool.close()  # 安全关闭被驱逐的连接池
-                    print(f"[LRU] remove oldest: {oldest_id}")
-
-            # 3. 创建新连接池并放入字典末尾
-            new_pool = get_driver_connection(ds, db_config, use_pool=True)
-            self._pools[ds.id] = new_pool
-            print(f"[LRU] create: {ds.id}")
-            return new_pool
-
-    def close_all(self):
-        """stop"""
-        with self._lock:
-            for pool in self._pools.values():
-                pool.close()
-            self._pools.clear()
-
-
-driver_pool_manager = DriverConnectionPoolManager(max_pools=500)
+def _engine_pool_usage(engine: Engine) -> tuple[int, int]:
+    return engine.pool.checkedout(), engine.pool.checkedin()
+
+
+def _create_driver_pool(ds: CoreDatasource | AssistantOutDsSchema, max_connections: int, db_config: dict):
+    pool = get_driver_connection(ds, db_config, use_pool=True, max_connections=max_connections)
+    return pool, pool
+
+
+def _driver_pool_usage(pool: PooledDB) -> tuple[int, int]:
+    return getattr(pool, '_connections', 0), len(getattr(pool, '_idle_cache', []))
+
+
+pool_manager = DatasourcePoolManager(max_pools=500, max_total_connections=settings.DS_POOL_MAX_TOTAL_CONNECTIONS,
+                                     idle_timeout=settings.DS_POOL_IDLE_TIMEOUT)
+pool_manager.register(POOL_ENGINE, PoolKind(
+    capacity=lambda ds: (_get_pool_conf(ds).poolSize or 5) + settings.DS_POOL_MAX_OVERFLOW,
+    create=_create_engine_pool,
+    usage=_engine_pool_usage,
+    dispose=methodcaller('dispose')))
+pool_manager.register(POOL_DRIVER, PoolKind(
+    capacity=lambda ds, db_config: _get_pool_conf(ds).poolSize or 5,
+    create=_create_driver_pool,
+    usage=_driver_pool_usage,
+    dispose=methodcaller('close')))
+
+
+# 对话中的连通性检查与版本查询走缓存，见 apps/db/health.py
+datasource_health = DatasourceHealthService(ping_datasource, get_version)
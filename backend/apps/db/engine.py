@@ -1,5 +1,6 @@
 # Author: Junjun
 # Date: 2025/5/19
+import threading
 import urllib.parse
 from typing import List
 
@@ -20,13 +21,31 @@ def get_engine_uri(conf: DatasourceConf):
     return f"postgresql+psycopg2://{urllib.parse.quote(conf.username)}:{urllib.parse.quote(conf.password)}@{conf.host}:{conf.port}/{urllib.parse.quote(conf.database)}"
 
 
+_engine = None
+_engine_lock = threading.Lock()
+
+
 def get_engine_conn():
-    conf = get_engine_config()
-    db_url = get_engine_uri(conf)
-    engine = create_engine(db_url,
-                           connect_args={"options": f"-c search_path={conf.dbSchema}", "connect_timeout": conf.timeout},
-                           pool_timeout=conf.timeout)
-    return engine
+    # 数据引擎配置来自环境变量，进程内共用一个带连接池的 engine
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                conf = get_engine_config()
+                db_url = get_engine_uri(conf)
+                _engine = create_engine(db_url,
+                                        connect_args={"options": f"-c search_path={conf.dbSchema}",
+                                                      "connect_timeout": conf.timeout},
+                                        pool_timeout=conf.timeout, pool_pre_ping=True)
+    return _engine
+
+
+def close_engine():
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.dispose()
 
 
 def get_data_engine():
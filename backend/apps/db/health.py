@@ -0,0 +1,176 @@
+"""
+数据源连通性与版本探测缓存
+
+对话每次提问都要检查数据源连接、查询数据库版本，直接探测需要额外的网络往返。
+按数据源 ID 缓存探测结果，缓存同时记录配置版本（类型与连接配置的哈希），配置变化后旧结果不再使用：
+    DATASOURCE_HEALTH_TTL 内直接返回缓存结果；
+    超过 TTL 但未超过 DATASOURCE_HEALTH_STALE_TTL 时先返回缓存结果，同时提交到 maintenance 通道后台刷新；
+    更久或上次探测失败时同步探测，失败结果不缓存，数据源恢复后下一次提问即可连通。
+版本号变化很少，使用单独的 DATASOURCE_VERSION_TTL。数据源修改/删除时调用 invalidate 清除。
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from apps.datasource.models.datasource import CoreDatasource
+from apps.db.result_cache import config_version
+from common.core.config import settings
+from common.core.task_scheduler import task_scheduler, LANE_MAINTENANCE
+from common.utils.utils import SQLBotLogUtil
+
+PROBE_ALIVE = 'alive'
+PROBE_VERSION = 'version'
+
+
+@dataclass
+class _HealthEntry:
+    config_version: str
+    # 探测类型 -> (探测时间, 结果)
+    results: dict[str, tuple[float, Any]] = field(default_factory=dict)
+    refreshing: set[str] = field(default_factory=set)
+
+
+class DatasourceHealthService:
+    """
+    alive_probe(ds) -> bool：检查数据源是否可用（应复用连接池，失败时返回 False 或抛出异常）
+    version_probe(ds) -> str：查询数据库版本
+    """
+
+    def __init__(self, alive_probe: Callable[[Any], bool], version_probe: Callable[[Any], str], max_size: int = 500):
+        self.alive_probe = alive_probe
+        self.version_probe = version_probe
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, _HealthEntry] = OrderedDict()
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._probes = 0
+        self._probe_failures = 0
+        self._background_refreshes = 0
+
+    @staticmethod
+    def enabled_for(ds) -> bool:
+        # 嵌入式助手的外部数据源每次由助手提供配置，不缓存
+        return settings.DATASOURCE_HEALTH_ENABLED and isinstance(ds, CoreDatasource) and ds.id is not None
+
+    @staticmethod
+    def _ttl(kind: str) -> int:
+        return settings.DATASOURCE_VERSION_TTL if kind == PROBE_VERSION else settings.DATASOURCE_HEALTH_TTL
+
+    def check_connection(self, ds) -> bool:
+        return bool(self._get(ds, PROBE_ALIVE))
+
+    def get_version(self, ds) -> str:
+        return self._get(ds, PROBE_VERSION) or ''
+
+    def _get(self, ds, kind: str):
+        if not self.enabled_for(ds):
+            return self._probe(ds, kind)
+
+        version = config_version(ds)
+        now = time.monotonic()
+        ttl = self._ttl(kind)
+        refresh = False
+        with self._lock:
+            entry = self._entries.get(ds.id)
+            cached = entry.results.get(kind) if entry is not None and entry.config_version == version else None
+            if cached is not None:
+                self._entries.move_to_end(ds.id)
+                age = now - cached[0]
+                if age < ttl:
+                    self._hits += 1
+                    return cached[1]
+                if age < ttl + settings.DATASOURCE_HEALTH_STALE_TTL:
+                    self._stale_hits += 1
+                    if kind not in entry.refreshing:
+                        refresh = True
+                        entry.refreshing.add(kind)
+                        self._background_refreshes += 1
+                else:
+                    cached = None
+
+        if cached is None:
+            return self._probe_and_store(ds, kind, version)
+        if refresh:
+            self._submit_refresh(ds, kind, version)
+        return cached[1]
+
+    def _submit_refresh(self, ds, kind: str, version: str):
+        # 复制一份，避免后台任务使用请求会话中已过期的对象
+        ds_copy = CoreDatasource(**ds.model_dump())
+        try:
+            task_scheduler.submit(LANE_MAINTENANCE, self._refresh, ds_copy, kind, version)
+        except Exception as e:
+            SQLBotLogUtil.warning(f'Datasource {ds.id} health refresh not scheduled: {e}')
+            self._clear_refreshing(ds.id, kind)
+
+    def _refresh(self, ds, kind: str, version: str):
+        try:
+            self._probe_and_store(ds, kind, version, refreshing=True)
+        finally:
+            self._clear_refreshing(ds.id, kind)
+
+    def _clear_refreshing(self, ds_id: int, kind: str):
+        with self._lock:
+            entry = self._entries.get(ds_id)
+            if entry is not None:
+                entry.refreshing.discard(kind)
+
+    def _probe(self, ds, kind: str):
+        with self._lock:
+            self._probes += 1
+        try:
+            result = self.alive_probe(ds) if kind == PROBE_ALIVE else self.version_probe(ds)
+        except Exception as e:
+            SQLBotLogUtil.error(f'Datasource {ds.id} {kind} probe failed: {e}')
+            result = None
+        if not result and kind == PROBE_ALIVE:
+            with self._lock:
+                self._probe_failures += 1
+        return result
+
+    def _probe_and_store(self, ds, kind: str, version: str, refreshing: bool = False):
+        result = self._probe(ds, kind)
+        with self._lock:
+            entry = self._entries.get(ds.id)
+            if refreshing and (entry is None or entry.config_version != version):
+                # 刷新期间数据源已修改或被清除，丢弃旧配置的探测结果
+                return result
+            if entry is None or entry.config_version != version:
+                entry = _HealthEntry(version)
+                self._entries[ds.id] = entry
+            self._entries.move_to_end(ds.id)
+            # 连接失败不缓存；版本查询失败时返回空字符串，与原 get_version 一致，同样不缓存
+            if result:
+                entry.results[kind] = (time.monotonic(), result)
+            else:
+                entry.results.pop(kind, None)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, ds_id: Optional[int] = None):
+        """清除某个数据源（不传则全部）的探测结果"""
+        with self._lock:
+            if ds_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(ds_id, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': settings.DATASOURCE_HEALTH_ENABLED,
+                'size': len(self._entries),
+                'ttl': settings.DATASOURCE_HEALTH_TTL,
+                'stale_ttl': settings.DATASOURCE_HEALTH_STALE_TTL,
+                'version_ttl': settings.DATASOURCE_VERSION_TTL,
+                'hits': self._hits,
+                'stale_hits': self._stale_hits,
+                'probes': self._probes,
+                'probe_failures': self._probe_failures,
+                'background_refreshes': self._background_refreshes,
+            }
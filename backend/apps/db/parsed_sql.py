@@ -0,0 +1,263 @@
+"""
+SQL 解析上下文
+
+同一条 SQL 在生成、校验、改写、执行、缓存各环节只按 dialect 解析一次：
+    ParsedSQL 记录 SQL 文本，按 dialect 缓存 sqlglot 解析出的语法树（解析失败时缓存异常），
+    只读校验、危险函数检查、表名提取、规范化与格式化都基于同一份结果；
+    parse_sql 按 SQL 文本做进程内 LRU，看板、实时数据等重复执行的 SQL 直接复用。
+语法树在多个调用方之间共享，只能读取，需要改写时先 copy()。
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import sqlglot
+import sqlparse
+from sqlglot import exp
+from sqlglot.errors import ErrorLevel
+
+from common.core.config import settings
+from common.utils.utils import equals_ignore_case
+
+
+def get_sqlglot_dialect(ds_type: str) -> str:
+    """根据数据源类型获取 sqlglot dialect"""
+    if equals_ignore_case(ds_type, 'mysql', 'doris', 'starrocks'):
+        return 'mysql'
+    elif equals_ignore_case(ds_type, 'sqlServer'):
+        return 'tsql'
+    elif equals_ignore_case(ds_type, 'hive'):
+        return 'hive'
+    return None
+
+
+# 通用危险函数（适用于所有数据库）
+COMMON_DANGEROUS_FUNCTIONS = {'version', 'current_user', 'user', 'database'}
+
+# 特定数据库的危险函数
+DS_SPECIFIC_DANGEROUS_FUNCTIONS = {
+    'mysql': {'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'},
+    'doris': {'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'},
+    'starrocks': {'LOAD_FILE', 'INTO OUTFILE', 'INTO DUMPFILE'},
+    'postgresql': {'pg_read_file', 'pg_write_file', 'lo_import', 'lo_export'},
+    'sqlserver': {'EXEC', 'xp_cmdshell', 'sp_executesql'},
+    'oracle': {'UTL_FILE', 'DBMS_PIPE', 'DBMS_LOCK'},
+    'hive': {'ADD FILE', 'ADD JAR'},
+}
+
+# 危险模式正则表达式（用于检查特殊语法）
+DANGEROUS_PATTERNS = [
+    r'\bINTO\s+OUTFILE\b',
+    r'\bINTO\s+DUMPFILE\b',
+    r'\bEXEC\s*\(',
+    r'\bCOPY\s+.*\bTO\s+PROGRAM\b',
+]
+_DANGEROUS_REGEXES = [(pattern, re.compile(pattern, re.IGNORECASE)) for pattern in DANGEROUS_PATTERNS]
+
+DENIED_WRITE_COMMANDS = {
+    "INSERT", "UPDATE", "DELETE", "CREATE", "DROP", "ALTER",
+    "TRUNCATE", "MERGE", "COPY", "REPLACE", "GRANT", "REVOKE",
+    "USE", "SET", "CALL"
+}
+
+WRITE_TYPES = (
+    exp.Insert, exp.Update, exp.Delete,
+    exp.Create, exp.Drop, exp.Alter,
+    exp.Merge, exp.Copy
+)
+
+
+def get_dangerous_functions(ds_type: str) -> set:
+    """获取危险函数（通用 + 特定数据源）"""
+    functions = COMMON_DANGEROUS_FUNCTIONS.copy()
+    ds_key = ds_type.lower() if ds_type else ''
+    if ds_key in DS_SPECIFIC_DANGEROUS_FUNCTIONS:
+        functions.update(DS_SPECIFIC_DANGEROUS_FUNCTIONS[ds_key])
+    return functions
+
+
+def check_dangerous_functions(statements: list, ds_type: str) -> bool:
+    """检查是否使用了危险函数，返回 True 表示安全"""
+    return find_dangerous_function(statements, ds_type) is None
+
+
+def find_dangerous_function(statements: list, ds_type: str) -> Optional[str]:
+    """返回第一个危险函数调用的函数名，没有时返回 None"""
+    dangerous_functions_upper = {f.upper() for f in get_dangerous_functions(ds_type)}
+    for stmt in statements:
+        if stmt:
+            for func in stmt.find_all(exp.Anonymous):
+                if func.name.upper() in dangerous_functions_upper:
+                    return func.name
+    return None
+
+
+class ParsedSQL:
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self._lock = threading.Lock()
+        # dialect -> 语法树列表或解析异常
+        self._statements: dict[Optional[str], list | Exception] = {}
+        self._memo: dict[tuple, Any] = {}
+
+    def statements(self, dialect: Optional[str] = None) -> list:
+        """按 dialect 解析（只解析一次），解析失败时抛出首次解析的异常"""
+        result = self._statements.get(dialect)
+        if result is None:
+            with self._lock:
+                result = self._statements.get(dialect)
+                if result is None:
+                    try:
+                        result = sqlglot.parse(self.sql, dialect=dialect, error_level=ErrorLevel.RAISE)
+                    except Exception as e:
+                        result = e
+                    self._statements[dialect] = result
+        if isinstance(result, Exception):
+            raise result.with_traceback(None)
+        return result
+
+    def _memoize(self, key: tuple, fn):
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def check_read(self, ds_type: Optional[str]) -> tuple[bool, str]:
+        """
+        检查 SQL 是否为安全的只读查询
+        返回: (是否安全, 错误原因)；无法解析时抛出 ValueError
+        """
+        allow_metadata = settings.SQLBOT_ALLOW_METADATA_QUERIES
+        result = self._memoize(('check_read', ds_type.lower() if ds_type else '', allow_metadata),
+                               lambda: self._check_read(ds_type, allow_metadata))
+        if isinstance(result, Exception):
+            raise result.with_traceback(None)
+        return result
+
+    def _check_read(self, ds_type: Optional[str], allow_metadata: bool) -> tuple[bool, str] | Exception:
+        try:
+            normalized_sql = self.sql.strip().lstrip("(").strip()
+            first_keyword = normalized_sql.split(None, 1)[0].upper() if normalized_sql else ""
+
+            # 根据配置决定是否允许元数据查询
+            if allow_metadata:
+                allowed_read_commands = {"SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"}
+            else:
+                allowed_read_commands = {"SELECT", "WITH"}
+
+            if not first_keyword:
+                raise ValueError("Parse SQL Error")
+            if first_keyword in DENIED_WRITE_COMMANDS:
+                return False, f"Write operation '{first_keyword}' is not allowed"
+
+            # 1. 使用正则检查特殊模式
+            for pattern, regex in _DANGEROUS_REGEXES:
+                if regex.search(self.sql):
+                    return False, f"SQL contains dangerous pattern: {pattern}"
+
+            statements = self.statements(get_sqlglot_dialect(ds_type))
+            if not statements:
+                raise ValueError("Parse SQL Error")
+
+            # 2. 使用 sqlglot 检查函数调用
+            func_name = find_dangerous_function(statements, ds_type)
+            if func_name is not None:
+                return False, f"SQL contains dangerous function: {func_name}"
+
+            # 3. 检查写操作类型
+            for stmt in statements:
+                if stmt is None:
+                    continue
+                if isinstance(stmt, WRITE_TYPES):
+                    return False, f"SQL contains write operation: {type(stmt).__name__}"
+
+            if first_keyword not in allowed_read_commands:
+                return False, f"SQL command '{first_keyword}' is not allowed. Only SELECT and WITH are permitted"
+
+            return True, ""
+
+        except Exception as e:
+            return ValueError(f"Parse SQL Error: {e}")
+
+    def dangerous_function(self, ds_type: Optional[str]) -> Optional[str]:
+        """危险函数调用的函数名，没有时返回 None"""
+        return self._memoize(('dangerous_function', ds_type.lower() if ds_type else ''),
+                             lambda: find_dangerous_function(self.statements(get_sqlglot_dialect(ds_type)), ds_type))
+
+    def tables(self, ds_type: Optional[str] = None) -> set:
+        """SQL 中引用的表名，无法解析时返回空集合"""
+
+        def _tables():
+            tables = set()
+            try:
+                for stmt in self.statements(get_sqlglot_dialect(ds_type)):
+                    if stmt:
+                        for table in stmt.find_all(exp.Table):
+                            if table.name:
+                                tables.add(table.name)
+            except Exception:
+                pass
+            return frozenset(tables)
+
+        return set(self._memoize(('tables', get_sqlglot_dialect(ds_type)), _tables))
+
+    def normalized(self, dialect: Optional[str] = None) -> str:
+        """sqlglot 规范化（关键字大小写、空白等），无法完整解析时退化为空白折叠"""
+
+        def _normalized():
+            try:
+                statements = [stmt.sql(dialect=dialect, unsupported_level=ErrorLevel.RAISE) if stmt else ''
+                              for stmt in self.statements(dialect)]
+                if statements:
+                    return ';'.join(statements)
+            except Exception:
+                pass
+            return ' '.join(self.sql.split())
+
+        return self._memoize(('normalized', dialect), _normalized)
+
+    def pretty(self) -> str:
+        """展示用的格式化 SQL（sqlparse 重新缩进，保留原 SQL 的写法）"""
+        return self._memoize(('pretty',), lambda: sqlparse.format(self.sql, reindent=True))
+
+
+class ParsedSQLCache:
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, ParsedSQL] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, sql: str) -> ParsedSQL:
+        with self._lock:
+            parsed = self._items.get(sql)
+            if parsed is not None:
+                self._items.move_to_end(sql)
+                self._hits += 1
+                return parsed
+            self._misses += 1
+            parsed = ParsedSQL(sql)
+            if self.max_size > 0:
+                self._items[sql] = parsed
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+            return parsed
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._items), 'max_size': self.max_size, 'hits': self._hits, 'misses': self._misses}
+
+
+parsed_sql_cache = ParsedSQLCache(settings.SQL_PARSE_CACHE_SIZE)
+
+
+def parse_sql(sql: str) -> ParsedSQL:
+    """获取 SQL 的解析上下文，相同 SQL 文本共用一份"""
+    return parsed_sql_cache.get(sql)
@@ -0,0 +1,224 @@
+"""
+数据源连接池管理
+
+SQLAlchemy 引擎与驱动连接池（DBUtils PooledDB）统一管理：
+    键为 (池类型, 数据源 ID)，同时记录配置版本，数据源配置变化后释放旧连接池并按新配置重建；
+    连接池被淘汰、空闲超时或数据源修改/删除时调用 dispose 真正关闭连接（engine.dispose / PooledDB.close）；
+    所有数据源的连接数上限（容量）之和不超过 DS_POOL_MAX_TOTAL_CONNECTIONS，新建连接池前先按 LRU 释放
+    没有借出连接的连接池，仍不足时按剩余额度缩小新连接池（至少 1 个连接，保证数据源可用）。
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from apps.db.result_cache import config_version
+from common.utils.utils import SQLBotLogUtil
+
+POOL_ENGINE = 'engine'
+POOL_DRIVER = 'driver'
+
+
+@dataclass
+class PoolKind:
+    """
+    capacity(ds, *args) -> int：按数据源配置期望的最大连接数
+    create(ds, max_connections, *args) -> (handle, resource)：创建连接池，handle 返回给调用方，resource 用于统计与释放
+    usage(resource) -> (借出连接数, 空闲连接数)
+    dispose(resource)：关闭连接池中的全部连接
+    """
+    capacity: Callable[..., int]
+    create: Callable[..., tuple[Any, Any]]
+    usage: Callable[[Any], tuple[int, int]]
+    dispose: Callable[[Any], None]
+
+
+@dataclass
+class _PoolEntry:
+    kind: str
+    ds_id: Any
+    ds_name: Optional[str]
+    config_version: str
+    handle: Any
+    resource: Any
+    capacity: int
+    last_used: float
+
+
+class DatasourcePoolManager:
+
+    def __init__(self, max_pools: int, max_total_connections: int, idle_timeout: int, sweep_interval: int = 60):
+        self.max_pools = max_pools
+        self.max_total_connections = max_total_connections
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.kinds: dict[str, PoolKind] = {}
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, Any], _PoolEntry] = OrderedDict()
+        self._reserved = 0
+        self._last_sweep = time.monotonic()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._created = 0
+        self._disposed = 0
+        self._idle_evictions = 0
+        self._budget_evictions = 0
+        self._shrunk = 0
+
+    def register(self, kind: str, pool_kind: PoolKind):
+        self.kinds[kind] = pool_kind
+
+    def get_pool(self, kind: str, ds, *args):
+        """返回数据源的连接池（不存在或配置已变化时创建），args 透传给 capacity / create"""
+        version = config_version(ds)
+        key = (kind, ds.id)
+        now = time.monotonic()
+        disposing = []
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = now
+                disposing.extend(self._pop_idle(now))
+
+            entry = self._entries.get(key)
+            if entry is not None and entry.config_version == version:
+                self._entries.move_to_end(key)
+                entry.last_used = now
+                handle = entry.handle
+            else:
+                if entry is not None:
+                    SQLBotLogUtil.info(f'[Pool] config changed, rebuild: {kind} {ds.id}')
+                    disposing.append(self._pop(key))
+                handle = self._create(kind, key, ds, version, now, args, disposing)
+        self._dispose_all(disposing)
+        return handle
+
+    def _create(self, kind: str, key, ds, version: str, now: float, args: tuple, disposing: list):
+        pool_kind = self.kinds[kind]
+        if len(self._entries) >= self.max_pools:
+            disposing.append(self._pop(self._lru_key()))
+
+        requested = max(1, pool_kind.capacity(ds, *args))
+        for lru_key in [k for k in self._entries]:
+            if self.max_total_connections - self._reserved >= requested:
+                break
+            if self._usage(self._entries[lru_key])[0] == 0:
+                disposing.append(self._pop(lru_key))
+                self._budget_evictions += 1
+        max_connections = min(requested, max(1, self.max_total_connections - self._reserved))
+        if max_connections < requested:
+            self._shrunk += 1
+            SQLBotLogUtil.warning(f'[Pool] connection budget exhausted, {kind} pool of datasource {ds.id} '
+                                  f'limited to {max_connections} connections (requested {requested})')
+
+        handle, resource = pool_kind.create(ds, max_connections, *args)
+        self._entries[key] = _PoolEntry(kind, ds.id, getattr(ds, 'name', None), version, handle, resource,
+                                        max_connections, now)
+        self._reserved += max_connections
+        self._created += 1
+        SQLBotLogUtil.info(f'[Pool] create: {kind} {ds.id}, max connections {max_connections}')
+        return handle
+
+    def _lru_key(self):
+        # 优先淘汰没有借出连接的连接池
+        for key, entry in self._entries.items():
+            if self._usage(entry)[0] == 0:
+                return key
+        return next(iter(self._entries))
+
+    def _pop(self, key) -> _PoolEntry:
+        entry = self._entries.pop(key)
+        self._reserved -= entry.capacity
+        return entry
+
+    def _pop_idle(self, now: float) -> list[_PoolEntry]:
+        idle = [key for key, entry in self._entries.items()
+                if now - entry.last_used >= self.idle_timeout and self._usage(entry)[0] == 0]
+        self._idle_evictions += len(idle)
+        return [self._pop(key) for key in idle]
+
+    def _usage(self, entry: _PoolEntry) -> tuple[int, int]:
+        try:
+            return self.kinds[entry.kind].usage(entry.resource)
+        except Exception:
+            return 0, 0
+
+    def _dispose_all(self, entries: list[_PoolEntry]):
+        # 在锁外关闭连接，避免网络操作阻塞其它数据源取连接池
+        for entry in entries:
+            try:
+                self.kinds[entry.kind].dispose(entry.resource)
+                SQLBotLogUtil.info(f'[Pool] dispose: {entry.kind} {entry.ds_id}')
+            except Exception as e:
+                SQLBotLogUtil.warning(f'[Pool] dispose {entry.kind} {entry.ds_id} failed: {e}')
+        if entries:
+            with self._lock:
+                self._disposed += len(entries)
+
+    def evict_idle(self):
+        """释放空闲超时且没有借出连接的连接池"""
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            disposing = self._pop_idle(self._last_sweep)
+        self._dispose_all(disposing)
+
+    def start_sweeper(self):
+        """启动后台线程定期释放空闲连接池，没有新请求时空闲连接也能按时关闭"""
+        if self._sweeper is not None:
+            return
+        self._stop.clear()
+
+        def _run():
+            while not self._stop.wait(self.sweep_interval):
+                try:
+                    self.evict_idle()
+                except Exception as e:
+                    SQLBotLogUtil.warning(f'[Pool] idle sweep failed: {e}')
+
+        self._sweeper = threading.Thread(target=_run, name='datasource-pool-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def invalidate(self, ds_id: Any = None):
+        """释放某个数据源（不传则全部）的连接池"""
+        with self._lock:
+            disposing = [self._pop(key) for key in [k for k in self._entries if ds_id is None or k[1] == ds_id]]
+        self._dispose_all(disposing)
+
+    def close_all(self):
+        self._stop.set()
+        self._sweeper = None
+        self.invalidate()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            entries = list(self._entries.values())
+            result = {
+                'pools': len(entries),
+                'max_pools': self.max_pools,
+                'reserved_connections': self._reserved,
+                'max_total_connections': self.max_total_connections,
+                'idle_timeout': self.idle_timeout,
+                'created': self._created,
+                'disposed': self._disposed,
+                'idle_evictions': self._idle_evictions,
+                'budget_evictions': self._budget_evictions,
+                'shrunk': self._shrunk,
+            }
+        now = time.monotonic()
+        datasources = []
+        for entry in entries:
+            checked_out, idle = self._usage(entry)
+            datasources.append({
+                'kind': entry.kind,
+                'datasource': entry.ds_id,
+                'name': entry.ds_name,
+                'max_connections': entry.capacity,
+                'checked_out': checked_out,
+                'idle': idle,
+                'idle_seconds': round(now - entry.last_used, 1),
+            })
+        result['checked_out'] = sum(item['checked_out'] for item in datasources)
+        result['idle'] = sum(item['idle'] for item in datasources)
+        result['datasources'] = datasources
+        return result
@@ -0,0 +1,187 @@
+"""
+SQL 查询结果缓存
+
+缓存键：数据源 ID + 配置版本（类型与连接配置的哈希）+ sqlglot 规范化后的 SQL + 行权限过滤条件 + 列名大小写模式
+一级为进程内 LRU，CACHE_TYPE=redis 时增加 Redis 二级缓存供多进程共享；
+数据源修改/删除时调用 invalidate 清除该数据源的全部结果。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+
+from apps.datasource.models.datasource import CoreDatasource
+from apps.db.parsed_sql import parse_sql
+from common.core.config import settings
+from common.utils.utils import SQLBotLogUtil
+
+REDIS_KEY_PREFIX = 'sqlbot:sql_result:v2:'
+
+
+def normalize_sql(sql: str, dialect: Optional[str] = None) -> str:
+    """sqlglot 规范化（关键字大小写、空白等），无法完整解析时退化为空白折叠"""
+    return parse_sql(sql).normalized(dialect)
+
+
+def config_version(ds: CoreDatasource) -> str:
+    return hashlib.sha1(f'{ds.type}|{ds.configuration}'.encode('utf-8')).hexdigest()[:16]
+
+
+class SQLResultCache:
+
+    def __init__(self, max_size: int, default_ttl: int, max_entry_bytes: int):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        # key -> (expire_at, ds_id, 序列化后的结果)
+        self._items: OrderedDict[str, tuple[float, int, bytes]] = OrderedDict()
+        self._redis = None
+        self._redis_inited = False
+
+        self._hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+        self._puts = 0
+        self._skipped = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def enabled_for(self, ds) -> bool:
+        return (settings.SQL_RESULT_CACHE_ENABLED and isinstance(ds, CoreDatasource) and ds.id is not None
+                and self.ttl_for(ds) > 0)
+
+    def ttl_for(self, ds: CoreDatasource) -> int:
+        """SQL_RESULT_CACHE_TTL_OVERRIDES 可按数据源 ID 或数据源类型覆盖默认 TTL，ID 优先"""
+        overrides = settings.SQL_RESULT_CACHE_TTL_OVERRIDES or {}
+        if str(ds.id) in overrides:
+            return int(overrides[str(ds.id)])
+        if ds.type and ds.type.lower() in overrides:
+            return int(overrides[ds.type.lower()])
+        return self.default_ttl
+
+    @staticmethod
+    def build_key(ds: CoreDatasource, sql: str, origin_column: bool = False, filters: Optional[list] = None,
+                  dialect: Optional[str] = None) -> str:
+        filters_text = orjson.dumps(filters or [], option=orjson.OPT_SORT_KEYS, default=str).decode()
+        digest = hashlib.sha256(
+            f'{normalize_sql(sql, dialect)}\n{filters_text}\n{bool(origin_column)}'.encode('utf-8')).hexdigest()
+        return f'{ds.id}:{config_version(ds)}:{digest}'
+
+    def _get_redis(self):
+        if self._redis_inited:
+            return self._redis
+        self._redis_inited = True
+        if settings.SQL_RESULT_CACHE_REDIS_ENABLED and settings.CACHE_TYPE == 'redis':
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(settings.CACHE_REDIS_URL or 'redis://localhost:6379/0')
+            except Exception as e:
+                SQLBotLogUtil.error(f'SQL result cache redis init failed: {e}')
+        return self._redis
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                if item[0] >= now:
+                    self._items.move_to_end(key)
+                    self._hits += 1
+                    return orjson.loads(item[2])
+                del self._items[key]
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                raw = client.get(REDIS_KEY_PREFIX + key)
+                ttl = client.ttl(REDIS_KEY_PREFIX + key) if raw is not None else 0
+            except Exception as e:
+                SQLBotLogUtil.warning(f'SQL result cache redis get failed: {e}')
+                raw = None
+            if raw is not None:
+                with self._lock:
+                    self._redis_hits += 1
+                if ttl and ttl > 0:
+                    self._put_local(key, int(key.split(':', 1)[0]), raw, ttl)
+                return orjson.loads(raw)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key: str, ds: CoreDatasource, value: dict[str, Any]):
+        try:
+            raw = orjson.dumps(value, default=str)
+        except Exception as e:
+            SQLBotLogUtil.warning(f'SQL result cache serialize failed: {e}')
+            return
+        if len(raw) > self.max_entry_bytes:
+            with self._lock:
+                self._skipped += 1
+            return
+        ttl = self.ttl_for(ds)
+        self._put_local(key, ds.id, raw, ttl)
+        with self._lock:
+            self._puts += 1
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.set(REDIS_KEY_PREFIX + key, raw, ex=ttl)
+            except Exception as e:
+                SQLBotLogUtil.warning(f'SQL result cache redis set failed: {e}')
+
+    def _put_local(self, key: str, ds_id: int, raw: bytes, ttl: int):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, ds_id, raw)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, ds_id: Optional[int] = None):
+        """清除某个数据源（不传则全部）的缓存结果"""
+        with self._lock:
+            if ds_id is None:
+                self._items.clear()
+            else:
+                for key in [k for k, v in self._items.items() if v[1] == ds_id]:
+                    del self._items[key]
+            self._invalidations += 1
+
+        client = self._get_redis()
+        if client is not None:
+            pattern = f'{REDIS_KEY_PREFIX}{ds_id}:*' if ds_id is not None else f'{REDIS_KEY_PREFIX}*'
+            try:
+                keys = list(client.scan_iter(match=pattern, count=500))
+                if keys:
+                    client.delete(*keys)
+            except Exception as e:
+                SQLBotLogUtil.warning(f'SQL result cache redis invalidate failed: {e}')
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._redis_hits + self._misses
+            return {
+                'enabled': settings.SQL_RESULT_CACHE_ENABLED,
+                'redis': self._redis is not None,
+                'size': len(self._items),
+                'max_size': self.max_size,
+                'default_ttl': self.default_ttl,
+                'hits': self._hits,
+                'redis_hits': self._redis_hits,
+                'misses': self._misses,
+                'puts': self._puts,
+                'skipped_too_large': self._skipped,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'hit_rate': round((self._hits + self._redis_hits) / total, 4) if total else 0.0,
+            }
+
+
+sql_result_cache = SQLResultCache(settings.SQL_RESULT_CACHE_SIZE, settings.SQL_RESULT_CACHE_TTL,
+                                  settings.SQL_RESULT_CACHE_MAX_ENTRY_BYTES)
@@ -0,0 +1,78 @@
+from typing import Any, Optional
+
+
+class ColumnarResult:
+    """
+    列式查询结果
+
+    fields: 列名（即原结果中的 fields）；fields_info: 字段信息
+    keys / columns: 行数据的键与对应的整列数据，keys 可能比 fields 多出别名键（与原列共享同一个 list，不复制）
+    执行、大数字转换、别名补全、pandas 等阶段直接按列处理，只在 JSON 接口、持久化等边界通过 rows() / to_dict() 生成 [{键: 值}]
+    """
+
+    __slots__ = ('fields', 'fields_info', 'keys', 'columns', 'sql', 'truncated')
+
+    def __init__(self, fields: list, columns: list[list], fields_info: Optional[list] = None,
+                 sql: Optional[str] = None, truncated: bool = False, keys: Optional[list[str]] = None):
+        self.fields = fields
+        self.fields_info = fields_info
+        self.keys = keys if keys is not None else [str(field) for field in fields]
+        self.columns = columns
+        self.sql = sql
+        self.truncated = truncated
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def key_index(self) -> dict[str, int]:
+        """键 -> 列下标，键重复时与 dict(zip(keys, row)) 一样取最后一列"""
+        return {key: idx for idx, key in enumerate(self.keys)}
+
+    def column(self, key: str) -> Optional[list]:
+        idx = self.key_index().get(key)
+        return self.columns[idx] if idx is not None else None
+
+    def add_alias(self, key: str, source_idx: int):
+        self.keys.append(key)
+        self.columns.append(self.columns[source_idx])
+
+    def head(self, limit: int) -> 'ColumnarResult':
+        """前 limit 行，别名列仍与原列共享"""
+        sliced = {}
+        columns = []
+        for values in self.columns:
+            if id(values) not in sliced:
+                sliced[id(values)] = values[:limit]
+            columns.append(sliced[id(values)])
+        return ColumnarResult(self.fields, columns, self.fields_info, self.sql, self.truncated, list(self.keys))
+
+    def rows(self) -> list[dict]:
+        return [dict(zip(self.keys, values)) for values in zip(*self.columns)]
+
+    def records(self, keys: list[str]) -> list[list]:
+        """按 keys 顺序取出每行的值（不存在的键为 None），用于构建 DataFrame"""
+        index = self.key_index()
+        empty = [None] * len(self)
+        return [list(values) for values in
+                zip(*[self.columns[index[key]] if key in index else empty for key in keys])]
+
+    def to_dict(self) -> dict[str, Any]:
+        """原 exec_sql 返回的结构：{"fields", "data": [{键: 值}], "fields_info", "sql", "truncated"}"""
+        return {"fields": self.fields, "data": self.rows(), "fields_info": self.fields_info, "sql": self.sql,
+                "truncated": self.truncated}
+
+    def to_cache(self) -> dict[str, Any]:
+        return {"fields": self.fields, "keys": self.keys, "columns": self.columns, "fields_info": self.fields_info,
+                "sql": self.sql, "truncated": self.truncated}
+
+    @classmethod
+    def from_cache(cls, value: dict[str, Any]) -> 'ColumnarResult':
+        return cls(value['fields'], value['columns'], value.get('fields_info'), value.get('sql'),
+                   value.get('truncated', False), value.get('keys'))
+
+    @classmethod
+    def from_rows(cls, fields: list, data: list[dict], fields_info: Optional[list] = None,
+                  sql: Optional[str] = None) -> 'ColumnarResult':
+        keys = [str(field) for field in fields]
+        columns = [[row.get(key) for row in data] for key in keys]
+        return cls(fields, columns, fields_info, sql, keys=keys)
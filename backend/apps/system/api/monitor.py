@@ -0,0 +1,74 @@
+from fastapi import APIRouter
+
+from apps.ai_model.embedding import embedding_query_cache
+from apps.datasource.crud.permission import permission_plan_cache
+from apps.datasource.crud.schema_prompt import schema_prompt_cache
+from apps.datasource.utils.excel_import import excel_import_progress
+from apps.db.db import datasource_health, pool_manager
+from apps.db.parsed_sql import parsed_sql_cache
+from apps.db.result_cache import sql_result_cache
+from apps.system.schemas.permission import SqlbotPermission, require_permissions
+from common.audit.schemas.log_writer import audit_log_writer
+from common.core.task_scheduler import task_scheduler
+
+router = APIRouter(tags=["system/monitor"], prefix="/system/monitor", include_in_schema=False)
+
+
+@router.get("/embedding")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def embedding_cache_stats():
+    return embedding_query_cache.stats()
+
+
+@router.get("/tasks")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def task_scheduler_stats():
+    return task_scheduler.stats()
+
+
+@router.get("/sql-cache")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def sql_result_cache_stats():
+    return sql_result_cache.stats()
+
+
+@router.get("/datasource-health")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def datasource_health_stats():
+    return datasource_health.stats()
+
+
+@router.get("/datasource-pools")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def datasource_pool_stats():
+    return pool_manager.stats()
+
+
+@router.get("/permission-plans")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def permission_plan_stats():
+    return permission_plan_cache.stats()
+
+
+@router.get("/schema-prompts")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def schema_prompt_stats():
+    return schema_prompt_cache.stats()
+
+
+@router.get("/sql-parse")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def parsed_sql_stats():
+    return parsed_sql_cache.stats()
+
+
+@router.get("/audit-log")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def audit_log_writer_stats():
+    return audit_log_writer.stats()
+
+
+@router.get("/excel-import")
+@require_permissions(permission=SqlbotPermission(role=['admin']))
+async def excel_import_stats():
+    return excel_import_progress.stats()
@@ -7,6 +7,7 @@ from fastapi import HTTPException
 from sqlalchemy import and_
 from sqlmodel import select
 
+from apps.datasource.crud.permission import permission_plan_cache
 from apps.system.models.system_variable_model import SystemVariable
 from common.core.deps import SessionDep, CurrentUser, Trans
 from common.core.pagination import Paginator
@@ -28,11 +29,14 @@ def save(session: SessionDep, user: CurrentUser, trans: Trans, variable: SystemV
             setattr(record, field, value)
         session.add(record)
         session.commit()
+        # 行权限条件中引用了系统变量的值
+        permission_plan_cache.invalidate()
     return True
 
 
 def delete(session: SessionDep, ids: List[int]):
     session.query(SystemVariable).filter(SystemVariable.id.in_(ids)).delete()
+    permission_plan_cache.invalidate()
 
 
 def list_all(session: SessionDep, trans: Trans, variable: SystemVariable):
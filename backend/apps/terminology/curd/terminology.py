@@ -8,7 +8,8 @@ import dicttoxml
 from sqlalchemy import and_, or_, select, func, delete, update, union, text, BigInteger
 from sqlalchemy.orm import aliased
 
-from apps.ai_model.embedding import EmbeddingModelCache
+from apps.ai_model.embedding import EmbeddingModelCache, embed_question
+from apps.ai_model.vector_index import prepare_vector_search, render_search_sql
 from apps.datasource.models.datasource import CoreDatasource
 from apps.system.models.system_model import AssistantModel
 from apps.template.generate_chart.generator import get_base_terminology_template
@@ -371,7 +372,7 @@ def create_terminology(session: SessionDep, info: TerminologyInfo, oid: int, tra
 
     # 处理embedding（批量插入时跳过）
     if not skip_embedding:
-        run_save_terminology_embeddings([parent.id])
+        run_save_terminology_embeddings([parent.id], oid)
 
     return parent.id
 
@@ -548,7 +549,7 @@ def batch_create_terminology(session: SessionDep, info_list: List[TerminologyInf
         # 批量处理embedding（只在最后执行一次）
         if success_count > 0 and inserted_ids:
             try:
-                run_save_terminology_embeddings(inserted_ids)
+                run_save_terminology_embeddings(inserted_ids, oid)
             except Exception as e:
                 # 如果embedding处理失败，记录错误但不回滚数据
                 print(f"Terminology embedding processing failed: {str(e)}")
@@ -698,7 +699,7 @@ def update_terminology(session: SessionDep, info: TerminologyInfo, oid: int, tra
     session.commit()
 
     # embedding
-    run_save_terminology_embeddings([info.id])
+    run_save_terminology_embeddings([info.id], oid)
 
     return info.id
 
@@ -782,44 +783,50 @@ def save_embeddings(session_maker, ids: List[int]):
 embedding_sql = f"""
 SELECT id, pid, word, similarity
 FROM
-(SELECT id, pid, word, oid, specific_ds, datasource_ids, enabled,
-( 1 - (embedding <=> :embedding_array) ) AS similarity
+(SELECT id, pid, word,
+( 1 - ({{embedding_distance}}) ) AS similarity
 FROM terminology AS child
-) TEMP
-WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY} AND oid = :oid AND enabled = true
+WHERE oid = :oid AND enabled = true AND {{embedding_filter}}
 AND (specific_ds = false OR specific_ds IS NULL)
-ORDER BY similarity DESC
+ORDER BY {{embedding_distance}}
 LIMIT {settings.EMBEDDING_TERMINOLOGY_TOP_COUNT}
+) TEMP
+WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY}
+ORDER BY similarity DESC
 """
 
 embedding_sql_with_datasource = f"""
 SELECT id, pid, word, similarity
 FROM
-(SELECT id, pid, word, oid, specific_ds, datasource_ids, enabled,
-( 1 - (embedding <=> :embedding_array) ) AS similarity
+(SELECT id, pid, word,
+( 1 - ({{embedding_distance}}) ) AS similarity
 FROM terminology AS child
-) TEMP
-WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY} AND oid = :oid AND enabled = true
+WHERE oid = :oid AND enabled = true AND {{embedding_filter}}
 AND (
     (specific_ds = false OR specific_ds IS NULL)
      OR
     (specific_ds = true AND datasource_ids IS NOT NULL AND datasource_ids @> jsonb_build_array(:datasource))
 )
-ORDER BY similarity DESC
+ORDER BY {{embedding_distance}}
 LIMIT {settings.EMBEDDING_TERMINOLOGY_TOP_COUNT}
+) TEMP
+WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY}
+ORDER BY similarity DESC
 """
 
 embedding_sql_with_advanced_application = f"""
 SELECT id, pid, word, similarity
 FROM
-(SELECT id, pid, word, oid, specific_ds, advanced_application, enabled,
-( 1 - (embedding <=> :embedding_array) ) AS similarity
+(SELECT id, pid, word,
+( 1 - ({{embedding_distance}}) ) AS similarity
 FROM terminology AS child
-) TEMP
-WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY} AND oid = :oid AND enabled = true
+WHERE oid = :oid AND enabled = true AND {{embedding_filter}}
 AND advanced_application = :advanced_application_id
-ORDER BY similarity DESC
+ORDER BY {{embedding_distance}}
 LIMIT {settings.EMBEDDING_TERMINOLOGY_TOP_COUNT}
+) TEMP
+WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY}
+ORDER BY similarity DESC
 """
 
 
@@ -870,20 +877,19 @@ def select_terminology_by_word(session: SessionDep, word: str, oid: int, datasou
     if settings.EMBEDDING_ENABLED:
         with session.begin_nested():
             try:
-                model = EmbeddingModelCache.get_model()
-
-                embedding = model.embed_query(word)
+                embedding = embed_question(word)
 
+                dimension = prepare_vector_search(session, 'terminology', embedding)
                 if advanced_application_id is not None:
-                    results = session.execute(text(embedding_sql_with_advanced_application),
+                    results = session.execute(text(render_search_sql(embedding_sql_with_advanced_application, dimension)),
                                               {'embedding_array': str(embedding), 'oid': oid,
                                                'advanced_application_id': advanced_application_id}).fetchall()
                 elif datasource is not None:
-                    results = session.execute(text(embedding_sql_with_datasource),
+                    results = session.execute(text(render_search_sql(embedding_sql_with_datasource, dimension)),
                                               {'embedding_array': str(embedding), 'oid': oid,
                                                'datasource': datasource}).fetchall()
                 else:
-                    results = session.execute(text(embedding_sql),
+                    results = session.execute(text(render_search_sql(embedding_sql, dimension)),
                                               {'embedding_array': str(embedding), 'oid': oid}).fetchall()
 
                 for row in results:
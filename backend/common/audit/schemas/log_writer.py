@@ -0,0 +1,205 @@
+"""
+操作日志异步批量写入
+
+system_log 装饰器只把日志放入有界队列（不阻塞事件循环、不占用请求的数据库连接），
+后台线程按 AUDIT_LOG_BATCH_SIZE 条或 AUDIT_LOG_FLUSH_INTERVAL 秒攒批，一个事务内批量插入
+sys_logs、sys_logs_resource，并批量回填删除操作的资源名称；批量写入失败时逐条重试，只丢弃出错的日志。
+队列满时丢弃新日志并计数；从入队到写入超过 AUDIT_LOG_LAG_WARNING 秒的日志计为延迟；
+应用关闭时写完队列中剩余的日志。
+"""
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from sqlalchemy import and_, bindparam, update
+from sqlmodel import Session
+
+from common.audit.models.log_model import SystemLog, SystemLogsResource
+from common.core.config import settings
+from common.utils.utils import SQLBotLogUtil
+
+
+@dataclass
+class AuditLogEntry:
+    log: SystemLog
+    resource_ids: list[str]
+    module: Optional[str] = None
+    # 删除操作：[{"resource_id", "resource_name", "module"}]，写入后回填同一资源历史日志的资源名称
+    resource_info_list: Optional[list[dict]] = None
+    enqueue_time: float = field(default_factory=time.monotonic)
+
+
+def write_audit_logs(session: Session, entries: list[AuditLogEntry]):
+    """一个事务内写入一批日志，调用方负责提交"""
+    logs = [entry.log for entry in entries]
+    session.add_all(logs)
+    session.flush()
+
+    resources = [SystemLogsResource(resource_id=resource_id, log_id=entry.log.id, module=entry.module)
+                 for entry in entries for resource_id in entry.resource_ids]
+    if resources:
+        session.add_all(resources)
+        session.flush()
+
+    names = [{'r_id': info['resource_id'], 'r_module': info['module'], 'r_name': info['resource_name']}
+             for entry in entries for info in entry.resource_info_list or []]
+    if names:
+        # Core UPDATE + executemany（ORM 的列表参数 UPDATE 要求按主键更新）
+        table = SystemLogsResource.__table__
+        session.execute(update(table).where(and_(
+            table.c.resource_id == bindparam('r_id'),
+            table.c.module == bindparam('r_module'),
+        )).values(resource_name=bindparam('r_name')), names)
+
+
+class AuditLogWriter:
+
+    def __init__(self, session_maker: Callable[[], Session], max_queue: int, batch_size: int,
+                 flush_interval: float, lag_warning: float):
+        self.session_maker = session_maker
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.lag_warning = lag_warning
+        self._queue: queue.Queue[Optional[AuditLogEntry]] = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._lagging = 0
+        self._batches = 0
+        self._max_lag = 0.0
+        self._last_lag = 0.0
+
+    def submit(self, entry: AuditLogEntry) -> bool:
+        """放入写入队列，队列已满时丢弃并返回 False"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+                dropped = self._dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                SQLBotLogUtil.warning(f'[AuditLog] queue full, {dropped} logs dropped')
+            return False
+
+    def write(self, entries: list[AuditLogEntry]):
+        """同步写入一批日志，失败时逐条重试"""
+        if not entries:
+            return
+        try:
+            with self.session_maker() as session:
+                write_audit_logs(session, entries)
+                session.commit()
+            failed = 0
+        except Exception as e:
+            SQLBotLogUtil.warning(f'[AuditLog] batch of {len(entries)} logs failed, retry one by one: {e}')
+            failed = 0
+            for entry in entries:
+                entry.log.id = None
+                try:
+                    with self.session_maker() as session:
+                        write_audit_logs(session, [entry])
+                        session.commit()
+                except Exception as item_error:
+                    failed += 1
+                    SQLBotLogUtil.error(f'[AuditLog] failed to write log: {item_error}')
+
+        now = time.monotonic()
+        lags = [now - entry.enqueue_time for entry in entries]
+        with self._lock:
+            self._batches += 1
+            self._written += len(entries) - failed
+            self._failed += failed
+            self._last_lag = lags[-1]
+            self._max_lag = max(self._max_lag, *lags)
+            lagging = sum(1 for lag in lags if lag > self.lag_warning)
+            self._lagging += lagging
+        if lagging:
+            SQLBotLogUtil.warning(f'[AuditLog] {lagging} logs written more than {self.lag_warning}s after the request')
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: list[AuditLogEntry] = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    entry = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            try:
+                self.write(batch)
+            except Exception as e:
+                SQLBotLogUtil.error(f'[AuditLog] writer error: {e}')
+        # 关闭前写完剩余日志
+        remaining = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None:
+                remaining.append(entry)
+        for index in range(0, len(remaining), self.batch_size):
+            self.write(remaining[index:index + self.batch_size])
+
+    def close(self, timeout: float = 10):
+        """停止后台线程，写完队列中剩余的日志"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # 队列已满时也要保证停止信号能放入
+        while True:
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                if not thread.is_alive():
+                    break
+        thread.join(timeout)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'written': self._written,
+                'batches': self._batches,
+                'dropped': self._dropped,
+                'failed': self._failed,
+                'lagging': self._lagging,
+                'last_lag': round(self._last_lag, 3),
+                'max_lag': round(self._max_lag, 3),
+            }
+
+
+def _session_maker() -> Session:
+    from common.core.db import engine
+
+    return Session(engine)
+
+
+audit_log_writer = AuditLogWriter(_session_maker, settings.AUDIT_LOG_QUEUE_SIZE, settings.AUDIT_LOG_BATCH_SIZE,
+                                  settings.AUDIT_LOG_FLUSH_INTERVAL, settings.AUDIT_LOG_LAG_WARNING)
@@ -9,12 +9,14 @@ from pydantic import BaseModel
 from sqlmodel import Session, select
 import traceback
 from sqlbot_xpack.audit.curd.audit import build_resource_union_query
-from common.audit.models.log_model import OperationType, OperationStatus, SystemLog, SystemLogsResource
+from common.audit.models.log_model import OperationType, OperationStatus, SystemLog
+from common.audit.schemas.log_writer import AuditLogEntry, audit_log_writer
 from common.audit.schemas.request_context import RequestContext
 from apps.system.crud.user import get_user_by_account
 from apps.system.schemas.system_schema import UserInfoDTO, BaseUserDTO
 from sqlalchemy import and_, select
 
+from common.core.config import settings
 from common.core.db import engine
 
 
@@ -447,39 +449,23 @@ class SystemLogger:
             )
 
 
-            with Session(engine) as session:
-                session.add(log)
-                session.commit()
-                session.refresh(log)
-                # 统一处理不同类型的 resource_id_info
-                if isinstance(resource_id, list):
-                    resource_ids = [str(rid) for rid in resource_id]
-                else:
-                    resource_ids = [str(resource_id)]
-                # 批量添加 SystemLogsResource
-                resource_entries = []
-                for resource_id_details in resource_ids:
-                    resource_entry = SystemLogsResource(
-                        resource_id=resource_id_details,
-                        log_id=log.id,
-                        module=config.module
-                    )
-                    resource_entries.append(resource_entry)
-                if resource_entries:
-                    session.bulk_save_objects(resource_entries)
-                    session.commit()
-
-                if config.operation_type == OperationType.DELETE and resource_info_list is not None:
-                    # 批量更新 SystemLogsResource 表的 resource_name
-                    for resource_info in resource_info_list:
-                        session.query(SystemLogsResource).filter(
-                            SystemLogsResource.resource_id == resource_info['resource_id'],
-                            SystemLogsResource.module == resource_info['module'],
-                        ).update({
-                            SystemLogsResource.resource_name: resource_info['resource_name']
-                        }, synchronize_session='fetch')
-                    session.commit()
-                return log
+            # 统一处理不同类型的 resource_id_info
+            if isinstance(resource_id, list):
+                resource_ids = [str(rid) for rid in resource_id]
+            else:
+                resource_ids = [str(resource_id)]
+            entry = AuditLogEntry(
+                log=log,
+                resource_ids=resource_ids,
+                module=config.module,
+                resource_info_list=resource_info_list if config.operation_type == OperationType.DELETE else None
+            )
+            if settings.AUDIT_LOG_ASYNC_ENABLED:
+                # 放入队列由后台线程批量写入，不阻塞事件循环
+                audit_log_writer.submit(entry)
+            else:
+                audit_log_writer.write([entry])
+            return log
 
         except Exception as e:
             print(f"[SystemLogger] Failed to create log: {str(traceback.format_exc())}")
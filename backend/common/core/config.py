@@ -109,14 +109,55 @@ class Settings(BaseSettings):
     EMBEDDING_TERMINOLOGY_TOP_COUNT: int = EMBEDDING_DEFAULT_TOP_COUNT
     EMBEDDING_DATA_TRAINING_TOP_COUNT: int = EMBEDDING_DEFAULT_TOP_COUNT
 
+    # pgvector 索引：hnsw / ivfflat / none，维度需与 embedding 模型输出一致（默认 0 按已存储向量或 embedding 模型的维度）
+    EMBEDDING_VECTOR_INDEX_TYPE: Literal["hnsw", "ivfflat", "none"] = "hnsw"
+    EMBEDDING_VECTOR_DIMENSION: int = 0
+    EMBEDDING_HNSW_M: int = 16
+    EMBEDDING_HNSW_EF_CONSTRUCTION: int = 64
+    EMBEDDING_HNSW_EF_SEARCH: int = 100
+    EMBEDDING_IVFFLAT_LISTS: int = 100
+    EMBEDDING_IVFFLAT_PROBES: int = 10
+
+    # 问题向量进程级缓存
+    EMBEDDING_QUERY_CACHE_SIZE: int = 2048
+    EMBEDDING_QUERY_CACHE_TTL: int = 3600
+
     # 是否启用SQL查询行数限制，默认值，可被参数配置覆盖
     GENERATE_SQL_QUERY_LIMIT_ENABLED: bool = True
     GENERATE_SQL_QUERY_HISTORY_ROUND_COUNT: int = 3
 
+    # 执行数据源 SQL：每批 fetchmany 行数，读取行数与估算字节数上限（默认 0 不限制），超过上限截断结果
+    SQL_EXEC_FETCH_SIZE: int = 1000
+    SQL_EXEC_MAX_ROWS: int = 0
+    SQL_EXEC_MAX_BYTES: int = 0
+
     # 安全配置：是否允许元数据查询（SHOW/DESCRIBE/DESC/EXPLAIN）
     # 默认关闭，防止通过元数据查询泄露数据库结构
     SQLBOT_ALLOW_METADATA_QUERIES: bool = False
 
+    # 行权限过滤、小助手动态数据源子查询默认通过 sqlglot 改写 SQL，开启后改写失败时再调用 LLM 改写
+    SQL_REWRITE_LLM_FALLBACK: bool = False
+
+    # 对话流式输出通道中未被消费的数据块上限，超过后生成任务等待（背压）
+    CHAT_STREAM_QUEUE_SIZE: int = 256
+
+    # 对话异步执行模式：任务在事件循环上运行（LLM astream、元数据库异步会话），需要 postgresql+psycopg 元数据库
+    CHAT_ASYNC_MODE_ENABLED: bool = False
+
+    # 后台任务调度通道：并发上限 / 排队上限 / 排队超时（秒，0 不限制）
+    TASK_CHAT_MAX_WORKERS: int = 100
+    TASK_CHAT_MAX_QUEUE: int = 200
+    TASK_CHAT_QUEUE_TIMEOUT: int = 60
+    TASK_BACKGROUND_LLM_MAX_WORKERS: int = 20
+    TASK_BACKGROUND_LLM_MAX_QUEUE: int = 200
+    TASK_BACKGROUND_LLM_QUEUE_TIMEOUT: int = 120
+    TASK_EMBEDDING_MAX_WORKERS: int = 4
+    TASK_EMBEDDING_MAX_QUEUE: int = 1000
+    TASK_EMBEDDING_QUEUE_TIMEOUT: int = 0
+    TASK_MAINTENANCE_MAX_WORKERS: int = 1
+    TASK_MAINTENANCE_MAX_QUEUE: int = 100
+    TASK_MAINTENANCE_QUEUE_TIMEOUT: int = 0
+
     PARSE_REASONING_BLOCK_ENABLED: bool = True
     DEFAULT_REASONING_CONTENT_START: str = '<think>'
     DEFAULT_REASONING_CONTENT_END: str = '</think>'
@@ -129,6 +170,64 @@ class Settings(BaseSettings):
     TABLE_EMBEDDING_ENABLED: bool = True
     TABLE_EMBEDDING_COUNT: int = 10
     DS_EMBEDDING_COUNT: int = 10
+    # 表/数据源向量矩阵在内存中的缓存时间（秒），本进程内写入向量会即时刷新
+    TABLE_EMBEDDING_MATRIX_TTL: int = 600
+    # 表/数据源 embedding 每批调用 embed_documents 与批量写回的条数
+    TABLE_EMBEDDING_BATCH_SIZE: int = 64
+
+    # SQL 查询结果缓存：TTL（秒）可通过 SQL_RESULT_CACHE_TTL_OVERRIDES 按数据源 ID 或类型覆盖，如 {"hive": 1800, "12": 60}
+    SQL_RESULT_CACHE_ENABLED: bool = True
+    SQL_RESULT_CACHE_TTL: int = 300
+    SQL_RESULT_CACHE_TTL_OVERRIDES: dict[str, int] = {}
+    SQL_RESULT_CACHE_SIZE: int = 512
+    SQL_RESULT_CACHE_MAX_ENTRY_BYTES: int = 8 * 1024 * 1024
+    # CACHE_TYPE=redis 时同时写入 Redis，多进程共享
+    SQL_RESULT_CACHE_REDIS_ENABLED: bool = True
+
+    # 数据源连接池：所有数据源连接数上限之和 / 空闲超时（秒）后释放连接池 / 单个池的溢出连接数、回收时间、等待超时，
+    # DS_POOL_PRE_PING 取连接时检查可用性，DS_DRIVER_POOL_MIN_CACHED 驱动连接池启动时预建的连接数
+    DS_POOL_MAX_TOTAL_CONNECTIONS: int = 1000
+    DS_POOL_IDLE_TIMEOUT: int = 600
+    DS_POOL_MAX_OVERFLOW: int = 20
+    DS_POOL_RECYCLE: int = 3600
+    DS_POOL_TIMEOUT: int = 30
+    DS_POOL_PRE_PING: bool = True
+    DS_DRIVER_POOL_MIN_CACHED: int = 0
+
+    # 按 (用户, 数据源) 缓存编译后的行/列权限计划的数量，0 不缓存
+    PERMISSION_PLAN_CACHE_SIZE: int = 2048
+
+    # 按 (数据源, 列权限指纹) 缓存拼接好的表结构片段与外键关系，TTL（秒）兜底其它进程中的结构修改
+    SCHEMA_PROMPT_CACHE_SIZE: int = 512
+    SCHEMA_PROMPT_CACHE_TTL: int = 600
+
+    # 按 SQL 文本缓存解析上下文（语法树、只读校验、表名、格式化结果）的数量，0 不缓存
+    SQL_PARSE_CACHE_SIZE: int = 256
+
+    # 操作日志异步批量写入：队列上限（满时丢弃）、每批条数、攒批等待秒数、入队到写入超过该秒数记为延迟
+    AUDIT_LOG_ASYNC_ENABLED: bool = True
+    AUDIT_LOG_QUEUE_SIZE: int = 10000
+    AUDIT_LOG_BATCH_SIZE: int = 200
+    AUDIT_LOG_FLUSH_INTERVAL: float = 1.0
+    AUDIT_LOG_LAG_WARNING: float = 5.0
+
+    # Excel/CSV 导入：每块行数（决定导入时的内存占用）、并行导入的 sheet 数
+    EXCEL_IMPORT_CHUNK_SIZE: int = 50000
+    EXCEL_IMPORT_WORKERS: int = 4
+
+    # 数据源连通性/版本探测缓存（秒）：TTL 内直接使用，之后 STALE_TTL 内先返回旧结果并后台刷新
+    DATASOURCE_HEALTH_ENABLED: bool = True
+    DATASOURCE_HEALTH_TTL: int = 30
+    DATASOURCE_HEALTH_STALE_TTL: int = 300
+    DATASOURCE_VERSION_TTL: int = 3600
+
+    # 仪表板图表并发查询：线程池大小 / 单个数据源同时执行的查询上限
+    DASHBOARD_CHART_WORKERS: int = 16
+    DASHBOARD_DS_CONCURRENCY: int = 4
+
+    # 对话查询结果、预测数据分页存储：每页行数 / zlib 压缩级别
+    CHAT_RESULT_PAGE_SIZE: int = 500
+    CHAT_RESULT_COMPRESS_LEVEL: int = 6
 
     ORACLE_CLIENT_PATH: str = '/opt/sqlbot/db_client/oracle_instant_client'
 
@@ -138,6 +237,13 @@ class Settings(BaseSettings):
                      'PARSE_REASONING_BLOCK_ENABLED',
                      'PG_POOL_PRE_PING',
                      'TABLE_EMBEDDING_ENABLED',
+                     'CHAT_ASYNC_MODE_ENABLED',
+                     'SQL_RESULT_CACHE_ENABLED',
+                     'SQL_RESULT_CACHE_REDIS_ENABLED',
+                     'DATASOURCE_HEALTH_ENABLED',
+                     'DS_POOL_PRE_PING',
+                     'SQL_REWRITE_LLM_FALLBACK',
+                     'AUDIT_LOG_ASYNC_ENABLED',
                      mode='before')
     @classmethod
     def lowercase_bool(cls, v: Any) -> Any:
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from sqlmodel import Session, create_engine, SQLModel
 
 from common.core.config import settings
@@ -9,6 +11,30 @@ engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI),
                        pool_pre_ping=settings.PG_POOL_PRE_PING)
 
 
+def async_engine_supported() -> bool:
+    """元数据库异步驱动：仅支持 postgresql+psycopg（psycopg3 同时支持同步与异步）"""
+    return str(settings.SQLALCHEMY_DATABASE_URI).startswith('postgresql+psycopg://')
+
+
+@lru_cache(maxsize=1)
+def get_async_engine():
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    return create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI),
+                               pool_size=settings.PG_POOL_SIZE,
+                               max_overflow=settings.PG_MAX_OVERFLOW,
+                               pool_recycle=settings.PG_POOL_RECYCLE,
+                               pool_pre_ping=settings.PG_POOL_PRE_PING)
+
+
+@lru_cache(maxsize=1)
+def get_async_session_maker():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    return async_sessionmaker(bind=get_async_engine(), class_=AsyncSession, expire_on_commit=False)
+
+
 def get_session():
     with Session(engine) as session:
         try:
@@ -1,14 +1,48 @@
 import json
-from typing import Optional
+from typing import Any, Mapping, Optional
 
+import orjson
+from starlette.background import BackgroundTask
 from starlette.exceptions import HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 
 from common.core.config import settings
 from common.utils.utils import SQLBotLogUtil
 
+# EnvelopeResponse 的标记头，ResponseMiddleware 见到后移除并直接返回，不再读取、解析响应体
+ENVELOPE_HEADER = 'x-sqlbot-envelope'
+
+
+def is_envelope(data: Any) -> bool:
+    return isinstance(data, dict) and all(k in data for k in ["code", "data", "msg"])
+
+
+def dumps_json(content: Any) -> bytes:
+    """orjson 序列化，orjson 不支持的内容（如超过 64 位的整数）退回标准库 json"""
+    try:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    except TypeError:
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class EnvelopeResponse(JSONResponse):
+    """
+    默认响应类：渲染时直接包装为 {code, data, msg} 并用 orjson 序列化一次
+    与 ResponseMiddleware 原有规则一致：只包装状态码 200 且本身不是 {code, data, msg} 结构的内容
+    """
+
+    def __init__(self, content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                 media_type: Optional[str] = None, background: Optional[BackgroundTask] = None):
+        super().__init__(content, status_code, headers, media_type, background)
+        self.headers[ENVELOPE_HEADER] = '1'
+
+    def render(self, content: Any) -> bytes:
+        if self.status_code == 200 and not is_envelope(content):
+            content = {"code": 0, "data": content, "msg": None}
+        return dumps_json(content)
+
 
 class ResponseMiddleware(BaseHTTPMiddleware):
     instances = []
@@ -27,6 +61,11 @@ class ResponseMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
         response = await call_next(request)
 
+        # 路由使用 EnvelopeResponse 时已在序列化时包装，这里只处理响应头
+        if ENVELOPE_HEADER in response.headers:
+            del response.headers[ENVELOPE_HEADER]
+            return response
+
         direct_paths = [
             f"{settings.API_V1_STR}/mcp/mcp_question",
             f"{settings.API_V1_STR}/mcp/mcp_assistant",
@@ -46,46 +85,28 @@ class ResponseMiddleware(BaseHTTPMiddleware):
         if response.status_code != 200:
             return response
         if response.headers.get("content-type") == "application/json":
+            # 路由直接返回的 JSON 响应（如 JSONResponse、xpack 中的路由）仍在这里包装
+            headers = {
+                k: v for k, v in response.headers.items()
+                if k.lower() not in ("content-length", "content-type")
+            }
             try:
-                body = b""
-                async for chunk in response.body_iterator:
-                    body += chunk
-
-                raw_data = json.loads(body.decode())
-
-                if isinstance(raw_data, dict) and all(k in raw_data for k in ["code", "data", "msg"]):
-                    return JSONResponse(
-                        content=raw_data,
-                        status_code=response.status_code,
-                        headers={
-                            k: v for k, v in response.headers.items()
-                            if k.lower() not in ("content-length", "content-type")
-                        }
-                    )
-
-                wrapped_data = {
-                    "code": 0,
-                    "data": raw_data,
-                    "msg": None
-                }
-
-                return JSONResponse(
-                    content=wrapped_data,
-                    status_code=response.status_code,
-                    headers={
-                        k: v for k, v in response.headers.items()
-                        if k.lower() not in ("content-length", "content-type")
+                chunks = [chunk async for chunk in response.body_iterator]
+                raw_data = json.loads(b"".join(chunks))
+                if not is_envelope(raw_data):
+                    raw_data = {
+                        "code": 0,
+                        "data": raw_data,
+                        "msg": None
                     }
-                )
+                return Response(content=dumps_json(raw_data), status_code=response.status_code, headers=headers,
+                                media_type="application/json")
             except Exception as e:
                 SQLBotLogUtil.error(f"Response processing error: {str(e)}", exc_info=True)
                 return JSONResponse(
                     status_code=500,
                     content=str(e),
-                    headers={
-                        k: v for k, v in response.headers.items()
-                        if k.lower() not in ("content-length", "content-type")
-                    }
+                    headers=headers
                 )
         content_type = response.headers.get("content-type", "")
         static_content_types = ["text/html", "javascript", "typescript", "css"]
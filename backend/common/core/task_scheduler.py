@@ -0,0 +1,307 @@
+"""
+后台任务调度器
+
+按用途划分独立通道（lane），每个通道有各自的并发上限、排队上限、排队超时和拒绝策略：
+    chat           交互式对话、分析、预测
+    background_llm 推荐问题等后台 LLM 调用
+    embedding      术语、训练数据、表/数据源的 embedding 生成
+    maintenance    启动时的 embedding 回填等维护任务
+
+同一通道内按工作空间（oid）轮转出队，单个工作空间的大批量任务不会饿死其它工作空间。
+在事件循环中运行的异步任务通过 acquire / release 占用通道的执行名额，与线程任务共用并发上限与排队规则。
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Literal, Optional
+
+from common.core.config import settings
+from common.error import SingleMessageError
+from common.utils.utils import SQLBotLogUtil
+
+LANE_CHAT = 'chat'
+LANE_BACKGROUND_LLM = 'background_llm'
+LANE_EMBEDDING = 'embedding'
+LANE_MAINTENANCE = 'maintenance'
+
+
+class TaskRejectedError(SingleMessageError):
+    pass
+
+
+class TaskTimeoutError(SingleMessageError):
+    pass
+
+
+@dataclass
+class _Task:
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    future: Future
+    workspace: Hashable
+    enqueue_time: float = field(default_factory=time.monotonic)
+    # 只占用执行名额，不在线程池中执行（acquire）
+    slot: bool = False
+
+
+class TaskLane:
+    """
+    单个通道：最多 max_workers 个任务并发执行，其余按工作空间排队
+    max_queue: 排队任务上限，超过后按 reject_policy 处理（raise 抛出 TaskRejectedError，discard 记录告警并计数后丢弃，
+               只用于丢弃后可由后续任务补偿的场景）
+    queue_timeout: 任务排队超过该秒数后不再执行，future 以 TaskTimeoutError 结束，0 表示不限制；
+                   工作线程全部占满时由后台清理线程按时结束超时的任务
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, queue_timeout: float = 0,
+                 reject_policy: Literal['raise', 'discard'] = 'raise'):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.reject_policy = reject_policy
+
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f'sqlbot-{name}')
+        self._queues: OrderedDict[Hashable, deque[_Task]] = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweep_wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def submit(self, fn: Callable, *args, workspace: Optional[Hashable] = None, **kwargs) -> Future:
+        return self._enqueue(_Task(fn=fn, args=args, kwargs=kwargs, future=Future(), workspace=workspace))
+
+    def acquire(self, workspace: Optional[Hashable] = None) -> Future:
+        """
+        申请一个执行名额，供在事件循环中运行的异步任务使用：future 完成即已占用名额，用完后必须调用 release
+        排队上限、排队超时与工作空间轮转同 submit
+        """
+        return self._enqueue(_Task(fn=self.acquire, args=(), kwargs={}, future=Future(), workspace=workspace,
+                                   slot=True))
+
+    def release(self, failed: bool = False):
+        """归还 acquire 占用的执行名额"""
+        with self._lock:
+            self._running -= 1
+            self._completed += 1
+            if failed:
+                self._failed += 1
+        self._dispatch()
+
+    def _enqueue(self, task: _Task) -> Future:
+        fn = task.fn
+        future = task.future
+        with self._lock:
+            if self._queued >= self.max_queue and self._running >= self.max_workers:
+                self._rejected += 1
+                rejected = True
+            else:
+                rejected = False
+                self._submitted += 1
+                self._queues.setdefault(task.workspace, deque()).append(task)
+                self._queued += 1
+                first_queued = self._queued == 1
+        if rejected:
+            error = TaskRejectedError(f'Too many pending tasks in lane [{self.name}], please try again later')
+            if self.reject_policy == 'raise':
+                raise error
+            with self._lock:
+                self._discarded += 1
+                discarded = self._discarded
+            SQLBotLogUtil.warning(f'{error}, task {getattr(fn, "__name__", fn)} discarded '
+                                  f'({discarded} discarded in total)')
+            future.set_exception(error)
+            return future
+        if self.queue_timeout:
+            self._ensure_sweeper()
+            if first_queued:
+                # 清理线程在队列为空时无限期等待，有任务入队时唤醒
+                self._sweep_wakeup.set()
+        self._dispatch()
+        return future
+
+    def _next_task(self) -> Optional[_Task]:
+        """按工作空间轮转取出下一个任务，需持有锁"""
+        if not self._queues:
+            return None
+        workspace, queue = next(iter(self._queues.items()))
+        task = queue.popleft()
+        self._queued -= 1
+        if queue:
+            self._queues.move_to_end(workspace)
+        else:
+            del self._queues[workspace]
+        return task
+
+    def _dispatch(self):
+        expired: list[_Task] = []
+        granted: list[_Task] = []
+        with self._lock:
+            while self._running < self.max_workers:
+                task = self._next_task()
+                if task is None:
+                    break
+                wait = time.monotonic() - task.enqueue_time
+                if self.queue_timeout and wait > self.queue_timeout:
+                    self._timeouts += 1
+                    expired.append(task)
+                    continue
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                self._running += 1
+                self._started += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+                if task.slot:
+                    granted.append(task)
+                else:
+                    self._pool.submit(self._run, task)
+        self._fail_expired(expired)
+        # 在锁外结束 future，等待方被唤醒后可能立即 release
+        for task in granted:
+            task.future.set_result(None)
+
+    def _fail_expired(self, expired: list[_Task]):
+        # 在锁外结束 future，避免回调中再次提交任务时死锁
+        for task in expired:
+            SQLBotLogUtil.warning(f'Task {getattr(task.fn, "__name__", task.fn)} in lane [{self.name}] '
+                                  f'timed out after waiting {self.queue_timeout}s')
+            if task.future.set_running_or_notify_cancel():
+                task.future.set_exception(
+                    TaskTimeoutError(f'Task waited too long in lane [{self.name}], please try again later'))
+
+    def _expire(self) -> Optional[float]:
+        """移出排队超时的任务，返回下一个排队任务的超时时间点，没有排队任务时返回 None"""
+        now = time.monotonic()
+        expired: list[_Task] = []
+        next_deadline = None
+        with self._lock:
+            for workspace in list(self._queues):
+                queue = self._queues[workspace]
+                # 同一工作空间内按入队顺序排列，只需检查队头
+                while queue and now - queue[0].enqueue_time > self.queue_timeout:
+                    expired.append(queue.popleft())
+                    self._queued -= 1
+                    self._timeouts += 1
+                if not queue:
+                    del self._queues[workspace]
+                    continue
+                deadline = queue[0].enqueue_time + self.queue_timeout
+                next_deadline = deadline if next_deadline is None else min(next_deadline, deadline)
+        self._fail_expired(expired)
+        return next_deadline
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None and not self._stopped.is_set():
+                self._sweeper = threading.Thread(target=self._sweep, name=f'sqlbot-{self.name}-sweeper', daemon=True)
+                self._sweeper.start()
+
+    def _sweep(self):
+        while not self._stopped.is_set():
+            self._sweep_wakeup.clear()
+            deadline = self._expire()
+            self._sweep_wakeup.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _run(self, task: _Task):
+        failed = False
+        try:
+            result = task.fn(*task.args, **task.kwargs)
+        except BaseException as e:
+            failed = True
+            task.future.set_exception(e)
+        else:
+            task.future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                if failed:
+                    self._failed += 1
+            self._dispatch()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'name': self.name,
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'running': self._running,
+                'queued': self._queued,
+                'queued_by_workspace': {str(k): len(v) for k, v in self._queues.items()},
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'discarded': self._discarded,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(self._total_wait * 1000 / self._started, 2) if self._started > 0 else 0,
+                'max_wait_ms': round(self._max_wait * 1000, 2),
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._stopped.set()
+        self._sweep_wakeup.set()
+        with self._lock:
+            pending = [task for queue in self._queues.values() for task in queue]
+            self._queues.clear()
+            self._queued = 0
+        for task in pending:
+            task.future.cancel()
+        self._pool.shutdown(wait=wait)
+
+
+class TaskScheduler:
+
+    def __init__(self):
+        self.lanes: dict[str, TaskLane] = {}
+
+    def add_lane(self, lane: TaskLane) -> TaskLane:
+        self.lanes[lane.name] = lane
+        return lane
+
+    def submit(self, lane: str, fn: Callable, *args, workspace: Optional[Hashable] = None, **kwargs) -> Future:
+        return self.lanes[lane].submit(fn, *args, workspace=workspace, **kwargs)
+
+    def acquire(self, lane: str, workspace: Optional[Hashable] = None) -> Future:
+        return self.lanes[lane].acquire(workspace=workspace)
+
+    def release(self, lane: str, failed: bool = False):
+        self.lanes[lane].release(failed=failed)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self, wait: bool = False):
+        for lane in self.lanes.values():
+            lane.shutdown(wait=wait)
+
+
+task_scheduler = TaskScheduler()
+task_scheduler.add_lane(TaskLane(LANE_CHAT, settings.TASK_CHAT_MAX_WORKERS, settings.TASK_CHAT_MAX_QUEUE,
+                                 settings.TASK_CHAT_QUEUE_TIMEOUT))
+task_scheduler.add_lane(TaskLane(LANE_BACKGROUND_LLM, settings.TASK_BACKGROUND_LLM_MAX_WORKERS,
+                                 settings.TASK_BACKGROUND_LLM_MAX_QUEUE, settings.TASK_BACKGROUND_LLM_QUEUE_TIMEOUT))
+# embedding / 维护任务排满时同样抛出异常由调用方处理，不静默丢弃；未生成的向量由启动时的回填任务补齐
+task_scheduler.add_lane(TaskLane(LANE_EMBEDDING, settings.TASK_EMBEDDING_MAX_WORKERS,
+                                 settings.TASK_EMBEDDING_MAX_QUEUE, settings.TASK_EMBEDDING_QUEUE_TIMEOUT))
+task_scheduler.add_lane(TaskLane(LANE_MAINTENANCE, settings.TASK_MAINTENANCE_MAX_WORKERS,
+                                 settings.TASK_MAINTENANCE_MAX_QUEUE, settings.TASK_MAINTENANCE_QUEUE_TIMEOUT))
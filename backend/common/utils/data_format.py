@@ -1,21 +1,35 @@
 from decimal import Decimal
+from operator import itemgetter
+from typing import Any
 
+import numpy as np
 import pandas as pd
 
 from apps.chat.models.chat_model import AxisObj
+from apps.db.result_set import ColumnarResult
 
 
 class DataFormat:
+    @staticmethod
+    def _tolist_matches_map(dtype) -> bool:
+        """tolist() 得到的值与 Series.map 传入的值 str() 结果一致的列类型；可空整型等扩展类型 map 时会转为 float，逐个处理"""
+        return isinstance(dtype, np.dtype) and (dtype.kind in 'OiubM' or dtype == np.float64)
+
     @staticmethod
     def safe_convert_to_string(df):
         df_copy = df.copy()
 
-        for col in df_copy.columns:
-            # 使用map避免ambiguous truth value问题
-            df_copy[col] = df_copy[col].map(
-                # 关键：在数字字符串前添加零宽空格，阻止pandas的自动格式化
-                lambda x: "" if pd.isna(x) else "\u200b" + str(x)
-            )
+        # 按位置处理，列名重复时也逐列转换
+        for idx in range(df_copy.shape[1]):
+            series = df_copy.iloc[:, idx]
+            if DataFormat._tolist_matches_map(series.dtype):
+                # 关键：在数字字符串前添加零宽空格，阻止pandas的自动格式化；空值由 isna 整列判断
+                converted = pd.Series(["\u200b" + str(x) for x in series.tolist()], index=series.index, dtype=object)
+                converted = converted.where(~series.isna(), "")
+            else:
+                # 使用map避免ambiguous truth value问题
+                converted = series.map(lambda x: "" if pd.isna(x) else "\u200b" + str(x))
+            df_copy.isetitem(idx, converted)
 
         return df_copy
 
@@ -48,68 +62,132 @@ class DataFormat:
         ]
 
     @staticmethod
-    def convert_large_numbers_in_object_array(obj_array, int_threshold=1e15, float_threshold=1e10):
-        """处理对象数组，将每个对象中的大数字转换为字符串"""
+    def _format_float_without_scientific(value):
+        """格式化浮点数，避免科学记数法"""
+        if value == 0:
+            return "0"
+        formatted = str(Decimal(str(value)))
+        if '.' in formatted:
+            formatted = formatted.rstrip('0').rstrip('.')
+        return formatted
 
-        def format_float_without_scientific(value):
-            """格式化浮点数，避免科学记数法"""
-            if value == 0:
-                return "0"
-            formatted = str(Decimal(str(value)))
-            if '.' in formatted:
-                formatted = formatted.rstrip('0').rstrip('.')
-            return formatted
-
-        def process_object(obj):
-            """处理单个对象"""
-            if not isinstance(obj, dict):
-                return obj
-
-            processed_obj = {}
-            for key, value in obj.items():
-                if isinstance(value, (int, float)):
-                    # 只转换大数字
-                    if isinstance(value, int) and abs(value) >= int_threshold:
-                        processed_obj[key] = str(value)
-                    elif isinstance(value, float) and (abs(value) >= float_threshold or abs(value) < 1e-6):
-                        processed_obj[key] = format_float_without_scientific(value)
-                    else:
-                        processed_obj[key] = value
-                elif isinstance(value, dict):
-                    # 处理嵌套对象
-                    processed_obj[key] = process_object(value)
-                elif isinstance(value, list):
-                    # 处理对象中的数组
-                    processed_obj[key] = [process_item(item) for item in value]
+    @staticmethod
+    def _convert_large_number_value(value, int_threshold, float_threshold):
+        """转换单个值：大数字转为字符串，嵌套的对象、数组递归处理"""
+        if isinstance(value, (int, float)):
+            # 只转换大数字
+            if isinstance(value, int) and abs(value) >= int_threshold:
+                return str(value)
+            elif isinstance(value, float) and (abs(value) >= float_threshold or abs(value) < 1e-6):
+                return DataFormat._format_float_without_scientific(value)
+            return value
+        elif isinstance(value, dict):
+            # 处理嵌套对象
+            return {k: DataFormat._convert_large_number_value(v, int_threshold, float_threshold)
+                    for k, v in value.items()}
+        elif isinstance(value, list):
+            # 处理对象中的数组，数组中只处理对象
+            return [DataFormat._convert_large_number_value(item, int_threshold, float_threshold)
+                    if isinstance(item, dict) else item for item in value]
+        return value
+
+    @staticmethod
+    def normalize_qualified_sql_column_keys_in_columns(result: ColumnarResult) -> ColumnarResult:
+        """按列补全 ``alias.column`` 的短列名，与 normalize_qualified_sql_column_keys 逐行处理结果一致，别名列与原列共享数据"""
+        index = result.key_index()
+        existing = set(index)
+        for key in dict.fromkeys(result.keys):
+            if "." not in key:
+                continue
+            short = key.rsplit(".", 1)[-1]
+            if short not in existing:
+                result.add_alias(short, index[key])
+                existing.add(short)
+        return result
+
+    @staticmethod
+    def _large_number_updates(values: list, int_threshold=1e15, float_threshold=1e10) -> list[tuple[int, Any]]:
+        """
+        计算一列数据中需要替换的值，返回 [(下标, 新值)]
+        纯 int 或纯 float（可含 None）的列用 NumPy 整列比较阈值，只转换超过阈值的值；
+        其他包含数字、对象、数组的列逐个转换（对象、数组总是复制，与逐行处理一致）
+        """
+        types = set(map(type, values))
+        numeric = types - {type(None)}
+        if numeric == {int} or numeric == {float}:
+            try:
+                # None 转为 NaN，与阈值比较均为 False
+                magnitudes = np.abs(np.array(values, dtype=np.float64))
+            except (OverflowError, TypeError, ValueError):
+                # 超出 float64 范围的整数逐个处理
+                magnitudes = None
+            if magnitudes is not None:
+                if numeric == {int}:
+                    mask = magnitudes >= int_threshold
                 else:
-                    processed_obj[key] = value
-            return processed_obj
+                    mask = (magnitudes >= float_threshold) | (magnitudes < 1e-6)
+                return [(pos, DataFormat._convert_large_number_value(values[pos], int_threshold, float_threshold))
+                        for pos in np.flatnonzero(mask).tolist()]
+        # bool 不会超过阈值
+        if not any(issubclass(t, (int, float, dict, list)) and t is not bool for t in types):
+            return []
+        return [(pos, DataFormat._convert_large_number_value(value, int_threshold, float_threshold))
+                for pos, value in enumerate(values)
+                if isinstance(value, (int, float, dict, list)) and not isinstance(value, bool)]
 
-        def process_item(item):
-            """处理数组中的项目"""
-            if isinstance(item, dict):
-                return process_object(item)
-            return item
+    @staticmethod
+    def convert_large_numbers_in_object_array(obj_array, int_threshold=1e15, float_threshold=1e10):
+        """处理对象数组，将每个对象中的大数字转换为字符串"""
+        if obj_array and isinstance(obj_array[0], dict):
+            keys = obj_array[0].keys()
+            if all(isinstance(obj, dict) and obj.keys() == keys for obj in obj_array):
+                # 查询结果各行的键相同：复制各行后按列计算需要替换的值，只改写这些位置
+                processed = [dict(obj) for obj in obj_array]
+                for key in list(keys):
+                    for pos, value in DataFormat._large_number_updates([obj[key] for obj in obj_array],
+                                                                       int_threshold, float_threshold):
+                        processed[pos][key] = value
+                return processed
+        return [DataFormat._convert_large_number_value(obj, int_threshold, float_threshold)
+                if isinstance(obj, dict) else obj for obj in obj_array]
 
-        return [process_item(obj) for obj in obj_array]
+    @staticmethod
+    def convert_large_numbers_in_columns(result: ColumnarResult, int_threshold=1e15, float_threshold=1e10):
+        """按列处理 ColumnarResult 中的大数字，与 convert_large_numbers_in_object_array 结果一致，只遍历可能需要转换的列"""
+        converted = {}
+        for idx, values in enumerate(result.columns):
+            if id(values) not in converted:
+                updates = DataFormat._large_number_updates(values, int_threshold, float_threshold)
+                new_values = values
+                if updates:
+                    new_values = list(values)
+                    for pos, value in updates:
+                        new_values[pos] = value
+                converted[id(values)] = new_values
+            result.columns[idx] = converted[id(values)]
+        return result
 
     @staticmethod
     def convert_object_array_for_pandas(column_list: list, data_list: list):
-        _fields_list = []
-        for field_idx, field in enumerate(column_list):
-            _fields_list.append(field.name)
+        _fields_list = [field.name for field in column_list]
+        keys = [field.value for field in column_list]
+        if not keys:
+            return [[] for _ in data_list], _fields_list
 
-        md_data = []
-        for inner_data in data_list:
-            _row = []
-            for field_idx, field in enumerate(column_list):
-                value = inner_data.get(field.value)
-                _row.append(value)
-            md_data.append(_row)
+        # 各行都包含全部键时用 itemgetter 整行取值，缺少键时退回逐个 get（缺少的值为 None）
+        getter = itemgetter(*keys)
+        try:
+            if len(keys) == 1:
+                md_data = [[getter(inner_data)] for inner_data in data_list]
+            else:
+                md_data = list(map(list, map(getter, data_list)))
+        except KeyError:
+            md_data = [[inner_data.get(key) for key in keys] for inner_data in data_list]
         return md_data, _fields_list
 
     @staticmethod
-    def convert_data_fields_for_pandas(chart: dict, fields: list, data: list):
+    def chart_column_list(chart: dict, fields: list) -> list[AxisObj]:
+        """按图表配置中的列名、轴名称生成表头，未配置的字段使用字段名"""
         _fields = {}
         if chart.get('columns'):
             for _column in chart.get('columns'):
@@ -137,11 +215,23 @@ class DataFormat:
         for field in fields:
             _column_list.append(
                 AxisObj(name=field if not _fields.get(field) else _fields.get(field), value=field))
+        return _column_list
+
+    @staticmethod
+    def convert_data_fields_for_pandas(chart: dict, fields: list, data: list):
+        _column_list = DataFormat.chart_column_list(chart, fields)
 
         md_data, _fields_list = DataFormat.convert_object_array_for_pandas(_column_list, data)
 
         return md_data, _fields_list
 
+    @staticmethod
+    def convert_columns_for_pandas(column_list: list, result: ColumnarResult):
+        """convert_object_array_for_pandas 的列式版本，直接从列数据生成行，不构建 {列名: 值}"""
+        _fields_list = [field.name for field in column_list]
+        md_data = result.records([field.value for field in column_list])
+        return md_data, _fields_list
+
     @staticmethod
     def format_pd_data(column_list: list, data_list: list, col_formats: dict = None):
         # 预处理数据并记录每列的格式类型
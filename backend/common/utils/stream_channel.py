@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Optional
+
+from common.core.config import settings
+
+_END = object()
+
+
+class StreamChannel:
+    """
+    后台线程与 StreamingResponse 之间的流式通道
+
+    生产者（线程池中的任务）调用 put 推送数据块，数据块立即通过 call_soon_threadsafe 投递到事件循环中的 asyncio.Queue，
+    ASGI 侧 async for 等待读取，不再轮询；
+    队列中未被消费的数据块超过 max_size 时 put 阻塞，形成背压；
+    消费方断开（取消迭代）后，后续 put 直接丢弃，任务本身继续执行完成（保存记录等）。
+    必须在事件循环线程中创建。
+    """
+
+    def __init__(self, max_size: Optional[int] = None, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.max_size = max(1, max_size or settings.CHAT_STREAM_QUEUE_SIZE)
+        self._loop = loop or asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._slots = threading.Semaphore(self.max_size)
+        # 生产者与消费者在同一事件循环时（异步模式）用于等待空位
+        self._space = asyncio.Event()
+        self._closed = False
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def _send(self, item: Any) -> bool:
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+            return True
+        except RuntimeError:
+            # 事件循环已关闭
+            self._cancelled = True
+            return False
+
+    def put(self, chunk: Any) -> bool:
+        """推送数据块，队列已满时阻塞；消费方已断开时返回 False"""
+        if self._closed:
+            raise RuntimeError('Stream channel is closed')
+        if self._cancelled:
+            return False
+        self._slots.acquire()
+        if self._cancelled:
+            return False
+        return self._send(chunk)
+
+    async def aput(self, chunk: Any) -> bool:
+        """在事件循环中推送数据块，队列已满时让出事件循环等待消费"""
+        if self._closed:
+            raise RuntimeError('Stream channel is closed')
+        while not self._cancelled and not self._slots.acquire(blocking=False):
+            self._space.clear()
+            await self._space.wait()
+        if self._cancelled:
+            return False
+        self._queue.put_nowait(chunk)
+        return True
+
+    def close(self):
+        """生产结束，消费方读完剩余数据块后结束迭代"""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._cancelled:
+            self._send(_END)
+
+    def cancel(self):
+        """消费方放弃读取，唤醒可能阻塞在 put 上的生产者"""
+        if self._cancelled:
+            return
+        self._cancelled = True
+        self._slots.release(self.max_size)
+        self._space.set()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _END:
+                    break
+                self._slots.release()
+                self._space.set()
+                yield item
+        finally:
+            if not self._closed:
+                self.cancel()
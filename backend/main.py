@@ -16,17 +16,23 @@ from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from alembic import command
+from apps.ai_model.vector_index import ensure_vector_indexes
 from apps.api import api_router
+from apps.db.db import pool_manager
+from apps.db.engine import close_engine
 from apps.swagger.i18n import PLACEHOLDER_PREFIX, tags_metadata, i18n_list
 from apps.swagger.i18n import get_translation, DEFAULT_LANG
 from apps.system.crud.aimodel_manage import async_model_info
 from apps.system.crud.assistant import init_dynamic_cors
 from apps.system.middleware.auth import TokenMiddleware
 from apps.system.schemas.permission import RequestContextMiddleware
+from common.audit.schemas.log_writer import audit_log_writer
 from common.audit.schemas.request_context import RequestContextMiddlewareCommon
 from common.core.config import settings
-from common.core.response_middleware import ResponseMiddleware, exception_handler
+from common.core.db import engine
+from common.core.response_middleware import ResponseMiddleware, exception_handler, EnvelopeResponse
 from common.core.sqlbot_cache import init_sqlbot_cache
+from common.core.task_scheduler import task_scheduler
 from common.utils.embedding_threads import fill_empty_terminology_embeddings, fill_empty_data_training_embeddings, \
     fill_empty_table_and_ds_embeddings
 from common.utils.utils import SQLBotLogUtil
@@ -37,6 +43,10 @@ def run_migrations():
     command.upgrade(alembic_cfg, "head")
 
 
+def init_vector_indexes():
+    ensure_vector_indexes(engine)
+
+
 def init_terminology_embedding_data():
     fill_empty_terminology_embeddings()
 
@@ -52,6 +62,7 @@ def init_table_and_ds_embedding():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     run_migrations()
+    init_vector_indexes()
     init_sqlbot_cache()
     init_dynamic_cors(app)
     init_terminology_embedding_data()
@@ -61,7 +72,12 @@ async def lifespan(app: FastAPI):
     await sqlbot_xpack.core.clean_xpack_cache()
     await async_model_info()  # 异步加密已有模型的密钥和地址
     await sqlbot_xpack.core.monitor_app(app)
+    pool_manager.start_sweeper()
     yield
+    task_scheduler.shutdown()
+    pool_manager.close_all()
+    audit_log_writer.close()
+    close_engine()
     SQLBotLogUtil.info("SQLBot 应用关闭")
 
 
@@ -75,6 +91,7 @@ app = FastAPI(
     openapi_url=f"{settings.CONTEXT_PATH}/openapi.json" if settings.SQLBOT_DOC_ENABLED else None,
     generate_unique_id_function=custom_generate_unique_id,
     lifespan=lifespan,
+    default_response_class=EnvelopeResponse,
     docs_url=None,
     redoc_url=None
 )
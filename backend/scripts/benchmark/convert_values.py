@@ -0,0 +1,79 @@
+"""
+查询结果值转换对比：逐个单元格 convert_value 与按列 ColumnConverterPlan
+
+按 MySQL、PostgreSQL、Oracle 驱动常见的返回类型造数（Oracle 的 NUMBER 均返回 Decimal），
+对比两种方式的耗时并校验结果一致：
+
+    cd backend
+    python -m scripts.benchmark.convert_values --rows 100000 --repeat 3
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from apps.db.db import ColumnConverterPlan, convert_value
+
+
+def _mysql_row(i: int) -> tuple:
+    return (i, f'name-{i}', Decimal(f'{i}.25'), datetime(2024, 1, 1) + timedelta(minutes=i),
+            date(2024, 1, 1) + timedelta(days=i % 365), None if i % 7 == 0 else i % 100, timedelta(seconds=i))
+
+
+def _pg_row(i: int) -> tuple:
+    return (i, f'code-{i}', i * 0.5, i % 2 == 0, datetime(2024, 1, 1) + timedelta(seconds=i),
+            Decimal(i) / 3, None if i % 5 == 0 else f'remark-{i}')
+
+
+def _oracle_row(i: int) -> tuple:
+    return (Decimal(i), f'NAME_{i}', Decimal(f'{i % 1000}.5'), datetime(2024, 1, 1) + timedelta(hours=i),
+            None if i % 3 == 0 else Decimal(i % 10))
+
+
+MIXES = {
+    'mysql': _mysql_row,
+    'pg': _pg_row,
+    'oracle': _oracle_row,
+}
+
+
+def per_cell(keys: list[str], rows: list[tuple]) -> list[dict]:
+    return [{keys[i]: convert_value(value) for i, value in enumerate(row)} for row in rows]
+
+
+def per_column(keys: list[str], rows: list[tuple]) -> list[dict]:
+    plan = ColumnConverterPlan(keys, rows)
+    return [dict(zip(keys, values)) for values in zip(*plan.convert(rows))]
+
+
+def _timeit(fn, keys, rows, repeat: int) -> tuple[float, list[dict]]:
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(keys, rows)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'mix':<8}{'rows':>10}{'cells':>10}{'per cell(ms)':>15}{'per column(ms)':>17}{'speedup':>10}")
+    for name, make_row in MIXES.items():
+        rows = [make_row(i) for i in range(args.rows)]
+        keys = [f'c{i}' for i in range(len(rows[0]))]
+        cell_time, expected = _timeit(per_cell, keys, rows, args.repeat)
+        column_time, actual = _timeit(per_column, keys, rows, args.repeat)
+        assert actual == expected, f'{name}: results differ'
+        print(f"{name:<8}{args.rows:>10}{args.rows * len(keys):>10}{cell_time * 1000:>15.1f}"
+              f"{column_time * 1000:>17.1f}{cell_time / column_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+DataFormat 转换对比：原逐个单元格的实现与按列（pandas / NumPy）实现
+
+对大数字转换、DataFrame 字符串化、按表头取值三种转换，分别用 1 万、10 万、100 万个单元格的查询结果
+（10 列：整数、大整数、小数、极小小数、字符串、空值、布尔、日期、Decimal、嵌套对象）对比耗时并校验结果一致：
+
+    cd backend
+    python -m scripts.benchmark.data_format --cells 10000 100000 1000000 --repeat 3
+
+legacy_* 为原实现，parity 测试（tests/test_data_format.py）以此为基准
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pandas as pd
+
+from apps.chat.models.chat_model import AxisObj
+from common.utils.data_format import DataFormat
+
+COLUMNS = ['id', 'big_id', 'amount', 'ratio', 'name', 'remark', 'flag', 'day', 'price', 'ext']
+
+
+def legacy_convert_large_numbers_in_object_array(obj_array, int_threshold=1e15, float_threshold=1e10):
+    def format_float_without_scientific(value):
+        if value == 0:
+            return "0"
+        formatted = str(Decimal(str(value)))
+        if '.' in formatted:
+            formatted = formatted.rstrip('0').rstrip('.')
+        return formatted
+
+    def process_object(obj):
+        if not isinstance(obj, dict):
+            return obj
+
+        processed_obj = {}
+        for key, value in obj.items():
+            if isinstance(value, (int, float)):
+                if isinstance(value, int) and abs(value) >= int_threshold:
+                    processed_obj[key] = str(value)
+                elif isinstance(value, float) and (abs(value) >= float_threshold or abs(value) < 1e-6):
+                    processed_obj[key] = format_float_without_scientific(value)
+                else:
+                    processed_obj[key] = value
+            elif isinstance(value, dict):
+                processed_obj[key] = process_object(value)
+            elif isinstance(value, list):
+                processed_obj[key] = [process_item(item) for item in value]
+            else:
+                processed_obj[key] = value
+        return processed_obj
+
+    def process_item(item):
+        if isinstance(item, dict):
+            return process_object(item)
+        return item
+
+    return [process_item(obj) for obj in obj_array]
+
+
+def legacy_safe_convert_to_string(df):
+    df_copy = df.copy()
+    for col in df_copy.columns:
+        df_copy[col] = df_copy[col].map(lambda x: "" if pd.isna(x) else "\u200b" + str(x))
+    return df_copy
+
+
+def legacy_convert_object_array_for_pandas(column_list: list, data_list: list):
+    _fields_list = []
+    for field in column_list:
+        _fields_list.append(field.name)
+
+    md_data = []
+    for inner_data in data_list:
+        _row = []
+        for field in column_list:
+            value = inner_data.get(field.value)
+            _row.append(value)
+        md_data.append(_row)
+    return md_data, _fields_list
+
+
+def make_rows(count: int) -> list[dict]:
+    start = date(2024, 1, 1)
+    return [{
+        'id': i,
+        'big_id': 10 ** 15 + i if i % 10 == 0 else i,
+        'amount': i * 1.25 if i % 50 else 1.5e10 + i,
+        'ratio': (i % 100) / 1000 + 0.5 if i % 20 else 1e-7 * (i % 3),
+        'name': f'name-{i}',
+        'remark': None,
+        'flag': i % 2 == 0,
+        'day': str(start + timedelta(days=i % 365)),
+        'price': Decimal(i) / 4,
+        'ext': {'n': i, 'tags': [{'v': 1e12}]} if i % 100 == 0 else None,
+    } for i in range(count)]
+
+
+def _timeit(fn, repeat: int):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _frames_equal(left: pd.DataFrame, right: pd.DataFrame) -> bool:
+    return left.columns.tolist() == right.columns.tolist() and left.values.tolist() == right.values.tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cells', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    column_list = [AxisObj(name=column.upper(), value=column) for column in COLUMNS]
+    print(f"{'case':<22}{'cells':>10}{'legacy(ms)':>13}{'vectorized(ms)':>17}{'speedup':>10}")
+    for cells in args.cells:
+        rows = make_rows(cells // len(COLUMNS))
+        md_data, fields = legacy_convert_object_array_for_pandas(column_list, rows)
+        df = pd.DataFrame(md_data, columns=fields)
+        cases = [
+            ('large_numbers', lambda rows=rows: legacy_convert_large_numbers_in_object_array(rows),
+             lambda rows=rows: DataFormat.convert_large_numbers_in_object_array(rows), None),
+            ('safe_convert_to_string', lambda df=df: legacy_safe_convert_to_string(df),
+             lambda df=df: DataFormat.safe_convert_to_string(df), _frames_equal),
+            ('object_array_to_rows', lambda rows=rows: legacy_convert_object_array_for_pandas(column_list, rows),
+             lambda rows=rows: DataFormat.convert_object_array_for_pandas(column_list, rows), None),
+        ]
+        for name, legacy, vectorized, equals in cases:
+            legacy_time, expected = _timeit(legacy, args.repeat)
+            vectorized_time, actual = _timeit(vectorized, args.repeat)
+            assert (equals(actual, expected) if equals else actual == expected), f'{name}: results differ'
+            print(f"{name:<22}{cells:>10}{legacy_time * 1000:>13.1f}{vectorized_time * 1000:>17.1f}"
+                  f"{legacy_time / vectorized_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Excel/CSV 导入对比：原实现整表读入 DataFrame 再整体生成 COPY 数据与分块读取、逐块生成 COPY 数据
+
+不连接数据库，只对比读取 + 生成 COPY 输入的耗时和内存峰值，并校验两种方式生成的数据一致：
+
+    cd backend
+    python -m scripts.benchmark.excel_import --rows 100000 1000000 --chunk-size 50000 --repeat 1
+
+legacy 为原实现：pd.read_csv / pd.read_excel 读取整个 sheet，to_csv 到一个 StringIO（另外 to_sql 还会再插入一遍）；
+--excel 同时生成 xlsx 文件对比 calamine 按行迭代（需要 xlsxwriter）
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+import pandas as pd
+
+from apps.datasource.utils.excel_import import SheetImport, read_chunks
+
+FIELD_TYPES = {'id': 'int', 'region': 'string', 'code': 'string', 'amount': 'float', 'quantity': 'int',
+               'day': 'datetime', 'customer': 'string'}
+
+
+def make_csv(path: str, rows: int):
+    with open(path, 'w') as f:
+        f.write(','.join(FIELD_TYPES) + '\n')
+        for i in range(rows):
+            f.write(f'{i},区域{i % 7},{i % 1000:04d},{i * 1.25},{"" if i % 11 == 0 else i % 100},'
+                    f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d},customer-{i}\n')
+
+
+def make_xlsx(path: str, csv_path: str):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    sheet = workbook.add_worksheet('Sheet1')
+    with open(csv_path) as f:
+        for index, line in enumerate(f):
+            values = line.rstrip('\n').split(',')
+            if index > 0:
+                values = [float(v) if v and k in ('id', 'amount', 'quantity') else v
+                          for k, v in zip(FIELD_TYPES, values, strict=True)]
+            sheet.write_row(index, 0, values)
+    workbook.close()
+
+
+def legacy_import(path: str) -> int:
+    dtype = {'id': 'int64', 'region': 'string', 'code': 'string', 'amount': 'float64', 'quantity': 'float64',
+             'customer': 'string'}
+    if path.endswith('.csv'):
+        df = pd.read_csv(path, engine='c', dtype=dtype, parse_dates=['day'])
+    else:
+        df = pd.read_excel(path, sheet_name='Sheet1', engine='calamine', dtype=dtype)
+        df['day'] = pd.to_datetime(df['day'])
+    df['quantity'] = df['quantity'].astype('Int64')
+    output = StringIO()
+    df.to_csv(output, sep='\t', header=False, index=False)
+    return hash(output.getvalue())
+
+
+def chunked_import(path: str, chunk_size: int, keep: bool = True) -> int:
+    content = []
+    for _, df in read_chunks(path, SheetImport('Sheet1', 't', FIELD_TYPES), chunk_size):
+        output = StringIO()
+        df.to_csv(output, sep='\t', header=False, index=False)
+        # 保留只用于校验结果，实际导入时每块 COPY 后即释放
+        if keep:
+            content.append(output.getvalue())
+    return hash(''.join(content))
+
+
+def _timeit(fn, repeat: int):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _peak(fn) -> int:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--excel', action='store_true')
+    args = parser.parse_args()
+
+    print(f"{'file':>6}{'rows':>10}{'size(MB)':>10}{'legacy(ms)':>13}{'chunked(ms)':>13}"
+          f"{'legacy peak(MB)':>17}{'chunked peak(MB)':>18}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            paths = [os.path.join(tmp, f'{rows}.csv')]
+            make_csv(paths[0], rows)
+            if args.excel:
+                paths.append(os.path.join(tmp, f'{rows}.xlsx'))
+                make_xlsx(paths[1], paths[0])
+            for path in paths:
+                legacy_time, expected = _timeit(lambda path=path: legacy_import(path), args.repeat)
+                chunked_time, actual = _timeit(lambda path=path: chunked_import(path, args.chunk_size), args.repeat)
+                assert actual == expected, f'{path}: results differ'
+                legacy_peak = _peak(lambda path=path: legacy_import(path))
+                chunked_peak = _peak(lambda path=path: chunked_import(path, args.chunk_size, keep=False))
+                print(f"{path.rsplit('.', 1)[1]:>6}{rows:>10}{os.path.getsize(path) / 1024 / 1024:>10.1f}"
+                      f"{legacy_time * 1000:>13.1f}{chunked_time * 1000:>13.1f}"
+                      f"{legacy_peak / 1024 / 1024:>17.1f}{chunked_peak / 1024 / 1024:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+SQL 解析上下文对比：原各环节分别解析与 ParsedSQL 只解析一次
+
+对生成的 SQL 依次做只读校验、表名提取、格式化展示、结果缓存键规范化（执行一次问数的 SQL 处理流程），
+用约 200 行的分析型 SQL（多个 CTE、多表连接、窗口函数、CASE、子查询）对比三种方式的耗时并校验结果一致：
+    legacy：原实现，每个环节各自解析
+    cold：新建 ParsedSQL，各环节共用一份语法树
+    warm：parse_sql 命中 LRU（看板、实时数据重复执行同一 SQL）
+
+    cd backend
+    python -m scripts.benchmark.parsed_sql --lines 200 --queries 20 --repeat 3
+"""
+import argparse
+import re
+import time
+
+import sqlglot
+import sqlparse
+from sqlglot import exp
+from sqlglot.errors import ErrorLevel
+
+from apps.db.parsed_sql import DANGEROUS_PATTERNS, DENIED_WRITE_COMMANDS, ParsedSQL, ParsedSQLCache, \
+    get_dangerous_functions, get_sqlglot_dialect
+
+DS_TYPE = 'pg'
+
+
+def legacy_check_sql_read(sql: str, ds_type: str) -> tuple[bool, str]:
+    try:
+        normalized_sql = sql.strip().lstrip("(").strip()
+        first_keyword = normalized_sql.split(None, 1)[0].upper() if normalized_sql else ""
+        allowed_read_commands = {"SELECT", "WITH"}
+        if not first_keyword:
+            raise ValueError("Parse SQL Error")
+        if first_keyword in DENIED_WRITE_COMMANDS:
+            return False, f"Write operation '{first_keyword}' is not allowed"
+        for pattern in DANGEROUS_PATTERNS:
+            if re.search(pattern, sql, re.IGNORECASE):
+                return False, f"SQL contains dangerous pattern: {pattern}"
+        statements = sqlglot.parse(sql, dialect=get_sqlglot_dialect(ds_type))
+        if not statements:
+            raise ValueError("Parse SQL Error")
+        dangerous_functions_upper = {f.upper() for f in get_dangerous_functions(ds_type)}
+        for stmt in statements:
+            if stmt:
+                for func in stmt.find_all(exp.Anonymous):
+                    if func.name.upper() in dangerous_functions_upper:
+                        return False, f"SQL contains dangerous function: {func.name}"
+        write_types = (exp.Insert, exp.Update, exp.Delete, exp.Create, exp.Drop, exp.Alter, exp.Merge, exp.Copy)
+        for stmt in statements:
+            if stmt is not None and isinstance(stmt, write_types):
+                return False, f"SQL contains write operation: {type(stmt).__name__}"
+        if first_keyword not in allowed_read_commands:
+            return False, f"SQL command '{first_keyword}' is not allowed. Only SELECT and WITH are permitted"
+        return True, ""
+    except Exception as e:
+        raise ValueError(f"Parse SQL Error: {e}")
+
+
+def legacy_extract_tables(sql: str, ds_type: str) -> set:
+    tables = set()
+    try:
+        for stmt in sqlglot.parse(sql, dialect=get_sqlglot_dialect(ds_type)):
+            if stmt:
+                for table in stmt.find_all(exp.Table):
+                    if table.name:
+                        tables.add(table.name)
+    except Exception:
+        pass
+    return tables
+
+
+def legacy_normalize_sql(sql: str, dialect) -> str:
+    try:
+        statements = sqlglot.transpile(sql, read=dialect, write=dialect, error_level=ErrorLevel.RAISE,
+                                       unsupported_level=ErrorLevel.RAISE)
+        if statements:
+            return ';'.join(statements)
+    except Exception:
+        pass
+    return ' '.join(sql.split())
+
+
+def legacy_pipeline(sql: str):
+    return (legacy_check_sql_read(sql, DS_TYPE), legacy_extract_tables(sql, DS_TYPE),
+            sqlparse.format(sql, reindent=True), legacy_normalize_sql(sql, get_sqlglot_dialect(DS_TYPE)))
+
+
+def context_pipeline(parsed: ParsedSQL):
+    return (parsed.check_read(DS_TYPE), parsed.tables(DS_TYPE), parsed.pretty(),
+            parsed.normalized(get_sqlglot_dialect(DS_TYPE)))
+
+
+def make_query(lines: int, seed: int) -> str:
+    """生成约 lines 行的分析型 SQL：按月汇总的 CTE 链 + 多表连接 + 窗口函数"""
+    ctes = []
+    select_items = []
+    index = 0
+    while True:
+        name = f'm{index}'
+        source = 'orders' if index == 0 else f'm{index - 1}'
+        ctes.append(f"""{name} AS (
+    SELECT
+        o.region,
+        o.category,
+        DATE_TRUNC('month', o.order_date) AS month,
+        SUM(o.amount * (1 - COALESCE(d.rate, 0))) AS revenue_{index},
+        COUNT(DISTINCT o.customer_id) AS customers_{index},
+        AVG(CASE WHEN o.status = 'paid' THEN o.amount ELSE NULL END) AS paid_avg_{index},
+        ROW_NUMBER() OVER (PARTITION BY o.region ORDER BY SUM(o.amount) DESC) AS rn_{index}
+    FROM {source} o
+    LEFT JOIN discounts d ON d.order_id = o.id AND d.valid_from <= o.order_date
+    INNER JOIN customers c ON c.id = o.customer_id AND c.segment IN ('smb', 'enterprise', 'seed{seed}')
+    WHERE o.order_date >= DATE '2024-01-01' AND o.amount > {seed + index}
+    GROUP BY o.region, o.category, DATE_TRUNC('month', o.order_date)
+)""")
+        select_items.append(f'    SUM({name}.revenue_{index}) OVER (PARTITION BY {name}.region) AS total_{index}')
+        index += 1
+        if sum(cte.count('\n') + 1 for cte in ctes) + 2 * index + 10 >= lines:
+            break
+    joins = '\n'.join(f'LEFT JOIN m{i} ON m{i}.region = m0.region AND m{i}.month = m0.month' for i in range(1, index))
+    return (f"WITH {','.join(ctes)}\nSELECT\n    m0.region,\n    m0.month,\n" + ',\n'.join(select_items) +
+            f"\nFROM m0\n{joins}\nWHERE m0.rn_0 <= 10\nORDER BY m0.region, m0.month\nLIMIT 1000")
+
+
+def _timeit(fn, repeat: int):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    queries = [make_query(args.lines, seed) for seed in range(args.queries)]
+    cache = ParsedSQLCache(max_size=args.queries)
+    for sql in queries:
+        cache.get(sql)
+        context_pipeline(cache.get(sql))
+
+    legacy_time, expected = _timeit(lambda: [legacy_pipeline(sql) for sql in queries], args.repeat)
+    cold_time, cold = _timeit(lambda: [context_pipeline(ParsedSQL(sql)) for sql in queries], args.repeat)
+    warm_time, warm = _timeit(lambda: [context_pipeline(cache.get(sql)) for sql in queries], args.repeat)
+    assert cold == expected and warm == expected, 'results differ'
+
+    lines = sum(sql.count('\n') + 1 for sql in queries) // len(queries)
+    print(f"{args.queries} queries, ~{lines} lines each, per query:")
+    print(f"{'case':<10}{'ms':>10}{'speedup':>10}")
+    for name, elapsed in (('legacy', legacy_time), ('cold', cold_time), ('warm', warm_time)):
+        per_query = elapsed * 1000 / len(queries)
+        print(f"{name:<10}{per_query:>10.2f}{legacy_time / elapsed:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+响应包装对比：原 ResponseMiddleware 读取响应体、解析后重新序列化与 EnvelopeResponse 序列化时直接包装
+
+用问数历史记录形式的响应（每条记录带 rows 行 10 列的查询结果）对比耗时和内存峰值，并校验两种方式的结果一致：
+
+    cd backend
+    python -m scripts.benchmark.response_envelope --rows 10000 100000 300000 --repeat 3
+
+legacy 为原实现：JSONResponse 渲染，中间件按 64KB 分块累加响应体，json.loads 后包装再用 JSONResponse 渲染
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from starlette.responses import JSONResponse
+
+from common.core.response_middleware import EnvelopeResponse
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_content(rows: int, records: int = 5) -> list[dict]:
+    start = datetime(2025, 1, 1)
+    per_record = max(1, rows // records)
+    result = []
+    for record_id in range(records):
+        data = [{'id': i, 'region': f'区域{i % 7}', 'category': f'category_{i % 13}', 'amount': i * 1.25,
+                 'quantity': i % 100, 'ratio': (i % 1000) / 1000, 'paid': i % 3 == 0,
+                 'day': (start + timedelta(days=i % 365)).strftime('%Y-%m-%d'), 'remark': None,
+                 'customer': f'customer-{i}'} for i in range(per_record)]
+        result.append({'id': record_id, 'question': f'question {record_id}', 'sql': 'SELECT * FROM orders',
+                       'chart': '{"type": "table"}', 'data': {'fields': list(data[0].keys()), 'data': data}})
+    return result
+
+
+def legacy_envelope(content) -> bytes:
+    rendered = JSONResponse(content).body
+    body = b""
+    for index in range(0, len(rendered), CHUNK_SIZE):
+        body += rendered[index:index + CHUNK_SIZE]
+    raw_data = json.loads(body.decode())
+    return JSONResponse(content={"code": 0, "data": raw_data, "msg": None}).body
+
+
+def envelope(content) -> bytes:
+    return EnvelopeResponse(content).body
+
+
+def _timeit(fn, repeat: int):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _peak(fn) -> int:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 300000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}{'size(MB)':>10}{'legacy(ms)':>13}{'envelope(ms)':>14}{'speedup':>10}"
+          f"{'legacy peak(MB)':>17}{'envelope peak(MB)':>19}")
+    for rows in args.rows:
+        content = make_content(rows)
+        legacy_time, expected = _timeit(lambda content=content: legacy_envelope(content), args.repeat)
+        envelope_time, actual = _timeit(lambda content=content: envelope(content), args.repeat)
+        assert json.loads(actual) == json.loads(expected), f'{rows}: results differ'
+        legacy_peak = _peak(lambda content=content: legacy_envelope(content))
+        envelope_peak = _peak(lambda content=content: envelope(content))
+        print(f"{rows:>8}{len(actual) / 1024 / 1024:>10.1f}{legacy_time * 1000:>13.1f}{envelope_time * 1000:>14.1f}"
+              f"{legacy_time / envelope_time:>9.1f}x{legacy_peak / 1024 / 1024:>17.1f}"
+              f"{envelope_peak / 1024 / 1024:>19.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+向量检索查询计划对比（需要可用的 SQLBot PostgreSQL + pgvector）
+
+在临时表中造数，对比旧的“子查询全表算相似度再过滤”写法与新的“先过滤再按距离 ORDER BY ... LIMIT”写法的执行计划与耗时：
+
+    cd backend
+    python -m scripts.benchmark.vector_index --rows 50000 --workspaces 5
+"""
+import argparse
+import json
+import random
+import time
+
+from sqlalchemy import text
+
+from apps.ai_model.vector_index import render_search_sql, search_settings_sql
+from common.core.config import settings
+from common.core.db import engine
+
+TABLE = 'bench_terminology_embedding'
+
+OLD_SQL = f"""
+SELECT id, word, similarity
+FROM
+(SELECT id, word, oid, enabled,
+( 1 - (embedding <=> :embedding_array) ) AS similarity
+FROM {TABLE}
+) TEMP
+WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY} AND oid = :oid AND enabled = true
+ORDER BY similarity DESC
+LIMIT {settings.EMBEDDING_TERMINOLOGY_TOP_COUNT}
+"""
+
+NEW_SQL = f"""
+SELECT id, word, similarity
+FROM
+(SELECT id, word,
+( 1 - ({{embedding_distance}}) ) AS similarity
+FROM {TABLE}
+WHERE oid = :oid AND enabled = true AND {{embedding_filter}}
+ORDER BY {{embedding_distance}}
+LIMIT {settings.EMBEDDING_TERMINOLOGY_TOP_COUNT}
+) TEMP
+WHERE similarity > {settings.EMBEDDING_TERMINOLOGY_SIMILARITY}
+ORDER BY similarity DESC
+"""
+
+
+def _plan_nodes(plan: dict) -> list[str]:
+    nodes = [plan.get('Node Type') + (f" ({plan['Index Name']})" if plan.get('Index Name') else '')]
+    for child in plan.get('Plans', []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+def _explain(conn, sql: str, params: dict) -> tuple[float, list[str]]:
+    row = conn.execute(text(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}'), params).scalar()
+    result = row if isinstance(row, list) else json.loads(row)
+    return result[0]['Execution Time'], _plan_nodes(result[0]['Plan'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--workspaces', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    dim = settings.EMBEDDING_VECTOR_DIMENSION or 768
+    index_type = settings.EMBEDDING_VECTOR_INDEX_TYPE
+    new_sql = render_search_sql(NEW_SQL, dim if index_type != 'none' else None)
+
+    with engine.connect() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS {TABLE}'))
+        conn.execute(text(f"""
+CREATE TABLE {TABLE} (id bigint PRIMARY KEY, oid bigint, word varchar(255), enabled boolean, embedding vector)
+"""))
+        start = time.perf_counter()
+        conn.execute(text(f"""
+INSERT INTO {TABLE}
+SELECT g, (g % :workspaces) + 1, 'word_' || g, true,
+       (SELECT array_agg(random() - 0.5) FROM generate_series(1, {dim}) WHERE g > 0)::vector
+FROM generate_series(1, :rows) g
+"""), {'rows': args.rows, 'workspaces': args.workspaces})
+        print(f'seeded {args.rows} rows in {time.perf_counter() - start:.1f}s')
+
+        if index_type != 'none':
+            options = f'WITH (m = {settings.EMBEDDING_HNSW_M}, ef_construction = {settings.EMBEDDING_HNSW_EF_CONSTRUCTION})' \
+                if index_type == 'hnsw' else f'WITH (lists = {settings.EMBEDDING_IVFFLAT_LISTS})'
+            start = time.perf_counter()
+            conn.execute(text(f"""
+CREATE INDEX ON {TABLE} USING {index_type} ((CAST(embedding AS vector({dim}))) vector_cosine_ops) {options}
+WHERE embedding IS NOT NULL AND vector_dims(embedding) = {dim}
+"""))
+            print(f'{index_type} index built in {time.perf_counter() - start:.1f}s')
+        conn.execute(text(f'ANALYZE {TABLE}'))
+        for sql in search_settings_sql():
+            conn.execute(text(sql))
+
+        old_times, new_times = [], []
+        old_nodes, new_nodes = [], []
+        for _ in range(args.queries):
+            params = {'embedding_array': str([random.random() - 0.5 for _ in range(dim)]),
+                      'oid': random.randint(1, args.workspaces)}
+            t, old_nodes = _explain(conn, OLD_SQL, params)
+            old_times.append(t)
+            t, new_nodes = _explain(conn, new_sql, params)
+            new_times.append(t)
+
+        print(f'old plan: {" -> ".join(old_nodes)}')
+        print(f'old avg execution time: {sum(old_times) / len(old_times):.2f} ms')
+        print(f'new plan: {" -> ".join(new_nodes)}')
+        print(f'new avg execution time: {sum(new_times) / len(new_times):.2f} ms')
+
+        conn.execute(text(f'DROP TABLE IF EXISTS {TABLE}'))
+        conn.commit()
+
+
+if __name__ == '__main__':
+    main()
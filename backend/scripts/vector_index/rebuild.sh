@@ -0,0 +1,5 @@
+#!/bin/bash
+
+# 重建 terminology / data_training 的 pgvector 索引
+# Usage: ./scripts/vector_index/rebuild.sh [--type hnsw|ivfflat|none] [--dimension 768]
+python -m apps.ai_model.vector_index rebuild "$@"
@@ -0,0 +1,11 @@
+"""
+Shared setup for the tests that import the backend packages.
+
+The backend directory is put on sys.path. Each test module skips itself with pytest.importorskip
+when the backend settings, the third-party modules or the backend modules it imports are not installed.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
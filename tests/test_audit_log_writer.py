@@ -0,0 +1,85 @@
+"""
+Tests for the write-behind audit log writer: batched inserts with resource name backfill,
+flushing on close, and the drop / lag accounting of the bounded queue.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, select
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("sqlmodel")
+
+from common.audit.models.log_model import SystemLog, SystemLogsResource
+from common.audit.schemas.log_writer import AuditLogEntry, AuditLogWriter
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    for model in (SystemLog, SystemLogsResource):
+        model.__table__.create(engine)
+    return engine
+
+
+def _writer(engine, max_queue=100, batch_size=10, lag_warning=5.0, session_maker=None):
+    return AuditLogWriter(session_maker or (lambda: Session(engine)), max_queue=max_queue, batch_size=batch_size,
+                          flush_interval=0.05, lag_warning=lag_warning)
+
+
+def _entry(detail, resource_ids=('1',), module='datasource', resource_info_list=None):
+    log = SystemLog(operation_type='update', operation_detail=detail, operation_status='success', module=module,
+                    create_time=datetime.now(timezone.utc))
+    return AuditLogEntry(log=log,
+                         resource_ids=list(resource_ids), module=module, resource_info_list=resource_info_list)
+
+
+def test_batch_write_and_name_backfill(engine):
+    writer = _writer(engine)
+    writer.write([_entry('a', ['1', '2']), _entry('b', ['3'])])
+    writer.write([_entry('delete', ['1'], resource_info_list=[
+        {'resource_id': '1', 'resource_name': 'orders', 'module': 'datasource'}])])
+
+    with Session(engine) as session:
+        logs = {log.operation_detail: log.id for log in session.exec(select(SystemLog)).all()}
+        resources = session.exec(select(SystemLogsResource).order_by(SystemLogsResource.id)).all()
+    assert [(r.resource_id, r.log_id) for r in resources] == [('1', logs['a']), ('2', logs['a']), ('3', logs['b']),
+                                                              ('1', logs['delete'])]
+    assert [r.resource_name for r in resources if r.resource_id == '1'] == ['orders', 'orders']
+    assert writer.stats()['written'] == 3 and writer.stats()['batches'] == 2
+
+
+def test_background_write_and_flush_on_close(engine):
+    writer = _writer(engine, batch_size=3)
+    for index in range(7):
+        assert writer.submit(_entry(f'log{index}'))
+    writer.close()
+
+    with Session(engine) as session:
+        assert len(session.exec(select(SystemLog)).all()) == 7
+    stats = writer.stats()
+    assert stats['written'] == 7 and stats['queued'] == 0 and stats['dropped'] == 0
+
+
+def test_drop_when_full_and_lag(engine):
+    release = threading.Event()
+
+    def blocking_session():
+        release.wait(5)
+        return Session(engine)
+
+    writer = _writer(engine, max_queue=1, batch_size=1, lag_warning=0.01, session_maker=blocking_session)
+    results = [writer.submit(_entry(f'log{index}')) for index in range(5)]
+    time.sleep(0.05)
+    release.set()
+    writer.close()
+
+    stats = writer.stats()
+    assert stats['dropped'] == results.count(False) >= 3
+    assert stats['written'] == results.count(True)
+    assert stats['lagging'] >= 1 and stats['max_lag'] >= 0.01
@@ -0,0 +1,170 @@
+"""
+Tests that blocking calls made by a chat task in async mode run in threads and leave the event loop free.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.util import greenlet_spawn
+
+pytest.importorskip("greenlet")
+pytest.importorskip("apps.chat.task.llm")
+
+from apps.ai_model import embedding
+from apps.ai_model.embedding import embed_question, question_embedding_context
+from apps.chat.task import llm
+from apps.chat.task.llm import LLMService
+from common.core.task_scheduler import LANE_CHAT, TaskLane
+
+
+class _AsyncSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_exc):
+        return False
+
+    async def run_sync(self, fn):
+        return await greenlet_spawn(fn, self)
+
+
+class _SlowModel:
+    def embed_query(self, text):
+        time.sleep(0.3)
+        return [float(len(text))]
+
+
+def _slow_probe(_ds):
+    time.sleep(0.3)
+    return True
+
+
+def _chat_lane(monkeypatch, max_workers=10, queue_timeout=0):
+    lane = TaskLane(LANE_CHAT, max_workers=max_workers, max_queue=10, queue_timeout=queue_timeout)
+    monkeypatch.setitem(llm.task_scheduler.lanes, LANE_CHAT, lane)
+    return lane
+
+
+def _service(monkeypatch):
+    monkeypatch.setattr(llm, 'get_async_session_maker', lambda: _AsyncSession)
+    monkeypatch.setattr(LLMService, 'enable_async_mode', lambda _self: True)
+    service = LLMService.__new__(LLMService)
+    service.async_mode = True
+    service.ds = SimpleNamespace(type='mysql')
+    service.current_user = SimpleNamespace(oid=1)
+    return service
+
+
+async def _read(service) -> list:
+    return [chunk async for chunk in service.await_result()]
+
+
+def _drive(service, task):
+    async def _main():
+        ticks = 0
+        service.submit_to_channel(LANE_CHAT, task)
+        reader = asyncio.create_task(_read(service))
+        while not reader.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        await service.future
+        return reader.result(), ticks
+
+    return asyncio.run(_main())
+
+
+def test_connection_probe_runs_off_the_loop(monkeypatch):
+    _chat_lane(monkeypatch)
+    service = _service(monkeypatch)
+    monkeypatch.setattr(llm.datasource_health, 'check_connection', _slow_probe)
+
+    def task():
+        yield 'start'
+        yield service.run_blocking(llm.datasource_health.check_connection, service.ds)
+
+    chunks, ticks = _drive(service, task)
+    assert chunks == ['start', True]
+    # the loop kept ticking every 10ms while the probe slept for 300ms
+    assert ticks >= 10
+
+
+def test_question_embedding_runs_off_the_loop(monkeypatch):
+    _chat_lane(monkeypatch)
+    service = _service(monkeypatch)
+    monkeypatch.setattr(embedding.EmbeddingModelCache, 'get_model', lambda _key=None: _SlowModel())
+    monkeypatch.setattr(embedding, 'embedding_query_cache', embedding.EmbeddingQueryCache(16, 60))
+
+    def task():
+        with question_embedding_context(service.run_blocking):
+            yield embed_question('slow  question')
+            yield embed_question('slow question')
+
+    chunks, ticks = _drive(service, task)
+    assert chunks == [[14.0], [14.0]]
+    assert ticks >= 10
+
+
+def test_sql_rewrite_runs_off_the_loop(monkeypatch):
+    _chat_lane(monkeypatch)
+    service = _service(monkeypatch)
+
+    def slow_rewrite(sql, _filters, _ds_type):
+        time.sleep(0.3)
+        return sql + ' WHERE 1 = 1'
+
+    monkeypatch.setattr(llm, 'apply_row_permission_filters', slow_rewrite)
+
+    def task():
+        yield service.apply_table_filter(None, 'SELECT 1', [])
+
+    chunks, ticks = _drive(service, task)
+    assert chunks == ['SELECT 1 WHERE 1 = 1']
+    assert ticks >= 10
+
+
+def test_async_tasks_share_the_chat_lane(monkeypatch):
+    lane = _chat_lane(monkeypatch, max_workers=1)
+    services = [_service(monkeypatch) for _ in range(2)]
+    events = []
+
+    def task(name):
+        def _task():
+            events.append(f'start {name}')
+            llm.await_only(asyncio.sleep(0.1))
+            events.append(f'end {name}')
+            yield name
+        return _task
+
+    async def _main():
+        for i, service in enumerate(services):
+            service.submit_to_channel(LANE_CHAT, task(i))
+        return await asyncio.gather(*(_read(service) for service in services))
+
+    assert asyncio.run(_main()) == [[0], [1]]
+    # the second task waited for the only slot
+    assert events == ['start 0', 'end 0', 'start 1', 'end 1']
+    stats = lane.stats()
+    assert (stats['running'], stats['completed']) == (0, 2)
+
+
+def test_async_task_queue_timeout(monkeypatch):
+    lane = _chat_lane(monkeypatch, max_workers=1, queue_timeout=0.05)
+    slow, waiting = _service(monkeypatch), _service(monkeypatch)
+
+    def slow_task():
+        llm.await_only(asyncio.sleep(0.3))
+        yield 'done'
+
+    def never():
+        yield 'never'
+
+    async def _main():
+        slow.submit_to_channel(LANE_CHAT, slow_task)
+        waiting.submit_to_channel(LANE_CHAT, never, in_chat=False, stream=False)
+        return await asyncio.gather(_read(slow), _read(waiting))
+
+    done, timed_out = asyncio.run(_main())
+    assert done == ['done']
+    assert timed_out[0]['success'] is False and 'waited too long' in timed_out[0]['message']
+    assert (lane.stats()['timeouts'], lane.stats()['running']) == (1, 0)
@@ -0,0 +1,64 @@
+"""
+Tests for saving chat query and predict results as pages and reading them back from the record.
+"""
+import orjson
+import pytest
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+
+pytest.importorskip("sqlmodel")
+pytest.importorskip("apps.chat.curd.chat")
+
+from apps.chat.curd import chat
+from apps.chat.curd.chat_result import load_record_data, load_record_predict_data
+from apps.chat.models.chat_model import ChatRecord, ChatRecordResultPage
+from apps.db.result_set import ColumnarResult
+from common.core.config import settings
+
+
+@compiles(BigInteger, 'sqlite')
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only auto-increments INTEGER primary keys
+    return 'INTEGER'
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(settings, 'CHAT_RESULT_PAGE_SIZE', 2)
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    for model in (ChatRecord, ChatRecordResultPage):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        session.add(ChatRecord(id=1, chat_id=1, question='q'))
+        session.commit()
+        yield session
+
+
+def _stored(session, column):
+    return orjson.loads(getattr(session.get(ChatRecord, 1), column))
+
+
+def test_save_sql_exec_result_pages(session):
+    result = ColumnarResult(['id', 'name'], [[1, 2, 3], ['a', 'b', None]], sql='c2VsZWN0')
+    chat.save_sql_exec_result(session, 1, {'fields': ['id', 'name'], 'sql': 'c2VsZWN0'}, result)
+    session.expire_all()
+
+    data = _stored(session, 'data')
+    assert 'data' not in data
+    assert session.query(ChatRecordResultPage).count() == 2
+    assert load_record_data(session, data) == {'fields': ['id', 'name'], 'sql': 'c2VsZWN0', 'data': [
+        {'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}, {'id': 3, 'name': None}]}
+    assert load_record_data(session, data, offset=1, limit=1)['data'] == [{'id': 2, 'name': 'b'}]
+
+
+def test_save_predict_data_pages(session):
+    rows = [{'month': f'2025-0{i}', 'value': i * 1.5} for i in range(1, 6)]
+    chat.save_predict_data(session, 1, orjson.dumps(rows).decode())
+    session.expire_all()
+
+    predict_data = _stored(session, 'predict_data')
+    assert session.query(ChatRecordResultPage).count() == 3
+    assert load_record_predict_data(session, predict_data) == rows
+    assert load_record_predict_data(session, predict_data, offset=3, limit=5) == rows[3:]
@@ -0,0 +1,83 @@
+"""
+Tests for the paged chat result storage codec and the range reads on stored records.
+"""
+import importlib.util
+import os
+
+import orjson
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("sqlmodel")
+pytest.importorskip("langchain_core")
+
+from apps.chat.curd.chat_result import (
+    RESULT_STORE_KEY,
+    build_data_header,
+    build_store,
+    decode_page,
+    load_record_data,
+    load_record_predict_data,
+    result_total,
+    split_columns,
+    split_rows,
+)
+
+MIGRATION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'backend', 'alembic', 'versions', '074_chat_record_result_page.py')
+
+
+def _load_migration():
+    pytest.importorskip("alembic.op")
+    spec = importlib.util.spec_from_file_location('migration_074', MIGRATION_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_columnar_pages_round_trip():
+    keys = ['o.id', 'name', 'id']
+    columns = [list(range(7)), [f'n{i}' for i in range(7)], list(range(7))]
+    pages = list(split_columns(keys, columns, 3))
+    assert [(start, count) for start, count, _ in pages] == [(0, 3), (3, 3), (6, 1)]
+    rows = [row for _, _, content in pages for row in decode_page(content)]
+    assert rows == [dict(zip(keys, values, strict=True)) for values in zip(*columns, strict=True)]
+
+
+def test_row_pages_keep_ragged_rows():
+    rows = [{'a': 1, 'b': 2.5}, {'b': None, 'a': 'x'}, {'c': [1, {'d': 2}]}]
+    pages = list(split_rows(rows, 2))
+    assert [row for _, _, content in pages for row in decode_page(content)] == rows
+
+    uniform = [{'a': i, 'b': str(i)} for i in range(5)]
+    assert [row for _, _, content in split_rows(uniform, 2) for row in decode_page(content)] == uniform
+    assert list(split_rows([], 2)) == []
+
+
+def test_header_and_legacy_results():
+    data_obj = {'fields': ['a'], 'data': [{'a': 1}], 'sql': 'c2VsZWN0', 'datasource': 3}
+    header = orjson.loads(build_data_header(data_obj, build_store(10, 'data', 1)))
+    assert header == {'fields': ['a'], 'sql': 'c2VsZWN0', 'datasource': 3,
+                      RESULT_STORE_KEY: {'record_id': 10, 'kind': 'data', 'total': 1}}
+    assert result_total(header) == 1
+
+    legacy = {'fields': ['a'], 'data': [{'a': i} for i in range(5)]}
+    assert result_total(legacy) == 5
+    assert load_record_data(None, legacy, 1, 2)['data'] == [{'a': 1}, {'a': 2}]
+    assert load_record_data(None, legacy)['data'] == legacy['data']
+    assert load_record_predict_data(None, [1, 2, 3], 2, 5) == [3]
+    assert result_total([1, 2]) == 2
+
+
+def test_migration_pages_match_the_app_codec():
+    migration = _load_migration()
+    assert migration.RESULT_STORE_KEY == RESULT_STORE_KEY
+    uniform = [{'a': i, 'b': str(i)} for i in range(migration.PAGE_SIZE + 3)]
+    ragged = [{'a': 1}, {'b': 2}, [3]]
+    for rows in (uniform, ragged):
+        pages = list(migration._split_rows(rows))
+        assert [row for _, _, content in pages for row in decode_page(content)] == rows
+        assert [row for _, _, content in split_rows(rows, migration.PAGE_SIZE)
+                for row in migration._decode_page(content)] == rows
+    assert [(start, count) for start, count, _ in migration._split_rows(uniform)] == \
+        [(0, migration.PAGE_SIZE), (migration.PAGE_SIZE, 3)]
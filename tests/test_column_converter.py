@@ -0,0 +1,70 @@
+"""
+Parity tests for the column-wise result conversion: ColumnConverterPlan must give the same values as convert_value.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("apps.db.db")
+
+from apps.db.db import ColumnConverterPlan, convert_value
+
+
+def _mysql_row(i: int) -> tuple:
+    # BIT columns come back as bytes, TIME as timedelta, DECIMAL as Decimal
+    return (i, f'name-{i}', Decimal(f'{i}.25'), datetime(2024, 1, 1) + timedelta(minutes=i),
+            date(2024, 1, 1) + timedelta(days=i), None if i % 3 == 0 else i % 100, timedelta(seconds=i * 61),
+            b'\x01' if i % 2 else b'\x00', f'text-{i}'.encode())
+
+
+def _pg_row(i: int) -> tuple:
+    return (i, f'code-{i}', i * 0.5, i % 2 == 0, datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=i),
+            Decimal(i) / 3, None if i % 2 == 0 else f'remark-{i}', time(i % 24, 30), bytes([0xff, i % 256, 0x00]))
+
+
+def _oracle_row(i: int) -> tuple:
+    # NUMBER is always Decimal, DATE is datetime
+    return (Decimal(i), f'NAME_{i}', Decimal(f'{i % 1000}.5'), datetime(2024, 1, 1) + timedelta(hours=i),
+            None if i % 3 == 0 else Decimal(i % 10), datetime(999, 12, 31, 23, 59, 59) + timedelta(days=i))
+
+
+def _typed(columns) -> list:
+    # compare types too: 1 == True == 1.0 would hide a wrong conversion
+    return [[(type(value), value) for value in column] for column in columns]
+
+
+def _per_cell(batch: list) -> list:
+    return _typed(zip(*([convert_value(value) for value in row] for row in batch), strict=True))
+
+
+def _assert_parity(batches: list):
+    plan = ColumnConverterPlan([f'c{i}' for i in range(len(batches[0][0]))], batches[0])
+    for batch in batches:
+        assert _typed(plan.convert(batch)) == _per_cell(batch)
+
+
+@pytest.mark.parametrize('make_row', [_mysql_row, _pg_row, _oracle_row], ids=['mysql', 'pg', 'oracle'])
+def test_driver_type_mixes(make_row):
+    _assert_parity([[make_row(i) for i in range(start, start + 50)] for start in range(0, 150, 50)])
+
+
+def test_columns_starting_with_none():
+    first = [(None, None, None, None)] * 3
+    later = [(Decimal('1.5'), datetime(2024, 5, 1, 8), b'\x01', timedelta(hours=1)),
+             (None, None, None, None),
+             (Decimal('2'), datetime(2024, 5, 2), b'\x00', timedelta(0))]
+    _assert_parity([first, later])
+
+
+def test_types_changing_between_batches():
+    first = [(Decimal('1.5'), datetime(2024, 1, 1), date(2024, 1, 1), 1)]
+    later = [(2.5, date(2024, 1, 2), datetime(2024, 1, 2, 3), Decimal('3')),
+             (Decimal('4'), datetime(2024, 1, 3, tzinfo=timezone(timedelta(hours=8))), None, True)]
+    _assert_parity([first, later])
+
+
+def test_bytes_values():
+    rows = [(b'\x00',), (b'\x01',), (b'\x00\x2a',), ('中文'.encode(),), (b'\xff\x00\x01' * 4,), (bytearray(b'\x01'),),
+            (b'\xe9t\xe9 plus long que huit',)]
+    _assert_parity([rows])
@@ -0,0 +1,75 @@
+"""
+Tests for the dashboard chart queries: per-datasource throttling and loading all chart data.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+pytest.importorskip("apps.dashboard.crud.dashboard_service")
+
+from apps.dashboard.crud import dashboard_service
+from common.core.config import settings
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(dashboard_service, 'chart_executor', executor)
+    monkeypatch.setattr(settings, 'DASHBOARD_DS_CONCURRENCY', 1)
+    yield executor
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+@pytest.mark.usefixtures('executor')
+def test_queued_queries_do_not_hold_workers(monkeypatch):
+    slow_ds, fast_ds = SimpleNamespace(id=1), SimpleNamespace(id=2)
+    release = threading.Event()
+    started = []
+
+    def query(datasource, sql):
+        started.append(sql)
+        if datasource is slow_ds:
+            assert release.wait(5)
+        return {'status': 'success', 'data': [sql], 'message': ''}
+
+    monkeypatch.setattr(dashboard_service, 'get_chart_data_by_ds', query)
+    slow = [dashboard_service._submit_chart_query(slow_ds, f'slow {i}') for i in range(3)]
+    fast = dashboard_service._submit_chart_query(fast_ds, 'fast')
+
+    # one worker runs the slow datasource, the queued slow queries leave the other worker free
+    assert fast.result(timeout=5)['data'] == ['fast']
+    assert sorted(started) == ['fast', 'slow 0']
+    assert not any(future.done() for future in slow)
+
+    release.set()
+    assert [future.result(timeout=5)['data'] for future in slow] == [['slow 0'], ['slow 1'], ['slow 2']]
+    assert started[2:] == ['slow 1', 'slow 2']
+    assert dashboard_service._ds_queues == {}
+
+
+@pytest.mark.usefixtures('executor')
+def test_load_chart_data(monkeypatch):
+    def query(_datasource, sql):
+        if sql == 'bad':
+            return {'status': 'failed', 'data': [], 'message': 'error'}
+        return {'status': 'success', 'data': [{'sql': sql}], 'message': ''}
+
+    monkeypatch.setattr(dashboard_service, 'get_ds', lambda _session, ds_id: SimpleNamespace(id=ds_id))
+    monkeypatch.setattr(dashboard_service, 'get_chart_data_by_ds', query)
+    canvas = {
+        'a': {'datasource': 1, 'sql': 'select 1', 'data': {}},
+        'b': {'datasource': 1, 'sql': 'select 1', 'data': {}},
+        'c': {'datasource': 2, 'sql': 'bad', 'data': {}},
+        'text': {'data': {}},
+    }
+    result = asyncio.run(dashboard_service.load_chart_data(None, {'canvas_view_info': orjson.dumps(canvas)}))
+
+    views = orjson.loads(result['canvas_view_info'])
+    assert views['a'] == views['b'] == {'datasource': 1, 'sql': 'select 1', 'data': {'data': [{'sql': 'select 1'}]},
+                                         'status': 'success', 'message': ''}
+    assert (views['c']['status'], views['c']['message']) == ('failed', 'error')
+    assert views['text'] == {'data': {}}
@@ -0,0 +1,112 @@
+"""
+Parity tests for the vectorized DataFormat transformations.
+
+Each transformation is compared with the original per-cell implementation kept in
+scripts/benchmark/data_format.py.
+"""
+import math
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from apps.chat.models.chat_model import AxisObj
+from apps.db.result_set import ColumnarResult
+from common.utils.data_format import DataFormat
+from scripts.benchmark.data_format import (
+    legacy_convert_large_numbers_in_object_array,
+    legacy_convert_object_array_for_pandas,
+    legacy_safe_convert_to_string,
+    make_rows,
+)
+
+EDGE_VALUES = [0, 1, -10 ** 15, 10 ** 15 - 1, 10 ** 400, True, False, 0.0, -0.0, 1e-7, -1e-6, 1e-6, 9.99e9, 1e10,
+               -2.5e12, math.inf, -math.inf, math.nan, None, 'text', Decimal('1e20'), {'v': 1e16, 'l': [1e-9, {'x': 2}]},
+               [1e16, {'y': 10 ** 16}]]
+
+
+def _assert_same(actual, expected):
+    # NaN 不等于自身，按 repr 比较
+    assert repr(actual) == repr(expected)
+
+
+def test_large_numbers_uniform_rows():
+    rows = make_rows(500)
+    _assert_same(DataFormat.convert_large_numbers_in_object_array(rows),
+                 legacy_convert_large_numbers_in_object_array(rows))
+
+
+@pytest.mark.parametrize('value', EDGE_VALUES)
+def test_large_numbers_edge_values(value):
+    rows = [{'a': value, 'b': 1}, {'a': 2, 'b': value}, {'a': None, 'b': 3.5}]
+    _assert_same(DataFormat.convert_large_numbers_in_object_array(rows),
+                 legacy_convert_large_numbers_in_object_array(rows))
+    result = ColumnarResult(['a', 'b'], [[row['a'] for row in rows], [row['b'] for row in rows]])
+    _assert_same(DataFormat.convert_large_numbers_in_columns(result).rows(),
+                 legacy_convert_large_numbers_in_object_array(rows))
+
+
+def test_large_numbers_mixed_columns_and_ragged_rows():
+    column = [1, 2.5, 10 ** 16, 1e-8, None, True]
+    rows = [{'a': value} for value in column]
+    _assert_same(DataFormat.convert_large_numbers_in_object_array(rows),
+                 legacy_convert_large_numbers_in_object_array(rows))
+
+    ragged = [{'a': 10 ** 16, 'b': 1}, {'b': 1e11, 'a': 1}, {'c': 1e-9}, 'raw', None, {}]
+    _assert_same(DataFormat.convert_large_numbers_in_object_array(ragged),
+                 legacy_convert_large_numbers_in_object_array(ragged))
+    assert DataFormat.convert_large_numbers_in_object_array([]) == []
+    assert DataFormat.convert_large_numbers_in_object_array([{}, {}]) == [{}, {}]
+
+
+def test_large_numbers_returns_copies():
+    rows = [{'a': 1, 'n': {'v': 1}}]
+    converted = DataFormat.convert_large_numbers_in_object_array(rows)
+    assert converted[0] is not rows[0]
+    assert converted[0]['n'] is not rows[0]['n']
+
+
+def test_safe_convert_to_string_dtypes():
+    df = pd.DataFrame({
+        'int': [1, 2, 10 ** 18],
+        'float': [0.1, 1e16, math.nan],
+        'whole_float': [1.0, 2.0, 3.0],
+        'bool': [True, False, True],
+        'text': ['a', None, 'c'],
+        'mixed': [Decimal('1.10'), 1.5, date(2024, 1, 1)],
+        'empty': [None, None, None],
+        'midnight': pd.to_datetime(['2024-01-01', '2024-01-02', None]),
+        'datetime': pd.to_datetime([datetime(2024, 1, 1, 8), None, datetime(2024, 1, 2)]),
+        'float32': np.array([0.1, 0.2, 1e20], dtype=np.float32),
+        'nullable': pd.array([1, None, 3], dtype='Int64'),
+    })
+    actual = DataFormat.safe_convert_to_string(df)
+    expected = legacy_safe_convert_to_string(df)
+    assert actual.columns.tolist() == expected.columns.tolist()
+    assert actual.values.tolist() == expected.values.tolist()
+
+    duplicated = pd.DataFrame([[1, 'x'], [None, 'y']], columns=['v', 'v'])
+    assert DataFormat.safe_convert_to_string(duplicated).values.tolist() == [['\u200b1.0', '\u200bx'],
+                                                                            ['', '\u200by']]
+    assert DataFormat.safe_convert_to_string(pd.DataFrame(columns=['a'])).empty
+
+
+def test_object_array_for_pandas():
+    column_list = [AxisObj(name='ID', value='id'), AxisObj(name='Name', value='name')]
+    rows = make_rows(50)
+    assert DataFormat.convert_object_array_for_pandas(column_list, rows) == \
+           legacy_convert_object_array_for_pandas(column_list, rows)
+
+    ragged = [{'id': 1}, {'id': 2, 'name': 'b'}]
+    assert DataFormat.convert_object_array_for_pandas(column_list, ragged) == \
+           legacy_convert_object_array_for_pandas(column_list, ragged)
+    single = column_list[:1]
+    assert DataFormat.convert_object_array_for_pandas(single, rows) == \
+           legacy_convert_object_array_for_pandas(single, rows)
+    assert DataFormat.convert_object_array_for_pandas([], rows[:2]) == ([[], []], [])
@@ -0,0 +1,143 @@
+"""
+Tests for the cached datasource health / version probes (TTL, stale refresh, invalidation).
+"""
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("sqlglot")
+pytest.importorskip("sqlmodel")
+
+from apps.datasource.models.datasource import CoreDatasource
+from apps.db import health
+from apps.db.health import DatasourceHealthService
+from common.core.config import settings
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class _Scheduler:
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, lane, fn, *args, **kwargs):
+        self.tasks.append((fn, args))
+
+    def run_all(self):
+        tasks, self.tasks = self.tasks, []
+        for fn, args in tasks:
+            fn(*args)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    clock = _Clock()
+    scheduler = _Scheduler()
+    monkeypatch.setattr(health.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(health, 'task_scheduler', scheduler)
+    monkeypatch.setattr(settings, 'DATASOURCE_HEALTH_ENABLED', True)
+    monkeypatch.setattr(settings, 'DATASOURCE_HEALTH_TTL', 30)
+    monkeypatch.setattr(settings, 'DATASOURCE_HEALTH_STALE_TTL', 300)
+    monkeypatch.setattr(settings, 'DATASOURCE_VERSION_TTL', 3600)
+    return clock, scheduler
+
+
+def _ds(ds_id=1, configuration='conf'):
+    return CoreDatasource(id=ds_id, name='ds', type='pg', configuration=configuration)
+
+
+def _service(alive=True, version='15.2'):
+    calls = {'alive': 0, 'version': 0, 'result': alive}
+
+    def alive_probe(_ds):
+        calls['alive'] += 1
+        if isinstance(calls['result'], Exception):
+            raise calls['result']
+        return calls['result']
+
+    def version_probe(_ds):
+        calls['version'] += 1
+        return version
+
+    return DatasourceHealthService(alive_probe, version_probe), calls
+
+
+def test_cached_within_ttl_and_reprobed_after_stale_window(env):
+    clock, scheduler = env
+    service, calls = _service()
+    ds = _ds()
+    assert service.check_connection(ds) and service.check_connection(ds)
+    assert service.get_version(ds) == '15.2' and service.get_version(ds) == '15.2'
+    assert calls == {'alive': 1, 'version': 1, 'result': True}
+
+    clock.now += 1000
+    assert service.check_connection(ds)
+    assert service.get_version(ds) == '15.2'
+    assert calls['alive'] == 2 and calls['version'] == 1
+    assert not scheduler.tasks
+
+
+def test_stale_result_refreshed_in_background(env):
+    clock, scheduler = env
+    service, calls = _service()
+    ds = _ds()
+    service.check_connection(ds)
+
+    clock.now += 60
+    assert service.check_connection(ds) and service.check_connection(ds)
+    assert calls['alive'] == 1 and len(scheduler.tasks) == 1
+    assert service.stats()['stale_hits'] == 2
+
+    calls['result'] = False
+    scheduler.run_all()
+    assert calls['alive'] == 2
+    # 后台刷新失败后清除结果，下一次同步探测
+    calls['result'] = True
+    assert service.check_connection(ds)
+    assert calls['alive'] == 3
+
+
+def test_failures_not_cached_and_invalidation(env):
+    clock, scheduler = env
+    service, calls = _service(alive=ConnectionError('refused'))
+    ds = _ds()
+    assert not service.check_connection(ds)
+    assert not service.check_connection(ds)
+    assert calls['alive'] == 2 and service.stats()['probe_failures'] == 2
+
+    calls['result'] = True
+    assert service.check_connection(ds)
+    assert service.check_connection(_ds(configuration='changed'))
+    assert calls['alive'] == 4
+
+    service.invalidate(ds.id)
+    assert service.check_connection(ds)
+    assert calls['alive'] == 5
+
+    # 刷新期间数据源被修改，旧配置的结果被丢弃
+    clock.now += 60
+    service.check_connection(ds)
+    service.invalidate(ds.id)
+    scheduler.run_all()
+    assert service.stats()['size'] == 0
+
+
+@pytest.mark.usefixtures('env')
+def test_disabled_or_external_datasource_probes_every_time(monkeypatch):
+    service, calls = _service()
+    ds = _ds(ds_id=None)
+    service.check_connection(ds)
+    service.check_connection(ds)
+    assert calls['alive'] == 2
+
+    monkeypatch.setattr(settings, 'DATASOURCE_HEALTH_ENABLED', False)
+    service.check_connection(_ds())
+    service.check_connection(_ds())
+    assert calls['alive'] == 4
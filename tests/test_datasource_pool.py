@@ -0,0 +1,103 @@
+"""
+Tests for the datasource connection pool manager: reuse per config, the global connection
+budget and idle eviction.
+"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("sqlglot")
+pytest.importorskip("sqlmodel")
+
+from apps.db import pool
+from apps.db.pool import DatasourcePoolManager, PoolKind
+
+
+def _ds(ds_id, configuration='conf', capacity=5):
+    return SimpleNamespace(id=ds_id, name=f'ds{ds_id}', type='pg', configuration=configuration, capacity=capacity)
+
+
+def _manager(max_total_connections=100, idle_timeout=600):
+    disposed = []
+
+    def create(_ds, max_connections):
+        engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=max_connections, max_overflow=0)
+        return sessionmaker(bind=engine), engine
+
+    def dispose(engine):
+        disposed.append(engine)
+        engine.dispose()
+
+    manager = DatasourcePoolManager(max_pools=3, max_total_connections=max_total_connections,
+                                    idle_timeout=idle_timeout)
+    manager.register('engine', PoolKind(capacity=lambda ds: ds.capacity, create=create,
+                                        usage=lambda engine: (engine.pool.checkedout(), engine.pool.checkedin()),
+                                        dispose=dispose))
+    return manager, disposed
+
+
+def test_reuse_and_rebuild_on_config_change():
+    manager, disposed = _manager()
+    first = manager.get_pool('engine', _ds(1))
+    assert manager.get_pool('engine', _ds(1)) is first
+    with first() as session:
+        assert session.execute(text('select 1')).scalar() == 1
+
+    rebuilt = manager.get_pool('engine', _ds(1, configuration='changed'))
+    assert rebuilt is not first
+    assert disposed == [first.kw['bind']]
+    assert manager.stats()['pools'] == 1 and manager.stats()['reserved_connections'] == 5
+
+    manager.invalidate(1)
+    assert manager.stats()['pools'] == 0 and len(disposed) == 2
+
+
+def test_budget_evicts_idle_then_shrinks():
+    manager, disposed = _manager(max_total_connections=10)
+    busy = manager.get_pool('engine', _ds(1))()
+    busy.connection()
+    manager.get_pool('engine', _ds(2))
+
+    # ds2 没有借出连接，被释放给 ds3
+    manager.get_pool('engine', _ds(3))
+    stats = manager.stats()
+    assert [item['datasource'] for item in stats['datasources']] == [1, 3]
+    assert stats['budget_evictions'] == 1 and stats['reserved_connections'] == 10
+    assert stats['checked_out'] == 1
+
+    # 其余连接池都有借出连接，新连接池缩小到剩余额度（至少 1 个）
+    busy3 = manager.get_pool('engine', _ds(3))()
+    busy3.connection()
+    manager.get_pool('engine', _ds(4))
+    stats = manager.stats()
+    assert stats['shrunk'] == 1
+    assert {item['datasource']: item['max_connections'] for item in stats['datasources']} == {1: 5, 3: 5, 4: 1}
+    busy.close()
+    busy3.close()
+    manager.close_all()
+    assert manager.stats()['pools'] == 0
+
+
+def test_idle_pools_disposed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pool.time, 'monotonic', lambda: now[0])
+    manager, disposed = _manager(idle_timeout=600)
+    session = manager.get_pool('engine', _ds(1))()
+    session.connection()
+    manager.get_pool('engine', _ds(2))
+
+    now[0] += 601
+    manager.evict_idle()
+    assert [item['datasource'] for item in manager.stats()['datasources']] == [1]
+    assert manager.stats()['idle_evictions'] == 1
+
+    session.close()
+    stats = manager.stats()
+    assert stats['datasources'][0]['checked_out'] == 0 and stats['datasources'][0]['idle'] == 1
+    manager.evict_idle()
+    assert manager.stats()['pools'] == 0 and len(disposed) == 2
@@ -0,0 +1,108 @@
+"""
+Tests for the NumPy embedding matrix used by table / datasource selection.
+"""
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("numpy")
+
+from apps.datasource.embedding.matrix import (
+    EmbeddingMatrix,
+    EmbeddingMatrixStore,
+    top_k,
+)
+from apps.datasource.embedding.utils import cosine_similarity
+
+
+def _random_vector(dim=16):
+    return [random.uniform(-1, 1) for _ in range(dim)]
+
+
+class TestEmbeddingMatrix:
+
+    def test_scores_match_python_cosine(self):
+        vectors = {i: _random_vector() for i in range(1, 50)}
+        q = _random_vector()
+        matrix = EmbeddingMatrix(vectors)
+        scores = matrix.scores(q, list(vectors.keys()))
+        for i, _id in enumerate(vectors.keys()):
+            assert scores[i] == pytest.approx(cosine_similarity(q, vectors[_id]), abs=1e-5)
+
+    def test_missing_ids_score_zero(self):
+        matrix = EmbeddingMatrix({1: _random_vector(), 2: _random_vector()})
+        scores = matrix.scores(_random_vector(), [3, 1, 4])
+        assert scores[0] == 0.0
+        assert scores[2] == 0.0
+        assert scores[1] != 0.0
+
+    def test_zero_vector(self):
+        matrix = EmbeddingMatrix({1: [0.0, 0.0], 2: [1.0, 0.0]})
+        assert matrix.scores([1.0, 0.0], [1, 2]).tolist() == [0.0, 1.0]
+
+    def test_dimension_mismatch(self):
+        matrix = EmbeddingMatrix({1: [1.0, 0.0]})
+        with pytest.raises(ValueError):
+            matrix.scores([1.0, 0.0, 0.0], [1])
+
+    def test_with_updates(self):
+        matrix = EmbeddingMatrix({1: [1.0, 0.0], 2: [0.0, 1.0]})
+        updated = matrix.with_updates({2: [1.0, 0.0], 3: [0.0, 1.0]})
+        assert updated.scores([1.0, 0.0], [1, 2, 3]).tolist() == [1.0, 1.0, 0.0]
+        # the original matrix is left untouched for concurrent readers
+        assert matrix.scores([1.0, 0.0], [1, 2, 3]).tolist() == [1.0, 0.0, 0.0]
+
+    def test_with_updates_dimension_change(self):
+        matrix = EmbeddingMatrix({1: [1.0, 0.0], 2: [0.0, 1.0]})
+        updated = matrix.with_updates({2: [0.0, 0.0, 1.0], 3: [1.0, 0.0, 0.0]})
+        assert len(updated) == 2
+        assert updated.scores([1.0, 0.0, 0.0], [1, 2, 3]).tolist() == [0.0, 0.0, 1.0]
+
+
+class TestTopK:
+
+    def test_matches_sorted_slice(self):
+        scores = np.asarray([random.random() for _ in range(200)], dtype=np.float32)
+        expected = sorted(range(200), key=lambda i: scores[i], reverse=True)[:10]
+        assert top_k(scores, 10) == expected
+
+    def test_ties_keep_original_order(self):
+        scores = np.asarray([0.0, 0.5, 0.0, 0.5, 0.0], dtype=np.float32)
+        assert top_k(scores, 5) == [1, 3, 0, 2, 4]
+
+    def test_k_larger_than_n(self):
+        assert top_k(np.asarray([0.1, 0.3], dtype=np.float32), 10) == [1, 0]
+
+
+class TestEmbeddingMatrixStore:
+
+    def test_load_once_and_reload_on_new_id(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {1: '[1.0, 0.0]', 2: None}
+
+        store = EmbeddingMatrixStore(ttl=600)
+        store.get('ds', [1, 2], loader)
+        store.get('ds', [1, 2], loader)
+        assert len(calls) == 1
+        store.get('ds', [1, 2, 3], loader)
+        assert len(calls) == 2
+
+    def test_refresh(self):
+        store = EmbeddingMatrixStore(ttl=600)
+        store.get('ds', [1, 2], lambda: {1: '[1.0, 0.0]', 2: None})
+        store.refresh('ds', {2: [1.0, 0.0]})
+        matrix = store.get('ds', [1, 2], lambda: pytest.fail('should not reload'))
+        assert matrix.scores([1.0, 0.0], [1, 2]).tolist() == [1.0, 1.0]
+
+    def test_refresh_dimension_change_reloads_old_ids(self):
+        store = EmbeddingMatrixStore(ttl=600)
+        store.get('ds', [1, 2], lambda: {1: '[1.0, 0.0]', 2: '[0.0, 1.0]'})
+        store.refresh('ds', {2: [0.0, 0.0, 1.0]})
+        assert store.get('ds', [2], lambda: pytest.fail('should not reload')).scores([0.0, 0.0, 1.0]).tolist() == [1.0]
+        matrix = store.get('ds', [1, 2], lambda: {1: '[1.0, 0.0, 0.0]', 2: '[0.0, 0.0, 1.0]'})
+        assert matrix.scores([1.0, 0.0, 0.0], [1, 2]).tolist() == [1.0, 0.0]
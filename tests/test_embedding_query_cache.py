@@ -0,0 +1,107 @@
+"""
+Tests for the question embedding cache: request-scope hits, the process-wide LRU with TTL and its counters.
+"""
+import pytest
+
+pytest.importorskip("apps.ai_model.embedding")
+
+from apps.ai_model import embedding
+from apps.ai_model.embedding import (
+    EmbeddingQueryCache,
+    embed_question,
+    question_embedding_context,
+)
+
+
+class _Model:
+    def __init__(self):
+        self.texts = []
+
+    def embed_query(self, text):
+        self.texts.append(text)
+        return [float(len(text))]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = _Model()
+    monkeypatch.setattr(embedding.EmbeddingModelCache, 'get_model', lambda _key=None: model)
+    return model
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = EmbeddingQueryCache(2, 60)
+    monkeypatch.setattr(embedding, 'embedding_query_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(embedding.time, 'monotonic', clock)
+    return clock
+
+
+def test_embeds_the_original_text(model, cache):
+    assert embed_question('  top   sales ') == [14.0]
+    # the whitespace-normalized text is only the cache key
+    assert embed_question('top sales') == [14.0]
+    assert model.texts == ['  top   sales ']
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_request_scope_hits(model, cache):
+    with question_embedding_context():
+        embed_question('q1')
+        cache.clear()
+        # served from the request context even though the process cache was cleared
+        assert embed_question('q1') == [2.0]
+        assert embed_question(' q1 ') == [2.0]
+    assert model.texts == ['q1']
+    assert cache.stats()['request_hits'] == 2
+
+    embed_question('q1')
+    assert model.texts == ['q1', 'q1']
+
+
+def test_lru_eviction(model, cache):
+    embed_question('a')
+    embed_question('bb')
+    embed_question('a')
+    # 'bb' is the least recently used entry when 'ccc' arrives
+    embed_question('ccc')
+    embed_question('a')
+    embed_question('bb')
+    assert model.texts == ['a', 'bb', 'ccc', 'bb']
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses'], stats['evictions']) == (2, 2, 4, 2)
+    assert stats['hit_rate'] == pytest.approx(2 / 6)
+
+
+def test_ttl_expiry(model, cache, clock):
+    embed_question('q')
+    clock.now += 59
+    embed_question('q')
+    clock.now += 61
+    embed_question('q')
+    assert model.texts == ['q', 'q']
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 2, 1)
+
+
+def test_disabled_cache(model, monkeypatch):
+    cache = EmbeddingQueryCache(0, 60)
+    monkeypatch.setattr(embedding, 'embedding_query_cache', cache)
+    embed_question('q')
+    embed_question('q')
+    assert model.texts == ['q', 'q']
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,110 @@
+"""
+Tests for the chunked Excel/CSV import pipeline.
+"""
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("pandas")
+pytest.importorskip("psycopg2")
+
+from apps.datasource.utils import excel_import
+from apps.datasource.utils.excel import infer_field_type
+from apps.datasource.utils.excel_import import (
+    ExcelReadError,
+    ExcelWriteError,
+    SheetImport,
+    import_file,
+    read_chunks,
+    scan_field_types,
+)
+
+
+def _collect(chunks):
+    return [(field_types, df.to_csv(sep='\t', header=False, index=False)) for field_types, df in chunks]
+
+
+def test_csv_chunks(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('id,code,amount,day\n1,007,1.5,2025-01-02\n,010,,2025-01-03\n3,,2,\n')
+    sheet = SheetImport('Sheet1', 't', {'id': 'int', 'code': 'string', 'amount': 'float', 'day': 'datetime'})
+    chunks = _collect(read_chunks(str(path), sheet, chunk_size=2))
+    assert [data for _, data in chunks] == ['1\t007\t1.5\t2025-01-02\n\t010\t\t2025-01-03\n', '3\t\t2.0\t\n']
+
+    with pytest.raises(ExcelReadError):
+        list(read_chunks(str(path), SheetImport('Sheet1', 't', {'amount': 'int'}), chunk_size=2))
+
+
+def test_infer_types_and_empty_file(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('id,name\n1,a\n2,b\n3,\n')
+    chunks = _collect(read_chunks(str(path), SheetImport('sheet1', 't'), chunk_size=2))
+    assert [field_types for field_types, _ in chunks] == [{'id': 'int', 'name': 'string'}] * 2
+    assert chunks[1][1] == '3\t\n'
+
+    path.write_text('id,name\n')
+    chunks = list(read_chunks(str(path), SheetImport('sheet1', 't', {'id': 'int'}), chunk_size=2))
+    assert len(chunks) == 1 and list(chunks[0][1].columns) == ['id', 'name']
+
+
+def test_infer_types_from_all_chunks(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('code,amount,note,empty\n1,1,a,\n2,2,,\nfoo,2.5,,\n4,3,,\n')
+    field_types = {'code': 'string', 'amount': 'float', 'note': 'string', 'empty': 'float'}
+    # the same types as inferring from the whole file at once
+    assert {col: infer_field_type(dtype) for col, dtype in pd.read_csv(path).dtypes.items()} == field_types
+    assert scan_field_types(str(path), 'sheet1', 2) == field_types
+
+    chunks = _collect(read_chunks(str(path), SheetImport('sheet1', 't'), chunk_size=2))
+    assert [types for types, _ in chunks] == [field_types] * 2
+    assert [data for _, data in chunks] == ['1\t1.0\ta\t\n2\t2.0\t\t\n', 'foo\t2.5\t\t\n4\t3.0\t\t\n']
+
+
+def test_excel_chunks_match_read_excel(tmp_path):
+    pytest.importorskip("python_calamine")
+    xlsxwriter = pytest.importorskip("xlsxwriter")
+    path = str(tmp_path / 'data.xlsx')
+    workbook = xlsxwriter.Workbook(path)
+    sheet = workbook.add_worksheet('订单')
+    sheet.write_row(0, 1, ['id', 'name', 'name', 'amount'])
+    for row in range(1, 6):
+        sheet.write_row(row, 1, [row, f'n{row}', '' if row == 3 else 'x', row * 1.5])
+    workbook.close()
+
+    field_types = {'id': 'int', 'name': 'string', 'name.1': 'string', 'amount': 'float'}
+    chunks = list(read_chunks(path, SheetImport('订单', 't', field_types), chunk_size=2))
+    assert [len(df) for _, df in chunks] == [2, 2, 1]
+    expected = pd.read_excel(path, sheet_name='订单', engine='calamine', dtype={'id': 'Int64', 'name.1': 'string'})
+    actual = pd.concat([df for _, df in chunks], ignore_index=True)
+    assert list(actual.columns) == list(expected.columns)
+    assert actual.to_csv(index=False) == expected.to_csv(index=False)
+
+
+def test_parallel_import_and_cleanup(tmp_path, monkeypatch):
+    path = tmp_path / 'data.csv'
+    path.write_text('id\n1\n2\n3\n')
+    written, dropped = {}, []
+
+    def writer(_engine, table_name, chunks, on_chunk):
+        rows = 0
+        for _, df in chunks:
+            if table_name == 'bad':
+                raise RuntimeError('copy failed')
+            rows += len(df)
+            on_chunk(rows)
+        written[table_name] = rows
+        return rows
+
+    monkeypatch.setattr(excel_import, 'drop_tables', lambda engine, tables: dropped.extend(tables))
+    sheets = [SheetImport('Sheet1', name, {'id': 'int'}) for name in ('a', 'b')]
+    assert import_file(None, str(path), sheets, chunk_size=2, workers=2, writer=writer) == [3, 3]
+    assert written == {'a': 3, 'b': 3} and dropped == []
+
+    sheets.append(SheetImport('Sheet1', 'bad', {'id': 'int'}))
+    with pytest.raises(ExcelWriteError, match='copy failed') as error:
+        import_file(None, str(path), sheets, chunk_size=2, workers=1, writer=writer)
+    assert error.value.table_name == 'bad'
+    assert dropped == ['a', 'b']
+    assert excel_import.excel_import_progress.stats()['running'] == []
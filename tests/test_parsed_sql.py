@@ -0,0 +1,79 @@
+"""
+Tests for the parse-once SQL analysis context shared by read-only checks, table extraction
+and result cache keys.
+"""
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("sqlglot")
+pytest.importorskip("sqlparse")
+
+from apps.db import parsed_sql
+from apps.db.parsed_sql import ParsedSQL, ParsedSQLCache
+from common.core.config import settings
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    parse = parsed_sql.sqlglot.parse
+
+    def counting_parse(sql, dialect=None, **kwargs):
+        calls.append(dialect)
+        return parse(sql, dialect=dialect, **kwargs)
+
+    monkeypatch.setattr(parsed_sql.sqlglot, 'parse', counting_parse)
+    return calls
+
+
+def test_check_read_rules(monkeypatch):
+    monkeypatch.setattr(settings, 'SQLBOT_ALLOW_METADATA_QUERIES', False)
+    assert ParsedSQL('SELECT id FROM orders').check_read('pg') == (True, '')
+    assert ParsedSQL('(WITH t AS (SELECT 1 AS a) SELECT a FROM t)').check_read('pg') == (True, '')
+    assert ParsedSQL('DELETE FROM orders').check_read('pg') == (False, "Write operation 'DELETE' is not allowed")
+    assert ParsedSQL("SELECT * FROM t INTO OUTFILE '/tmp/x'").check_read('mysql')[1].startswith(
+        'SQL contains dangerous pattern')
+    assert ParsedSQL("SELECT pg_read_file('/etc/passwd')").check_read('postgresql') == (
+        False, 'SQL contains dangerous function: pg_read_file')
+    assert ParsedSQL('SHOW TABLES').check_read('mysql')[0] is False
+    with pytest.raises(ValueError, match='Parse SQL Error'):
+        ParsedSQL('   ').check_read('pg')
+
+    monkeypatch.setattr(settings, 'SQLBOT_ALLOW_METADATA_QUERIES', True)
+    assert ParsedSQL('SHOW TABLES').check_read('mysql') == (True, '')
+
+
+def test_single_parse_per_dialect(parse_calls):
+    parsed = ParsedSQL('SELECT o.id FROM orders o JOIN sales.customers c ON o.cid = c.id')
+    assert parsed.check_read('pg') == (True, '')
+    assert parsed.tables('pg') == {'orders', 'customers'}
+    assert parsed.normalized(None) == 'SELECT o.id FROM orders AS o JOIN sales.customers AS c ON o.cid = c.id'
+    assert parsed.dangerous_function('pg') is None
+    assert parse_calls == [None]
+
+    parsed.tables('mysql')
+    parsed.check_read('mysql')
+    assert parse_calls == [None, 'mysql']
+    assert 'FROM orders o' in parsed.pretty()
+
+
+def test_parse_errors_cached(parse_calls):
+    parsed = ParsedSQL('SELECT FROM WHERE (')
+    for _ in range(2):
+        with pytest.raises(ValueError, match='Parse SQL Error'):
+            parsed.check_read('pg')
+    assert parsed.tables('pg') == set()
+    assert parsed.normalized() == 'SELECT FROM WHERE ('
+    assert parse_calls == [None]
+
+
+def test_lru():
+    cache = ParsedSQLCache(max_size=2)
+    first = cache.get('SELECT 1')
+    assert cache.get('SELECT 1') is first
+    cache.get('SELECT 2')
+    cache.get('SELECT 3')
+    assert cache.get('SELECT 1') is not first
+    assert cache.stats() == {'size': 2, 'max_size': 2, 'hits': 1, 'misses': 4}
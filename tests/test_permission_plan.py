@@ -0,0 +1,112 @@
+"""
+Tests for the compiled row / column permission plans and their per-user cache.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import Session
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("sqlmodel")
+pytest.importorskip("sqlbot_xpack")
+
+from apps.datasource.crud.permission import (
+    PermissionPlan,
+    PermissionPlanCache,
+    _compile_plan,
+    get_column_permission_fields,
+    get_row_permission_filters,
+)
+from apps.datasource.crud.row_permission import transFilterTree
+from apps.datasource.models.datasource import CoreDatasource, CoreField
+from apps.system.models.system_variable_model import SystemVariable
+
+TREE = {'logic': 'and', 'items': [
+    {'type': 'item', 'field_id': 11, 'filter_type': 'logic', 'term': 'in', 'value': "a,b'c"},
+    {'type': 'tree', 'sub_tree': {'logic': 'or', 'items': [
+        {'type': 'item', 'field_id': 12, 'filter_type': 'logic', 'term': 'eq', 'value_type': 'variable',
+         'variable_id': 1},
+        {'type': 'item', 'field_id': 12, 'filter_type': 'logic', 'term': 'like', 'value_type': 'variable',
+         'variable_id': 2},
+        {'type': 'item', 'field_id': 99, 'filter_type': 'logic', 'term': 'eq', 'value': 'missing'},
+    ]}},
+]}
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    for model in (CoreField, SystemVariable):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        session.add_all([
+            CoreField(id=11, ds_id=1, table_id=5, checked=True, field_name='region', field_type='varchar',
+                      field_index=0),
+            CoreField(id=12, ds_id=1, table_id=5, checked=True, field_name='owner', field_type='varchar',
+                      field_index=1),
+            SystemVariable(id=1, name='account', var_type='text', type='system', value=['account']),
+            SystemVariable(id=2, name='dept', var_type='text', type='custom', value=['sales', 'ops']),
+        ])
+        session.commit()
+        yield session
+
+
+def _user():
+    return SimpleNamespace(id=7, name='Alice', account='alice', email='a@x.com',
+                           system_variables=[{'variableId': 2, 'variableValues': ['ops']}])
+
+
+def _permission(pid, ptype, table_id, expression_tree='{}', permissions='[]'):
+    return SimpleNamespace(id=pid, type=ptype, table_id=table_id, expression_tree=expression_tree,
+                           permissions=permissions)
+
+
+def test_compiled_filters_match_lookup_path(session):
+    ds = CoreDatasource(id=1, name='ds', type='pg')
+    null_tree = {'logic': 'and', 'items': [
+        {'type': 'item', 'field_id': 11, 'filter_type': 'logic', 'term': 'null', 'value': ''}]}
+    permissions = [(_permission(1, 'row', 5, json.dumps(TREE)), 'orders'),
+                   (_permission(2, 'row', 5, json.dumps(null_tree)), 'orders'),
+                   (_permission(3, 'column', 6, permissions='[{"field_id": 21, "enable": false}, '
+                                                            '{"field_id": 22, "enable": true}]'), 'users')]
+    plan = _compile_plan(session, _user(), ds, permissions)
+
+    expected = transFilterTree(session, _user(), [SimpleNamespace(tree=json.loads(p.expression_tree))
+                                                  for p, _ in permissions[:2]], ds)
+    assert plan.row_filters == {5: ('orders', expected)}
+    assert "'alice'" in expected and "'%ops%'" in expected and "'b''c'" in expected
+    assert plan.column_masks == {6: {21}}
+
+
+def test_plan_applied_per_table():
+    plan = PermissionPlan(row_filters={5: ('orders', '(a = 1)'), 6: ('users', '(b = 2)')},
+                          column_masks={6: {21}})
+    user = _user()
+    assert get_row_permission_filters(None, user, None, tables=['orders'], plan=plan) == \
+           [{'table': 'orders', 'filter': '(a = 1)'}]
+    assert get_row_permission_filters(None, user, None, single_table=SimpleNamespace(id=6), plan=plan) == \
+           [{'table': 'users', 'filter': '(b = 2)'}]
+    assert get_row_permission_filters(None, SimpleNamespace(id=1), None, tables=['orders'], plan=plan) == []
+
+    fields = [SimpleNamespace(id=21), SimpleNamespace(id=22)]
+    assert [f.id for f in get_column_permission_fields(None, user, SimpleNamespace(id=6), fields, plan=plan)] == [22]
+    assert get_column_permission_fields(None, user, SimpleNamespace(id=5), fields, plan=plan) == fields
+
+
+def test_plan_cache():
+    cache = PermissionPlanCache(max_size=2)
+    plan = PermissionPlan()
+    cache.put((7, 1), 'f1', plan)
+    assert cache.get((7, 1), 'f1') is plan
+    assert cache.get((7, 1), 'f2') is None
+    cache.put((7, 2), 'f1', plan)
+    cache.put((8, 1), 'f1', plan)
+    assert cache.get((7, 1), 'f1') is None
+
+    cache.invalidate(1)
+    assert cache.get((8, 1), 'f1') is None and cache.get((7, 2), 'f1') is plan
+    cache.invalidate()
+    assert cache.stats()['size'] == 0
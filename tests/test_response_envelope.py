@@ -0,0 +1,68 @@
+"""
+Tests for EnvelopeResponse and the headers-only response middleware.
+"""
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from common.core.response_middleware import (
+    ENVELOPE_HEADER,
+    EnvelopeResponse,
+    ResponseMiddleware,
+    dumps_json,
+)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI(default_response_class=EnvelopeResponse)
+    app.add_middleware(ResponseMiddleware)
+
+    @app.get('/items')
+    async def items():
+        return {'rows': [{'id': 1, 'name': '名称'}], 'total': 1}
+
+    @app.get('/wrapped')
+    async def wrapped():
+        return {'code': 0, 'data': [1], 'msg': 'ok'}
+
+    @app.get('/direct')
+    async def direct():
+        return JSONResponse(content=[1, 2])
+
+    @app.get('/created', status_code=201)
+    async def created():
+        return {'id': 3}
+
+    @app.get('/missing')
+    async def missing():
+        raise HTTPException(status_code=404, detail='not found')
+
+    return TestClient(app)
+
+
+def test_route_result_wrapped_once(client):
+    response = client.get('/items')
+    assert response.json() == {'code': 0, 'data': {'rows': [{'id': 1, 'name': '名称'}], 'total': 1}, 'msg': None}
+    assert ENVELOPE_HEADER not in response.headers
+    assert response.headers['content-type'] == 'application/json'
+
+
+def test_previous_rules_kept(client):
+    assert client.get('/wrapped').json() == {'code': 0, 'data': [1], 'msg': 'ok'}
+    assert client.get('/direct').json() == {'code': 0, 'data': [1, 2], 'msg': None}
+    assert client.get('/created').json() == {'id': 3}
+    response = client.get('/missing')
+    assert response.status_code == 404 and response.json() == {'detail': 'not found'}
+
+
+def test_dumps_fallback():
+    assert dumps_json({1: 'a', 'n': None}) == b'{"1":"a","n":null}'
+    assert dumps_json({'big': 2 ** 70}) == b'{"big":1180591620717411303424}'
@@ -0,0 +1,57 @@
+"""
+Tests for the columnar query result and the column-wise DataFormat helpers.
+"""
+
+import pytest
+
+from apps.db.result_set import ColumnarResult
+
+FIELDS = ['o.id', 'c.id', 'name', 'amount', 'o.id']
+ROWS = [
+    (1, 10 ** 16, 'a', 1.5e11, 'dup-1'),
+    (2, 3, 'b', 0.25, 'dup-2'),
+    (3, None, None, 1e-9, 'dup-3'),
+]
+
+
+def _result():
+    return ColumnarResult(FIELDS, [list(values) for values in zip(*ROWS, strict=True)], sql='c2VsZWN0')
+
+
+def _legacy_rows():
+    return [dict(zip(FIELDS, row, strict=True)) for row in ROWS]
+
+
+def test_rows_and_dict_shape():
+    result = _result()
+    assert len(result) == 3
+    assert result.rows() == _legacy_rows()
+    assert result.to_dict() == {'fields': FIELDS, 'data': _legacy_rows(), 'fields_info': None, 'sql': 'c2VsZWN0',
+                                'truncated': False}
+    assert result.column('o.id') == ['dup-1', 'dup-2', 'dup-3']
+    assert result.records(['name', 'missing']) == [['a', None], ['b', None], [None, None]]
+    assert ColumnarResult([], []).rows() == []
+
+
+def test_head_and_cache_round_trip():
+    result = _result()
+    result.add_alias('id', 0)
+    head = result.head(2)
+    assert head.rows() == [dict(row, id=values[0]) for row, values in zip(_legacy_rows()[:2], ROWS[:2], strict=True)]
+    assert head.columns[0] is head.columns[-1]
+    restored = ColumnarResult.from_cache(result.to_cache())
+    assert restored.keys == result.keys
+    assert restored.rows() == result.rows()
+
+
+def test_data_format_parity():
+    pytest.importorskip("pandas")
+    pytest.importorskip("langchain_core")
+    from common.utils.data_format import DataFormat
+
+    expected = DataFormat.normalize_qualified_sql_column_keys_in_object_array(
+        DataFormat.convert_large_numbers_in_object_array(_legacy_rows()))
+    result = DataFormat.normalize_qualified_sql_column_keys_in_columns(
+        DataFormat.convert_large_numbers_in_columns(_result()))
+    assert result.rows() == expected
+    assert result.fields == FIELDS
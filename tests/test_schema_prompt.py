@@ -0,0 +1,74 @@
+"""
+Tests for the schema prompt fragment cache.
+"""
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("orjson")
+
+from apps.datasource.crud import schema_prompt
+from apps.datasource.crud.schema_prompt import (
+    SchemaPrompt,
+    SchemaPromptCache,
+    column_mask_fingerprint,
+)
+
+
+def _builder(calls, name='orders'):
+    def build():
+        calls.append(name)
+        return SchemaPrompt(db_name='db', tables=[{'id': 1, 'table_name': name, 'schema_table': f'# Table: {name}'}])
+
+    return build
+
+
+def test_reused_per_datasource_and_mask():
+    cache = SchemaPromptCache(max_size=10, ttl=600)
+    calls = []
+    first = cache.get_or_build(1, '', 'conf', _builder(calls))
+    assert cache.get_or_build(1, '', 'conf', _builder(calls)) is first
+    assert calls == ['orders']
+
+    masked = column_mask_fingerprint({5: {22, 21}, 6: set()})
+    assert masked == column_mask_fingerprint({5: {21, 22}}) and masked != ''
+    cache.get_or_build(1, masked, 'conf', _builder(calls))
+    cache.get_or_build(2, '', 'conf', _builder(calls))
+    assert len(calls) == 3
+    assert cache.stats()['hits'] == 1 and cache.stats()['size'] == 3
+
+
+def test_rebuilt_on_change(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(schema_prompt.time, 'monotonic', lambda: now[0])
+    cache = SchemaPromptCache(max_size=10, ttl=600)
+    calls = []
+    cache.get_or_build(1, '', 'conf', _builder(calls))
+    cache.get_or_build(1, '', 'conf|relations', _builder(calls))
+    assert len(calls) == 2
+
+    cache.invalidate(1)
+    cache.get_or_build(1, '', 'conf|relations', _builder(calls))
+    cache.get_or_build(2, '', 'conf', _builder(calls))
+    cache.invalidate()
+    cache.get_or_build(2, '', 'conf', _builder(calls))
+    assert len(calls) == 5
+
+    now[0] += 601
+    cache.get_or_build(2, '', 'conf', _builder(calls))
+    assert len(calls) == 6
+
+
+def test_build_racing_with_invalidation_not_cached():
+    cache = SchemaPromptCache(max_size=10, ttl=600)
+    calls = []
+
+    def build():
+        cache.invalidate(1)
+        return _builder(calls)()
+
+    assert cache.get_or_build(1, '', 'conf', build).tables[0]['table_name'] == 'orders'
+    assert cache.stats()['size'] == 0
+    cache.get_or_build(1, '', 'conf', _builder(calls))
+    cache.get_or_build(1, '', 'conf', _builder(calls))
+    assert len(calls) == 2
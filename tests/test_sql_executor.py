@@ -0,0 +1,160 @@
+"""
+Tests for the streaming SQL executor: fetchmany budgets, the byte cutoff, generator mode and error mapping.
+"""
+import itertools
+
+import pytest
+
+pytest.importorskip("apps.db.db")
+
+from apps.datasource.models.datasource import CoreDatasource
+from apps.db import db
+from apps.db.db import SQLExecuteAdapter
+from common.core.config import settings
+from common.error import ParseSQLResultError, SQLBotDBError
+
+
+class _Cursor:
+    # PostgreSQL type OIDs: int4, text
+    description = [('ID', 23), ('NAME', 25)]
+
+    def __init__(self, rows, execute_error=None, fetch_error=None):
+        self.rows = iter(rows)
+        self.execute_error = execute_error
+        self.fetch_error = fetch_error
+        self.sql = None
+        self.fetch_sizes = []
+
+    def execute(self, sql):
+        if self.execute_error:
+            raise self.execute_error
+        self.sql = sql
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        if self.fetch_error and len(self.fetch_sizes) > 1:
+            raise self.fetch_error
+        return list(itertools.islice(self.rows, size))
+
+
+class _Adapter(SQLExecuteAdapter):
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.closed = False
+
+    def connect(self, _ds):
+        return _Handle(self.cursor)
+
+    def close(self, _cursor):
+        self.closed = True
+
+
+class _Handle:
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self.cursor
+
+    def __exit__(self, *_exc):
+        return False
+
+
+def _rows(count):
+    return [(i, f'name-{i:05d}') for i in range(count)]
+
+
+@pytest.fixture
+def ds():
+    return CoreDatasource(id=1, name='ds', type='pg', configuration='conf')
+
+
+@pytest.fixture
+def run(monkeypatch):
+    monkeypatch.setattr(settings, 'SQL_EXEC_FETCH_SIZE', 4)
+
+    def _run(cursor):
+        adapter = _Adapter(cursor)
+        monkeypatch.setattr(db, 'get_sql_adapter', lambda _ds_type: adapter)
+        return adapter
+
+    return _run
+
+
+def test_no_limit_by_default(ds, run):
+    cursor = _Cursor(_rows(10))
+    adapter = run(cursor)
+    result = db.exec_sql(ds, 'select id, name from t;', columnar=True)
+    assert cursor.sql == 'select id, name from t'
+    assert result.fields == ['id', 'name']
+    assert [info['is_numeric'] for info in result.fields_info] == [True, False]
+    assert list(result.columns[0]) == list(range(10))
+    assert not result.truncated
+    assert cursor.fetch_sizes == [4, 4, 4, 4]
+    assert adapter.closed
+
+
+def test_row_budget(ds, run):
+    cursor = _Cursor(_rows(10))
+    run(cursor)
+    result = db.exec_sql(ds, 'select id, name from t', max_rows=6)
+    assert [row['id'] for row in result['data']] == list(range(6))
+    assert result['truncated']
+    # the last batch only asks for the remaining budget, then one row is probed
+    assert cursor.fetch_sizes == [4, 2, 1]
+
+    cursor = _Cursor(_rows(8))
+    run(cursor)
+    result = db.exec_sql(ds, 'select id, name from t', max_rows=8)
+    assert len(result['data']) == 8 and not result['truncated']
+
+
+def test_byte_budget(ds, run):
+    cursor = _Cursor(_rows(10))
+    run(cursor)
+    # each row is estimated at 8 bytes for the int and 10 for the name
+    with db.open_sql_stream(ds, 'select id, name from t', max_bytes=18 * 5 + 17) as stream:
+        batches = list(stream.column_batches())
+        assert [len(columns[0]) for columns in batches] == [4, 1]
+        assert stream.truncated
+        assert (stream.row_count, stream.byte_count) == (5, 90)
+    assert cursor.fetch_sizes == [4, 4]
+
+
+def test_generator_mode(ds, run):
+    cursor = _Cursor(_rows(10))
+    adapter = run(cursor)
+    batches = db.iter_sql(ds, 'select id, name from t')
+    assert next(batches) == [{'id': i, 'name': f'name-{i:05d}'} for i in range(4)]
+    assert cursor.fetch_sizes == [4]
+    assert not adapter.closed
+    batches.close()
+    assert adapter.closed
+
+    cursor = _Cursor(_rows(10))
+    run(cursor)
+    assert [len(batch) for batch in db.iter_sql(ds, 'select id, name from t')] == [4, 4, 2]
+
+
+def test_error_mapping(ds, run, monkeypatch):
+    run(_Cursor(_rows(10), execute_error=RuntimeError('relation "t" does not exist')))
+    with pytest.raises(SQLBotDBError, match='does not exist'):
+        db.exec_sql(ds, 'select id, name from t')
+
+    adapter = run(_Cursor(_rows(10), fetch_error=RuntimeError('connection lost')))
+    with pytest.raises(SQLBotDBError, match='connection lost'):
+        db.exec_sql(ds, 'select id, name from t')
+    assert adapter.closed
+
+    def fail(_plan, _batch):
+        raise ValueError('bad value')
+
+    run(_Cursor(_rows(10)))
+    monkeypatch.setattr(db.ColumnConverterPlan, 'convert', fail)
+    with pytest.raises(ParseSQLResultError, match='bad value'):
+        db.exec_sql(ds, 'select id, name from t')
+
+    with pytest.raises(ValueError, match='read operations'):
+        db.exec_sql(ds, 'delete from t')
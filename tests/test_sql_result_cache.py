@@ -0,0 +1,63 @@
+"""
+Tests for the SQL query result cache.
+"""
+import time
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("sqlglot")
+pytest.importorskip("sqlmodel")
+
+from apps.datasource.models.datasource import CoreDatasource
+from apps.db.result_cache import SQLResultCache
+
+
+def _ds(ds_id=1, configuration='conf'):
+    return CoreDatasource(id=ds_id, name='ds', type='pg', configuration=configuration)
+
+
+def test_key_normalization():
+    ds = _ds()
+    key = SQLResultCache.build_key(ds, 'select a,  b from t where a = 1')
+    assert key == SQLResultCache.build_key(ds, 'SELECT a, b\nFROM t\nWHERE a = 1')
+    assert key != SQLResultCache.build_key(ds, 'select a, b from t where a = 2')
+    assert key != SQLResultCache.build_key(ds, 'select a, b from t where a = 1', filters=[{'table': 't'}])
+    assert key != SQLResultCache.build_key(_ds(configuration='other'), 'select a, b from t where a = 1')
+    assert key != SQLResultCache.build_key(ds, 'select a, b from t where a = 1', origin_column=True)
+
+
+def test_get_put_ttl_and_lru():
+    cache = SQLResultCache(max_size=2, default_ttl=60, max_entry_bytes=1024)
+    ds = _ds()
+    value = {'fields': ['a'], 'data': [{'a': 1}]}
+    cache.put('k1', ds, value)
+
+    hit = cache.get('k1')
+    assert hit == value
+    hit['data'].append({'a': 2})
+    assert cache.get('k1') == value
+
+    cache.put('k2', ds, value)
+    cache.put('k3', ds, value)
+    assert cache.get('k1') is None
+    assert cache.stats()['evictions'] == 1
+
+    cache.put('big', ds, {'data': ['x' * 2048]})
+    assert cache.get('big') is None
+
+    short = SQLResultCache(max_size=2, default_ttl=0.01, max_entry_bytes=1024)
+    short.put('k', ds, value)
+    time.sleep(0.02)
+    assert short.get('k') is None
+
+
+def test_invalidate_datasource():
+    cache = SQLResultCache(max_size=10, default_ttl=60, max_entry_bytes=1024)
+    cache.put('1:a', _ds(1), {'data': []})
+    cache.put('2:a', _ds(2), {'data': []})
+    cache.invalidate(1)
+    assert cache.get('1:a') is None
+    assert cache.get('2:a') == {'data': []}
+    assert 0 < cache.stats()['hit_rate'] < 1
@@ -0,0 +1,69 @@
+"""
+Tests for the sqlglot based SQL rewrites (row permission filters, dynamic datasource tables).
+"""
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+pytest.importorskip("sqlglot")
+pytest.importorskip("oracledb")
+
+from apps.datasource.crud.sql_rewrite import (
+    SQLRewriteError,
+    apply_row_permission_filters,
+    substitute_subqueries,
+)
+
+
+def test_wrap_keeps_alias():
+    sql = 'SELECT o.id, c.name FROM orders o LEFT JOIN customers AS c ON o.cid = c.id WHERE o.amount > 10'
+    filters = [{'table': 'orders', 'filter': '("region" IN (\'east\'))'},
+               {'table': 'orders', 'filter': '("region" IN (\'east\'))'}]
+    result = apply_row_permission_filters(sql, filters, 'pg')
+    assert result == ('SELECT o.id, c.name FROM (SELECT * FROM orders WHERE ("region" IN (\'east\'))) AS o '
+                      'LEFT JOIN customers AS c ON o.cid = c.id WHERE o.amount > 10')
+
+
+def test_dialects():
+    mysql = apply_row_permission_filters('SELECT `id` FROM `orders` LIMIT 10',
+                                         [{'table': 'orders', 'filter': "(`region` = 'e')"}], 'mysql')
+    assert mysql == "SELECT `id` FROM (SELECT * FROM `orders` WHERE (`region` = 'e')) AS `orders` LIMIT 10"
+
+    oracle = apply_row_permission_filters('SELECT t.id FROM "S"."ORDERS" t WHERE ROWNUM <= 10',
+                                          [{'table': 'ORDERS', 'filter': '("REGION" = \'e\')'}], 'oracle')
+    assert oracle == 'SELECT t.id FROM (SELECT * FROM "S"."ORDERS" WHERE ("REGION" = \'e\')) t WHERE ROWNUM <= 10'
+
+    tsql = apply_row_permission_filters('SELECT TOP 10 [id] FROM [dbo].[orders]',
+                                        [{'table': 'orders', 'filter': "([region] IN (N'e'))"}], 'sqlServer')
+    assert tsql == "SELECT TOP 10 [id] FROM (SELECT * FROM [dbo].[orders] WHERE ([region] IN (N'e'))) AS [orders]"
+
+
+def test_cte_and_unrelated_tables():
+    sql = 'WITH o AS (SELECT * FROM orders) SELECT * FROM o JOIN items ON o.id = items.oid'
+    result = apply_row_permission_filters(sql, [{'table': 'orders', 'filter': '(r = 1)'},
+                                                {'table': 'o', 'filter': '(r = 2)'}], 'pg')
+    assert result == ('WITH o AS (SELECT * FROM (SELECT * FROM orders WHERE (r = 1)) AS orders) '
+                      'SELECT * FROM o JOIN items ON o.id = items.oid')
+    assert apply_row_permission_filters('SELECT 1 FROM items', [{'table': 'orders', 'filter': '(r = 1)'}],
+                                        'pg') == 'SELECT 1 FROM items'
+
+
+def test_invalid_filter():
+    with pytest.raises(SQLRewriteError):
+        apply_row_permission_filters('SELECT 1 FROM orders', [{'table': 'orders', 'filter': '1=1; DROP TABLE x'}],
+                                     'pg')
+    with pytest.raises(SQLRewriteError):
+        apply_row_permission_filters('SELECT 1 FROM orders; SELECT 2', [{'table': 'orders', 'filter': '(r = 1)'}],
+                                     'pg')
+
+
+def test_substitute_subqueries():
+    sql = 'SELECT o.id, SUM(items.qty) FROM orders o JOIN items ON o.id = items.oid GROUP BY o.id'
+    result = substitute_subqueries(sql, {'orders': 'select * from raw_orders where tenant = 3',
+                                         'items': 'SELECT id, oid, qty FROM raw_items'}, 'pg')
+    assert result == ('SELECT o.id, SUM(items.qty) FROM (SELECT * FROM raw_orders WHERE tenant = 3) AS o '
+                      'JOIN (SELECT id, oid, qty FROM raw_items) AS items ON o.id = items.oid GROUP BY o.id')
+    assert substitute_subqueries('SELECT 1 FROM other', {'orders': 'SELECT 1'}, 'pg') is None
+    with pytest.raises(SQLRewriteError):
+        substitute_subqueries('SELECT 1 FROM orders', {'orders': 'DELETE FROM raw_orders'}, 'pg')
@@ -0,0 +1,102 @@
+"""
+Tests for the StreamChannel between chat worker threads and StreamingResponse.
+"""
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from common.utils.stream_channel import StreamChannel
+
+
+def _produce(channel: StreamChannel, items, results=None):
+    def _run():
+        for item in items:
+            ok = channel.put(item)
+            if results is not None:
+                results.append(ok)
+        channel.close()
+
+    thread = threading.Thread(target=_run)
+    thread.start()
+    return thread
+
+
+def test_chunks_in_order():
+    async def _main():
+        channel = StreamChannel(max_size=4)
+        thread = _produce(channel, range(100))
+        received = [item async for item in channel]
+        thread.join(timeout=5)
+        return received
+
+    assert asyncio.run(_main()) == list(range(100))
+
+
+def test_put_blocks_when_full():
+    async def _main():
+        channel = StreamChannel(max_size=2)
+        produced = []
+
+        def _run():
+            for item in range(5):
+                channel.put(item)
+                produced.append(item)
+            channel.close()
+
+        thread = threading.Thread(target=_run)
+        thread.start()
+        await asyncio.sleep(0.2)
+        pending = len(produced)
+        received = [item async for item in channel]
+        thread.join(timeout=5)
+        return pending, received
+
+    pending, received = asyncio.run(_main())
+    assert pending == 2
+    assert received == list(range(5))
+
+
+def test_cancel_releases_producer():
+    async def _main():
+        channel = StreamChannel(max_size=1)
+        results = []
+        thread = _produce(channel, range(10), results)
+
+        stream = channel.__aiter__()
+        assert await stream.__anext__() == 0
+        # StreamingResponse closes the iterator when the client disconnects
+        await stream.aclose()
+        thread.join(timeout=5)
+        return thread.is_alive(), results, channel.cancelled
+
+    alive, results, cancelled = asyncio.run(_main())
+    assert not alive
+    assert cancelled
+    assert results[0] is True
+    assert results[-1] is False
+
+
+def test_aput_same_loop_backpressure():
+    async def _main():
+        channel = StreamChannel(max_size=2)
+        produced = []
+
+        async def _produce_async():
+            for item in range(10):
+                await channel.aput(item)
+                produced.append(item)
+            channel.close()
+
+        task = asyncio.create_task(_produce_async())
+        await asyncio.sleep(0.05)
+        pending = len(produced)
+        received = [item async for item in channel]
+        await task
+        return pending, received
+
+    pending, received = asyncio.run(_main())
+    assert pending == 2
+    assert received == list(range(10))
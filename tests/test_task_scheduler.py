@@ -0,0 +1,149 @@
+"""
+Tests for the lane-based task scheduler.
+"""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("passlib")
+
+from common.core.task_scheduler import (
+    LANE_EMBEDDING,
+    LANE_MAINTENANCE,
+    TaskLane,
+    TaskRejectedError,
+    TaskTimeoutError,
+    task_scheduler,
+)
+
+
+def _blocker():
+    gate = threading.Event()
+
+    def _wait():
+        gate.wait(5)
+
+    return gate, _wait
+
+
+def test_concurrency_limit():
+    lane = TaskLane('test', max_workers=2, max_queue=100)
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def _task():
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.01)
+        with lock:
+            state['running'] -= 1
+
+    futures = [lane.submit(_task) for _ in range(20)]
+    for future in futures:
+        future.result(timeout=5)
+    assert state['peak'] <= 2
+    assert lane.stats()['completed'] == 20
+    lane.shutdown()
+
+
+def test_workspace_fairness():
+    lane = TaskLane('test', max_workers=1, max_queue=100)
+    gate, wait = _blocker()
+    first = lane.submit(wait)
+
+    order = []
+    futures = [lane.submit(order.append, ('a', i), workspace='a') for i in range(3)]
+    futures += [lane.submit(order.append, ('b', i), workspace='b') for i in range(3)]
+    assert lane.stats()['queued_by_workspace'] == {'a': 3, 'b': 3}
+
+    gate.set()
+    first.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+    assert [w for w, _ in order] == ['a', 'b', 'a', 'b', 'a', 'b']
+    lane.shutdown()
+
+
+def test_reject_and_discard():
+    lane = TaskLane('test', max_workers=1, max_queue=1)
+    gate, wait = _blocker()
+    lane.submit(wait)
+    lane.submit(wait)
+    with pytest.raises(TaskRejectedError):
+        lane.submit(wait)
+
+    discard_lane = TaskLane('discard', max_workers=1, max_queue=0, reject_policy='discard')
+    discard_gate, discard_wait = _blocker()
+    discard_lane.submit(discard_wait)
+    future = discard_lane.submit(discard_wait)
+    assert isinstance(future.exception(timeout=1), TaskRejectedError)
+
+    gate.set()
+    discard_gate.set()
+    assert lane.stats()['rejected'] == 1
+    assert (lane.stats()['discarded'], discard_lane.stats()['discarded']) == (0, 1)
+    assert discard_lane.stats()['rejected'] == 1
+    lane.shutdown()
+    discard_lane.shutdown()
+
+
+
+def test_background_lanes_do_not_discard():
+    # embedding and maintenance jobs are not dropped silently when their lanes are full
+    for name in (LANE_EMBEDDING, LANE_MAINTENANCE):
+        assert task_scheduler.lanes[name].reject_policy == 'raise'
+
+
+def test_queue_timeout():
+    lane = TaskLane('test', max_workers=1, max_queue=10, queue_timeout=0.05)
+    gate, wait = _blocker()
+    lane.submit(wait)
+    stale = lane.submit(lambda: 'never')
+    time.sleep(0.1)
+    gate.set()
+    assert isinstance(stale.exception(timeout=5), TaskTimeoutError)
+    assert lane.stats()['timeouts'] == 1
+    lane.shutdown()
+
+
+def test_queue_timeout_while_workers_busy():
+    lane = TaskLane('test', max_workers=1, max_queue=10, queue_timeout=0.05)
+    gate, wait = _blocker()
+    lane.submit(wait)
+    stale = [lane.submit(lambda: 'never', workspace=workspace) for workspace in ('a', 'b')]
+    # the only worker is still blocked, the sweeper fails the queued tasks on time
+    for future in stale:
+        assert isinstance(future.exception(timeout=1), TaskTimeoutError)
+    stats = lane.stats()
+    assert stats['timeouts'] == 2 and stats['queued'] == 0 and stats['running'] == 1
+
+    fresh = lane.submit(lambda: 'done')
+    gate.set()
+    assert fresh.result(timeout=5) == 'done'
+    lane.shutdown()
+
+
+def test_acquire_shares_the_worker_limit():
+    lane = TaskLane('test', max_workers=1, max_queue=2, queue_timeout=0.2)
+    slot = lane.acquire(workspace='a')
+    assert slot.result(timeout=1) is None
+    queued = lane.submit(lambda: 'done')
+    waiting = lane.acquire(workspace='b')
+    # the held slot counts as a running task, so the queue is full and new requests are rejected
+    with pytest.raises(TaskRejectedError):
+        lane.acquire()
+    assert not queued.done() and not waiting.done()
+
+    lane.release()
+    assert queued.result(timeout=5) == 'done'
+    waiting.result(timeout=5)
+    stale = lane.acquire()
+    # never released, the queued slot request times out like a queued task
+    assert isinstance(stale.exception(timeout=1), TaskTimeoutError)
+    lane.release(failed=True)
+    stats = lane.stats()
+    assert (stats['running'], stats['completed'], stats['failed'], stats['timeouts']) == (0, 3, 1, 1)
+    lane.shutdown()
@@ -0,0 +1,95 @@
+"""
+Tests for the pgvector index helpers: the index dimension check before a search and the search SQL it renders.
+"""
+import pytest
+
+pytest.importorskip("apps.ai_model.vector_index")
+
+from apps.ai_model import vector_index
+from apps.ai_model.vector_index import prepare_vector_search, render_search_sql
+from common.core.config import settings
+
+SEARCH_SQL = """
+SELECT id, 1 - ({embedding_distance}) AS similarity FROM terminology
+WHERE oid = :oid AND {embedding_filter}
+ORDER BY {embedding_distance}
+"""
+
+
+class _Result:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class _Session:
+    def __init__(self, indexdef):
+        self.indexdef = indexdef
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append(str(statement))
+        return _Result(self.indexdef if 'pg_indexes' in str(statement) else None)
+
+
+def _indexdef(dim):
+    return (f'CREATE INDEX idx_terminology_embedding ON public.terminology USING hnsw '
+            f'(((embedding)::vector({dim})) vector_cosine_ops) WITH (m=\'16\', ef_construction=\'64\') '
+            f'WHERE ((embedding IS NOT NULL) AND (vector_dims(embedding) = {dim}))')
+
+
+@pytest.fixture(autouse=True)
+def index_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'EMBEDDING_VECTOR_INDEX_TYPE', 'hnsw')
+    monkeypatch.setattr(vector_index, '_index_dimensions', {})
+    monkeypatch.setattr(vector_index, '_dimension_warnings', set())
+
+
+def test_matching_dimension_uses_the_index():
+    session = _Session(_indexdef(4))
+    assert prepare_vector_search(session, 'terminology', [0.1] * 4) == 4
+    assert session.executed[-1] == f'SET LOCAL hnsw.ef_search = {settings.EMBEDDING_HNSW_EF_SEARCH}'
+
+    sql = render_search_sql(SEARCH_SQL, 4)
+    assert 'CAST(embedding AS vector(4)) <=> CAST(:embedding_array AS vector(4))' in sql
+    assert 'embedding IS NOT NULL AND vector_dims(embedding) = 4' in sql
+
+    # the index dimension is cached
+    assert prepare_vector_search(session, 'terminology', [0.1] * 4) == 4
+    assert sum('pg_indexes' in sql for sql in session.executed) == 1
+
+
+def test_mismatched_dimension_falls_back(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(vector_index.SQLBotLogUtil, 'warning', warnings.append)
+    session = _Session(_indexdef(768))
+
+    assert prepare_vector_search(session, 'terminology', [0.1] * 1024) is None
+    assert prepare_vector_search(session, 'terminology', [0.1] * 1024) is None
+    assert len(warnings) == 1 and 'dimension 768' in warnings[0] and '1024' in warnings[0]
+    assert not any(sql.startswith('SET LOCAL') for sql in session.executed)
+
+    sql = render_search_sql(SEARCH_SQL, None)
+    assert 'vector_dims' not in sql and 'CAST' not in sql
+    assert 'ORDER BY embedding <=> :embedding_array' in sql
+    assert 'WHERE oid = :oid AND embedding IS NOT NULL' in sql
+
+
+def test_without_index(monkeypatch):
+    session = _Session(None)
+    assert prepare_vector_search(session, 'terminology', [0.1] * 4) is None
+
+    monkeypatch.setattr(settings, 'EMBEDDING_VECTOR_INDEX_TYPE', 'none')
+    session = _Session(_indexdef(4))
+    assert prepare_vector_search(session, 'terminology', [0.1] * 4) is None
+    assert session.executed == []
+
+
+def test_create_index_sql():
+    sql = vector_index.create_index_sql('data_training', 1024, 'ivfflat', concurrently=True)
+    assert 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_data_training_embedding' in sql
+    assert 'USING ivfflat ((CAST(embedding AS vector(1024))) vector_cosine_ops)' in sql
+    assert 'vector_dims(embedding) = 1024' in sql
+    assert vector_index.create_index_sql('data_training', 1024, 'none') is None